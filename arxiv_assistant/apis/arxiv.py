@@ -1,14 +1,17 @@
 from html import unescape
 from xml.etree import ElementTree
 
-import feedparser
 import re
 import requests
 import retry
 import warnings
-from typing import Dict, List, Set, Tuple
+from datetime import date
+from typing import Dict, List, Set, Tuple, Union
 
-from arxiv_assistant.environment import OUTPUT_DEBUG_FILE_FORMAT
+from arxiv_assistant.apis.arxiv_oai import OaiHarvester, OaiRecord, get_oai_harvester, get_oai_set
+from arxiv_assistant.environment import get_context
+from arxiv_assistant.utils.dump import get_dump_options, get_dump_writer
+from arxiv_assistant.utils.tracing import get_tracer
 from arxiv_assistant.utils.utils import Paper, normalize_whitespace
 
 
@@ -20,6 +23,9 @@ def get_papers_from_arxiv_api(
     force_primary: bool = False,
     debug_messages: bool = False,
     dump_debug_file: bool = False,
+    debug_file_format: str = None,
+    session: requests.Session = None,
+    debug_compress_level: int = 1,
 ) -> Tuple[List, List[Paper]]:
     """
     Get papers by calling the arXiv API.
@@ -32,7 +38,7 @@ def get_papers_from_arxiv_api(
     begin_year, begin_month, begin_day = begin_date
     end_year, end_month, end_day = end_date
 
-    base_url = "http://export.arxiv.org/api/query"
+    base_url = f"{get_context().arxiv_base_url}/api/query"
     begin_date_string = f"{begin_year}{format(begin_month, '02d')}{format(begin_day, '02d')}"
     end_date_string = f"{end_year}{format(end_month, '02d')}{format(end_day, '02d')}"
     date_query = f"submittedDate:[{begin_date_string}0000+TO+{end_date_string}2359]"
@@ -40,11 +46,14 @@ def get_papers_from_arxiv_api(
 
     url = f"{base_url}?search_query={area_query}+AND+{date_query}&start=0&max_results=10000"
     print(f"Getting papers from {url}")
-    response = requests.get(url, timeout=10)
-    response.raise_for_status()
+    with get_tracer().span(f"api {area}", "fetch") as span:
+        response = (session if session is not None else requests).get(url, timeout=10)
+        response.raise_for_status()
+        span.add(bytes=len(response.content))
     if dump_debug_file:
-        with open(OUTPUT_DEBUG_FILE_FORMAT.format(f"raw_content_{area}.xml"), "w", encoding="utf-8") as outfile:
-            outfile.write(response.text)
+        if debug_file_format is None:
+            debug_file_format = get_context().output_debug_file_format
+        get_dump_writer().write_text(debug_file_format.format(f"raw_content_{area}.xml"), response.text, compress_level=debug_compress_level)
 
     # Parse the XML response
     root = ElementTree.fromstring(response.text)
@@ -81,6 +90,25 @@ def get_papers_from_arxiv_api(
     return entries, paper_list
 
 
+def paper_from_rss_entry(entry) -> Paper:
+    # for the author field make sure to strip the HTML tags
+    authors = [
+        unescape(re.sub("<[^<]+?>", "", author)).strip()
+        for author in entry.author.replace("\n", ", ").split(",")
+    ]
+    # strip html tags from summary
+    summary = re.sub("<[^<]+?>", "", entry.summary)
+    summary = unescape(re.sub("\n", " ", summary))
+    # strip the last pair of parentehses containing (arXiv:xxxx.xxxxx [area.XX])
+    title = re.sub(r"\(arXiv:[0-9]+\.[0-9]+v[0-9]+ \[.*\]\)$", "", entry.title)
+    # strip the abstract
+    abstract = summary.split("Abstract: ")[-1]
+    # remove the link part of the id
+    arxiv_id = entry.link.split("/")[-1].split("v")[0]
+
+    return Paper(authors=authors, title=title, abstract=abstract, arxiv_id=arxiv_id)
+
+
 @retry.retry(tries=3, delay=30.0)
 def get_papers_from_arxiv_rss(
     area: str,
@@ -88,24 +116,34 @@ def get_papers_from_arxiv_rss(
     force_primary: bool = False,
     debug_messages: bool = False,
     dump_debug_file: bool = False,
+    debug_file_format: str = None,
+    session: requests.Session = None,
+    debug_compress_level: int = 1,
 ) -> Tuple[List[Dict], List[Paper]]:
     """
     Get papers from the arXiv RSS feed.
     - Cons:
         Cannot go back to a previous date to get corresponding announced papers.
     """
+    import feedparser
+
     if announce_type is None:
         announce_type = {"new"}
 
     # get the list of entries
-    url = f"https://export.arxiv.org/rss/{area}"
+    url = f"{get_context().arxiv_base_url}/rss/{area}"
     print(f"Getting papers from {url}")
-    response = requests.get(url, timeout=10)
-    response.raise_for_status()
-    feed = feedparser.parse(response.text)
+    with get_tracer().span(f"rss {area}", "fetch") as span:
+        response = (session if session is not None else requests).get(url, timeout=10)
+        response.raise_for_status()
+        span.add(bytes=len(response.content))
+    with get_tracer().span(f"rss {area}", "parse"):
+        feed = feedparser.parse(response.text)
+    get_context().observe_feed(feed)  # the announcement date of this run is resolved from the first fetched feed
     if dump_debug_file:
-        with open(OUTPUT_DEBUG_FILE_FORMAT.format(f"raw_content_{area}.rss"), "w", encoding="utf-8") as outfile:
-            outfile.write(response.text)
+        if debug_file_format is None:
+            debug_file_format = get_context().output_debug_file_format
+        get_dump_writer().write_text(debug_file_format.format(f"raw_content_{area}.rss"), response.text, compress_level=debug_compress_level)
 
     # get the list of entries
     entries = feed.entries
@@ -131,44 +169,132 @@ def get_papers_from_arxiv_rss(
                 print(f"Ignoring \"{paper.title}\" by `paper_area` ({paper_area})")
             continue
 
-        # otherwise make a new paper, for the author field make sure to strip the HTML tags
-        authors = [
-            unescape(re.sub("<[^<]+?>", "", author)).strip()
-            for author in paper.author.replace("\n", ", ").split(",")
-        ]
-        # strip html tags from summary
-        summary = re.sub("<[^<]+?>", "", paper.summary)
-        summary = unescape(re.sub("\n", " ", summary))
-        # strip the last pair of parentehses containing (arXiv:xxxx.xxxxx [area.XX])
-        title = re.sub(r"\(arXiv:[0-9]+\.[0-9]+v[0-9]+ \[.*\]\)$", "", paper.title)
-        # strip the abstract
-        abstract = summary.split("Abstract: ")[-1]
-        # remove the link part of the id
-        arxiv_id = paper.link.split("/")[-1].split("v")[0]
-
-        # make a new paper
-        new_paper = Paper(authors=authors, title=title, abstract=abstract, arxiv_id=arxiv_id)
-        paper_list.append(new_paper)
+        # otherwise make a new paper
+        paper_list.append(paper_from_rss_entry(paper))
 
     print(f"{len(paper_list)} papers left for {area}")
 
     return entries, paper_list
 
 
+@retry.retry(tries=3, delay=30.0)
+def get_papers_from_arxiv_oai(
+    area: str,
+    begin_date: Tuple[int, int, int],  # year, month, day
+    end_date: Tuple[int, int, int],  # year, month, day
+    announce_type: Set[str] = None,
+    force_primary: bool = False,
+    debug_messages: bool = False,
+    dump_debug_file: bool = False,
+    debug_file_format: str = None,
+    session: requests.Session = None,
+    debug_compress_level: int = 1,
+    harvester: OaiHarvester = None,
+) -> Tuple[List[OaiRecord], List[Paper]]:
+    """
+    Get papers announced between `begin_date` and `end_date` by harvesting the arXiv OAI-PMH interface (see `arxiv_oai.py`).
+    - Pros:
+        Filter papers by their announced dates and `announce_type`, over any date range.
+        Harvest the whole archive of the area for the range in a few requests, shared by the other areas of the archive and by later runs.
+    - Cons:
+        Only the latest version of each paper is served, so papers replaced after the range are missing from it.
+    """
+    if announce_type is None:
+        announce_type = {"new"}
+    if harvester is None:
+        harvester = get_oai_harvester(get_context().config)
+    set_spec = get_oai_set(area)
+    from_date, until_date = date(*begin_date), date(*end_date)
+
+    on_page = None
+    if dump_debug_file:
+        if debug_file_format is None:
+            debug_file_format = get_context().output_debug_file_format
+        on_page = lambda name, content: get_dump_writer().write_text(
+            debug_file_format.format(f"raw_content_oai_{name}.xml"), content.decode("utf-8"), compress_level=debug_compress_level,
+        )
+    print(f"Getting papers of {area} from the OAI-PMH set {set_spec} from {from_date} to {until_date}")
+    harvester.update(f"{get_context().arxiv_base_url}/oai2", set_spec, from_date, until_date, session, on_page)
+
+    # the records announced in the feed of the area, like the entries of its RSS feed
+    entries = []
+    paper_list = []
+    for record in harvester.iter_records(set_spec, from_date, until_date):
+        record_announce_type = record.get_announce_type(area)
+        if record_announce_type is None:
+            continue
+        entries.append(record)
+
+        # filter by `announce_type`
+        if record_announce_type not in announce_type:
+            if debug_messages:
+                print(f"Ignoring \"{record.title}\" by `announce_type` ({record_announce_type})")
+            continue
+
+        # ignore papers not in primary area
+        paper_area = record.categories[0]
+        if (area != paper_area) and force_primary:
+            if debug_messages:
+                print(f"Ignoring \"{record.title}\" by `paper_area` ({paper_area})")
+            continue
+
+        paper_list.append(record.to_paper())
+
+    if len(entries) == 0:
+        print(f"No entries found for {area}")
+        return [], []
+    print(f"{len(entries)} entries found for {area}")
+    print(f"{len(paper_list)} papers left for {area}")
+
+    return entries, paper_list
+
+
+def harvest_arxiv_oai(config, begin_date: Tuple[int, int, int], end_date: Tuple[int, int, int], session: requests.Session = None) -> int:
+    """
+    Harvests the OAI-PMH sets of all categories in `arxiv_category` from `begin_date` to `end_date` in one pass,
+    so that the runs of each day in the range read the harvested records without requests.
+    :return: the number of harvested records
+    """
+    harvester = get_oai_harvester(config)
+    area_list = [s.strip() for s in config["FILTERING"]["arxiv_category"].split(",")]
+    records = 0
+    for set_spec in dict.fromkeys(get_oai_set(area) for area in area_list):
+        records += harvester.update(f"{get_context().arxiv_base_url}/oai2", set_spec, date(*begin_date), date(*end_date), session)
+    return records
+
+
 def get_papers_from_arxiv(
     config,
     source="rss",
     begin_date: Tuple[int, int, int] = None,
     end_date: Tuple[int, int, int] = None,
-) -> Tuple[List[Dict], Dict[str, List[Paper]]]:
+    debug_file_format: str = None,
+    fetch_cache=None,
+    session: requests.Session = None,
+    keep_entries: bool = None,
+) -> Tuple[Union[List[Dict], int], Dict[str, List[Paper]]]:
+    # `fetch_cache` is an in-memory cache of (entries, papers) keyed by the query, shared by concurrent runs
+    # `session` is an optional HTTP session kept alive across calls
+    # `keep_entries=False` (the default with `low_memory = true`) drops the raw entries after parsing and returns their count instead
+    if keep_entries is None:
+        keep_entries = not config["OUTPUT"].getboolean("low_memory", fallback=False)
     all_entries = []
+    entry_cnt = 0
     arxiv_paper_dict = {}
+    ingested_papers = {}  # arxiv id -> the first parsed paper, shared by all areas listing it
+
+    def ingest(area, entries, papers):
+        nonlocal entry_cnt
+        entry_cnt += entries if isinstance(entries, int) else len(entries)
+        if keep_entries and not isinstance(entries, int):
+            all_entries.extend(entries)
+        arxiv_paper_dict[area] = [ingested_papers.setdefault(paper.arxiv_id, paper) for paper in papers]
 
     area_list = [s.strip() for s in config["FILTERING"]["arxiv_category"].split(",")]
     announce_type_list = [s.strip() for s in config["FILTERING"].get("announce_type", "new").split(",")]
     force_primary = config["FILTERING"].getboolean("force_primary")
     debug_messages = config["OUTPUT"].getboolean("debug_messages")
-    dump_debug_file = config["OUTPUT"].getboolean("dump_debug_file")
+    dump_debug_file, debug_compress_level = get_dump_options(config)
 
     if source == "rss":
         print(f"Using RSS feed to get papers...")
@@ -181,9 +307,11 @@ def get_papers_from_arxiv(
                 force_primary,
                 debug_messages,
                 dump_debug_file,
+                debug_file_format,
+                session,
+                debug_compress_level,
             )
-            all_entries.extend(entries)
-            arxiv_paper_dict[area] = papers
+            ingest(area, entries, papers)
 
     elif source == "api":
         print(f"Using arXiv API to get papers...")
@@ -197,24 +325,55 @@ def get_papers_from_arxiv(
         if not (len(announce_type_list) == 1 and "new" in announce_type_list):
             warnings.warn(f"Specifying `announce_type` is not supported for \"api\" source, ignoring {announce_type_list}")
         for area in area_list:
-            entries, papers = get_papers_from_arxiv_api(
+            cache_key = f"api/{area}/{begin_date}/{end_date}/{force_primary}"
+            if fetch_cache is not None and cache_key in fetch_cache:
+                print(f"Using cached papers for {area} from {begin_date} to {end_date}")
+                entries, papers = fetch_cache.get(cache_key)
+            else:
+                entries, papers = get_papers_from_arxiv_api(
+                    area,
+                    begin_date,
+                    end_date,
+                    force_primary,
+                    debug_messages,
+                    dump_debug_file,
+                    debug_file_format,
+                    session,
+                    debug_compress_level,
+                )
+                if fetch_cache is not None:
+                    fetch_cache.set(cache_key, (entries if keep_entries else len(entries), papers))
+            ingest(area, entries, papers)
+
+    elif source == "oai":
+        print(f"Using arXiv OAI-PMH to get papers...")
+        if begin_date is None or end_date is None:
+            raise ValueError(f"Both `begin_date` and `end_date` arguments are required for \"oai\" source")
+        for area in area_list:
+            # the harvested records are stored, so there is nothing to keep in `fetch_cache`
+            entries, papers = get_papers_from_arxiv_oai(
                 area,
                 begin_date,
                 end_date,
+                set(announce_type_list),
                 force_primary,
                 debug_messages,
+                dump_debug_file,
+                debug_file_format,
+                session,
+                debug_compress_level,
             )
-            all_entries.extend(entries)
-            arxiv_paper_dict[area] = papers
+            ingest(area, entries if keep_entries else len(entries), papers)
 
     else:
         raise ValueError(f"Unknown source \"{source}\"")
 
+    if not keep_entries:
+        return entry_cnt, arxiv_paper_dict
     return all_entries, arxiv_paper_dict
 
 
 if __name__ == "__main__":
-    from arxiv_assistant.environment import NOW_TIME
     from datetime import timedelta
 
     area = "cs.LG"
@@ -226,7 +385,7 @@ if __name__ == "__main__":
     print("Getting papers from arXiv RSS...")
     entries, papers = get_papers_from_arxiv_rss(area, announce_type, force_primary, debug_messages, dump_debug_file)
 
-    yesterday = NOW_TIME - timedelta(days=1)  # use yesterday's time as the API returns papers by their uploaded date instead of the announced date
+    yesterday = get_context().now_time - timedelta(days=1)  # use yesterday's time as the API returns papers by their uploaded date instead of the announced date
     yesterday_date = (int(yesterday.strftime("%Y")), int(yesterday.strftime("%m")), int(yesterday.strftime("%d")))
 
     print("Getting papers from arXiv API...")
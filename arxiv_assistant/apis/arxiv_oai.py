@@ -0,0 +1,366 @@
+"""
+Bulk harvesting of arXiv metadata through OAI-PMH (https://info.arxiv.org/help/oa/index.html), for backfills over many days.
+
+One `ListRecords` request returns up to about a thousand records of a set (an arXiv archive, e.g. `physics:astro-ph` or `cs`)
+whose datestamp (the day the record last changed, i.e. its announcement for new versions) is within `from` and `until`,
+and a resumption token for the next page. A window of weeks is thus harvested in a handful of requests, whatever the number of days,
+instead of one search per category and day through the arXiv API.
+
+Records are kept in a SQLite store (`cache_path`/oai_harvest.sqlite, WAL mode), keyed by set and arXiv id:
+- harvesting is incremental: the days of a set harvested by a complete run are recorded, and later requests only harvest the missing days
+  (days from today on are never recorded as complete, as their records may still change),
+- each page is stored with the resumption token of the next one in one transaction, so an interrupted harvest continues from its last page
+  (a harvest restarts from its first page if the repository has expired the token),
+- `iter_records` streams the stored records of a window, and `OaiRecord.to_paper` turns them into `Paper` objects.
+Flow control answers (503 or 429 with `Retry-After`) are waited for. OAI-PMH only serves the current version of each record,
+so a paper replaced after the window appears on the day of its latest version, not in the window.
+The store is not carried by the cache snapshots (`arxiv_assistant.utils.snapshot`): a backfill on a fresh runner harvests its range again.
+"""
+import io
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from xml.etree import ElementTree
+
+import requests
+
+from arxiv_assistant.utils.io import create_dir
+from arxiv_assistant.utils.tracing import get_tracer
+from arxiv_assistant.utils.utils import Paper, normalize_whitespace
+
+OAI_NAMESPACE = "{http://www.openarchives.org/OAI/2.0/}"
+ARXIV_NAMESPACE = "{http://arxiv.org/OAI/arXiv/}"
+METADATA_PREFIX = "arXiv"
+# the archives grouped under the `physics` set
+PHYSICS_ARCHIVES = {"astro-ph", "cond-mat", "gr-qc", "hep-ex", "hep-lat", "hep-ph", "hep-th", "math-ph", "nlin", "nucl-ex", "nucl-th", "physics", "quant-ph"}
+# a record whose latest version is older than this when its datestamp changed had a metadata-only update, it was not announced that day
+MAX_ANNOUNCE_DELAY_DAYS = 14
+MAX_FLOW_CONTROL_RETRIES = 5
+MAX_RETRY_AFTER_SECONDS = 600
+REQUEST_TIMEOUT_SECONDS = 120
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    set_spec TEXT NOT NULL,
+    arxiv_id TEXT NOT NULL,
+    datestamp TEXT NOT NULL,
+    categories TEXT NOT NULL,
+    created TEXT,
+    updated TEXT,
+    title TEXT NOT NULL,
+    abstract TEXT NOT NULL,
+    authors TEXT NOT NULL,
+    PRIMARY KEY (set_spec, arxiv_id)
+);
+CREATE INDEX IF NOT EXISTS records_datestamp ON records (set_spec, datestamp);
+CREATE TABLE IF NOT EXISTS harvested_days (
+    set_spec TEXT NOT NULL,
+    day TEXT NOT NULL,
+    harvested REAL NOT NULL,
+    PRIMARY KEY (set_spec, day)
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    set_spec TEXT NOT NULL,
+    from_date TEXT NOT NULL,
+    until_date TEXT NOT NULL,
+    token TEXT NOT NULL,
+    pages INTEGER NOT NULL,
+    records INTEGER NOT NULL,
+    complete_list_size INTEGER,
+    updated REAL NOT NULL,
+    PRIMARY KEY (set_spec, from_date, until_date)
+);
+"""
+
+
+def get_oai_set(category: str) -> str:
+    # the OAI-PMH set of an arXiv category, e.g. "astro-ph.GA" -> "physics:astro-ph", "cs.LG" -> "cs"
+    archive = category.split(".")[0]
+    return f"physics:{archive}" if archive in PHYSICS_ARCHIVES else archive
+
+
+@dataclass(frozen=True)
+class OaiRecord:
+    arxiv_id: str
+    datestamp: str  # YYYY-MM-DD
+    categories: Tuple[str, ...]  # the primary category first
+    created: Optional[str]  # the date of the first version
+    updated: Optional[str]  # the date of the latest version, None for a single version
+    title: str
+    abstract: str
+    authors: Tuple[str, ...]
+
+    def to_paper(self) -> Paper:
+        return Paper(authors=self.authors, title=self.title, abstract=self.abstract, arxiv_id=self.arxiv_id)
+
+    def get_announce_type(self, area: str) -> Optional[str]:
+        # the announce type of the record in the feed of `area` on its datestamp, as in the RSS feeds, None if it was not announced there
+        if area not in self.categories:
+            return None
+        version_date = self.updated or self.created
+        if version_date is not None and date.fromisoformat(version_date) < date.fromisoformat(self.datestamp) - timedelta(days=MAX_ANNOUNCE_DELAY_DAYS):
+            return None
+        primary = area == self.categories[0]
+        if self.updated is not None:
+            return "replace" if primary else "replace-cross"
+        return "new" if primary else "cross"
+
+
+@dataclass
+class OaiPage:
+    records: List[OaiRecord]
+    deleted_ids: List[str]
+    token: Optional[str]  # None on the last page
+    complete_list_size: Optional[int]
+    error_code: Optional[str] = None
+
+
+def get_text(element, tag) -> Optional[str]:
+    child = element.find(tag)
+    return child.text if child is not None and child.text is not None else None
+
+
+def parse_author(element) -> str:
+    parts = [get_text(element, f"{ARXIV_NAMESPACE}{tag}") for tag in ("forenames", "keyname", "suffix")]
+    return normalize_whitespace(" ".join(part for part in parts if part))
+
+
+def parse_page(content: bytes) -> OaiPage:
+    # parses the records one by one and drops each once parsed, so a page never lives as a full tree
+    page = OaiPage([], [], None, None)
+    for _, element in ElementTree.iterparse(io.BytesIO(content), events=("end",)):
+        if element.tag == f"{OAI_NAMESPACE}record":
+            header = element.find(f"{OAI_NAMESPACE}header")
+            if header.get("status") == "deleted":
+                page.deleted_ids.append(get_text(header, f"{OAI_NAMESPACE}identifier").rsplit(":", 1)[-1])
+            else:
+                metadata = element.find(f"{OAI_NAMESPACE}metadata/{ARXIV_NAMESPACE}arXiv")
+                page.records.append(OaiRecord(
+                    arxiv_id=get_text(metadata, f"{ARXIV_NAMESPACE}id").strip(),
+                    datestamp=get_text(header, f"{OAI_NAMESPACE}datestamp").strip(),
+                    categories=tuple((get_text(metadata, f"{ARXIV_NAMESPACE}categories") or "").split()),
+                    created=get_text(metadata, f"{ARXIV_NAMESPACE}created"),
+                    updated=get_text(metadata, f"{ARXIV_NAMESPACE}updated"),
+                    title=normalize_whitespace(get_text(metadata, f"{ARXIV_NAMESPACE}title") or ""),
+                    abstract=normalize_whitespace(get_text(metadata, f"{ARXIV_NAMESPACE}abstract") or ""),
+                    authors=tuple(parse_author(author) for author in metadata.iter(f"{ARXIV_NAMESPACE}author")),
+                ))
+            element.clear()
+        elif element.tag == f"{OAI_NAMESPACE}resumptionToken":
+            page.token = element.text.strip() if element.text and element.text.strip() else None
+            size = element.get("completeListSize")
+            page.complete_list_size = int(size) if size is not None else None
+        elif element.tag == f"{OAI_NAMESPACE}error":
+            page.error_code = element.get("code")
+            if page.error_code not in ("noRecordsMatch", "badResumptionToken"):
+                raise ValueError(f"OAI-PMH error {page.error_code}: {element.text}")
+    return page
+
+
+def get_retry_after(response) -> float:
+    try:
+        return min(float(response.headers.get("Retry-After", 30)), MAX_RETRY_AFTER_SECONDS)
+    except ValueError:  # an HTTP date instead of seconds
+        return 30.0
+
+
+def request_page(url, params: Dict[str, str], session: requests.Session = None) -> requests.Response:
+    # one OAI-PMH request, waiting out the flow control answers of the repository
+    for _ in range(MAX_FLOW_CONTROL_RETRIES):
+        response = (session if session is not None else requests).get(url, params=params, timeout=REQUEST_TIMEOUT_SECONDS)
+        if response.status_code in (429, 503) and "Retry-After" in response.headers:
+            retry_after = get_retry_after(response)
+            print(f"OAI-PMH repository asked to retry after {retry_after:.0f}s")
+            time.sleep(retry_after)
+            continue
+        response.raise_for_status()
+        return response
+    raise RuntimeError(f"OAI-PMH repository at {url} is still busy after {MAX_FLOW_CONTROL_RETRIES} attempts")
+
+
+def get_day_ranges(days: List[date]) -> List[Tuple[date, date]]:
+    # sorted days -> ranges of consecutive days
+    ranges = []
+    for day in days:
+        if len(ranges) > 0 and ranges[-1][1] + timedelta(days=1) == day:
+            ranges[-1] = (ranges[-1][0], day)
+        else:
+            ranges.append((day, day))
+    return ranges
+
+
+class OaiHarvester:
+    """
+    The harvested records and checkpoints, safe to share across threads. Each set is harvested by one thread at a time.
+    """
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        if path != ":memory:":
+            create_dir(os.path.dirname(path) or ".")
+        self._lock = threading.Lock()
+        self._set_locks = defaultdict(threading.Lock)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def get_missing_days(self, set_spec: str, from_date: date, until_date: date) -> List[date]:
+        with self._lock:
+            harvested = {row[0] for row in self._conn.execute(
+                "SELECT day FROM harvested_days WHERE set_spec = ? AND day BETWEEN ? AND ?", (set_spec, from_date.isoformat(), until_date.isoformat()),
+            )}
+        days = [from_date + timedelta(days=i) for i in range((until_date - from_date).days + 1)]
+        return [day for day in days if day.isoformat() not in harvested]
+
+    def get_checkpoint(self, set_spec: str, from_date: date, until_date: date) -> Optional[Tuple[str, int, int]]:
+        # (token, pages, records) of an interrupted harvest of this window
+        with self._lock:
+            return self._conn.execute(
+                "SELECT token, pages, records FROM checkpoints WHERE set_spec = ? AND from_date = ? AND until_date = ?",
+                (set_spec, from_date.isoformat(), until_date.isoformat()),
+            ).fetchone()
+
+    def store_page(self, set_spec: str, from_date: date, until_date: date, page: OaiPage, pages: int, records: int):
+        # the records of a page and the checkpoint of the next one, atomically
+        def write(conn):
+            conn.executemany(
+                "INSERT OR REPLACE INTO records (set_spec, arxiv_id, datestamp, categories, created, updated, title, abstract, authors) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [
+                    (set_spec, record.arxiv_id, record.datestamp, " ".join(record.categories), record.created, record.updated,
+                     record.title, record.abstract, json.dumps(record.authors, ensure_ascii=False))
+                    for record in page.records
+                ],
+            )
+            conn.executemany("DELETE FROM records WHERE set_spec = ? AND arxiv_id = ?", [(set_spec, arxiv_id) for arxiv_id in page.deleted_ids])
+            key = (set_spec, from_date.isoformat(), until_date.isoformat())
+            if page.token is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints (set_spec, from_date, until_date, token, pages, records, complete_list_size, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (*key, page.token, pages, records, page.complete_list_size, time.time()),
+                )
+                return
+            # the harvest is complete: its days are harvested, except those which may still change
+            conn.execute("DELETE FROM checkpoints WHERE set_spec = ? AND from_date = ? AND until_date = ?", key)
+            today = datetime.now(timezone.utc).date()
+            now_time = time.time()
+            conn.executemany(
+                "INSERT OR REPLACE INTO harvested_days (set_spec, day, harvested) VALUES (?, ?, ?)",
+                [
+                    (set_spec, (from_date + timedelta(days=i)).isoformat(), now_time)
+                    for i in range((min(until_date, today - timedelta(days=1)) - from_date).days + 1)
+                ],
+            )
+
+        self._transaction(write)
+
+    def clear_checkpoint(self, set_spec: str, from_date: date, until_date: date):
+        self._transaction(lambda conn: conn.execute(
+            "DELETE FROM checkpoints WHERE set_spec = ? AND from_date = ? AND until_date = ?", (set_spec, from_date.isoformat(), until_date.isoformat()),
+        ))
+
+    def harvest(
+        self, base_url: str, set_spec: str, from_date: date, until_date: date, session: requests.Session = None, on_page: Callable[[str, bytes], None] = None,
+    ) -> Iterator[OaiRecord]:
+        """
+        Harvests the records of `set_spec` with a datestamp within `from_date` and `until_date`, continuing an interrupted harvest of this window.
+        Records are yielded page by page, as soon as each page is stored.
+        :param on_page: called with a name and the raw content of each page, e.g. to dump it
+        """
+        checkpoint = self.get_checkpoint(set_spec, from_date, until_date)
+        token, pages, records = checkpoint if checkpoint is not None else (None, 0, 0)
+        if token is not None:
+            print(f"Continuing the OAI-PMH harvest of {set_spec} from {from_date} to {until_date} after {pages} pages and {records} records")
+        while True:
+            if token is not None:
+                params = {"verb": "ListRecords", "resumptionToken": token}
+            else:
+                params = {"verb": "ListRecords", "metadataPrefix": METADATA_PREFIX, "set": set_spec, "from": from_date.isoformat(), "until": until_date.isoformat()}
+            with get_tracer().span(f"oai {set_spec}", "fetch") as span:
+                response = request_page(base_url, params, session)
+                span.add(bytes=len(response.content))
+            if on_page is not None:
+                on_page(f"{set_spec.replace(':', '_')}_{from_date}_{until_date}_{pages}", response.content)
+            with get_tracer().span(f"oai {set_spec}", "parse"):
+                page = parse_page(response.content)
+            if page.error_code == "badResumptionToken":
+                if token is None:
+                    raise ValueError(f"OAI-PMH repository rejected the harvest of {set_spec} from {from_date} to {until_date}")
+                print(f"The resumption token of the OAI-PMH harvest of {set_spec} has expired, harvesting from the first page")
+                self.clear_checkpoint(set_spec, from_date, until_date)
+                token, pages, records = None, 0, 0
+                continue
+            pages += 1
+            records += len(page.records)
+            self.store_page(set_spec, from_date, until_date, page, pages, records)
+            yield from page.records
+            if page.token is None:
+                return
+            token = page.token
+
+    def update(self, base_url: str, set_spec: str, from_date: date, until_date: date, session: requests.Session = None, on_page: Callable[[str, bytes], None] = None) -> int:
+        # harvests the days of the window missing from the store, returns the number of harvested records
+        with self._set_locks[set_spec]:
+            missing_days = self.get_missing_days(set_spec, from_date, until_date)
+            if len(missing_days) == 0:
+                print(f"Using harvested records of {set_spec} from {from_date} to {until_date}")
+                return 0
+            records = 0
+            for range_from, range_until in get_day_ranges(missing_days):
+                start_time = time.perf_counter()
+                range_records = sum(1 for _ in self.harvest(base_url, set_spec, range_from, range_until, session, on_page))
+                print(f"Harvested {range_records} records of {set_spec} from {range_from} to {range_until} in {time.perf_counter() - start_time:.1f}s")
+                records += range_records
+            return records
+
+    def iter_records(self, set_spec: str, from_date: date, until_date: date) -> Iterator[OaiRecord]:
+        # the stored records of the window, by datestamp then arXiv id
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT arxiv_id, datestamp, categories, created, updated, title, abstract, authors FROM records "
+                "WHERE set_spec = ? AND datestamp BETWEEN ? AND ? ORDER BY datestamp, arxiv_id",
+                (set_spec, from_date.isoformat(), until_date.isoformat()),
+            ).fetchall()
+        for arxiv_id, datestamp, categories, created, updated, title, abstract, authors in rows:
+            yield OaiRecord(arxiv_id, datestamp, tuple(categories.split()), created, updated, title, abstract, tuple(json.loads(authors)))
+
+
+_harvesters = {}
+_harvesters_lock = threading.Lock()
+
+
+def get_oai_harvest_path(config) -> str:
+    cache_path = config["OUTPUT"].get("cache_path", os.path.join(config["OUTPUT"]["output_path"], "cache"))
+    return config["OUTPUT"].get("oai_harvest_path", os.path.join(cache_path, "oai_harvest.sqlite"))
+
+
+def get_oai_harvester(config) -> OaiHarvester:
+    # one open store per path, shared by all runs of this process
+    path = get_oai_harvest_path(config)
+    with _harvesters_lock:
+        if path not in _harvesters:
+            _harvesters[path] = OaiHarvester(path)
+        return _harvesters[path]
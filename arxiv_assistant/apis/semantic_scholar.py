@@ -1,9 +1,28 @@
 import time
+
 from requests import Session
 from retry import retry
 from tqdm import tqdm
 from typing import Dict, List, Optional
 
+from arxiv_assistant.environment import get_context
+from arxiv_assistant.utils.coordination import SharedRateLimiter, get_host_coordinator, is_host_coordinated
+from arxiv_assistant.utils.rate_limit import RateLimiter
+from arxiv_assistant.utils.tracing import get_tracer
+
+# shared by all threads, so that concurrent runs (e.g., backfills) respect the global rate limit
+# with a key, allow a query every 20ms, otherwise semantic scholar aggressively rate limits, so do 1.0s
+S2_RATE_LIMITER_WITH_KEY = RateLimiter(1, period=0.02)
+S2_RATE_LIMITER_WITHOUT_KEY = RateLimiter(1, period=1.0)
+
+
+def get_s2_rate_limiter(S2_API_KEY: str):
+    # with `host_coordination = true`, the same rates hold for all processes of the host
+    rate_limiter = S2_RATE_LIMITER_WITH_KEY if S2_API_KEY is not None else S2_RATE_LIMITER_WITHOUT_KEY
+    if is_host_coordinated():
+        return SharedRateLimiter(get_host_coordinator(), "s2:requests", rate_limiter.limit, period=rate_limiter.period)
+    return rate_limiter
+
 
 def get_author_batch(
     session: Session,
@@ -29,7 +48,7 @@ def get_author_batch(
     }
 
     with session.post(
-        "https://api.semanticscholar.org/graph/v1/author/batch",
+        f"{get_context().s2_base_url}/graph/v1/author/batch",
         params=params,
         headers=headers,
         json=body,
@@ -42,16 +61,18 @@ def get_author_batch(
 def get_one_author(session, author: str, S2_API_KEY: str) -> str:
     # query the right endpoint https://api.semanticscholar.org/graph/v1/author/search?query=adam+smith
     params = {"query": author, "fields": "authorId,name,hIndex", "limit": "10"}
+    get_tracer().current_span().attempt()
     if S2_API_KEY is None:
         headers = {}
     else:
         headers = {"X-API-KEY": S2_API_KEY}
     with session.get(
-        "https://api.semanticscholar.org/graph/v1/author/search",
+        f"{get_context().s2_base_url}/graph/v1/author/search",
         params=params,
         headers=headers,
     ) as response:
         response.raise_for_status()
+        get_tracer().current_span().add(bytes=len(response.content))
         response_json = response.json()
         if len(response_json["data"]) >= 1:
             return response_json["data"]
@@ -59,25 +80,60 @@ def get_one_author(session, author: str, S2_API_KEY: str) -> str:
             return None
 
 
+def is_fresh(entry, config: Optional[Dict]) -> bool:
+    # cache entries are {"time": ..., "authors": aliases or None}, entries of the older format (bare aliases) have no time and are stale
+    if not isinstance(entry, dict) or "time" not in entry:
+        return False
+    if entry["authors"] is None:
+        max_age_days = config["SELECTION"].getfloat("author_cache_miss_days", fallback=7)
+    else:
+        max_age_days = config["SELECTION"].getfloat("author_cache_days", fallback=30)
+    return max_age_days <= 0 or time.time() - entry["time"] < max_age_days * 86400
+
+
+def lookup_author(session: Session, author: str, S2_API_KEY: str, config: Optional[Dict], cache=None):
+    # looks up one author name through the cache or the rate-limited search, returns the list of aliases or None
+    # cached results are looked up again once older than `author_cache_days` (`author_cache_miss_days` for names not found)
+    entry = cache.get(author) if cache is not None else None
+    if is_fresh(entry, config):
+        return entry["authors"]
+    # wait if another run (or process) is looking up the same name, and reuse its result
+    coordinator = get_host_coordinator()
+    claimed, auth_map = coordinator.acquire_work(f"s2:{author}")
+    if not claimed:
+        if cache is not None:
+            cache.set(author, {"time": time.time(), "authors": auth_map})
+        return auth_map
+
+    with get_tracer().span("author_lookup", "author") as span:
+        span.add(queue_wait=get_s2_rate_limiter(S2_API_KEY).acquire())
+        try:
+            auth_map = get_one_author(session, author, S2_API_KEY)
+            if cache is not None:
+                cache.set(author, {"time": time.time(), "authors": auth_map})
+            coordinator.finish_work(f"s2:{author}", auth_map, publish=True)
+        except Exception as ex:
+            coordinator.finish_work(f"s2:{author}")
+            if config["OUTPUT"].getboolean("debug_messages"):
+                print("exception happened" + str(ex))
+            # keep using an expired entry rather than losing the author
+            auth_map = entry["authors"] if isinstance(entry, dict) and "time" in entry else entry
+    return auth_map
+
+
 def get_authors(
-    all_authors: List[str], S2_API_KEY: str, config: Optional[Dict], **kwargs
+    all_authors: List[str], S2_API_KEY: str, config: Optional[Dict], cache=None, session: Session = None, **kwargs
 ):
     # first get the list of all author ids by querying by author names
+    # `cache` maps author names to their timed query results (None for authors not found), shared across runs
+    # `session` is an optional HTTP session kept alive across calls
+    if session is None:
+        with Session() as session:
+            return get_authors(all_authors, S2_API_KEY, config, cache=cache, session=session, **kwargs)
+
     author_metadata_dict = {}
-    with Session() as session:
-        for author in tqdm(all_authors):
-            try:
-                auth_map = get_one_author(session, author, S2_API_KEY)
-            except Exception as ex:
-                if config["OUTPUT"].getboolean("debug_messages"):
-                    print("exception happened" + str(ex))
-                auth_map = None
-            if auth_map is not None:
-                author_metadata_dict[author] = auth_map
-            # add a 20ms wait time to avoid rate limiting
-            # otherwise, semantic scholar aggressively rate limits, so do 1.0s
-            if S2_API_KEY is not None:
-                time.sleep(0.02)
-            else:
-                time.sleep(1.0)
+    for author in tqdm(all_authors):
+        auth_map = lookup_author(session, author, S2_API_KEY, config, cache=cache)
+        if auth_map is not None:
+            author_metadata_dict[author] = auth_map
     return author_metadata_dict
@@ -1,9 +1,20 @@
+"""
+The run context: configs, watched authors, prompts, keys, the announcement date and output paths.
+
+Nothing is loaded when importing this module. Everything is read lazily from `get_context()` on first access,
+and the announcement date is taken from the first arXiv RSS feed fetched by the run (see `RunContext.observe_feed`),
+so no extra network request is needed to resolve it.
+The old module-level constants (`CONFIG`, `NOW_YEAR`, `OUTPUT_JSON_FILE_FORMAT`, ...) are still available for compatibility,
+but accessing them triggers the corresponding lazy loading.
+"""
 import configparser
-import feedparser
 import os
+import threading
 from datetime import UTC, datetime
+from functools import cached_property
+from typing import Tuple
 
-from arxiv_assistant.utils.io import create_dir
+from arxiv_assistant.utils.io import get_output_file_formats
 
 
 def parse_authors(lines):
@@ -21,87 +32,228 @@ def parse_authors(lines):
     return authors, author_ids
 
 
-# load config.ini
-CONFIG = configparser.ConfigParser()
-CONFIG.read("configs/config.ini")
-
-print({section: dict(CONFIG[section]) for section in CONFIG.sections()})
-print(f"###################################################################")
-
-# load authors.txt
-with open("configs/authors.txt", "r", encoding="utf-8") as fopen:
-    author_names, author_ids = parse_authors(fopen.readlines())
-AUTHOR_ID_SET = set(author_ids)
-
-# load prompts
-with open("prompts/system_prompt.txt", "r", encoding="utf-8") as f:
-    SYSTEM_PROMPT = f.read()
-with open("prompts/paper_topics.txt", "r", encoding="utf-8") as f:
-    TOPIC_PROMPT = f.read()
-with open("prompts/score_criteria.txt", "r", encoding="utf-8") as f:
-    SCORE_PROMPT = f.read()
-with open("prompts/postfix_prompt_title.txt", "r", encoding="utf-8") as f:
-    POSTFIX_PROMPT_TITLE = f.read()
-with open("prompts/postfix_prompt_abstract.txt", "r", encoding="utf-8") as f:
-    POSTFIX_PROMPT_ABSTRACT = f.read()
-
-# keys
-S2_API_KEY = os.environ.get("S2_KEY")
-OPENAI_API_KEY = os.environ.get("OPENAI_API_KEY")
-OPENAI_BASE_URL = os.environ.get("OPENAI_BASE_URL")
-SLACK_KEY = os.environ.get("SLACK_KEY")
-SLACK_CHANNEL_ID = os.environ.get("SLACK_CHANNEL_ID")
-
-print(f"S2_API_KEY: {S2_API_KEY}")
-print(f"OPENAI_API_KEY: {OPENAI_API_KEY}")
-print(f"OPENAI_BASE_URL: {OPENAI_BASE_URL}")
-print(f"SLACK_KEY: {SLACK_KEY}")
-print(f"SLACK_CHANNEL_ID: {SLACK_CHANNEL_ID}")
-
-if OPENAI_API_KEY is None:
-    raise ValueError("OpenAI key is not set - please set OPENAI_API_KEY to your OpenAI key")
-
-# now time
-try:
-    # get from ArXiv
-    feed = feedparser.parse("https://export.arxiv.org/rss/cs.LG")  # use the cs.LG area
-    if len(feed.entries) > 0:
-        # Example `feed.published`: "Tue, 18 Feb 2025 00:00:00 -0500"
-        parsed_time = datetime.strptime(feed.entries[0].published, "%a, %d %b %Y %H:%M:%S %z")
-        NOW_TIME = parsed_time
-        NOW_YEAR = int(NOW_TIME.strftime("%Y"))
-        NOW_MONTH = int(NOW_TIME.strftime("%m"))
-        NOW_DAY = int(NOW_TIME.strftime("%d"))
-    else:
-        raise ValueError("Feed does not contain any entries")
-except Exception as e:
-    # use local time
-    NOW_TIME = datetime.now(UTC)
-    NOW_YEAR = int(NOW_TIME.strftime("%Y"))
-    NOW_MONTH = int(NOW_TIME.strftime("%m"))
-    NOW_DAY = int(NOW_TIME.strftime("%d"))
-
-print(f"NOW_YEAR: {NOW_YEAR}")
-print(f"NOW_MONTH: {NOW_MONTH}")
-print(f"NOW_DAY: {NOW_DAY}")
-
-# output path
-OUTPUT_DEBUG_DIR = os.path.join(CONFIG["OUTPUT"]["output_path"], "debug", f"{NOW_YEAR}-{format(NOW_MONTH, '02d')}", f"{NOW_YEAR}-{format(NOW_MONTH, '02d')}-{format(NOW_DAY, '02d')}")
-OUTPUT_DEBUG_FILE_FORMAT = os.path.join(OUTPUT_DEBUG_DIR, "{}")
-create_dir(OUTPUT_DEBUG_DIR)
-
-OUTPUT_MD_DIR = os.path.join(CONFIG["OUTPUT"]["output_path"], "md", f"{NOW_YEAR}-{format(NOW_MONTH, '02d')}")
-OUTPUT_MD_FILE_FORMAT = os.path.join(OUTPUT_MD_DIR, f"{NOW_YEAR}-{format(NOW_MONTH, '02d')}-{format(NOW_DAY, '02d')}-" + "{}")
-create_dir(OUTPUT_MD_DIR)
-
-OUTPUT_JSON_DIR = os.path.join(CONFIG["OUTPUT"]["output_path"], "json", f"{NOW_YEAR}-{format(NOW_MONTH, '02d')}")
-OUTPUT_JSON_FILE_FORMAT = os.path.join(OUTPUT_JSON_DIR, f"{NOW_YEAR}-{format(NOW_MONTH, '02d')}-{format(NOW_DAY, '02d')}-" + "{}")
-create_dir(OUTPUT_JSON_DIR)
-
-print(f"OUTPUT_DEBUG_DIR: {OUTPUT_DEBUG_DIR}")
-print(f"OUTPUT_DEBUG_FILE_FORMAT: {OUTPUT_DEBUG_FILE_FORMAT}")
-print(f"OUTPUT_MD_DIR: {OUTPUT_MD_DIR}")
-print(f"OUTPUT_MD_FILE_FORMAT: {OUTPUT_MD_FILE_FORMAT}")
-print(f"OUTPUT_JSON_DIR: {OUTPUT_JSON_DIR}")
-print(f"OUTPUT_JSON_FILE_FORMAT: {OUTPUT_JSON_FILE_FORMAT}")
-print(f"###################################################################")
+def read_text_file(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def parse_feed_time(feed) -> datetime:
+    # Example `feed.published`: "Tue, 18 Feb 2025 00:00:00 -0500"
+    return datetime.strptime(feed.entries[0].published, "%a, %d %b %Y %H:%M:%S %z")
+
+
+def mask_key(key):
+    if key is None:
+        return None
+    return key[:4] + "*" * max(len(key) - 4, 0)
+
+
+class RunContext:
+    def __init__(self, config_path="configs/config.ini", authors_path="configs/authors.txt", prompts_dir="prompts"):
+        self.config_path = config_path
+        self.authors_path = authors_path
+        self.prompts_dir = prompts_dir
+        self._now_time = None
+        self._now_time_lock = threading.Lock()
+
+    # configs
+    @cached_property
+    def config(self) -> configparser.ConfigParser:
+        config = configparser.ConfigParser()
+        config.read(self.config_path)
+        return config
+
+    @cached_property
+    def authors(self) -> Tuple[list, list]:
+        with open(self.authors_path, "r", encoding="utf-8") as fopen:
+            return parse_authors(fopen.readlines())
+
+    @cached_property
+    def author_id_set(self) -> set:
+        return set(self.authors[1])
+
+    # prompts
+    @cached_property
+    def system_prompt(self) -> str:
+        return read_text_file(os.path.join(self.prompts_dir, "system_prompt.txt"))
+
+    @cached_property
+    def topic_prompt(self) -> str:
+        return read_text_file(os.path.join(self.prompts_dir, "paper_topics.txt"))
+
+    @cached_property
+    def score_prompt(self) -> str:
+        return read_text_file(os.path.join(self.prompts_dir, "score_criteria.txt"))
+
+    @cached_property
+    def postfix_prompt_title(self) -> str:
+        return read_text_file(os.path.join(self.prompts_dir, "postfix_prompt_title.txt"))
+
+    @cached_property
+    def postfix_prompt_abstract(self) -> str:
+        return read_text_file(os.path.join(self.prompts_dir, "postfix_prompt_abstract.txt"))
+
+    @cached_property
+    def postfix_prompt_abstract_compact(self) -> str:
+        return read_text_file(os.path.join(self.prompts_dir, "postfix_prompt_abstract_compact.txt"))
+
+    @cached_property
+    def rules_text(self) -> str:
+        # keyword rules decided before any LLM call (see `arxiv_assistant/filters/filter_rules.py`), empty without a rules file
+        rules_path = self.config["SELECTION"].get("rules_path", "configs/rules.txt")
+        return read_text_file(rules_path) if os.path.exists(rules_path) else ""
+
+    # keys, read from the environment on every access
+    @property
+    def s2_api_key(self):
+        return os.environ.get("S2_KEY")
+
+    @property
+    def openai_api_key(self):
+        return os.environ.get("OPENAI_API_KEY")
+
+    @property
+    def openai_base_url(self):
+        return os.environ.get("OPENAI_BASE_URL")
+
+    @property
+    def slack_key(self):
+        return os.environ.get("SLACK_KEY")
+
+    @property
+    def slack_channel_id(self):
+        return os.environ.get("SLACK_CHANNEL_ID")
+
+    # service endpoints, overridable for local stand-ins (e.g. the offline benchmarks)
+    @property
+    def arxiv_base_url(self):
+        return os.environ.get("ARXIV_BASE_URL", "https://export.arxiv.org").rstrip("/")
+
+    @property
+    def s2_base_url(self):
+        return os.environ.get("S2_BASE_URL", "https://api.semanticscholar.org").rstrip("/")
+
+    @property
+    def slack_base_url(self):
+        return os.environ.get("SLACK_BASE_URL", "https://slack.com/api/")
+
+    def require_openai_api_key(self):
+        if self.openai_api_key is None:
+            raise ValueError("OpenAI key is not set - please set OPENAI_API_KEY to your OpenAI key")
+        return self.openai_api_key
+
+    # now time
+    def observe_feed(self, feed) -> bool:
+        # resolves the announcement date from an already fetched RSS feed, the first resolved date is kept for the whole run
+        with self._now_time_lock:
+            if self._now_time is not None:
+                return False
+            if len(feed.entries) == 0:
+                return False
+            try:
+                self._now_time = parse_feed_time(feed)
+            except Exception as e:
+                print(f"Failed to resolve the announcement date from the feed ({e})")
+                return False
+            print(f"Announcement date resolved from the feed: {self._now_time.strftime('%Y-%m-%d')}")
+            return True
+
+    def set_now_time(self, now_time):
+        with self._now_time_lock:
+            self._now_time = now_time
+
+    def reset_now_time(self):
+        # forget the resolved date, so that the next run resolves it from its own feeds
+        self.set_now_time(None)
+
+    @property
+    def now_time(self) -> datetime:
+        with self._now_time_lock:
+            if self._now_time is None:
+                # no feed has been observed, use local time
+                self._now_time = datetime.now(UTC)
+            return self._now_time
+
+    @property
+    def now_date(self) -> Tuple[int, int, int]:
+        now_time = self.now_time
+        return now_time.year, now_time.month, now_time.day
+
+    # output paths, the directories are created on first access
+    @property
+    def output_file_formats(self) -> Tuple[str, str, str]:
+        return get_output_file_formats(self.config["OUTPUT"]["output_path"], self.now_date)
+
+    @property
+    def output_debug_file_format(self) -> str:
+        return self.output_file_formats[0]
+
+    @property
+    def output_md_file_format(self) -> str:
+        return self.output_file_formats[1]
+
+    @property
+    def output_json_file_format(self) -> str:
+        return self.output_file_formats[2]
+
+    def describe(self):
+        print({section: dict(self.config[section]) for section in self.config.sections()})
+        print(f"S2_API_KEY: {mask_key(self.s2_api_key)}")
+        print(f"OPENAI_API_KEY: {mask_key(self.openai_api_key)}")
+        print(f"OPENAI_BASE_URL: {self.openai_base_url}")
+        print(f"SLACK_KEY: {mask_key(self.slack_key)}")
+        print(f"SLACK_CHANNEL_ID: {self.slack_channel_id}")
+        print(f"###################################################################")
+
+
+_context = None
+_context_lock = threading.Lock()
+
+
+def get_context() -> RunContext:
+    global _context
+    with _context_lock:
+        if _context is None:
+            _context = RunContext()
+        return _context
+
+
+def set_context(context: RunContext):
+    global _context
+    with _context_lock:
+        _context = context
+
+
+# compatibility with the old module-level constants, resolved lazily on access
+_LAZY_ATTRIBUTES = {
+    "CONFIG": lambda context: context.config,
+    "AUTHOR_ID_SET": lambda context: context.author_id_set,
+    "author_names": lambda context: context.authors[0],
+    "author_ids": lambda context: context.authors[1],
+    "SYSTEM_PROMPT": lambda context: context.system_prompt,
+    "TOPIC_PROMPT": lambda context: context.topic_prompt,
+    "SCORE_PROMPT": lambda context: context.score_prompt,
+    "POSTFIX_PROMPT_TITLE": lambda context: context.postfix_prompt_title,
+    "POSTFIX_PROMPT_ABSTRACT": lambda context: context.postfix_prompt_abstract,
+    "S2_API_KEY": lambda context: context.s2_api_key,
+    "OPENAI_API_KEY": lambda context: context.openai_api_key,
+    "OPENAI_BASE_URL": lambda context: context.openai_base_url,
+    "SLACK_KEY": lambda context: context.slack_key,
+    "SLACK_CHANNEL_ID": lambda context: context.slack_channel_id,
+    "NOW_TIME": lambda context: context.now_time,
+    "NOW_YEAR": lambda context: context.now_date[0],
+    "NOW_MONTH": lambda context: context.now_date[1],
+    "NOW_DAY": lambda context: context.now_date[2],
+    "OUTPUT_DEBUG_FILE_FORMAT": lambda context: context.output_debug_file_format,
+    "OUTPUT_MD_FILE_FORMAT": lambda context: context.output_md_file_format,
+    "OUTPUT_JSON_FILE_FORMAT": lambda context: context.output_json_file_format,
+    "OUTPUT_DEBUG_DIR": lambda context: os.path.dirname(context.output_debug_file_format),
+    "OUTPUT_MD_DIR": lambda context: os.path.dirname(context.output_md_file_format),
+    "OUTPUT_JSON_DIR": lambda context: os.path.dirname(context.output_json_file_format),
+}
+
+
+def __getattr__(name):
+    if name in _LAZY_ATTRIBUTES:
+        return _LAZY_ATTRIBUTES[name](get_context())
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
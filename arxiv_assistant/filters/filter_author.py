@@ -1,50 +1,139 @@
-import dataclasses
+import threading
+from typing import Dict, FrozenSet, Iterable, List
 
+from arxiv_assistant.utils.utils import Paper, PaperResult
 
-def select_by_author(all_authors, paper_list, author_targets, config):
+
+class AuthorIndex:
+    """
+    An inverted index over the output of `get_authors` (author name -> list of Semantic Scholar aliases).
+    It maps each name to its author ids and max h-index, and each author id back to names,
+    so that the author selection and the h-index cutoff are set lookups instead of nested loops over aliases.
+    Names are indexed again only when their aliases change (e.g., a refreshed lookup), so the same index can be updated
+    and reused across profiles and dates.
+    """
+
+    def __init__(self, all_authors: Dict = None):
+        self.author_ids: Dict[str, FrozenSet[str]] = {}  # name -> author ids of all aliases
+        self.max_hindex: Dict[str, float] = {}  # name -> max h-index over aliases
+        self.id_to_names: Dict[str, set] = {}  # author id -> names
+        self._aliases = {}  # name -> indexed aliases, unchanged lookups are skipped by identity
+        self._watched_names = {}  # frozenset of watched ids -> names having any of them
+        self._paper_max_hindex = {}  # arxiv id -> max h-index over the paper's authors
+        self._lock = threading.Lock()
+        if all_authors is not None:
+            self.update(all_authors)
+
+    def update(self, all_authors: Dict) -> int:
+        # indexes the new names and those whose author ids or h-index changed, returns their number
+        with self._lock:
+            new_cnt = 0
+            for name, aliases in all_authors.items():
+                if self._aliases.get(name) is aliases:
+                    continue
+                self._aliases[name] = aliases
+                ids = frozenset(alias["authorId"] for alias in aliases)
+                max_hindex = max([alias.get("hIndex") or 0 for alias in aliases] + [0])
+                old_ids = self.author_ids.get(name)
+                if old_ids == ids and self.max_hindex[name] == max_hindex:
+                    continue
+                for author_id in (old_ids or frozenset()) - ids:
+                    self.id_to_names[author_id].discard(name)
+                self.author_ids[name] = ids
+                self.max_hindex[name] = max_hindex
+                for author_id in ids:
+                    self.id_to_names.setdefault(author_id, set()).add(name)
+                new_cnt += 1
+            if new_cnt > 0:
+                # derived lookups may change with new or changed names
+                self._watched_names.clear()
+                self._paper_max_hindex.clear()
+            return new_cnt
+
+    def __contains__(self, name):
+        return name in self.author_ids
+
+    def __len__(self):
+        return len(self.author_ids)
+
+    def get_watched_names(self, author_targets: Iterable[str]) -> FrozenSet[str]:
+        # names with any alias in `author_targets`, cached per watch list
+        author_targets = frozenset(author_targets)
+        with self._lock:
+            if author_targets not in self._watched_names:
+                self._watched_names[author_targets] = frozenset(
+                    name for author_id in author_targets for name in self.id_to_names.get(author_id, ())
+                )
+            return self._watched_names[author_targets]
+
+    def get_paper_max_hindex(self, paper: Paper) -> float:
+        max_hindex = self._paper_max_hindex.get(paper.arxiv_id)
+        if max_hindex is None:
+            max_hindex = max([self.max_hindex.get(author, 0) for author in paper.authors] + [0])
+            self._paper_max_hindex[paper.arxiv_id] = max_hindex
+        return max_hindex
+
+    def get_watched_papers(self, paper_list: List[Paper], author_targets: Iterable[str]) -> Dict[str, List[Paper]]:
+        # maps each watched author id to the papers it appears on
+        author_targets = frozenset(author_targets)
+        watched_names = self.get_watched_names(author_targets)
+        watched_papers = {}
+        for paper in paper_list:
+            for author in watched_names.intersection(paper.authors):
+                for author_id in self.author_ids[author] & author_targets:
+                    watched_papers.setdefault(author_id, []).append(paper)
+        return watched_papers
+
+
+# shared by all runs of this process, so that profiles and dates reuse the indexed names
+_author_index = AuthorIndex()
+
+
+def get_author_index(all_authors: Dict = None) -> AuthorIndex:
+    if all_authors is not None:
+        _author_index.update(all_authors)
+    return _author_index
+
+
+def select_by_author(all_authors, paper_list, author_targets, config, author_index: AuthorIndex = None):
     # author-based selection
+    if author_index is None:
+        author_index = get_author_index(all_authors)
+    watched_names = author_index.get_watched_names(author_targets)
+
     new_paper_list = []
     selected_results = {}
 
     for paper in paper_list:
-        selected = any(
-            alias["authorId"] in author_targets
-            for author in paper.authors if author in all_authors
-            for alias in all_authors[author]
-        )
-        if selected:
-            selected_results[paper.arxiv_id] = {
+        if watched_names.isdisjoint(paper.authors):
+            new_paper_list.append(paper)
+        else:
+            selected_results[paper.arxiv_id] = PaperResult(paper, {
                 "COMMENT": "Author match",
                 "SCORE": float(config["SELECTION"]["author_match_score"]),
-                **dataclasses.asdict(paper),
-            }
-        else:
-            new_paper_list.append(paper)
+            })
 
     print(f"Selected {len(selected_results)} papers based on author match, remaining {len(new_paper_list)} papers")
     return new_paper_list, selected_results
 
 
-def filter_papers_by_hindex(all_authors, paper_list, config):
+def filter_papers_by_hindex(all_authors, paper_list, config, author_index: AuthorIndex = None):
     # filters papers by checking to see if there's at least one author with > h_cutoff hindex
+    if author_index is None:
+        author_index = get_author_index(all_authors)
+    h_cutoff = float(config["FILTERING"]["h_cutoff"])
+
     new_paper_list = []
     filtered_results = {}
 
     for paper in paper_list:
-        max_hindex = max(
-            [
-                alias["hIndex"]
-                for author in paper.authors if author in all_authors
-                for alias in all_authors[author]
-            ] + [0]
-        )
-        filtered = (max_hindex < float(config["FILTERING"]["h_cutoff"]))
+        max_hindex = author_index.get_paper_max_hindex(paper)
+        filtered = (max_hindex < h_cutoff)
         if filtered:
-            filtered_results[paper.arxiv_id] = {
+            filtered_results[paper.arxiv_id] = PaperResult(paper, {
                 "COMMENT": f"H-index filtered (max is {max_hindex}<{config['FILTERING']['h_cutoff']})",
                 "SCORE": 0,
-                **dataclasses.asdict(paper),
-            }
+            })
         else:
             new_paper_list.append(paper)
 
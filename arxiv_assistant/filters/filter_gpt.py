@@ -1,19 +1,32 @@
-import dataclasses
-import datetime
+import hashlib
 import json
 import math
 import re
 import retry
+import threading
 import time
-from openai import OpenAI
 from tqdm import tqdm
-from typing import Dict, List, Tuple
-
-from arxiv_assistant.environment import OPENAI_API_KEY, OPENAI_BASE_URL, OUTPUT_DEBUG_FILE_FORMAT
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Tuple
+
+from arxiv_assistant.environment import get_context
+from arxiv_assistant.filters.near_duplicates import REUSE_SAME_ID_SIMILARITY, REUSE_SIMILARITY, get_near_duplicate_index, get_scoring_tag
+from arxiv_assistant.filters.priority import is_past
+from arxiv_assistant.filters.stage_planner import StagePlan, StagePlanner, get_abstract_stage, get_stage_stats
+from arxiv_assistant.utils.coordination import SharedRateLimiter, get_host_coordinator, is_host_coordinated
+from arxiv_assistant.utils.dump import get_dump_options, get_dump_writer
 from arxiv_assistant.utils.pricing import MODEL_PRICING
-from arxiv_assistant.utils.utils import EnhancedJSONEncoder, Paper, batched
+from arxiv_assistant.utils.rate_limit import RateLimiter
+from arxiv_assistant.utils.tracing import get_tracer
+from arxiv_assistant.utils.utils import Paper, PaperResult, batched
 
 ABSTRACT_CUTOFF = 4000
+OUTPUT_PROTOCOLS = ("jsonl", "compact")
+# the `max_tokens` of a compact batch: the scores of every paper, and a one-sentence comment for those above the cutoffs
+COMPACT_TOKENS_PER_PAPER = 64
+COMPACT_TOKENS_OVERHEAD = 16
+# the comment length assumed for the papers left without one by the compact protocol, when estimating the JSONL completion
+JSONL_COMMENT_CHARS = 120
 
 
 def calc_price(model, usage):
@@ -63,6 +76,28 @@ def paper_to_string(paper_entry: Paper) -> str:
     )
 
 
+def get_paper_handle(index: int) -> str:
+    # a batch-local handle, shorter than the arXiv ID both in the prompt and in the output
+    return f"P{index + 1}"
+
+
+def paper_to_compact_string(paper_entry: Paper, handle: str) -> str:
+    # like `paper_to_string`, but the paper is identified by its batch-local handle
+    return (
+        "Paper: "
+        + handle
+        + "\n"
+        + "Title: "
+        + paper_entry.title
+        + "\n"
+        + "Authors: "
+        + ", ".join(paper_entry.authors)
+        + "\n"
+        + "Abstract: "
+        + paper_entry.abstract[:ABSTRACT_CUTOFF]
+    )
+
+
 def get_user_prompt_for_title_filtering(topic_prompt, postfix_prompt, batch_str):
     user_prompt = "\n\n".join(
         [
@@ -104,14 +139,68 @@ def get_batch_size(batch_size, paper_num, config):
     return int(batch_size * scale_factor)
 
 
-start_query_time = None
-query_cnt = 0
+# shared by all threads, so that concurrent runs (e.g., backfills) respect the global rate limit
+# (and by all processes of the host with `host_coordination = true`)
+rate_limiters = {}
+rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(limit_per_minute):
+    with rate_limiters_lock:
+        if limit_per_minute not in rate_limiters:
+            if is_host_coordinated():
+                rate_limiters[limit_per_minute] = SharedRateLimiter(get_host_coordinator(), "openai:requests", limit_per_minute, period=60.0)
+            else:
+                rate_limiters[limit_per_minute] = RateLimiter(limit_per_minute, period=60.0)
+        return rate_limiters[limit_per_minute]
+
+
+def estimate_tokens(*texts) -> int:
+    # a rough prompt size reserved from the token budget before the call, corrected by the actual usage after it
+    return sum(len(text) for text in texts) // 4
+
+
+def get_llm_cache_key(model, system_prompt, user_prompt):
+    return hashlib.sha256("\n\n".join([model, system_prompt, user_prompt]).encode("utf-8")).hexdigest()
+
+
+def get_topic_tag(topic_prompt) -> str:
+    # tags the cached LLM outputs of a topic prompt, so that cache snapshots can be pruned by profile
+    return hashlib.sha256(topic_prompt.encode("utf-8")).hexdigest()[:16]
+
+
+def completion_from_cache(cached):
+    # mimics the fields of an OpenAI completion that we use, a cached completion costs no tokens
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=cached["content"]))],
+        usage=SimpleNamespace(prompt_tokens=0, completion_tokens=0, model_extra={}),
+    )
 
 
 @retry.retry(tries=3, delay=30.0)
-def call_chatgpt(system_prompt, user_prompt, openai_client, model, limit_per_minute=-1):
-    def call():
-        return openai_client.chat.completions.create(
+def call_chatgpt(system_prompt, user_prompt, openai_client, model, limit_per_minute=-1, llm_cache=None, tokens_per_minute=-1, cache_tag=None, max_tokens=None):
+    cache_key = get_llm_cache_key(model, system_prompt, user_prompt)
+    if llm_cache is not None:
+        cached = llm_cache.get(cache_key)
+        if cached is not None:
+            return completion_from_cache(cached)
+
+    # wait if another run (or process) is sending the same prompt, and reuse its output
+    coordinator = get_host_coordinator()
+    claimed, shared = coordinator.acquire_work(f"openai:{cache_key}")
+    if not claimed:
+        if llm_cache is not None:
+            llm_cache.set(cache_key, shared)
+        return completion_from_cache(shared)
+
+    try:
+        span = get_tracer().current_span()
+        span.attempt()
+        # limit the query num and the tokens within a minute (no limit if <= 0)
+        span.add(queue_wait=get_rate_limiter(limit_per_minute).acquire())
+        estimated_tokens = estimate_tokens(system_prompt, user_prompt)
+        span.add(queue_wait=coordinator.acquire("openai:tokens", tokens_per_minute, period=60.0, amount=estimated_tokens))
+        completion = openai_client.chat.completions.create(
             model=model,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -119,30 +208,62 @@ def call_chatgpt(system_prompt, user_prompt, openai_client, model, limit_per_min
             ],
             temperature=0.0,
             seed=0,
+            **({"max_tokens": max_tokens} if max_tokens is not None else {}),
         )
+        span.add(prompt_tokens=completion.usage.prompt_tokens, completion_tokens=completion.usage.completion_tokens)
+        if tokens_per_minute > 0:
+            coordinator.record("openai:tokens", completion.usage.prompt_tokens + completion.usage.completion_tokens - estimated_tokens)
+    except BaseException:
+        coordinator.finish_work(f"openai:{cache_key}")
+        raise
+
+    output = {"content": completion.choices[0].message.content}
+    if cache_tag is not None:
+        output["tag"] = cache_tag
+    coordinator.finish_work(f"openai:{cache_key}", output, publish=True)
+    if llm_cache is not None:
+        llm_cache.set(cache_key, output)
+    return completion
+
+
+def record_llm_batch(config, stage, batch, system_prompt, user_prompt, completion, seconds, failed_cnt, filtered_cnt=0):
+    # records a batch for planning the next runs (see `stage_planner.py`), `completion` is None if the call failed
+    stage_stats = get_stage_stats(config)
+    if stage_stats is None or (completion is not None and completion.usage.prompt_tokens == 0):  # cached outputs cost nothing
+        return
+    stage_stats.record_batch(
+        config["SELECTION"]["model"],
+        stage,
+        len(batch),
+        len(batch),
+        failed_papers=failed_cnt,
+        filtered_papers=filtered_cnt,
+        prompt_tokens=completion.usage.prompt_tokens if completion is not None else 0,
+        estimated_prompt_tokens=estimate_tokens(system_prompt, user_prompt) if completion is not None else 0,
+        completion_tokens=completion.usage.completion_tokens if completion is not None else 0,
+        seconds=seconds,
+    )
 
-    if limit_per_minute <= 0:  # no limit
-        return call()
-
-    else:  # limit the query num within a minute
-        global start_query_time, query_cnt
-
-        while True:
-            now_time = datetime.datetime.now()
-            if start_query_time is None or now_time - start_query_time > datetime.timedelta(minutes=1):
-                start_query_time = now_time
-                query_cnt = 0
-            if query_cnt < limit_per_minute:
-                query_cnt += 1
-                return call()
-            else:  # wait for a second and recheck
-                time.sleep(1)
-                continue
+
+def discard_llm_output(llm_cache, model, system_prompt, user_prompt):
+    # do not reuse an invalid output when retrying, neither from the cache nor from another run
+    cache_key = get_llm_cache_key(model, system_prompt, user_prompt)
+    if llm_cache is not None:
+        llm_cache.delete(cache_key)
+    get_host_coordinator().discard(f"openai:{cache_key}")
+
+
+def create_openai_client():
+    from openai import OpenAI
+
+    context = get_context()
+    return OpenAI(api_key=context.require_openai_api_key(), base_url=context.openai_base_url)
 
 
 def filter_papers_by_title(
-    paper_list, openai_client, system_prompt, topic_prompt, postfix_prompt, config, retry=3,
+    paper_list, openai_client, system_prompt, topic_prompt, postfix_prompt, config, retry=3, llm_cache=None, deadline=None,
 ) -> Tuple[List[Paper], Dict, float, float, int, int]:
+    # papers not filtered by the `deadline` (a UNIX timestamp) are kept for abstract filtering
     batch_size = get_batch_size(int(config["SELECTION"]["title_batch_size"]), len(paper_list), config)
     print(f"Using batch size of {batch_size} for title filtering")
     batches_of_papers = batched(paper_list, batch_size)
@@ -156,17 +277,25 @@ def filter_papers_by_title(
     completion_tokens = 0
 
     for batch in tqdm(batches_of_papers, desc="Filtering title"):
+        if is_past(deadline):
+            new_paper_list.extend(batch)
+            continue
+
         # prepare input
         papers_string = [paper_to_titles(paper) for paper in batch]
         user_prompt = get_user_prompt_for_title_filtering(topic_prompt, postfix_prompt, papers_string)
         model = config["SELECTION"]["model"]
+        start_time = time.perf_counter()
         try:
-            completion = call_chatgpt(system_prompt,user_prompt, openai_client, model)
+            with get_tracer().span("title_batch", "llm", papers=len(batch)):
+                completion = call_chatgpt(system_prompt, user_prompt, openai_client, model, llm_cache=llm_cache, tokens_per_minute=int(config["SELECTION"].get("tokens_per_minute", "-1")), cache_tag=get_topic_tag(topic_prompt))
         except Exception as ex:
             if config["OUTPUT"].getboolean("debug_messages"):
                 print(f"Exception happened: Failed to call GPT with batch size {len(batch)} ({ex})")
             invalid_paper_list.extend(batch)
+            record_llm_batch(config, "title", batch, system_prompt, user_prompt, None, time.perf_counter() - start_time, len(batch))
             continue
+        seconds = time.perf_counter() - start_time
 
         # get GPT output
         prompt_cost, completion_cost = calc_price(model, completion.usage)
@@ -179,30 +308,36 @@ def filter_papers_by_title(
 
         # parse output
         try:
-            filtered_set = set(json.loads(out_text))
+            with get_tracer().span("title_output", "parse"):
+                filtered_set = set(json.loads(out_text))
             for paper in batch:
                 if paper.arxiv_id in filtered_set:
-                    filtered_results[paper.arxiv_id] = {
+                    filtered_results[paper.arxiv_id] = PaperResult(paper, {
                         "COMMENT": f"Title filtered",
                         "SCORE": 0,
-                        **dataclasses.asdict(paper),
-                    }
+                    })
                     print(f"Filtered out paper {paper.arxiv_id} by title ({paper.title})")
                 else:
                     new_paper_list.append(paper)
         except Exception as ex:
             invalid_paper_list.extend(batch)
+            discard_llm_output(llm_cache, model, system_prompt, user_prompt)
+            record_llm_batch(config, "title", batch, system_prompt, user_prompt, completion, seconds, len(batch))
             if config["OUTPUT"].getboolean("debug_messages"):
                 print(f"Exception happened: Failed to parse LM output as list ({ex})")
                 print(f"`out_text`: {out_text}")
             continue
+        record_llm_batch(config, "title", batch, system_prompt, user_prompt, completion, seconds, 0, filtered_cnt=len(filtered_set & {paper.arxiv_id for paper in batch}))
 
     print(f"Filtered {len(filtered_results)} papers based on title with cost of ${total_prompt_cost + total_completion_cost}, remaining {len(new_paper_list)} papers:\n"
           f"({prompt_tokens} prompt tokens cost ${total_prompt_cost})\n"
           f"({completion_tokens} completion tokens cost ${total_completion_cost})")
 
     if len(invalid_paper_list) > 0:
-        if retry > 0:
+        if is_past(deadline):
+            print(f"Scoring deadline reached, skip retrying {len(invalid_paper_list)} papers failed to be filtered by GPT through title filtering")
+            new_paper_list.extend(invalid_paper_list)
+        elif retry > 0:
             print(f"Retrying {len(invalid_paper_list)} papers failed to be filtered by GPT through title filtering (left {retry - 1} retries)")
             retried_new_paper_list, retried_filtered_results, retried_total_prompt_cost, retried_total_completion_cost, retried_prompt_tokens, retried_completion_tokens = filter_papers_by_title(
                 invalid_paper_list,
@@ -212,6 +347,8 @@ def filter_papers_by_title(
                 postfix_prompt,
                 config,
                 retry - 1,
+                llm_cache=llm_cache,
+                deadline=deadline,
             )
             new_paper_list.extend(retried_new_paper_list)
             filtered_results.update(retried_filtered_results)
@@ -254,14 +391,79 @@ def parse_chatgpt(raw_out_text, config):
     return json_dicts, invalid_cnt
 
 
+def get_output_protocol(config) -> str:
+    protocol = config["SELECTION"].get("output_protocol", fallback="jsonl")
+    if protocol not in OUTPUT_PROTOCOLS:
+        raise ValueError(f"Unknown output_protocol \"{protocol}\", expected one of {OUTPUT_PROTOCOLS}")
+    return protocol
+
+
+def get_postfix_prompt_abstract(config) -> str:
+    # the output instructions of the abstract filter for `output_protocol`, with the cutoffs of the compact protocol filled in
+    context = get_context()
+    if get_output_protocol(config) == "compact":
+        return (
+            context.postfix_prompt_abstract_compact
+            .replace("{relevance_cutoff}", config["FILTERING"]["relevance_cutoff"])
+            .replace("{novelty_cutoff}", config["FILTERING"]["novelty_cutoff"])
+        )
+    return context.postfix_prompt_abstract
+
+
+def get_compact_max_tokens(batch_size: int) -> int:
+    return COMPACT_TOKENS_OVERHEAD + COMPACT_TOKENS_PER_PAPER * batch_size
+
+
+def parse_compact_output(raw_out_text, handle_ids: Dict[str, str], config):
+    # parses `HANDLE|RELEVANCE|NOVELTY|COMMENT` lines (the comment is optional) into the dicts of `parse_chatgpt`
+    json_dicts = []
+    invalid_cnt = 0
+    for line in raw_out_text.split("\n"):
+        line = line.strip()
+        if not line or line.startswith("```"):
+            continue
+        parts = line.split("|", 3)
+        try:
+            json_dicts.append({
+                "ARXIVID": handle_ids[parts[0].strip().strip("[]")],
+                "COMMENT": parts[3].strip() if len(parts) > 3 else "",
+                "RELEVANCE": int(parts[1]),
+                "NOVELTY": int(parts[2]),
+            })
+        except Exception as ex:
+            invalid_cnt += 1
+            if config["OUTPUT"].getboolean("debug_messages"):
+                print(f"Exception happened: Failed to parse LM output line \"{line}\" as HANDLE|RELEVANCE|NOVELTY|COMMENT ({ex!r})")
+    return json_dicts, invalid_cnt
+
+
+def estimate_jsonl_completion_tokens(json_dicts) -> int:
+    # the completion tokens the JSONL protocol would have taken for the same scores, for reporting the savings of the compact one
+    return estimate_tokens("```jsonl\n```", *(
+        json.dumps({**jdict, "COMMENT": jdict["COMMENT"] or "x" * JSONL_COMMENT_CHARS}) + "\n"
+        for jdict in json_dicts
+    ))
+
+
+def is_filtered_by_score(fields, config) -> bool:
+    return (
+        int(fields["RELEVANCE"]) < int(config["FILTERING"]["relevance_cutoff"]) or
+        int(fields["NOVELTY"]) < int(config["FILTERING"]["novelty_cutoff"])
+    )
+
+
 def filter_papers_by_abstract(
-    paper_list, id_paper_mapping, openai_client, system_prompt, topic_prompt, score_prompt, postfix_prompt, config, retry=3, limit_per_minute=-1,
-) -> Tuple[List[List[Dict]], Dict, Dict, float, float, int, int]:
+    paper_list, id_paper_mapping, openai_client, system_prompt, topic_prompt, score_prompt, postfix_prompt, config, retry=3, limit_per_minute=-1, llm_cache=None, deadline=None,
+) -> Tuple[List[List[Dict]], Dict, Dict, float, float, int, int, List[Paper], int]:
+    # batches are sent in the order of `paper_list`, and those left at the `deadline` (a UNIX timestamp) are returned as unscored
+    # the last value is the estimated number of completion tokens saved by the compact `output_protocol`
     batch_size = get_batch_size(int(config["SELECTION"]["abstract_batch_size"]), len(paper_list), config)
     print(f"Using batch size of {batch_size} for abstract filtering")
     batches_of_papers = batched(paper_list, batch_size)
+    compact = get_output_protocol(config) == "compact"
 
     invalid_arxiv_ids = set()  # arxiv ids of papers failed to be scored by GPT, recorded for retrying
+    unscored_papers = []  # papers left unscored at the deadline or after all retries
     scored_batches = []
     selected_results = {}
     filtered_results = {}
@@ -269,24 +471,39 @@ def filter_papers_by_abstract(
     total_completion_cost = 0.0
     prompt_tokens = 0
     completion_tokens = 0
+    saved_completion_tokens = 0
 
     for batch in tqdm(batches_of_papers, desc="Filtering abstract"):
+        if is_past(deadline):
+            unscored_papers.extend(batch)
+            continue
+
         # temp values
         this_scored_batch = []
         all_arxiv_ids = {paper.arxiv_id for paper in batch}
         finished_arxiv_ids = set()
 
         # prepare input
-        batch_str = [paper_to_string(paper) for paper in batch]
+        if compact:
+            handle_ids = {get_paper_handle(i): paper.arxiv_id for i, paper in enumerate(batch)}
+            batch_str = [paper_to_compact_string(paper, handle) for handle, paper in zip(handle_ids, batch)]
+            max_tokens = get_compact_max_tokens(len(batch))
+        else:
+            batch_str = [paper_to_string(paper) for paper in batch]
+            max_tokens = None
         user_prompt = get_user_prompt_for_abstract_filtering(topic_prompt, score_prompt, postfix_prompt, batch_str)
         model = config["SELECTION"]["model"]
+        start_time = time.perf_counter()
         try:
-            completion = call_chatgpt(system_prompt,user_prompt, openai_client, model, limit_per_minute=limit_per_minute)
+            with get_tracer().span("abstract_batch", "llm", papers=len(batch)):
+                completion = call_chatgpt(system_prompt, user_prompt, openai_client, model, limit_per_minute=limit_per_minute, llm_cache=llm_cache, tokens_per_minute=int(config["SELECTION"].get("tokens_per_minute", "-1")), cache_tag=get_topic_tag(topic_prompt), max_tokens=max_tokens)
         except Exception as ex:
             if config["OUTPUT"].getboolean("debug_messages"):
                 print(f"Exception happened: Failed to call GPT with batch size {len(batch)} ({ex})")
             invalid_arxiv_ids.update(all_arxiv_ids)
+            record_llm_batch(config, get_abstract_stage(config), batch, system_prompt, user_prompt, None, time.perf_counter() - start_time, len(batch))
             continue
+        seconds = time.perf_counter() - start_time
 
         # get GPT output
         prompt_cost, completion_cost = calc_price(model, completion.usage)
@@ -298,7 +515,13 @@ def filter_papers_by_abstract(
         print({"prompt": {"tokens": completion.usage.prompt_tokens, "cost": prompt_cost}, "completion": {"tokens": completion.usage.completion_tokens, "cost": completion_cost}})
 
         # parse output
-        json_dicts, _ = parse_chatgpt(out_text, config)
+        with get_tracer().span("abstract_output", "parse"):
+            if compact:
+                json_dicts, _ = parse_compact_output(out_text, handle_ids, config)
+            else:
+                json_dicts, _ = parse_chatgpt(out_text, config)
+        if compact and completion.usage.completion_tokens > 0:  # cached completions cost nothing either way
+            saved_completion_tokens += estimate_jsonl_completion_tokens(json_dicts) - completion.usage.completion_tokens
 
         for jdict in json_dicts:
             if jdict["ARXIVID"] not in id_paper_mapping:
@@ -306,18 +529,13 @@ def filter_papers_by_abstract(
                     print(f"Exception happened: ARXIVID \"{jdict['ARXIVID']}\" not found in `id_paper_mapping`")
                 continue
 
-            result = {
+            result = PaperResult(id_paper_mapping[jdict["ARXIVID"]], {
                 "SCORE": jdict["RELEVANCE"] + jdict["NOVELTY"],
                 **jdict,
-                **dataclasses.asdict(id_paper_mapping[jdict["ARXIVID"]]),
-            }
+            })
             this_scored_batch.append(result)
 
-            filtered = (
-                int(jdict["RELEVANCE"]) < int(config["FILTERING"]["relevance_cutoff"]) or
-                int(jdict["NOVELTY"]) < int(config["FILTERING"]["novelty_cutoff"])
-            )
-            if filtered:
+            if is_filtered_by_score(jdict, config):
                 filtered_results[jdict["ARXIVID"]] = result
                 print(f"Filtered out paper {jdict['ARXIVID']} by score (RELEVANCE={jdict['RELEVANCE']}, NOVELTY={jdict['NOVELTY']}) ({id_paper_mapping[jdict['ARXIVID']].title})")
             else:
@@ -330,17 +548,27 @@ def filter_papers_by_abstract(
         this_invalid_arxiv_ids = all_arxiv_ids - finished_arxiv_ids
         if len(this_invalid_arxiv_ids) > 0:
             invalid_arxiv_ids.update(this_invalid_arxiv_ids)
+            discard_llm_output(llm_cache, model, system_prompt, user_prompt)  # do not reuse the incomplete output
+        record_llm_batch(config, get_abstract_stage(config), batch, system_prompt, user_prompt, completion, seconds, len(this_invalid_arxiv_ids))
 
     print(f"Filtered {len(filtered_results)} papers based on abstract with cost of ${total_prompt_cost + total_completion_cost}, remaining {len(selected_results)} papers:\n"
           f"({prompt_tokens} prompt tokens cost ${total_prompt_cost})\n"
           f"({completion_tokens} completion tokens cost ${total_completion_cost})")
+    if compact:
+        print(f"The compact output protocol saved about {saved_completion_tokens} completion tokens over JSONL")
+
+    if len(unscored_papers) > 0:
+        print(f"Scoring deadline reached, left {len(unscored_papers)} papers unscored")
 
     # retry invalid arxiv ids
     if len(invalid_arxiv_ids) > 0:
-        if retry > 0:
+        if is_past(deadline):
+            print(f"Scoring deadline reached, skip retrying {len(invalid_arxiv_ids)} papers failed to be scored by GPT through abstract filtering")
+            unscored_papers.extend(paper for paper in paper_list if paper.arxiv_id in invalid_arxiv_ids)
+        elif retry > 0:
             print(f"Retrying {len(invalid_arxiv_ids)} papers failed to be scored by GPT through abstract filtering (left {retry - 1} retries)")
-            retried_scored_batches, retried_selected_results, retried_filtered_results, retried_total_prompt_cost, retried_total_completion_cost, retried_prompt_tokens, retried_completion_tokens = filter_papers_by_abstract(
-                [id_paper_mapping[arxiv_id] for arxiv_id in invalid_arxiv_ids],
+            retried_scored_batches, retried_selected_results, retried_filtered_results, retried_total_prompt_cost, retried_total_completion_cost, retried_prompt_tokens, retried_completion_tokens, retried_unscored_papers, retried_saved_completion_tokens = filter_papers_by_abstract(
+                [paper for paper in paper_list if paper.arxiv_id in invalid_arxiv_ids],  # keep the order for reproducible batches
                 id_paper_mapping,
                 openai_client,
                 system_prompt,
@@ -349,6 +577,9 @@ def filter_papers_by_abstract(
                 postfix_prompt,
                 config,
                 retry - 1,
+                limit_per_minute=limit_per_minute,
+                llm_cache=llm_cache,
+                deadline=deadline,
             )
             scored_batches.extend(retried_scored_batches)
             selected_results.update(retried_selected_results)
@@ -357,26 +588,106 @@ def filter_papers_by_abstract(
             total_completion_cost += retried_total_completion_cost
             prompt_tokens += retried_prompt_tokens
             completion_tokens += retried_completion_tokens
+            unscored_papers.extend(retried_unscored_papers)
+            saved_completion_tokens += retried_saved_completion_tokens
         else:
             print(f"Maximum retries reached, skip retrying")
             print(f"Left {len(invalid_arxiv_ids)} papers failed to be scored by GPT through abstract filtering")
             print(f"Invalid paper titles:")
             for arxiv_id in invalid_arxiv_ids:
                 print(f"{id_paper_mapping[arxiv_id].title}")
-
-    return scored_batches, selected_results, filtered_results, total_prompt_cost, total_completion_cost, prompt_tokens, completion_tokens
-
-
-def filter_by_gpt(paper_list, system_prompt, topic_prompt, score_prompt, postfix_prompt_title, postfix_prompt_abstract, config):
+            unscored_papers.extend(paper for paper in paper_list if paper.arxiv_id in invalid_arxiv_ids)
+
+    return scored_batches, selected_results, filtered_results, total_prompt_cost, total_completion_cost, prompt_tokens, completion_tokens, unscored_papers, saved_completion_tokens
+
+
+def plan_stages(forced_papers, paper_list, system_prompt, topic_prompt, score_prompt, postfix_prompt_title, postfix_prompt_abstract, config, deadline=None) -> Optional[StagePlan]:
+    # chooses the stages and batch sizes of this run from the statistics of past runs (see `stage_planner.py`), None if planning is off
+    stage_stats = get_stage_stats(config)
+    if stage_stats is None or not config["SELECTION"].getboolean("plan_stages", fallback=False) or len(forced_papers) + len(paper_list) == 0:
+        return None
+    latency_limits = []
+    if config["SELECTION"].getfloat("planner_latency_minutes", fallback=0) > 0:
+        latency_limits.append(config["SELECTION"].getfloat("planner_latency_minutes") * 60)
+    if deadline is not None:
+        latency_limits.append(max(deadline - time.time(), 0.0))
+
+    with get_tracer().span("plan_stages", "plan", papers=len(forced_papers) + len(paper_list)):
+        stage_plan = StagePlanner(stage_stats, config).plan(
+            (len(forced_papers), sum(estimate_tokens(paper_to_string(paper)) for paper in forced_papers)),
+            [estimate_tokens(paper_to_titles(paper)) for paper in paper_list],
+            [estimate_tokens(paper_to_string(paper)) for paper in paper_list],
+            estimate_tokens(system_prompt, get_user_prompt_for_title_filtering(topic_prompt, postfix_prompt_title, [])),
+            estimate_tokens(system_prompt, get_user_prompt_for_abstract_filtering(topic_prompt, score_prompt, postfix_prompt_abstract, [])),
+            latency_seconds=min(latency_limits) if len(latency_limits) > 0 else None,
+        )
+    print(f"Stage plan: {stage_plan.describe()}, {format_prediction(stage_plan)} ({stage_plan.reason})")
+    if config["OUTPUT"].getboolean("debug_messages"):
+        for description, cost, seconds in sorted(stage_plan.alternatives, key=lambda alternative: alternative[1]):
+            print(f"    Alternative plan: {description}, predicted ${cost:.4f} in {seconds:.0f}s")
+    return stage_plan
+
+
+def format_prediction(stage_plan: StagePlan) -> str:
+    if stage_plan.predicted_cost is None:
+        return "no prediction"
+    return f"predicted ${stage_plan.predicted_cost:.4f} in {stage_plan.predicted_seconds:.0f}s"
+
+
+def filter_by_gpt(paper_list, system_prompt, topic_prompt, score_prompt, postfix_prompt_title, postfix_prompt_abstract, config, llm_cache=None, debug_file_format=None, openai_client=None, priority_scorer=None, deadline=None, forced_papers=None):
+    """
+    Filter papers by titles (if enabled), then score the rest by abstracts.
+    :param priority_scorer: an optional `PriorityScorer` deciding the order in which papers are sent
+    :param deadline: an optional UNIX timestamp after which no more batches are sent
+    :param forced_papers: papers forced to be scored by a rule, sent first and never filtered by titles
+    :return: the selected and filtered results, the costs and tokens, the papers left unscored,
+        and the completion tokens saved by the compact `output_protocol` (estimated)
+    """
     total_filtered_results = {}
     total_prompt_cost = 0.0
     total_completion_cost = 0.0
     total_prompt_tokens = 0
     total_completion_tokens = 0
 
-    openai_client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
+    context = get_context()
+    if openai_client is None:
+        openai_client = create_openai_client()
+    forced_ids = {paper.arxiv_id for paper in forced_papers or []}
+    paper_list = list(forced_papers or []) + paper_list
     id_paper_mapping: Dict[str, Paper] = {paper.arxiv_id: paper for paper in paper_list}
 
+    # reuse the scores of new versions and near-duplicates of papers scored before
+    near_duplicate_index = get_near_duplicate_index(config) if config["SELECTION"].getboolean("run_abstract_filter") else None
+    reused_results = {}
+    if near_duplicate_index is not None:
+        scoring_tag = get_scoring_tag(topic_prompt, score_prompt, config["SELECTION"]["model"])
+        with get_tracer().span("reuse_scores", "index", papers=len(paper_list)):
+            matches = near_duplicate_index.find_matches(
+                paper_list,
+                scoring_tag,
+                similarity_threshold=config["SELECTION"].getfloat("reuse_similarity", fallback=REUSE_SIMILARITY),
+                same_id_threshold=config["SELECTION"].getfloat("reuse_same_id_similarity", fallback=REUSE_SAME_ID_SIMILARITY),
+            )
+        for arxiv_id, (source_id, reason, similarity, fields) in matches.items():
+            reused_results[arxiv_id] = PaperResult(id_paper_mapping[arxiv_id], {**fields, "ARXIVID": arxiv_id, "REUSED_FROM": source_id})
+            print(f"Reusing the scores of {source_id} for {arxiv_id} ({reason}, similarity {similarity:.2f}) ({id_paper_mapping[arxiv_id].title})")
+        if len(matches) > 0:
+            near_duplicate_index.record_reuses(matches, scoring_tag)
+            paper_list = [paper for paper in paper_list if paper.arxiv_id not in matches]
+            print(f"Reused the scores of {len(matches)} papers scored before, {len(paper_list)} papers left to score")
+
+    # the forced papers keep their feed order ahead of the others
+    forced_list = [paper for paper in paper_list if paper.arxiv_id in forced_ids]
+    paper_list = [paper for paper in paper_list if paper.arxiv_id not in forced_ids]
+    if priority_scorer is not None:
+        paper_list = priority_scorer.order(paper_list)
+
+    # choose whether to filter by titles and the batch sizes from the statistics of past runs
+    stage_plan = plan_stages(forced_list, paper_list, system_prompt, topic_prompt, score_prompt, postfix_prompt_title, postfix_prompt_abstract, config, deadline=deadline)
+    if stage_plan is not None:
+        config = stage_plan.apply(config)
+    llm_start_time = time.perf_counter()
+
     # filter papers by titles
     if config["SELECTION"].getboolean("run_title_filter"):
         paper_list, filtered_results, prompt_cost, completion_cost, prompt_tokens, completion_tokens = filter_papers_by_title(
@@ -387,6 +698,8 @@ def filter_by_gpt(paper_list, system_prompt, topic_prompt, score_prompt, postfix
             postfix_prompt_title,
             config,
             retry=int(config["SELECTION"]["title_retry"]),
+            llm_cache=llm_cache,
+            deadline=deadline,
         )
     else:
         filtered_results = {}
@@ -398,10 +711,11 @@ def filter_by_gpt(paper_list, system_prompt, topic_prompt, score_prompt, postfix
     total_completion_cost += completion_cost
     total_prompt_tokens += prompt_tokens
     total_completion_tokens += completion_tokens
+    paper_list = forced_list + paper_list
 
     # filter remaining papers by abstracts
     if config["SELECTION"].getboolean("run_abstract_filter"):
-        scored_batches, selected_results, filtered_results, prompt_cost, completion_cost, prompt_tokens, completion_tokens = filter_papers_by_abstract(
+        scored_batches, selected_results, filtered_results, prompt_cost, completion_cost, prompt_tokens, completion_tokens, unscored_papers, saved_completion_tokens = filter_papers_by_abstract(
             paper_list,
             id_paper_mapping,
             openai_client,
@@ -412,12 +726,15 @@ def filter_by_gpt(paper_list, system_prompt, topic_prompt, score_prompt, postfix
             config,
             retry=int(config["SELECTION"]["abstract_retry"]),
             limit_per_minute=int(config["SELECTION"]["limit_per_minute"]),
+            llm_cache=llm_cache,
+            deadline=deadline,
         )
     else:
         scored_batches = []
-        selected_results = {paper.arxiv_id: {**dataclasses.asdict(paper)} for paper in paper_list}
+        selected_results = {paper.arxiv_id: PaperResult(paper) for paper in paper_list}
         filtered_results = {}
-        prompt_cost, completion_cost, prompt_tokens, completion_tokens = 0.0, 0.0, 0, 0
+        unscored_papers = []
+        prompt_cost, completion_cost, prompt_tokens, completion_tokens, saved_completion_tokens = 0.0, 0.0, 0, 0, 0
         print("Skipping GPT abstract filtering")
 
     total_filtered_results.update(filtered_results)
@@ -426,15 +743,43 @@ def filter_by_gpt(paper_list, system_prompt, topic_prompt, score_prompt, postfix
     total_prompt_tokens += prompt_tokens
     total_completion_tokens += completion_tokens
 
-    if config["OUTPUT"].getboolean("dump_debug_file"):
-        with open(OUTPUT_DEBUG_FILE_FORMAT.format("gpt_paper_batches.json"), "w") as outfile:
-            json.dump(scored_batches, outfile, cls=EnhancedJSONEncoder, indent=4)
+    if near_duplicate_index is not None:
+        newly_scored = {arxiv_id: result.fields for arxiv_id, result in {**selected_results, **filtered_results}.items() if "SCORE" in result.fields}
+        for arxiv_id, result in reused_results.items():
+            if is_filtered_by_score(result, config):
+                total_filtered_results[arxiv_id] = result
+            else:
+                selected_results[arxiv_id] = result
+        # reused results are added too, so that the next version of a paper finds its own id
+        near_duplicate_index.add({**newly_scored, **{arxiv_id: result.fields for arxiv_id, result in reused_results.items()}}, id_paper_mapping, scoring_tag)
+
+    stage_stats = get_stage_stats(config)
+    if stage_stats is not None:
+        stage_stats.flush()
+        if stage_plan is not None:
+            actual_seconds = time.perf_counter() - llm_start_time
+            print(f"Stage plan: {stage_plan.describe()}, {format_prediction(stage_plan)}, "
+                  f"actual ${total_prompt_cost + total_completion_cost:.4f} in {actual_seconds:.0f}s")
+            stage_stats.record_plan(
+                config["SELECTION"]["model"], len(id_paper_mapping), stage_plan.describe(), stage_plan.predicted_cost, stage_plan.predicted_seconds,
+                total_prompt_cost + total_completion_cost, actual_seconds,
+            )
+
+    dump_debug_file, debug_compress_level = get_dump_options(config)
+    if dump_debug_file:
+        if debug_file_format is None:
+            debug_file_format = context.output_debug_file_format
+        get_dump_writer().write_records(debug_file_format.format("gpt_paper_batches"), scored_batches, compress_level=debug_compress_level)
+        if len(unscored_papers) > 0:
+            get_dump_writer().write_records(debug_file_format.format("unscored_papers"), unscored_papers, compress_level=debug_compress_level)
+        if len(reused_results) > 0:
+            get_dump_writer().write_records(debug_file_format.format("reused_scores"), reused_results.values(), compress_level=debug_compress_level)
 
     print(f"Total cost is ${total_prompt_cost + total_completion_cost}:\n"
           f"({total_prompt_tokens} prompt tokens cost ${total_prompt_cost})\n"
           f"({total_completion_tokens} completion tokens cost ${total_completion_cost})")
 
-    return selected_results, total_filtered_results, total_prompt_cost, total_completion_cost, total_prompt_tokens, total_completion_tokens
+    return selected_results, total_filtered_results, total_prompt_cost, total_completion_cost, total_prompt_tokens, total_completion_tokens, unscored_papers, saved_completion_tokens
 
 # if __name__ == "__main__":
 #     openai_client = OpenAI(api_key=OPENAI_API_KEY, base_url=OPENAI_BASE_URL)
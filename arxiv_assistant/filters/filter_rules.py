@@ -0,0 +1,221 @@
+"""
+Keyword rules decided before any LLM call.
+
+A rules file (`rules_path` in config.ini, default `configs/rules.txt`, or `rules.txt` in a profile dir) has one rule per line,
+`<action> <field>: <pattern>`, and lines starting with # are ignored:
+    include text: JWST
+    include authors: Kristin McQuinn
+    exclude category: astro-ph.IM
+    force_score title: dwarf galaxy
+Actions:
+- `include`: the paper is selected without being scored, like an author match (with `author_match_score`),
+- `exclude`: the paper is filtered without being scored,
+- `force_score`: the paper is always scored by the LLM: exclude rules and the h-index cutoff do not apply,
+  it skips the title filter and is scored first under a deadline.
+A paper matching both include and exclude rules (and no force_score rule) is left to the LLM.
+Fields are `title`, `abstract`, `text` (title or abstract), `authors` (any author name) and `category` (any arXiv category, exact).
+
+Patterns are case-insensitive sequences of whole words ("X-ray" matches "x ray" and "X-Ray", but not "x-rays").
+The patterns of each field are compiled into one Aho-Corasick automaton over words, so each paper is matched
+in one pass over its words whatever the number of rules, and papers without the first word of any pattern are skipped in C.
+"""
+import re
+from collections import deque
+from dataclasses import dataclass
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from arxiv_assistant.utils.utils import Paper, PaperResult
+
+ACTIONS = ("include", "exclude", "force_score")
+FIELDS = ("title", "abstract", "text", "authors", "category")
+WORD_PATTERN = re.compile(r"\w+")
+AUTHOR_SEPARATOR = "\x00"  # between author names, so that a pattern never spans two authors
+
+
+@dataclass(frozen=True)
+class Rule:
+    action: str
+    field: str
+    pattern: str
+    line: int
+
+    def __str__(self):
+        return f"{self.action} {self.field}: {self.pattern}"
+
+
+def parse_rules(text: str) -> List[Rule]:
+    rules = []
+    for i, line in enumerate(text.splitlines()):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        head, sep, pattern = line.partition(":")
+        head_split = head.split()
+        if not sep or len(head_split) != 2 or head_split[0] not in ACTIONS or head_split[1] not in FIELDS or not pattern.strip():
+            raise ValueError(f"Invalid rule in line {i + 1}: \"{line}\", expected \"<{'|'.join(ACTIONS)}> <{'|'.join(FIELDS)}>: <pattern>\"")
+        rules.append(Rule(head_split[0], head_split[1], pattern.strip(), i + 1))
+    return rules
+
+
+def tokenize(text: str) -> List[str]:
+    return WORD_PATTERN.findall(text.lower())
+
+
+class WordAutomaton:
+    """
+    An Aho-Corasick automaton over word sequences: `find` reports every pattern occurring in a list of words in linear time.
+    """
+
+    def __init__(self, patterns: Iterable[Tuple[List[str], int]]):
+        # `patterns` are (words, value) pairs, `find` returns the values of the matched patterns
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.outputs: List[FrozenSet[int]] = [frozenset()]
+        outputs = [set()]
+        for words, value in patterns:
+            state = 0
+            for word in words:
+                if word not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    outputs.append(set())
+                    self.goto[state][word] = len(self.goto) - 1
+                state = self.goto[state][word]
+            outputs[state].add(value)
+
+        # breadth-first, so the failure state of each state is built before its children
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, child in self.goto[state].items():
+                queue.append(child)
+                if state != 0:  # the children of the root fail to the root
+                    fallback = self.fail[state]
+                    while fallback and word not in self.goto[fallback]:
+                        fallback = self.fail[fallback]
+                    self.fail[child] = self.goto[fallback].get(word, 0)
+                outputs[child] |= outputs[self.fail[child]]
+        self.outputs = [frozenset(output) for output in outputs]
+        self.first_words = frozenset(self.goto[0])
+
+    def find(self, words: List[str]) -> Set[int]:
+        matched = set()
+        if self.first_words.isdisjoint(words):
+            return matched
+        goto, fail, outputs = self.goto, self.fail, self.outputs
+        state = 0
+        for word in words:
+            while state and word not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(word, 0)
+            if outputs[state]:
+                matched |= outputs[state]
+        return matched
+
+
+class RuleSet:
+    """
+    The compiled rules of a profile.
+    """
+
+    def __init__(self, rules: List[Rule]):
+        self.rules = rules
+        automaton_patterns = {"title": [], "abstract": [], "authors": []}
+        self.category_rules: Dict[str, List[int]] = {}
+        for i, rule in enumerate(rules):
+            if rule.field == "category":
+                self.category_rules.setdefault(rule.pattern, []).append(i)
+                continue
+            words = tokenize(rule.pattern)
+            if len(words) == 0:
+                raise ValueError(f"Invalid rule in line {rule.line}: \"{rule}\" has no words to match")
+            for field in (("title", "abstract") if rule.field == "text" else (rule.field,)):
+                automaton_patterns[field].append((words, i))
+        self.automata = {field: WordAutomaton(patterns) for field, patterns in automaton_patterns.items() if len(patterns) > 0}
+
+    def __len__(self):
+        return len(self.rules)
+
+    def match(self, paper: Paper, categories: Iterable[str] = ()) -> List[Rule]:
+        # the rules matched by the paper, in file order
+        matched = set()
+        if "title" in self.automata:
+            matched |= self.automata["title"].find(tokenize(paper.title))
+        if "abstract" in self.automata:
+            matched |= self.automata["abstract"].find(tokenize(paper.abstract))
+        if "authors" in self.automata:
+            words = []
+            for author in paper.authors:
+                words.extend(tokenize(author))
+                words.append(AUTHOR_SEPARATOR)
+            matched |= self.automata["authors"].find(words)
+        for category in categories:
+            matched.update(self.category_rules.get(category, ()))
+        return [self.rules[i] for i in sorted(matched)]
+
+
+def decide(matched_rules: List[Rule]) -> Tuple[Optional[str], List[Rule]]:
+    # the action taken on a paper (None leaves it to the other filters) and the rules behind it
+    force_rules = [rule for rule in matched_rules if rule.action == "force_score"]
+    if len(force_rules) > 0:
+        return "force_score", force_rules
+    include_rules = [rule for rule in matched_rules if rule.action == "include"]
+    exclude_rules = [rule for rule in matched_rules if rule.action == "exclude"]
+    if len(include_rules) > 0 and len(exclude_rules) > 0:
+        return "conflict", include_rules + exclude_rules
+    if len(include_rules) > 0:
+        return "include", include_rules
+    if len(exclude_rules) > 0:
+        return "exclude", exclude_rules
+    return None, []
+
+
+def apply_rules(
+    rule_set: RuleSet, paper_list: List[Paper], paper_categories: Dict[str, List[str]] = None, include_score: Optional[float] = None,
+) -> Tuple[List[Paper], Dict[str, PaperResult], Dict[str, PaperResult], List[Paper], List[Dict]]:
+    """
+    Applies the rules to `paper_list`.
+    :param include_score: the score of the included papers, they have none if None
+    :return: the papers left to the other filters, the included and excluded results, the papers to force-score (in feed order),
+        and one decision record per matched paper
+    """
+    paper_categories = paper_categories or {}
+    remaining_papers = []
+    included_results = {}
+    excluded_results = {}
+    forced_papers = []
+    decisions = []
+    for paper in paper_list:
+        action, rules = decide(rule_set.match(paper, paper_categories.get(paper.arxiv_id, ())))
+        if action is None:
+            remaining_papers.append(paper)
+            continue
+        rule_strings = [str(rule) for rule in rules]
+        decisions.append({"arxiv_id": paper.arxiv_id, "title": paper.title, "action": action, "rules": rule_strings})
+        if action == "include":
+            fields = {"COMMENT": f"Included by rule `{rule_strings[0]}`", "RULES": rule_strings}
+            if include_score is not None:
+                fields["SCORE"] = include_score
+            included_results[paper.arxiv_id] = PaperResult(paper, fields)
+        elif action == "exclude":
+            excluded_results[paper.arxiv_id] = PaperResult(paper, {"COMMENT": f"Excluded by rule `{rule_strings[0]}`", "RULES": rule_strings})
+        elif action == "force_score":
+            forced_papers.append(paper)
+        else:
+            remaining_papers.append(paper)  # conflicting rules, left to the LLM
+        print(f"Rule decision for paper {paper.arxiv_id}: {action} by {'; '.join(f'`{rule}`' for rule in rule_strings)} ({paper.title})")
+
+    print(f"Rules: {len(included_results)} papers included, {len(excluded_results)} excluded, {len(forced_papers)} force-scored, "
+          f"{sum(decision['action'] == 'conflict' for decision in decisions)} with conflicting rules, {len(remaining_papers)} left to the other filters")
+    return remaining_papers, included_results, excluded_results, forced_papers, decisions
+
+
+_rule_sets = {}
+
+
+def get_rule_set(rules_text: str) -> Optional[RuleSet]:
+    # the compiled rules of a rules file, cached by content as profiles often share one, None if there are no rules
+    if rules_text not in _rule_sets:
+        rules = parse_rules(rules_text)
+        _rule_sets[rules_text] = RuleSet(rules) if len(rules) > 0 else None
+    return _rule_sets[rules_text]
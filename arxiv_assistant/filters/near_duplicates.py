@@ -0,0 +1,300 @@
+"""
+Reuse of LLM scores for papers seen before: new versions (`replace`, `replace-cross`) and near-identical abstracts.
+
+Every scored paper is added to a SQLite index (`cache_path`/near_duplicates.sqlite, WAL mode) with its score fields
+and a MinHash signature of the word 3-grams of its title and abstract. Signatures use one-permutation hashing:
+each 3-gram is hashed once (from the CRC32 of its words) into one of `NUM_BINS` bins keeping the minimum, and empty bins are filled from the next
+non-empty one, which estimates the Jaccard similarity like `NUM_BINS` independent permutations at the cost of one.
+Candidates are found by LSH over `NUM_BANDS` bands of `NUM_BINS // NUM_BANDS` bins, then checked against the signatures.
+
+Before scoring, a paper inherits the scores of a previously scored paper instead of being sent to the LLM if
+- it has the same arXiv id (without version) and a similarity of at least `reuse_same_id_similarity` (a revision), or
+- its similarity to another paper is at least `reuse_similarity`.
+Scores are only reused within the same topic prompt, score prompt and model. Each reuse is recorded in the `reuses` table
+(and dumped as `reused_scores` in debug mode), and the reused result has a `REUSED_FROM` field with the source arXiv id.
+The scored papers (not the reuse log) are carried by the cache snapshots of `arxiv_assistant.utils.snapshot`.
+"""
+import base64
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from array import array
+from itertools import repeat
+from operator import and_, mul, rshift, xor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from arxiv_assistant.utils.io import create_dir
+from arxiv_assistant.utils.utils import Paper
+
+BIN_BITS = 6
+NUM_BINS = 2 ** BIN_BITS
+NUM_BANDS = 16
+ROWS_PER_BAND = NUM_BINS // NUM_BANDS
+MULTIPLIER_1, MULTIPLIER_2 = 0x9E3779B1, 0x85EBCA77
+MASK = 0xFFFFFFFF
+MAX_CACHED_SIGNATURES = 200000
+# the defaults of `reuse_similarity` and `reuse_same_id_similarity`
+REUSE_SIMILARITY = 0.8
+REUSE_SAME_ID_SIMILARITY = 0.5
+
+VERSION_PATTERN = re.compile(r"v\d+$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scored (
+    tag TEXT NOT NULL,
+    arxiv_id TEXT NOT NULL,
+    time REAL NOT NULL,
+    signature BLOB NOT NULL,
+    fields TEXT NOT NULL,
+    PRIMARY KEY (tag, arxiv_id)
+);
+CREATE INDEX IF NOT EXISTS scored_time ON scored (time);
+CREATE TABLE IF NOT EXISTS bands (
+    tag TEXT NOT NULL,
+    key INTEGER NOT NULL,
+    arxiv_id TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS bands_tag_key ON bands (tag, key);
+CREATE INDEX IF NOT EXISTS bands_tag_arxiv_id ON bands (tag, arxiv_id);
+CREATE TABLE IF NOT EXISTS reuses (
+    time REAL NOT NULL,
+    tag TEXT NOT NULL,
+    arxiv_id TEXT NOT NULL,
+    source_id TEXT NOT NULL,
+    reason TEXT NOT NULL,
+    similarity REAL NOT NULL
+);
+"""
+
+
+def get_base_id(arxiv_id: str) -> str:
+    # "2502.10001v2" -> "2502.10001"
+    return VERSION_PATTERN.sub("", arxiv_id)
+
+
+def get_scoring_tag(topic_prompt, score_prompt, model) -> str:
+    # scores are only comparable under the same prompts and model
+    return "{:08x}".format(zlib.crc32("\n\n".join([model, topic_prompt, score_prompt]).encode("utf-8")))
+
+
+def get_signature(paper: Paper) -> array:
+    hashes = list(map(zlib.crc32, (paper.title + " " + paper.abstract).lower().encode("utf-8").split()))
+    hashes += [0] * max(3 - len(hashes), 0)
+    # the hashes of word 3-grams combined from the word hashes, the maps run in C, which matters on large days
+    values = sorted(map(and_, map(xor, map(xor, map(mul, hashes, repeat(MULTIPLIER_1)), map(mul, hashes[1:], repeat(MULTIPLIER_2))), hashes[2:]), repeat(MASK)), reverse=True)
+    bins = dict(zip(map(rshift, values, repeat(32 - BIN_BITS)), values))  # the smallest value of each bin is written last
+    if len(bins) < NUM_BINS:
+        # densify by rotation, so that empty bins of similar texts still agree
+        filled = sorted(bins)
+        for i in range(NUM_BINS):
+            if i not in bins:
+                source = next((j for j in filled if j > i), filled[0])
+                bins[i] = (bins[source] + (source - i) % NUM_BINS) & MASK
+    return array("I", [bins[i] for i in range(NUM_BINS)])
+
+
+def get_similarity(signature: array, other: array) -> float:
+    return sum(a == b for a, b in zip(signature, other)) / NUM_BINS
+
+
+def get_band_keys(signature: array) -> List[int]:
+    # one key per band, the band number in the high bits
+    return [
+        (band << 32) | zlib.crc32(signature[band * ROWS_PER_BAND:(band + 1) * ROWS_PER_BAND].tobytes())
+        for band in range(NUM_BANDS)
+    ]
+
+
+def to_array(blob) -> array:
+    signature = array("I")
+    signature.frombytes(blob)
+    return signature
+
+
+class NearDuplicateIndex:
+    """
+    The index of scored papers, safe to share across threads. Concurrent processes are serialized by SQLite (WAL mode).
+    """
+
+    def __init__(self, path=":memory:", max_age_days: float = 365):
+        self.path = path
+        self.max_age_days = max_age_days
+        if path != ":memory:":
+            create_dir(os.path.dirname(path) or ".")
+        self._lock = threading.Lock()
+        self._signatures = {}  # paper -> signature, papers are checked before scoring and added after it, for each profile
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM scored").fetchone()[0]
+
+    def get_signature(self, paper: Paper) -> array:
+        signature = self._signatures.get(paper)
+        if signature is None:
+            if len(self._signatures) >= MAX_CACHED_SIGNATURES:
+                self._signatures.clear()
+            signature = self._signatures[paper] = get_signature(paper)
+        return signature
+
+    def find_matches(
+        self, paper_list: List[Paper], tag: str, similarity_threshold=REUSE_SIMILARITY, same_id_threshold=REUSE_SAME_ID_SIMILARITY,
+    ) -> Dict[str, Tuple[str, str, float, Dict]]:
+        """
+        Finds the previously scored paper to reuse for each paper in `paper_list`.
+        :return: arxiv id -> (source arxiv id, reason ("same_id" or "near_duplicate"), similarity, score fields of the source)
+        """
+        if len(paper_list) == 0:
+            return {}
+        signatures = {paper.arxiv_id: self.get_signature(paper) for paper in paper_list}
+        with self._lock:
+            self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS query_keys (arxiv_id TEXT NOT NULL, key INTEGER NOT NULL)")
+            self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS query_ids (arxiv_id TEXT NOT NULL, base_id TEXT NOT NULL)")
+            self._conn.execute("DELETE FROM query_keys")
+            self._conn.execute("DELETE FROM query_ids")
+            self._conn.executemany("INSERT INTO query_keys (arxiv_id, key) VALUES (?, ?)", (
+                (arxiv_id, key) for arxiv_id, signature in signatures.items() for key in get_band_keys(signature)
+            ))
+            self._conn.executemany("INSERT INTO query_ids (arxiv_id, base_id) VALUES (?, ?)", (
+                (arxiv_id, get_base_id(arxiv_id)) for arxiv_id in signatures
+            ))
+            # LSH candidates and papers of the same base id, with their signatures
+            # (CROSS JOIN keeps the query papers in the outer loop, instead of scanning every band of the tag)
+            rows = self._conn.execute(
+                """
+                SELECT q.arxiv_id, s.arxiv_id, s.time, s.signature, s.fields FROM query_keys q
+                CROSS JOIN bands b ON b.tag = ? AND b.key = q.key
+                CROSS JOIN scored s ON s.tag = b.tag AND s.arxiv_id = b.arxiv_id
+                UNION
+                SELECT q.arxiv_id, s.arxiv_id, s.time, s.signature, s.fields FROM query_ids q
+                CROSS JOIN scored s ON s.tag = ? AND s.arxiv_id = q.base_id
+                """,
+                (tag, tag),
+            ).fetchall()
+
+        matches = {}
+        best_keys = {}
+        for arxiv_id, source_id, source_time, blob, fields in rows:
+            similarity = get_similarity(signatures[arxiv_id], to_array(blob))
+            if source_id == get_base_id(arxiv_id):
+                if similarity < same_id_threshold:
+                    continue
+                reason = "same_id"
+            elif similarity >= similarity_threshold:
+                reason = "near_duplicate"
+            else:
+                continue
+            # prefer the same paper, then the most similar one, then the most recent one
+            best_key = (reason == "same_id", similarity, source_time)
+            if arxiv_id not in best_keys or best_key > best_keys[arxiv_id]:
+                best_keys[arxiv_id] = best_key
+                matches[arxiv_id] = (source_id, reason, similarity, json.loads(fields))
+        return matches
+
+    def add(self, results: Dict[str, Dict], id_paper_mapping: Dict[str, Paper], tag: str):
+        # adds (or updates) the score fields of scored papers, and drops the papers scored more than `max_age_days` ago
+        now_time = time.time()
+        rows, band_rows = [], []
+        for arxiv_id, fields in results.items():
+            base_id = get_base_id(arxiv_id)
+            signature = self.get_signature(id_paper_mapping[arxiv_id])
+            stored_fields = {key: value for key, value in fields.items() if key not in ("ARXIVID", "REUSED_FROM")}
+            rows.append((tag, base_id, now_time, signature.tobytes(), json.dumps(stored_fields)))
+            band_rows.extend((tag, key, base_id) for key in get_band_keys(signature))
+        if len(rows) == 0:
+            return
+
+        def add_rows(conn):
+            conn.executemany("DELETE FROM bands WHERE tag = ? AND arxiv_id = ?", ((row[0], row[1]) for row in rows))
+            conn.executemany("INSERT OR REPLACE INTO scored (tag, arxiv_id, time, signature, fields) VALUES (?, ?, ?, ?, ?)", rows)
+            conn.executemany("INSERT INTO bands (tag, key, arxiv_id) VALUES (?, ?, ?)", band_rows)
+            if self.max_age_days > 0:
+                expired_time = now_time - self.max_age_days * 86400
+                conn.execute("DELETE FROM bands WHERE (tag, arxiv_id) IN (SELECT tag, arxiv_id FROM scored WHERE time < ?)", (expired_time,))
+                conn.execute("DELETE FROM scored WHERE time < ?", (expired_time,))
+                conn.execute("DELETE FROM reuses WHERE time < ?", (expired_time,))
+
+        self._transaction(add_rows)
+
+    def export_entries(self) -> Iterator[Tuple[str, float, Dict]]:
+        # (key, scoring time, value) of each scored paper, newest first, for cache snapshots (the bands are rebuilt from the signatures)
+        with self._lock:
+            rows = self._conn.execute("SELECT tag, arxiv_id, time, signature, fields FROM scored ORDER BY time DESC").fetchall()
+        for tag, arxiv_id, scored_time, signature, fields in rows:
+            yield f"{tag}/{arxiv_id}", scored_time, {"signature": base64.b64encode(signature).decode("ascii"), "fields": fields}
+
+    def import_entries(self, entries: Iterable[Tuple[str, float, Dict]]) -> int:
+        # adds the exported papers missing from the index (local entries win), returns their number
+        def add_rows(conn):
+            new_cnt = 0
+            for key, scored_time, value in entries:
+                tag, arxiv_id = key.split("/", 1)
+                signature = base64.b64decode(value["signature"])
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO scored (tag, arxiv_id, time, signature, fields) VALUES (?, ?, ?, ?, ?)", (tag, arxiv_id, scored_time, signature, value["fields"]),
+                )
+                if cursor.rowcount > 0:
+                    conn.executemany("INSERT INTO bands (tag, key, arxiv_id) VALUES (?, ?, ?)", ((tag, band_key, arxiv_id) for band_key in get_band_keys(to_array(signature))))
+                    new_cnt += 1
+            return new_cnt
+
+        return self._transaction(add_rows)
+
+    def record_reuses(self, matches: Dict[str, Tuple[str, str, float, Dict]], tag: str):
+        # the audit log of reused scores
+        now_time = time.time()
+        self._transaction(lambda conn: conn.executemany(
+            "INSERT INTO reuses (time, tag, arxiv_id, source_id, reason, similarity) VALUES (?, ?, ?, ?, ?, ?)",
+            ((now_time, tag, arxiv_id, source_id, reason, similarity) for arxiv_id, (source_id, reason, similarity, _) in matches.items()),
+        ))
+
+    def get_reuses(self, limit=100) -> List[Dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT time, tag, arxiv_id, source_id, reason, similarity FROM reuses ORDER BY time DESC LIMIT ?", (limit,)
+            ).fetchall()
+        return [dict(zip(("time", "tag", "arxiv_id", "source_id", "reason", "similarity"), row)) for row in rows]
+
+
+_near_duplicate_indexes = {}
+_near_duplicate_indexes_lock = threading.Lock()
+
+
+def get_near_duplicate_index_path(config) -> str:
+    cache_path = config["OUTPUT"].get("cache_path", os.path.join(config["OUTPUT"]["output_path"], "cache"))
+    return config["OUTPUT"].get("near_duplicate_index_path", os.path.join(cache_path, "near_duplicates.sqlite"))
+
+
+def get_near_duplicate_index(config) -> Optional[NearDuplicateIndex]:
+    # one open index per path, shared by all runs of this process, None if score reuse is off
+    if not config["SELECTION"].getboolean("reuse_scores", fallback=False):
+        return None
+    path = get_near_duplicate_index_path(config)
+    with _near_duplicate_indexes_lock:
+        if path not in _near_duplicate_indexes:
+            _near_duplicate_indexes[path] = NearDuplicateIndex(path, max_age_days=config["SELECTION"].getfloat("reuse_max_age_days", fallback=365))
+        return _near_duplicate_indexes[path]
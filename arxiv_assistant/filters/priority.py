@@ -0,0 +1,125 @@
+"""
+Priority order and deadline of LLM scoring.
+
+The daily digest has to go out on time, so papers are scored in order of a cheap priority signal
+and scoring stops at a wall-clock deadline, leaving the lowest-priority papers unscored instead of the last ones in the feed.
+The priority of a paper adds up:
+- `WATCHLIST_WEIGHT` if any author may be on the watch list of the profile (pre-matched by name, see `watchlist.py`),
+- up to `HINDEX_WEIGHT` for the max h-index of its authors (from `get_authors`, if author matching ran),
+- up to `SIMILARITY_WEIGHT` for the lexical similarity of its title and abstract to the topic prompt,
+- the weight of its arXiv categories in `category_weights` (e.g., `astro-ph.GA: 2, astro-ph.CO: 1`).
+Ties keep the feed order, so the batches (and LLM prompts) are the same when rerunning a day.
+
+The deadline is the earliest of the next `scoring_deadline_utc` (HH:MM) after the run starts
+and `scoring_budget_minutes` after it starts. Papers left when it is reached are reported as unscored.
+"""
+import math
+import re
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional
+
+from arxiv_assistant.filters.filter_author import AuthorIndex
+from arxiv_assistant.filters.watchlist import WatchlistIndex
+from arxiv_assistant.utils.utils import Paper
+
+WATCHLIST_WEIGHT = 4.0
+HINDEX_WEIGHT = 1.0
+SIMILARITY_WEIGHT = 2.0
+HINDEX_SCALE = 100  # h-indices above this get the full weight
+
+WORD_PATTERN = re.compile(r"[a-z][a-z0-9-]{2,}")
+
+
+def get_words(text: str) -> set:
+    return set(WORD_PATTERN.findall(text.lower()))
+
+
+def parse_category_weights(string: str) -> Dict[str, float]:
+    # "astro-ph.GA: 2, astro-ph.CO: 1" -> {"astro-ph.GA": 2.0, "astro-ph.CO": 1.0}
+    weights = {}
+    for item in string.split(","):
+        if ":" in item:
+            category, weight = item.rsplit(":", 1)
+            weights[category.strip()] = float(weight)
+    return weights
+
+
+class PriorityScorer:
+    def __init__(
+        self,
+        topic_prompt: str,
+        paper_list: List[Paper],
+        watchlist: WatchlistIndex = None,
+        author_index: AuthorIndex = None,
+        category_weights: Dict[str, float] = None,
+        paper_categories: Dict[str, List[str]] = None,
+    ):
+        self.topic_words = get_words(topic_prompt)
+        self.watchlist = watchlist if watchlist is not None and len(watchlist) > 0 else None
+        self._may_match = {}  # author name -> whether it may be watched, names repeat across papers
+        self.author_index = author_index
+        self.category_weights = category_weights or {}
+        self.paper_categories = paper_categories or {}
+
+        # inverse document frequencies over the day, so that common words weigh little without a stop word list
+        self._paper_words = {paper.arxiv_id: get_words(paper.title + " " + paper.abstract) for paper in paper_list}
+        document_freqs = Counter(word for words in self._paper_words.values() for word in words)
+        self._idf = {word: math.log((1 + len(paper_list)) / (1 + freq)) + 1 for word, freq in document_freqs.items()}
+
+    def get_similarity(self, paper: Paper) -> float:
+        # the idf-weighted share of the paper's words found in the topic prompt, in [0, 1]
+        words = self._paper_words.get(paper.arxiv_id)
+        if words is None:
+            words = get_words(paper.title + " " + paper.abstract)
+        total = sum(self._idf.get(word, 1.0) for word in words)
+        if total == 0:
+            return 0.0
+        return sum(self._idf.get(word, 1.0) for word in words & self.topic_words) / total
+
+    def may_match(self, name: str) -> bool:
+        may_match = self._may_match.get(name)
+        if may_match is None:
+            may_match = self._may_match[name] = self.watchlist.may_match(name)
+        return may_match
+
+    def get_priority(self, paper: Paper) -> float:
+        priority = SIMILARITY_WEIGHT * self.get_similarity(paper)
+        if self.watchlist is not None and any(self.may_match(author) for author in paper.authors):
+            priority += WATCHLIST_WEIGHT
+        if self.author_index is not None:
+            max_hindex = self.author_index.get_paper_max_hindex(paper)
+            priority += HINDEX_WEIGHT * min(math.log1p(max_hindex) / math.log1p(HINDEX_SCALE), 1.0)
+        priority += max([self.category_weights.get(category, 0.0) for category in self.paper_categories.get(paper.arxiv_id, ())] + [0.0])
+        return priority
+
+    def order(self, paper_list: Iterable[Paper]) -> List[Paper]:
+        # highest priority first, stable for ties
+        return sorted(paper_list, key=self.get_priority, reverse=True)
+
+
+def get_scoring_deadline(config, start_time: float = None) -> Optional[float]:
+    # the deadline of LLM scoring as a UNIX timestamp, None if there is none
+    if start_time is None:
+        start_time = time.time()
+    deadlines = []
+
+    budget_minutes = config["SELECTION"].getfloat("scoring_budget_minutes", fallback=0)
+    if budget_minutes > 0:
+        deadlines.append(start_time + budget_minutes * 60)
+
+    deadline_utc = config["SELECTION"].get("scoring_deadline_utc", fallback="").strip()
+    if deadline_utc:
+        hour, minute = (int(s) for s in deadline_utc.split(":"))
+        start = datetime.fromtimestamp(start_time, tz=timezone.utc)
+        deadline = start.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if deadline <= start:
+            deadline += timedelta(days=1)
+        deadlines.append(deadline.timestamp())
+
+    return min(deadlines) if len(deadlines) > 0 else None
+
+
+def is_past(deadline: Optional[float]) -> bool:
+    return deadline is not None and time.time() >= deadline
@@ -0,0 +1,353 @@
+"""
+Cost-based planning of the LLM stages: whether to run the title filter, and the batch sizes of both filters.
+
+Every batch sent to the LLM is recorded per model, stage (`title`, or `abstract:<output_protocol>`) and batch size
+in a SQLite store (`cache_path`/stage_stats.sqlite, WAL mode, shared by concurrent processes): papers, failed papers
+(sent again as retries), papers filtered by titles, prompt tokens (and their estimate from the prompt length), completion tokens and seconds.
+Buckets are halved once they hold more than `MAX_HISTORY_PAPERS` papers, so recent days weigh more.
+
+Before scoring, `StagePlanner` predicts the cost and latency of each candidate plan for the papers of the day:
+- prompt tokens are estimated from the lengths of the prompts and papers, corrected by the ratio of actual to estimated tokens seen so far,
+- completion tokens per paper, the failure rate (by batch size), the seconds per batch and the filter-out rate of the title filter are taken from the history,
+- costs come from `MODEL_PRICING`.
+The cheapest plan within `planner_latency_minutes` (and the scoring deadline) is chosen, or the fastest one if none fits.
+Only batch sizes with at least `MIN_HISTORY_PAPERS` recorded papers are candidates besides the configured ones, and the configured
+stages are kept until both filters have a history. Each plan is logged and recorded (table `plans`) with its predicted and actual cost.
+The buckets (not the plans) are carried by the cache snapshots of `arxiv_assistant.utils.snapshot`.
+"""
+import configparser
+import math
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from arxiv_assistant.utils.io import create_dir
+from arxiv_assistant.utils.pricing import MODEL_PRICING
+
+MIN_HISTORY_PAPERS = 50
+MAX_HISTORY_PAPERS = 10000
+MAX_FAILURE_RATE = 0.9
+MAX_RECORDED_PLANS = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    model TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    batch_size INTEGER NOT NULL,
+    batches REAL NOT NULL DEFAULT 0,
+    papers REAL NOT NULL DEFAULT 0,
+    failed_papers REAL NOT NULL DEFAULT 0,
+    filtered_papers REAL NOT NULL DEFAULT 0,
+    prompt_tokens REAL NOT NULL DEFAULT 0,
+    estimated_prompt_tokens REAL NOT NULL DEFAULT 0,
+    completion_tokens REAL NOT NULL DEFAULT 0,
+    seconds REAL NOT NULL DEFAULT 0,
+    updated REAL NOT NULL,
+    PRIMARY KEY (model, stage, batch_size)
+);
+CREATE TABLE IF NOT EXISTS plans (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    created REAL NOT NULL,
+    model TEXT NOT NULL,
+    papers INTEGER NOT NULL,
+    plan TEXT NOT NULL,
+    predicted_cost REAL,
+    predicted_seconds REAL,
+    actual_cost REAL,
+    actual_seconds REAL
+);
+"""
+COUNTERS = ("batches", "papers", "failed_papers", "filtered_papers", "prompt_tokens", "estimated_prompt_tokens", "completion_tokens", "seconds")
+
+
+@dataclass
+class Bucket:
+    batches: float = 0.0
+    papers: float = 0.0
+    failed_papers: float = 0.0
+    filtered_papers: float = 0.0
+    prompt_tokens: float = 0.0
+    estimated_prompt_tokens: float = 0.0
+    completion_tokens: float = 0.0
+    seconds: float = 0.0
+
+    def add(self, other: "Bucket"):
+        for name in COUNTERS:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+
+    @property
+    def answered_papers(self) -> float:
+        return self.papers - self.failed_papers
+
+    @property
+    def failure_rate(self) -> float:
+        return min(self.failed_papers / self.papers, MAX_FAILURE_RATE) if self.papers > 0 else 0.0
+
+
+class StageStats:
+    """
+    The per-stage statistics of past LLM batches, safe to share across threads. Batches are buffered and written by `flush`.
+    """
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        if path != ":memory:":
+            create_dir(os.path.dirname(path) or ".")
+        self._lock = threading.Lock()
+        self._pending: Dict[Tuple[str, str, int], Bucket] = {}
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def record_batch(self, model, stage, batch_size, papers, failed_papers=0, filtered_papers=0, prompt_tokens=0, estimated_prompt_tokens=0, completion_tokens=0, seconds=0.0):
+        # one batch sent to the LLM (cached outputs are not recorded), `failed_papers` are those sent again
+        bucket = Bucket(1, papers, failed_papers, filtered_papers, prompt_tokens, estimated_prompt_tokens, completion_tokens, seconds)
+        with self._lock:
+            self._pending.setdefault((model, stage, batch_size), Bucket()).add(bucket)
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if len(pending) == 0:
+            return
+
+        def write(conn):
+            now_time = time.time()
+            for (model, stage, batch_size), bucket in pending.items():
+                conn.execute(
+                    f"INSERT INTO buckets (model, stage, batch_size, {', '.join(COUNTERS)}, updated) VALUES (?, ?, ?, {', '.join('?' * len(COUNTERS))}, ?) "
+                    f"ON CONFLICT (model, stage, batch_size) DO UPDATE SET {', '.join(f'{name} = {name} + excluded.{name}' for name in COUNTERS)}, updated = excluded.updated",
+                    (model, stage, batch_size, *(getattr(bucket, name) for name in COUNTERS), now_time),
+                )
+                conn.execute(
+                    f"UPDATE buckets SET {', '.join(f'{name} = {name} / 2' for name in COUNTERS)} WHERE model = ? AND stage = ? AND batch_size = ? AND papers > ?",
+                    (model, stage, batch_size, MAX_HISTORY_PAPERS),
+                )
+
+        self._transaction(write)
+
+    def get_buckets(self, model, stage) -> Dict[int, Bucket]:
+        with self._lock:
+            rows = self._conn.execute(f"SELECT batch_size, {', '.join(COUNTERS)} FROM buckets WHERE model = ? AND stage = ?", (model, stage)).fetchall()
+        return {row[0]: Bucket(*row[1:]) for row in rows}
+
+    def export_entries(self) -> Iterator[Tuple[str, float, Dict]]:
+        # (key, update time, counters) of each bucket, newest first, for cache snapshots (the plan log is left out)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT model, stage, batch_size, {', '.join(COUNTERS)}, updated FROM buckets ORDER BY updated DESC").fetchall()
+        for model, stage, batch_size, *counters, updated in rows:
+            yield f"{model}|{stage}|{batch_size}", updated, dict(zip(COUNTERS, counters))
+
+    def import_entries(self, entries: Iterable[Tuple[str, float, Dict]]) -> int:
+        # adds the exported buckets missing from the store (local buckets win), returns their number
+        def write(conn):
+            new_cnt = 0
+            for key, updated, counters in entries:
+                model, stage, batch_size = key.rsplit("|", 2)
+                cursor = conn.execute(
+                    f"INSERT OR IGNORE INTO buckets (model, stage, batch_size, {', '.join(COUNTERS)}, updated) VALUES (?, ?, ?, {', '.join('?' * len(COUNTERS))}, ?)",
+                    (model, stage, int(batch_size), *(counters.get(name, 0) for name in COUNTERS), updated),
+                )
+                new_cnt += cursor.rowcount
+            return new_cnt
+
+        return self._transaction(write)
+
+    def record_plan(self, model, papers, description, predicted_cost: Optional[float], predicted_seconds: Optional[float], actual_cost: float, actual_seconds: Optional[float]):
+        def write(conn):
+            conn.execute(
+                "INSERT INTO plans (created, model, papers, plan, predicted_cost, predicted_seconds, actual_cost, actual_seconds) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (time.time(), model, papers, description, predicted_cost, predicted_seconds, actual_cost, actual_seconds),
+            )
+            conn.execute("DELETE FROM plans WHERE id <= (SELECT MAX(id) FROM plans) - ?", (MAX_RECORDED_PLANS,))
+
+        self._transaction(write)
+
+
+@dataclass
+class StagePlan:
+    run_title_filter: bool
+    title_batch_size: int
+    abstract_batch_size: int
+    predicted_cost: Optional[float] = None  # None without enough history
+    predicted_seconds: Optional[float] = None
+    reason: str = ""
+    alternatives: List[Tuple[str, float, float]] = field(default_factory=list)  # (plan, cost, seconds) of the other candidates
+
+    def describe(self) -> str:
+        title = f"title filter (batch {self.title_batch_size}) + " if self.run_title_filter else ""
+        return f"{title}abstract filter (batch {self.abstract_batch_size})"
+
+    def apply(self, config) -> configparser.ConfigParser:
+        # a copy of `config` running the planned stages with fixed batch sizes
+        planned_config = configparser.ConfigParser()
+        planned_config.read_dict({section: dict(config[section]) for section in config.sections()})
+        planned_config["SELECTION"]["run_title_filter"] = str(self.run_title_filter).lower()
+        planned_config["SELECTION"]["title_batch_size"] = str(self.title_batch_size)
+        planned_config["SELECTION"]["abstract_batch_size"] = str(self.abstract_batch_size)
+        planned_config["SELECTION"]["adaptive_batch_size"] = "false"
+        planned_config["SELECTION"]["plan_stages"] = "false"
+        return planned_config
+
+
+def get_abstract_stage(config) -> str:
+    return f"abstract:{config['SELECTION'].get('output_protocol', fallback='jsonl')}"
+
+
+def get_nearest_bucket(buckets: Dict[int, Bucket], batch_size: int) -> Optional[Bucket]:
+    # the bucket of `batch_size`, or of the closest batch size (by ratio) with enough history
+    known = {size: bucket for size, bucket in buckets.items() if bucket.papers >= MIN_HISTORY_PAPERS}
+    if batch_size in known:
+        return known[batch_size]
+    if len(known) == 0:
+        return None
+    return known[min(known, key=lambda size: abs(math.log(size / batch_size)))]
+
+
+class StagePlanner:
+    def __init__(self, stats: StageStats, config):
+        self.stats = stats
+        self.config = config
+        self.model = config["SELECTION"]["model"]
+        self.title_buckets = stats.get_buckets(self.model, "title")
+        self.abstract_buckets = stats.get_buckets(self.model, get_abstract_stage(config))
+
+    def predict_stage(self, buckets: Dict[int, Bucket], batch_size, paper_cnt, paper_tokens, prompt_overhead) -> Tuple[float, float]:
+        # the cost and seconds of one stage over `paper_cnt` papers, retries included
+        if paper_cnt == 0:
+            return 0.0, 0.0
+        total = Bucket()
+        for bucket in buckets.values():
+            total.add(bucket)
+        # the aggregate of all batch sizes when none has enough history yet
+        bucket = get_nearest_bucket(buckets, batch_size) or total
+        token_ratio = total.prompt_tokens / total.estimated_prompt_tokens if total.estimated_prompt_tokens > 0 else 1.0
+        completion_per_paper = total.completion_tokens / total.answered_papers if total.answered_papers > 0 else 0.0
+        seconds_per_batch = bucket.seconds / bucket.batches if bucket.batches > 0 else 0.0
+        retry_factor = 1 / (1 - bucket.failure_rate)
+
+        batch_cnt = math.ceil(paper_cnt / batch_size)
+        prompt_tokens = token_ratio * (batch_cnt * prompt_overhead + paper_tokens)
+        completion_tokens = completion_per_paper * paper_cnt
+        pricing = MODEL_PRICING[self.model]
+        cost = retry_factor * (prompt_tokens * pricing["prompt"] + completion_tokens * pricing["completion"]) / 1_000_000
+        return cost, retry_factor * batch_cnt * seconds_per_batch
+
+    def get_candidate_sizes(self, buckets: Dict[int, Bucket], configured_size: int) -> List[int]:
+        return sorted({configured_size} | {size for size, bucket in buckets.items() if bucket.papers >= MIN_HISTORY_PAPERS})
+
+    def plan(
+        self,
+        forced_papers_tokens: Tuple[int, int],  # (number, abstract tokens) of the papers that skip the title filter
+        title_paper_tokens: List[int],  # title tokens of each of the other papers
+        abstract_paper_tokens: List[int],  # abstract tokens of each of the other papers
+        title_overhead: int,
+        abstract_overhead: int,
+        latency_seconds: Optional[float] = None,
+    ) -> StagePlan:
+        from arxiv_assistant.filters.filter_gpt import get_batch_size
+
+        config = self.config
+        paper_cnt = len(title_paper_tokens)
+        forced_cnt, forced_tokens = forced_papers_tokens
+        configured = StagePlan(
+            run_title_filter=config["SELECTION"].getboolean("run_title_filter"),
+            title_batch_size=get_batch_size(int(config["SELECTION"]["title_batch_size"]), paper_cnt, config),
+            abstract_batch_size=get_batch_size(int(config["SELECTION"]["abstract_batch_size"]), paper_cnt + forced_cnt, config),
+        )
+        if self.model not in MODEL_PRICING:
+            configured.reason = f"no pricing for model {self.model}, keeping the configured stages"
+            return configured
+        if get_nearest_bucket(self.abstract_buckets, configured.abstract_batch_size) is None:
+            configured.reason = "no history of the abstract filter yet, keeping the configured stages"
+            return configured
+
+        # the title filter is only switched on or off once both filters have a history
+        title_known = get_nearest_bucket(self.title_buckets, configured.title_batch_size) is not None
+        if title_known:
+            title_options = [None] + self.get_candidate_sizes(self.title_buckets, configured.title_batch_size)
+        elif configured.run_title_filter:
+            # its cost and filter-out rate cannot be predicted yet
+            configured.reason = "no history of the title filter yet, keeping the configured stages"
+            return configured
+        else:
+            title_options = [None]
+        title_total = Bucket()
+        for bucket in self.title_buckets.values():
+            title_total.add(bucket)
+        filter_rate = title_total.filtered_papers / title_total.answered_papers if title_total.answered_papers > 0 else 0.0
+        abstract_tokens = sum(abstract_paper_tokens)
+
+        candidates = []
+        for title_size in title_options:
+            if title_size is not None and paper_cnt > 0:
+                title_cost, title_seconds = self.predict_stage(self.title_buckets, title_size, paper_cnt, sum(title_paper_tokens), title_overhead)
+                kept_cnt = paper_cnt * (1 - filter_rate)
+                kept_tokens = abstract_tokens * (1 - filter_rate)
+            else:
+                title_cost, title_seconds = 0.0, 0.0
+                kept_cnt, kept_tokens = paper_cnt, abstract_tokens
+            for abstract_size in self.get_candidate_sizes(self.abstract_buckets, configured.abstract_batch_size):
+                abstract_cost, abstract_seconds = self.predict_stage(
+                    self.abstract_buckets, abstract_size, round(kept_cnt) + forced_cnt, kept_tokens + forced_tokens, abstract_overhead,
+                )
+                candidates.append(StagePlan(
+                    run_title_filter=title_size is not None,
+                    title_batch_size=title_size if title_size is not None else configured.title_batch_size,
+                    abstract_batch_size=abstract_size,
+                    predicted_cost=title_cost + abstract_cost,
+                    predicted_seconds=title_seconds + abstract_seconds,
+                ))
+
+        within_latency = [plan for plan in candidates if latency_seconds is None or plan.predicted_seconds <= latency_seconds]
+        if len(within_latency) > 0:
+            chosen = min(within_latency, key=lambda plan: plan.predicted_cost)
+            chosen.reason = f"cheapest of {len(candidates)} plans" + (f" within {latency_seconds:.0f}s" if latency_seconds is not None else "")
+        else:
+            chosen = min(candidates, key=lambda plan: plan.predicted_seconds)
+            chosen.reason = f"fastest of {len(candidates)} plans, none fits within {latency_seconds:.0f}s"
+        if not title_known:
+            chosen.reason += ", the title filter has no history yet"
+        chosen.alternatives = [(plan.describe(), plan.predicted_cost, plan.predicted_seconds) for plan in candidates if plan is not chosen]
+        return chosen
+
+
+_stage_stats = {}
+_stage_stats_lock = threading.Lock()
+
+
+def get_stage_stats_path(config) -> str:
+    cache_path = config["OUTPUT"].get("cache_path", os.path.join(config["OUTPUT"]["output_path"], "cache"))
+    return config["OUTPUT"].get("stage_stats_path", os.path.join(cache_path, "stage_stats.sqlite"))
+
+
+def get_stage_stats(config) -> Optional[StageStats]:
+    # one open store per path, shared by all runs of this process, None if statistics are not recorded
+    if not config["SELECTION"].getboolean("record_stage_stats", fallback=False):
+        return None
+    path = get_stage_stats_path(config)
+    with _stage_stats_lock:
+        if path not in _stage_stats:
+            _stage_stats[path] = StageStats(path)
+        return _stage_stats[path]
@@ -0,0 +1,123 @@
+"""
+Watchlist-first author lookups.
+
+Author matching only needs Semantic Scholar for the few authors that may be on the watch list (`authors.txt`),
+so paper authors are first pre-matched locally against the watched names:
+names are compared after folding diacritics, case and punctuation, and by first initial plus last name,
+so "Kristin B. W. McQuinn", "K. McQuinn" and "Kristin Mcquinn" all pre-match each other.
+Add one line per spelling with the same id to `authors.txt` for other known aliases (e.g., a maiden name).
+Pre-matched names are then confirmed by their Semantic Scholar ids as before.
+
+With `h_cutoff` > 0, the h-index of some more authors is needed: the authors of each paper are looked up one by one
+(first and last authors first) until one reaches the cutoff, so a paper costs one or two lookups instead of all its authors.
+"""
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Tuple
+
+from requests import Session
+
+from arxiv_assistant.apis.semantic_scholar import lookup_author
+from arxiv_assistant.utils.utils import Paper
+
+# letters without a Unicode decomposition into a base letter
+FOLDED_LETTERS = str.maketrans({"ø": "o", "æ": "ae", "œ": "oe", "ł": "l", "đ": "d", "ð": "d", "þ": "th", "ı": "i"})
+
+
+def normalize_name(name: str) -> str:
+    # "José García-Pérez" -> "jose garcia perez", "O'Brien" -> "obrien"
+    name = unicodedata.normalize("NFKD", name)
+    name = "".join(c for c in name if not unicodedata.combining(c))
+    name = name.casefold().translate(FOLDED_LETTERS).replace("'", "").replace("’", "")
+    name = re.sub(r"[^\w]+", " ", name)
+    return " ".join(name.split())
+
+
+def get_name_keys(name: str) -> Tuple[str, str]:
+    # the full normalized name and the first initial with the last name, e.g. ("kristin b w mcquinn", "k mcquinn")
+    tokens = normalize_name(name).split()
+    if len(tokens) == 0:
+        return "", ""
+    if len(tokens) == 1:
+        return tokens[0], tokens[0]
+    return " ".join(tokens), f"{tokens[0][0]} {tokens[-1]}"
+
+
+class WatchlistIndex:
+    def __init__(self, names: Iterable[str]):
+        self.full_keys = set()
+        self.initial_keys = set()
+        for name in names:
+            full_key, initial_key = get_name_keys(name)
+            if full_key:
+                self.full_keys.add(full_key)
+                self.initial_keys.add(initial_key)
+
+    def __len__(self):
+        return len(self.full_keys)
+
+    def may_match(self, name: str) -> bool:
+        # True if `name` may be a watched author, to be confirmed by the Semantic Scholar ids
+        full_key, initial_key = get_name_keys(name)
+        return full_key in self.full_keys or initial_key in self.initial_keys
+
+
+def get_max_hindex(aliases) -> float:
+    return max([alias.get("hIndex") or 0 for alias in aliases] + [0])
+
+
+def order_for_hindex(authors) -> List[str]:
+    # senior authors are often first or last
+    if len(authors) <= 2:
+        return list(authors)
+    return [authors[0], authors[-1]] + list(authors[1:-1])
+
+
+def get_authors_watchlist_first(
+    paper_list: List[Paper],
+    watchlist: WatchlistIndex,
+    h_cutoff: float,
+    S2_API_KEY: str,
+    config,
+    cache=None,
+    session: Session = None,
+) -> Dict:
+    """
+    Look up the authors needed for author matching and the h-index cutoff only.
+    :return: the author name -> aliases dict of the looked-up authors, in the format of `get_authors`
+    """
+    if session is None:
+        with Session() as session:
+            return get_authors_watchlist_first(paper_list, watchlist, h_cutoff, S2_API_KEY, config, cache=cache, session=session)
+
+    all_names = list(dict.fromkeys(author for paper in paper_list for author in paper.authors))
+    looked_up = set()
+    author_metadata_dict = {}
+
+    def lookup(author):
+        looked_up.add(author)
+        auth_map = lookup_author(session, author, S2_API_KEY, config, cache=cache)
+        if auth_map is not None:
+            author_metadata_dict[author] = auth_map
+        return auth_map
+
+    # possible watch list hits
+    candidates = [name for name in all_names if watchlist.may_match(name)]
+    print(f"Pre-matched {len(candidates)} of {len(all_names)} authors against {len(watchlist)} watched names")
+    for author in candidates:
+        lookup(author)
+
+    # authors needed for the h-index cutoff, until each paper has one author reaching it
+    if h_cutoff > 0:
+        for paper in paper_list:
+            if any(get_max_hindex(author_metadata_dict[author]) >= h_cutoff for author in paper.authors if author in author_metadata_dict):
+                continue
+            for author in order_for_hindex(paper.authors):
+                if author in looked_up:
+                    continue
+                auth_map = lookup(author)
+                if auth_map is not None and get_max_hindex(auth_map) >= h_cutoff:
+                    break
+
+    print(f"Looked up {len(looked_up)} of {len(all_names)} authors")
+    return author_metadata_dict
@@ -0,0 +1,392 @@
+"""
+The daily pipeline shared by `main.py` and the backfill script: fetch papers, look up authors, filter, and write outputs.
+Papers and author metadata are fetched once and shared by all profiles, while each profile is filtered and written separately.
+"""
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple, Union
+
+from arxiv_assistant.apis.arxiv import get_papers_from_arxiv
+from arxiv_assistant.apis.semantic_scholar import get_authors
+from arxiv_assistant.environment import get_context
+from arxiv_assistant.filters.filter_author import AuthorIndex, filter_papers_by_hindex, get_author_index, select_by_author
+from arxiv_assistant.filters.filter_gpt import filter_by_gpt, get_postfix_prompt_abstract
+from arxiv_assistant.filters.filter_rules import apply_rules, get_rule_set
+from arxiv_assistant.filters.priority import PriorityScorer, get_scoring_deadline, parse_category_weights
+from arxiv_assistant.filters.watchlist import WatchlistIndex, get_authors_watchlist_first
+from arxiv_assistant.profiles import Profile, get_default_profile
+from arxiv_assistant.push_to_slack import get_slack_delivery, get_slack_ledger, push_to_slack
+from arxiv_assistant.renderers.render_daily import write_daily_md
+from arxiv_assistant.renderers.render_site import build_site
+from arxiv_assistant.search_index import get_search_index
+from arxiv_assistant.utils.dump import get_dump_options, get_dump_writer, submit_debug_pruning
+from arxiv_assistant.utils.io import copy_file_or_dir, delete_file_or_dir, get_output_file_formats
+from arxiv_assistant.utils.memory import get_memory_guard
+from arxiv_assistant.utils.pricing import MODEL_PRICING
+from arxiv_assistant.utils.tracing import get_tracer
+from arxiv_assistant.utils.utils import EnhancedJSONEncoder, PaperResult
+
+
+def run_profile(
+    profile: Profile,
+    now_date: Tuple[int, int, int],  # year, month, day
+    all_entries: Union[List, int],  # the raw entries, or their count in low-memory mode
+    arxiv_paper_dict: Dict,
+    paper_list: List,
+    all_authors: Dict,
+    header: str = None,
+    copy_to_latest: bool = True,
+    llm_cache=None,
+    openai_client=None,
+    slack_client=None,
+    author_index: AuthorIndex = None,
+    deadline: float = None,
+) -> Dict:
+    # filters the shared paper list for one profile and writes its outputs
+    context = get_context()
+    tracer = get_tracer()
+    config = profile.config
+    debug_file_format, _, _ = get_output_file_formats(profile.output_path, now_date)
+
+    dump_debug_file, debug_compress_level = get_dump_options(config)
+    dump_writer = get_dump_writer()
+    if dump_debug_file:
+        dump_writer.write_records(debug_file_format.format("config"), [{section: dict(config[section]) for section in config.sections()}], compress_level=debug_compress_level)
+        dump_writer.write_records(debug_file_format.format("author_id_set"), sorted(profile.author_id_set), compress_level=debug_compress_level)
+
+    # initialize vars for filtering
+    selected_paper_dict = {}
+    filtered_paper_dict = {}  # NOTE: NOT USED HERE
+
+    # select papers by author
+    if config["SELECTION"].getboolean("run_author_match"):
+        with tracer.stage("select_by_author", profile=profile.name):
+            paper_list, selected_results = select_by_author(
+                all_authors,
+                paper_list,
+                profile.author_id_set,
+                config,
+                author_index=author_index,
+            )
+        selected_paper_dict.update(selected_results)
+        if dump_debug_file and author_index is not None:
+            watched_papers = author_index.get_watched_papers([result.paper for result in selected_results.values()], profile.author_id_set)
+            dump_writer.write_records(
+                debug_file_format.format("watched_papers"),
+                ({"author_id": author_id, "arxiv_ids": [paper.arxiv_id for paper in papers]} for author_id, papers in watched_papers.items()),
+                compress_level=debug_compress_level,
+            )
+    else:
+        print("Skipping selection by author")
+
+    # the arXiv categories of each paper, for rules, prioritizing and the site index pages
+    paper_categories = get_paper_categories(arxiv_paper_dict)
+
+    # decide papers by keyword rules, forced papers are held out of the h-index filter and scored first
+    forced_papers = []
+    rule_set = get_rule_set(profile.rules_text) if config["SELECTION"].getboolean("run_rules", fallback=True) else None
+    if rule_set is not None:
+        with tracer.stage("apply_rules", profile=profile.name):
+            paper_list, included_results, excluded_results, forced_papers, rule_decisions = apply_rules(
+                rule_set,
+                paper_list,
+                paper_categories,
+                include_score=float(config["SELECTION"]["author_match_score"]),
+            )
+        selected_paper_dict.update(included_results)
+        filtered_paper_dict.update(excluded_results)
+        if dump_debug_file and len(rule_decisions) > 0:
+            dump_writer.write_records(debug_file_format.format("rule_decisions"), rule_decisions, compress_level=debug_compress_level)
+    else:
+        print("Skipping keyword rules")
+
+    # filter papers by h-index
+    if config["SELECTION"].getboolean("run_author_match"):
+        with tracer.stage("filter_by_hindex", profile=profile.name):
+            paper_list, filtered_results = filter_papers_by_hindex(
+                all_authors,
+                paper_list,
+                config,
+                author_index=author_index,
+            )
+        filtered_paper_dict.update(filtered_results)
+    else:
+        print("Skipping h-index filtering")
+
+    # filter papers by GPT, the most promising papers first
+    unscored_papers = []
+    if config["SELECTION"].getboolean("run_openai"):
+        if config["SELECTION"].getboolean("prioritize_scoring", fallback=True):
+            priority_scorer = PriorityScorer(
+                profile.topic_prompt,
+                paper_list,
+                watchlist=WatchlistIndex(profile.author_names),
+                author_index=author_index,
+                category_weights=parse_category_weights(config["SELECTION"].get("category_weights", fallback="")),
+                paper_categories=paper_categories,
+            )
+        else:
+            priority_scorer = None
+        with tracer.stage("filter_by_gpt", profile=profile.name):
+            selected_results, filtered_results, total_prompt_cost, total_completion_cost, total_prompt_tokens, total_completion_tokens, unscored_papers, saved_completion_tokens = filter_by_gpt(
+                paper_list,
+                context.system_prompt,
+                profile.topic_prompt,
+                profile.score_prompt,
+                context.postfix_prompt_title,
+                get_postfix_prompt_abstract(config),
+                config,
+                llm_cache=llm_cache,
+                debug_file_format=debug_file_format,
+                openai_client=openai_client,
+                priority_scorer=priority_scorer,
+                deadline=deadline,
+                forced_papers=forced_papers,
+            )
+        selected_paper_dict.update(selected_results)
+        filtered_paper_dict.update(filtered_results)
+    else:
+        total_prompt_cost, total_completion_cost, total_prompt_tokens, total_completion_tokens, saved_completion_tokens = 0.0, 0.0, 0, 0, 0
+        print("Skipping GPT filtering")
+
+    return write_profile_outputs(
+        profile,
+        now_date,
+        all_entries,
+        arxiv_paper_dict,
+        selected_paper_dict,
+        filtered_paper_dict,
+        (total_prompt_cost, total_completion_cost, total_prompt_tokens, total_completion_tokens, saved_completion_tokens),
+        header=header,
+        copy_to_latest=copy_to_latest,
+        slack_client=slack_client,
+        unscored_papers=unscored_papers,
+        paper_categories=paper_categories,
+    )
+
+
+def get_paper_categories(arxiv_paper_dict: Dict) -> Dict[str, List[str]]:
+    # the arXiv categories of each paper
+    paper_categories = {}
+    for area, area_papers in arxiv_paper_dict.items():
+        for paper in area_papers:
+            paper_categories.setdefault(paper.arxiv_id, []).append(area)
+    return paper_categories
+
+
+def write_profile_outputs(
+    profile: Profile,
+    now_date: Tuple[int, int, int],  # year, month, day
+    all_entries: Union[List, int],
+    arxiv_paper_dict: Dict,
+    selected_paper_dict: Dict,
+    filtered_paper_dict: Dict,
+    costs: Tuple[float, float, int, int, int],  # prompt cost, completion cost, prompt tokens, completion tokens, completion tokens saved by the compact protocol
+    header: str = None,
+    copy_to_latest: bool = True,
+    slack_client=None,
+    unscored_papers: List = None,
+    paper_categories: Dict[str, List[str]] = None,
+) -> Dict:
+    # sorts the results of one profile and writes its outputs (also used to merge the results of sharded workers)
+    context = get_context()
+    tracer = get_tracer()
+    config = profile.config
+    debug_file_format, md_file_format, json_file_format = get_output_file_formats(profile.output_path, now_date)
+    dump_debug_file, debug_compress_level = get_dump_options(config)
+    dump_writer = get_dump_writer()
+    total_prompt_cost, total_completion_cost, total_prompt_tokens, total_completion_tokens, saved_completion_tokens = costs
+    if paper_categories is None:
+        paper_categories = get_paper_categories(arxiv_paper_dict)
+
+    # sort the papers by relevance and novelty, and record their arXiv categories for the site index pages
+    selected_paper_dict = {
+        k: PaperResult(v.paper, {**v.fields, "CATEGORIES": paper_categories.get(k, [])})
+        for k, v in sorted(
+            selected_paper_dict.items(),
+            key=lambda x: (x[1].get("SCORE", 0), x[1].get("RELEVANCE", 0)),  # sort first by total scores then by relevance
+            reverse=True
+        )
+    }
+
+    # dump filtered & selected papers for debugging
+    # one record per paper, the arxiv ids are in the records
+    if dump_debug_file:
+        dump_writer.write_records(debug_file_format.format("selected_paper_dict"), selected_paper_dict.values(), compress_level=debug_compress_level)
+        dump_writer.write_records(debug_file_format.format("filtered_paper_dict"), filtered_paper_dict.values(), compress_level=debug_compress_level)
+
+    if config["OUTPUT"].getboolean("dump_json"):
+        with open(json_file_format.format("output.json"), "w") as outfile:
+            json.dump(selected_paper_dict, outfile, cls=EnhancedJSONEncoder, indent=4)
+
+    if config["OUTPUT"].getboolean("dump_md"):
+        head_table = {
+            "headers": [f"*[{config['SELECTION']['model']}]*", "Prompt", "Completion", "Total"],
+            "data": [
+                ["**Token**", total_prompt_tokens, total_completion_tokens, total_prompt_tokens + total_completion_tokens],
+                ["**Cost**", f"${round(total_prompt_cost, 2)}", f"${round(total_completion_cost, 2)}", f"${round(total_prompt_cost + total_completion_cost, 2)}"],
+            ]
+        }
+        if saved_completion_tokens > 0:
+            saved_cost = MODEL_PRICING.get(config["SELECTION"]["model"], {}).get("completion", 0) * saved_completion_tokens / 1_000_000
+            head_table["note"] = f"The compact output protocol saved about {saved_completion_tokens} completion tokens (${round(saved_cost, 2)}) over JSONL output."
+        with tracer.stage("render", profile=profile.name):
+            write_daily_md(md_file_format.format("output.md"), all_entries, arxiv_paper_dict, selected_paper_dict, header=header, now_date=now_date, prompts=(context.system_prompt, get_postfix_prompt_abstract(config), profile.score_prompt, profile.topic_prompt), head_table=head_table, unscored_papers=unscored_papers)
+
+    # only push to slack for non-empty dicts
+    if config["OUTPUT"].getboolean("push_to_slack"):
+        if context.slack_key is None:
+            print("Warning: push_to_slack is true, but SLACK_KEY is not set - not pushing to slack")
+        else:
+            delivery_args = dict(
+                channel_id=profile.slack_channel_id,
+                client=slack_client,
+                now_date=now_date,
+                profile_name=profile.name,
+                ledger=get_slack_ledger(config) if config["OUTPUT"].getboolean("slack_ledger", fallback=True) else None,
+            )
+            if config["OUTPUT"].getboolean("background_delivery", fallback=True):
+                get_slack_delivery().submit(selected_paper_dict, **delivery_args)
+            else:
+                with tracer.stage("push", profile=profile.name):
+                    push_to_slack(selected_paper_dict, **delivery_args)
+
+    # copy files
+    if copy_to_latest and config["OUTPUT"].getboolean("dump_md"):
+        copy_file_or_dir(md_file_format.format("output.md"), profile.output_path, print_info=True)
+        delete_file_or_dir(os.path.join(profile.output_path, "output.md"))
+        os.rename(
+            os.path.join(profile.output_path, os.path.basename(md_file_format.format("output.md"))),
+            os.path.join(profile.output_path, "output.md"),
+        )
+
+    return selected_paper_dict
+
+
+def run_pipeline(
+    config,
+    now_date: Tuple[int, int, int] = None,  # year, month, day
+    source: str = "rss",
+    begin_date: Tuple[int, int, int] = None,  # year, month, day
+    end_date: Tuple[int, int, int] = None,  # year, month, day
+    header: str = None,
+    copy_to_latest: bool = True,
+    profiles: List[Profile] = None,
+    fetch_cache=None,
+    author_cache=None,
+    llm_cache=None,
+    session=None,
+    openai_client=None,
+    slack_client=None,
+) -> Optional[Dict[str, Dict]]:
+    """
+    Run the whole pipeline for papers announced on `now_date`.
+    If `now_date` is None, it is resolved from the fetched RSS feeds (or local time) by the run context.
+    The caches are optional and can be shared by concurrent runs for different dates.
+    The clients (HTTP session, OpenAI, Slack) are optional and can be kept warm across runs by a long-running service.
+    :return: a dict mapping each profile name to its selected paper dict, or None if no papers are found.
+    """
+    context = get_context()
+    tracer = get_tracer()
+    memory_guard = get_memory_guard(config)
+    deadline = get_scoring_deadline(config)
+    if profiles is None:
+        profiles = [get_default_profile(config)]
+    if now_date is not None:
+        debug_file_format, _, _ = get_output_file_formats(config["OUTPUT"]["output_path"], now_date)
+    else:
+        debug_file_format = None  # resolved after the first feed is fetched
+
+    # get the paper list from arxiv
+    with tracer.stage("fetch"):
+        all_entries, arxiv_paper_dict = get_papers_from_arxiv(
+            config,
+            source=source,
+            begin_date=begin_date,
+            end_date=end_date,
+            debug_file_format=debug_file_format,
+            fetch_cache=fetch_cache,
+            session=session,
+        )
+    memory_guard.check("fetch")
+    if now_date is None:
+        now_date = context.now_date
+        debug_file_format, _, _ = get_output_file_formats(config["OUTPUT"]["output_path"], now_date)
+    print(f"Running pipeline for {now_date}")
+    # dedupe cross-listed papers in feed order, so that batches (and LLM prompts) are the same when rerunning a day
+    paper_list = list(dict.fromkeys(v for area_papers in arxiv_paper_dict.values() for v in area_papers))
+    print("Total number of papers:" + str(len(paper_list)))
+    if len(paper_list) == 0:
+        print("No papers found")
+        get_dump_writer().flush()  # keep the feed dumps of the days worth debugging
+        return None
+
+    # get the author list from papers, once for all profiles
+    author_profiles = [profile for profile in profiles if profile.config["SELECTION"].getboolean("run_author_match")]
+    if len(author_profiles) > 0:
+        if config["SELECTION"].getboolean("watchlist_first_lookup", fallback=True):
+            # only look up the possible watch list hits and the authors needed for the h-index cutoff
+            watchlist = WatchlistIndex(name for profile in author_profiles for name in profile.author_names)
+            h_cutoff = max(float(profile.config["FILTERING"]["h_cutoff"]) for profile in author_profiles)
+            with tracer.stage("authors"):
+                all_authors = get_authors_watchlist_first(paper_list, watchlist, h_cutoff, context.s2_api_key, config, cache=author_cache, session=session)
+        else:
+            all_authors = list(dict.fromkeys(author for paper in paper_list for author in paper.authors))
+            print("Getting author info for " + str(len(all_authors)) + " authors")
+            with tracer.stage("authors"):
+                all_authors = get_authors(all_authors, context.s2_api_key, config=config, cache=author_cache, session=session)
+        # indexed once for all profiles, and kept for later dates of this process
+        author_index = get_author_index(all_authors)
+    else:
+        print("Skipping author info")
+        all_authors = {}
+        author_index = None
+    memory_guard.check("authors")
+
+    # dump all papers for debugging
+    dump_debug_file, debug_compress_level = get_dump_options(config)
+    if dump_debug_file:
+        get_dump_writer().write_records(debug_file_format.format("all_papers"), paper_list, compress_level=debug_compress_level)
+        get_dump_writer().write_records(
+            debug_file_format.format("all_authors"),
+            ({"name": name, "aliases": aliases} for name, aliases in all_authors.items()),
+            compress_level=debug_compress_level,
+        )
+
+    # score all profiles as one workload, their LLM calls share the global rate limit
+    profile_args = (now_date, all_entries, arxiv_paper_dict, paper_list, all_authors, header, copy_to_latest, llm_cache, openai_client, slack_client, author_index, deadline)
+    if len(profiles) == 1:
+        results = {profiles[0].name: run_profile(profiles[0], *profile_args)}
+    else:
+        max_workers = min(len(profiles), int(config["SELECTION"].get("max_profile_workers", "4")))
+        with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+            futures = {
+                profile.name: executor.submit(run_profile, profile, *profile_args)
+                for profile in profiles
+            }
+            results = {name: future.result() for name, future in futures.items()}
+    memory_guard.check("profiles")
+
+    # debug dumps are written in the background during the run, wait for the rest and prune old ones
+    if dump_debug_file or any(profile.config["OUTPUT"].getboolean("dump_debug_file") for profile in profiles):
+        year, month, day = now_date
+        submit_debug_pruning(config, [config["OUTPUT"]["output_path"]] + [profile.output_path for profile in profiles], keep_dates=[f"{year}-{month:02d}-{day:02d}"])
+        with tracer.stage("flush_dumps"):
+            get_dump_writer().flush()
+
+    # index the new outputs for searching past days
+    if config["OUTPUT"].getboolean("update_search_index", fallback=True):
+        with tracer.stage("index"):
+            try:
+                file_cnt, paper_cnt = get_search_index(config).update(config["OUTPUT"]["output_path"])
+                print(f"Indexed {paper_cnt} papers from {file_cnt} files for searching")
+            except Exception as e:
+                print(f"Failed to update the search index: {e}")
+
+    # update the multi-page site of each output path, only the new days are rendered
+    if config["OUTPUT"].getboolean("build_site", fallback=True):
+        with tracer.stage("site"):
+            for output_path in dict.fromkeys(profile.output_path for profile in profiles if profile.config["OUTPUT"].getboolean("dump_json")):
+                build_site(output_path)
+    return results
@@ -0,0 +1,134 @@
+"""
+Topic profiles, each with its own prompts, watched authors, config overrides and outputs.
+
+A profile is a directory under `profiles_path` (see config.ini), for example:
+    profiles/dwarf_galaxies/
+        paper_topics.txt     # replaces prompts/paper_topics.txt
+        score_criteria.txt   # replaces prompts/score_criteria.txt
+        authors.txt          # replaces configs/authors.txt
+        rules.txt            # replaces configs/rules.txt
+        config.ini           # overrides sections/keys of configs/config.ini, e.g. [FILTERING] relevance_cutoff
+Any missing file falls back to the default one. All profiles score the papers of one shared fetch, so the keys that select
+the fetched papers (`FETCH_KEYS` of [FILTERING]) cannot be overridden by a profile, set them in configs/config.ini.
+"""
+import configparser
+import os
+from dataclasses import dataclass, field
+from typing import List, Optional, Set
+
+from arxiv_assistant.environment import get_context, parse_authors
+from arxiv_assistant.utils.io import get_output_file_formats
+
+DEFAULT_PROFILE_NAME = "default"
+FETCH_KEYS = ("arxiv_category", "announce_type", "force_primary")
+
+
+@dataclass
+class Profile:
+    name: str
+    config: configparser.ConfigParser
+    topic_prompt: str
+    score_prompt: str
+    author_id_set: Set[str]
+    output_path: str
+    slack_channel_id: Optional[str] = None
+    author_names: List[str] = field(default_factory=list)  # names of the watched authors, for pre-matching before lookups
+    rules_text: str = ""  # keyword rules decided before any LLM call
+
+
+def get_default_profile(config) -> Profile:
+    context = get_context()
+    return Profile(
+        name=DEFAULT_PROFILE_NAME,
+        config=config,
+        topic_prompt=context.topic_prompt,
+        score_prompt=context.score_prompt,
+        author_id_set=context.author_id_set,
+        output_path=config["OUTPUT"]["output_path"],
+        slack_channel_id=context.slack_channel_id,
+        author_names=context.authors[0],
+        rules_text=context.rules_text,
+    )
+
+
+def has_outputs(profile: Profile, now_date) -> bool:
+    # True if the profile's output of `now_date` exists, e.g. written by a previous process
+    _, _, json_file_format = get_output_file_formats(profile.output_path, now_date, create=False)
+    return os.path.exists(json_file_format.format("output.json"))
+
+
+def load_profile(config, profile_dir) -> Profile:
+    context = get_context()
+    name = os.path.basename(os.path.normpath(profile_dir))
+
+    # overlay the profile config on top of the base config
+    profile_config = configparser.ConfigParser()
+    profile_config.read_dict({section: dict(config[section]) for section in config.sections()})
+    if os.path.exists(os.path.join(profile_dir, "config.ini")):
+        overrides = configparser.ConfigParser()
+        overrides.read(os.path.join(profile_dir, "config.ini"))
+        fetch_keys = [key for key in FETCH_KEYS if overrides.has_section("FILTERING") and key in overrides["FILTERING"]]
+        if len(fetch_keys) > 0:
+            raise ValueError(
+                f"Profile \"{name}\" overrides {fetch_keys} of [FILTERING], but all profiles share one fetch: set them in the base config instead"
+            )
+        profile_config.read(os.path.join(profile_dir, "config.ini"))
+
+    def read_or_default(file_name, default):
+        path = os.path.join(profile_dir, file_name)
+        if not os.path.exists(path):
+            return default
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    topic_prompt = read_or_default("paper_topics.txt", context.topic_prompt)
+    score_prompt = read_or_default("score_criteria.txt", context.score_prompt)
+    rules_text = read_or_default("rules.txt", context.rules_text)
+    if os.path.exists(os.path.join(profile_dir, "authors.txt")):
+        with open(os.path.join(profile_dir, "authors.txt"), "r", encoding="utf-8") as f:
+            author_names, author_ids = parse_authors(f.readlines())
+        author_id_set = set(author_ids)
+    else:
+        author_names, author_id_set = context.authors[0], context.author_id_set
+
+    return Profile(
+        name=name,
+        config=profile_config,
+        topic_prompt=topic_prompt,
+        score_prompt=score_prompt,
+        author_id_set=author_id_set,
+        output_path=os.path.join(config["OUTPUT"]["output_path"], "profiles", name),
+        slack_channel_id=profile_config["OUTPUT"].get("slack_channel_id", context.slack_channel_id),
+        author_names=author_names,
+        rules_text=rules_text,
+    )
+
+
+def load_profiles(config, names: List[str] = None) -> List[Profile]:
+    # load the profiles with the given names, or all profiles under `profiles_path` if `names` is None
+    profiles_path = config["OUTPUT"].get("profiles_path", "profiles/")
+    if names is None:
+        if not os.path.isdir(profiles_path):
+            raise ValueError(f"Profile directory \"{profiles_path}\" does not exist")
+        names = sorted(name for name in os.listdir(profiles_path) if os.path.isdir(os.path.join(profiles_path, name)))
+
+    profiles = []
+    for name in names:
+        if name == DEFAULT_PROFILE_NAME:
+            profiles.append(get_default_profile(config))
+            continue
+        profile_dir = os.path.join(profiles_path, name)
+        if not os.path.isdir(profile_dir):
+            raise ValueError(f"Profile \"{name}\" not found in \"{profiles_path}\"")
+        profiles.append(load_profile(config, profile_dir))
+    print(f"Loaded {len(profiles)} profiles: {[profile.name for profile in profiles]}")
+    return profiles
+
+
+def load_profiles_from_arg(config, profiles_arg: Optional[str]) -> Optional[List[Profile]]:
+    # parses the `--profiles` command line argument, None means the single default profile
+    if profiles_arg is None:
+        return None
+    if profiles_arg == "all":
+        return load_profiles(config)
+    return load_profiles(config, [s.strip() for s in profiles_arg.split(",")])
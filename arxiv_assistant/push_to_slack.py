@@ -1,52 +1,109 @@
 """
 Code to render the output.json into a format suitable for a slackbot, and to push it to slack using webhooks
+
+Deliveries are rate-limited per channel (`chat.postMessage` allows about one message per second per channel, with short bursts),
+retried after `Retry-After` on 429s and with exponential backoff on server errors,
+and recorded in a delivery ledger (`cache_path`/slack_ledger.json) keyed by date, channel and profile:
+a rerun or a backfill of the same day only posts the papers not posted yet, in the thread of the first message.
+With `background_delivery = true`, deliveries run on background threads while the pipeline goes on,
+different channels and profiles are delivered concurrently, and the messages of one thread are posted in order.
 """
 import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from slack_sdk import WebClient
-from slack_sdk.errors import SlackApiError
-from typing import List
+from typing import Dict, List, Tuple
 
-from arxiv_assistant.environment import SLACK_CHANNEL_ID, SLACK_KEY
+from arxiv_assistant.environment import get_context
+from arxiv_assistant.utils.cache import JsonCache, load_cache
+from arxiv_assistant.utils.rate_limit import RateLimiter
+from arxiv_assistant.utils.tracing import get_tracer
 from arxiv_assistant.utils.utils import Paper, batched
 
+# papers in the thread of each day, and blocks per thread message (a paper is a section and a divider)
+MAX_THREAD_PAPERS = 50
+MAX_BLOCKS_PER_MESSAGE = 50
+# at most one message per second per channel on average, allowing short bursts
+CHANNEL_BURST = 3
+# Slack errors worth retrying
+RETRIED_ERRORS = ("ratelimited", "internal_error", "fatal_error", "service_unavailable", "request_timeout")
+
+_channel_limiters = {}
+_channel_limiters_lock = threading.Lock()
+
+
+def get_channel_limiter(channel_id) -> RateLimiter:
+    # shared by all deliveries of this process to the same channel
+    with _channel_limiters_lock:
+        if channel_id not in _channel_limiters:
+            _channel_limiters[channel_id] = RateLimiter(CHANNEL_BURST, period=float(CHANNEL_BURST))
+        return _channel_limiters[channel_id]
+
+
+def get_retry_after(error) -> float:
+    # the `Retry-After` header of a Slack error response, if any
+    headers = getattr(error.response, "headers", None) or {}
+    for key, value in headers.items():
+        if key.lower() == "retry-after":
+            try:
+                return float(value[0] if isinstance(value, list) else value)
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+def post_message(client, channel_id, span_name, max_retries=5, **kwargs):
+    # posts one message, waiting for the channel's rate limit and retrying on rate limits and server errors
+    from slack_sdk.errors import SlackApiError
+
+    with get_tracer().span(span_name, "push", blocks=len(kwargs.get("blocks", []))) as span:
+        for attempt in range(max_retries + 1):
+            span.attempt()
+            span.add(queue_wait=get_channel_limiter(channel_id).acquire())
+            try:
+                return client.chat_postMessage(channel=channel_id, unfurl_links=False, **kwargs)
+            except SlackApiError as e:
+                status_code = getattr(e.response, "status_code", None) or 0
+                error = e.response.get("error") if hasattr(e.response, "get") else None
+                if attempt == max_retries or not (status_code == 429 or status_code >= 500 or error in RETRIED_ERRORS):
+                    raise
+                retry_after = get_retry_after(e)
+                delay = retry_after if retry_after is not None else min(2 ** attempt, 30) * (0.5 + random.random())
+                print(f"Slack error ({status_code} {error}), retrying in {delay:.1f}s")
+                time.sleep(delay)
+
 
 def send_main_message(block_list: List, channel_id, client):
+    from slack_sdk.errors import SlackApiError
+
     try:
-        # Call the conversations.list method using the WebClient
-        result = client.chat_postMessage(
-            channel=channel_id,
-            blocks=block_list,
-            text="Arxiv update",
-            unfurl_links=False,
-            # You could also use a blocks[] array to send richer content
-        )
-        # Print result, which includes information about the message (like TS)
-        print(result)
+        result = post_message(client, channel_id, "slack_main_message", blocks=block_list, text="Arxiv update")
+        print(f"Posted the main message to {channel_id} (ts: {result['ts']})")
         return result["ts"]
 
     except SlackApiError as e:
         print(f"Error: {e}")
 
 
-def send_thread(block_list: List, channel_id, thread_id, client):
+def send_thread(block_list: List, channel_id, thread_id, client, on_sent=None):
+    # posts the blocks as messages in order, calling `on_sent(index of the message)` after each one
+    from slack_sdk.errors import SlackApiError
+
     try:
-        batches = batched(block_list, 50)
-        # Call the conversations.list method using the WebClient
-        for batch in batches:
-            result = client.chat_postMessage(
-                thread_ts=thread_id,
-                text="Arxiv full update",
-                channel=channel_id,
-                blocks=batch,
-                unfurl_links=False,
-                # You could also use a blocks[] array to send richer content
-            )
-            # Print result, which includes information about the message (like TS)
-            print(result)
+        batches = batched(block_list, MAX_BLOCKS_PER_MESSAGE)
+        for i, batch in enumerate(batches):
+            post_message(client, channel_id, "slack_thread_message", thread_ts=thread_id, text="Arxiv full update", blocks=batch)
+            if on_sent is not None:
+                on_sent(i)
+        print(f"Posted {len(batches)} thread messages to {channel_id}")
+        return True
 
     except SlackApiError as e:
         print(f"Error: {e}")
+        return False
 
 
 def render_paper(paper_entry: Paper, counter: int) -> str:
@@ -118,17 +175,20 @@ def render_title(paper_entry: Paper, counter: int) -> str:
     return paper_string
 
 
-def build_block_list(title_strings, paper_strings):
+def build_block_list(title_strings, paper_strings, now_date: Tuple[int, int, int] = None):
     """
     builds a list of slack-bot blocks from a list of markdown formatted papers
     """
+    if now_date is not None:
+        date_string = datetime(*now_date).strftime("%m/%d/%Y")
+    else:
+        date_string = datetime.today().strftime("%m/%d/%Y")
     slack_block_list = [
         {
             "type": "header",
             "text": {
                 "type": "plain_text",
-                "text": "Paper alert bot update on "
-                        + datetime.today().strftime("%m/%d/%Y"),
+                "text": "Paper alert bot update on " + date_string,
             },
         },
         {
@@ -148,31 +208,135 @@ def build_block_list(title_strings, paper_strings):
             {"type": "section", "text": {"type": "mrkdwn", "text": paper}}
         )
 
+    return slack_block_list, build_thread_blocks(paper_strings[:MAX_THREAD_PAPERS])
+
+
+def build_thread_blocks(paper_strings):
     thread_blocks = []
-    for paper in paper_strings[:50]:
+    for paper in paper_strings:
         thread_blocks.append(
             {"type": "section", "text": {"type": "mrkdwn", "text": paper}}
         )
         thread_blocks.append({"type": "divider"})
+    return thread_blocks
+
+
+def create_slack_client():
+    from slack_sdk import WebClient
+
+    context = get_context()
+    return WebClient(token=context.slack_key, base_url=context.slack_base_url)
+
+
+_ledgers = {}
+_ledgers_lock = threading.Lock()
+
+
+def get_slack_ledger(config) -> JsonCache:
+    # one ledger per cache path, shared by all profiles and dates of this process
+    cache_path = config["OUTPUT"].get("cache_path", os.path.join(config["OUTPUT"]["output_path"], "cache"))
+    with _ledgers_lock:
+        if cache_path not in _ledgers:
+            _ledgers[cache_path] = load_cache(config, "slack_ledger")
+        return _ledgers[cache_path]
+
 
-    return slack_block_list, thread_blocks
+def get_ledger_key(now_date, channel_id, profile_name) -> str:
+    date_string = "today" if now_date is None else "{}-{:02d}-{:02d}".format(*now_date)
+    return f"{date_string}/{channel_id}/{profile_name}"
 
 
-def push_to_slack(papers_dict):
-    client = WebClient(token=SLACK_KEY)
+def push_to_slack(papers_dict, channel_id=None, client=None, now_date: Tuple[int, int, int] = None, profile_name="default", ledger: JsonCache = None):
+    """
+    Posts the papers of a day to a channel: the top titles as a message, then the papers in its thread.
+    If a `ledger` is given, what has been posted is recorded, and only the papers not posted yet are posted on reruns.
+    """
+    if channel_id is None:
+        channel_id = get_context().slack_channel_id
+    if client is None:
+        client = create_slack_client()
     # render each paper
     if len(papers_dict) == 0:
         return
-    title_strings = [
-        render_title(paper, i) for i, paper in enumerate(papers_dict.values())
-    ]
-    paper_strings = [
-        render_paper(paper, i) for i, paper in enumerate(papers_dict.values())
-    ]
-    blocks, thread_blocks = build_block_list(title_strings, paper_strings)
-    # push to slack
-    ts = send_main_message(blocks, SLACK_CHANNEL_ID, client)
-    send_thread(thread_blocks, SLACK_CHANNEL_ID, ts, client)
+    ledger_key = get_ledger_key(now_date, channel_id, profile_name)
+    delivery = dict(ledger.get(ledger_key) or {}) if ledger is not None else {}
+    posted_ids = set(delivery.get("posted", []))
+
+    def record(**kwargs):
+        if ledger is not None:
+            delivery.update(kwargs)
+            ledger.set(ledger_key, dict(delivery))
+            ledger.save()
+
+    papers = list(papers_dict.values())[:MAX_THREAD_PAPERS]
+    new_papers = [(i, paper) for i, paper in enumerate(papers) if paper["arxiv_id"] not in posted_ids]
+    if delivery.get("ts") is not None and len(new_papers) == 0:
+        print(f"Already delivered to {channel_id} for {ledger_key}, skipping")
+        return
+
+    # the main message, only once per day
+    ts = delivery.get("ts")
+    if ts is None:
+        title_strings = [
+            render_title(paper, i) for i, paper in enumerate(papers_dict.values())
+        ]
+        blocks, _ = build_block_list(title_strings, [], now_date=now_date)
+        ts = send_main_message(blocks, channel_id, client)
+        if ts is None:
+            return
+        record(ts=ts, posted=[])
+
+    # the papers not posted yet, in the thread of the main message
+    thread_blocks = build_thread_blocks([render_paper(paper, i) for i, paper in new_papers])
+    papers_per_message = MAX_BLOCKS_PER_MESSAGE // 2
+
+    def on_sent(message_index):
+        sent_papers = new_papers[message_index * papers_per_message:(message_index + 1) * papers_per_message]
+        record(posted=delivery.get("posted", []) + [paper["arxiv_id"] for _, paper in sent_papers])
+
+    send_thread(thread_blocks, channel_id, ts, client, on_sent=on_sent)
+
+
+class SlackDelivery:
+    """
+    Runs deliveries on background threads, so that the pipeline does not wait for Slack.
+    Call `wait` before exiting (e.g., at the end of `main.py`).
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self._executor = None
+        self._futures: List[Future] = []
+        self._lock = threading.Lock()
+
+    def submit(self, papers_dict: Dict, **kwargs) -> Future:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="slack-delivery")
+            future = self._executor.submit(push_to_slack, dict(papers_dict), **kwargs)
+            self._futures.append(future)
+            return future
+
+    def wait(self) -> int:
+        # waits for the submitted deliveries, returns the number of failed ones
+        with self._lock:
+            futures, self._futures = self._futures, []
+        failed_cnt = 0
+        for future in futures:
+            try:
+                future.result()
+            except Exception as e:
+                print(f"Failed to deliver to Slack: {e}")
+                failed_cnt += 1
+        return failed_cnt
+
+
+# shared by all runs of this process
+_slack_delivery = SlackDelivery()
+
+
+def get_slack_delivery() -> SlackDelivery:
+    return _slack_delivery
 
 
 if __name__ == "__main__":
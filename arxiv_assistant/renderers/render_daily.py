@@ -1,6 +1,6 @@
 import json
-from tabulate import tabulate
-from typing import Dict, List, Tuple
+import os
+from typing import Dict, Iterator, List, Tuple, Union
 
 from arxiv_assistant.filters.filter_gpt import get_user_prompt_for_abstract_filtering
 from arxiv_assistant.utils.io import add_prefix_to_lines
@@ -47,14 +47,16 @@ def render_paper_content(paper_entry: Dict, idx: int) -> str:
     return paper_string
 
 
-def render_daily_md(
-    all_entries: List,
+def iter_daily_md(
+    all_entries: Union[List, int],  # the raw entries, or their count in low-memory mode
     arxiv_paper_dict: Dict[str, List[Paper]],
     selected_paper_dict: Dict[str, Dict],
     now_date: Tuple[int, int, int] = None,  # year, month, day
     prompts: Tuple[str, str, str, str] = None,  # base, topic, score, postfix
     head_table: Dict = None,
-):
+    unscored_papers: List[Paper] = None,  # papers left unscored by the scoring deadline or after all retries
+) -> Iterator[str]:
+    # yields the daily report piece by piece, so that it can be streamed to a file without building the whole string
     # render date content
     if now_date is not None:
         now_year, now_month, now_day = now_date
@@ -64,21 +66,15 @@ def render_daily_md(
 
     # render head table
     if head_table is not None:
+        from tabulate import tabulate
+
         head_table_strings = tabulate(head_table["data"], headers=head_table["headers"], tablefmt="github")
         head_table_strings = align_markdown_table(head_table_strings, "center")
+        if head_table.get("note"):
+            head_table_strings += "\n\n" + head_table["note"]
     else:
         head_table_strings = ""
 
-    # render each paper
-    title_strings = [
-        render_title_and_author(paper, i + 1)
-        for i, paper in enumerate(selected_paper_dict.values())
-    ]
-    paper_strings = [
-        render_paper_content(paper, i + 1)
-        for i, paper in enumerate(selected_paper_dict.values())
-    ]
-
     # render prompt
     if prompts is not None:
         system_prompt, topic_prompt, score_prompt, postfix_prompt = prompts
@@ -92,25 +88,63 @@ def render_daily_md(
         system_prompt = ""
         user_prompt = ""
 
-    # cat output string
-    output_string = "\n\n".join([
-        f"# Personalized Daily ArXiv Papers {date_string}",
+    yield f"# Personalized Daily ArXiv Papers {date_string}"
+    for part in (
         head_table_strings,
-        f"Total arXiv papers: {len(all_entries)}",
+        f"Total arXiv papers: {all_entries if isinstance(all_entries, int) else len(all_entries)}",
         f"Total scanned papers: {sum([len(paper_list) for paper_list in arxiv_paper_dict.values()])}",
         f"Total relevant papers: {len(selected_paper_dict)}",
-        "**Table of contents with paper titles:**",
-        "\n\n".join(title_strings),
-        "---",
-        "\n\n---\n\n".join(paper_strings),
+    ):
+        yield "\n\n" + part
+    if unscored_papers:
+        yield f"\n\n**Partial results:** {len(unscored_papers)} papers were left unscored (by the scoring deadline or after all retries), they are listed at the end."
+    yield "\n\n**Table of contents with paper titles:**"
+
+    # render each paper
+    yield "\n\n"
+    for i, paper in enumerate(selected_paper_dict.values()):
+        yield ("\n\n" if i > 0 else "") + render_title_and_author(paper, i + 1)
+    yield "\n\n---\n\n"
+    for i, paper in enumerate(selected_paper_dict.values()):
+        yield ("\n\n---\n\n" if i > 0 else "") + render_paper_content(paper, i + 1)
+
+    if unscored_papers:
+        yield "\n\n---\n\n# Unscored Papers"
+        for paper in unscored_papers:
+            yield f"\n\n- [{paper.title}](https://arxiv.org/abs/{paper.arxiv_id}) ({paper.arxiv_id})"
+
+    for part in (
         "---",
         "# Paper Selection Prompt",
         "## System Prompt",
         add_prefix_to_lines(system_prompt, "> "),
         "## User Prompt",
         add_prefix_to_lines(user_prompt, "> "),
-    ])
-    return output_string
+    ):
+        yield "\n\n" + part
+
+
+def render_daily_md(
+    all_entries: Union[List, int],  # the raw entries, or their count in low-memory mode
+    arxiv_paper_dict: Dict[str, List[Paper]],
+    selected_paper_dict: Dict[str, Dict],
+    now_date: Tuple[int, int, int] = None,  # year, month, day
+    prompts: Tuple[str, str, str, str] = None,  # base, topic, score, postfix
+    head_table: Dict = None,
+    unscored_papers: List[Paper] = None,
+):
+    return "".join(iter_daily_md(all_entries, arxiv_paper_dict, selected_paper_dict, now_date=now_date, prompts=prompts, head_table=head_table, unscored_papers=unscored_papers))
+
+
+def write_daily_md(path, *args, header: str = None, **kwargs):
+    # streams the report of `iter_daily_md` to `path`, with an optional header before it
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w") as f:
+        if header is not None:
+            f.write(header + "\n\n")
+        for part in iter_daily_md(*args, **kwargs):
+            f.write(part)
+    os.replace(temp_path, path)
 
 
 if __name__ == "__main__":
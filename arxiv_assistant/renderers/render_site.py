@@ -0,0 +1,244 @@
+"""
+A multi-page Markdown site over the daily outputs in `output_path`/json, written to `site_path` (default `output_path`/site):
+- `<month>/<date>.md`: the papers selected on each day,
+- `<month>/index.md`: the days of a month with their top papers,
+- `categories/<category>.md`: the papers of each arXiv category, newest first,
+- `index.md`: the months and categories, and `latest.md`: the most recent day.
+
+Builds are incremental: the content hash of each day's JSON is kept in `site_path`/.manifest.json with a short summary of its papers,
+so only new or changed days are parsed and re-rendered, and index pages are rebuilt from the summaries without reading old days.
+Pages are streamed to disk paper by paper, so a build never holds more than one day's papers in memory.
+
+Usage:
+    python -m arxiv_assistant.renderers.render_site [--force]
+"""
+import glob
+import hashlib
+import json
+import os
+import re
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+from arxiv_assistant.renderers.render_daily import render_paper_content, render_title_and_author
+from arxiv_assistant.utils.io import create_dir
+
+# bump to re-render every page after changing the page layout
+SITE_VERSION = 1
+OUTPUT_FILE_PATTERN = re.compile(r"(\d{4}-\d{2})-(\d{2})-output\.json$")
+MANIFEST_NAME = ".manifest.json"
+TOP_PAPERS_PER_DAY = 3
+
+
+def hash_file(path) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(2 ** 16), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def write_page(path, parts: Iterable[str]):
+    # streams `parts` to `path` atomically
+    create_dir(os.path.dirname(path))
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        for part in parts:
+            f.write(part)
+    os.replace(temp_path, path)
+
+
+def get_category_file_name(category) -> str:
+    return re.sub(r"[^\w.-]+", "_", category) + ".md"
+
+
+def iter_day_page(date_string, selected_paper_dict: Dict[str, Dict], in_month_dir=True) -> Iterator[str]:
+    # `in_month_dir` is False for `latest.md`, which is at the root of the site
+    month_string = date_string[:7]
+    yield f"# Personalized Daily ArXiv Papers {date_string}\n\n"
+    if in_month_dir:
+        yield f"[All months](../index.md) | [{month_string}](index.md)\n\n"
+    else:
+        yield f"[All months](index.md) | [{month_string}]({month_string}/index.md)\n\n"
+    yield f"Total relevant papers: {len(selected_paper_dict)}\n\n"
+    yield "**Table of contents with paper titles:**\n\n"
+    for i, paper in enumerate(selected_paper_dict.values()):
+        yield render_title_and_author(paper, i + 1) + "\n\n"
+    for i, paper in enumerate(selected_paper_dict.values()):
+        yield "---\n\n" + render_paper_content(paper, i + 1) + "\n\n"
+
+
+def summarize_day(selected_paper_dict: Dict[str, Dict]) -> List[List]:
+    # [arxiv id, title, score, categories] of each paper, enough to render the index pages
+    return [
+        [paper["arxiv_id"], paper["title"], paper.get("SCORE"), paper.get("CATEGORIES", [])]
+        for paper in selected_paper_dict.values()
+    ]
+
+
+def render_paper_link(summary, page_path) -> str:
+    # a list item linking to the paper on arXiv and to its section of the day page
+    arxiv_id, title, score, _ = summary
+    score_string = f" ({score})" if score is not None else ""
+    return f"- [{title}](https://arxiv.org/abs/{arxiv_id}){score_string} [[details]({page_path})]\n"
+
+
+def iter_month_page(month_string, days: List[Tuple[str, Dict]]) -> Iterator[str]:
+    yield f"# Personalized Daily ArXiv Papers {month_string}\n\n"
+    yield "[All months](../index.md)\n\n"
+    for date_string, day in days:
+        yield f"## [{date_string}]({date_string}.md) ({len(day['papers'])} papers)\n\n"
+        for summary in day["papers"][:TOP_PAPERS_PER_DAY]:
+            yield render_paper_link(summary, f"{date_string}.md")
+        yield "\n"
+
+
+def iter_category_page(category, days: List[Tuple[str, Dict]]) -> Iterator[str]:
+    yield f"# {category}\n\n"
+    yield "[All months](../index.md)\n\n"
+    for date_string, day in days:
+        summaries = [summary for summary in day["papers"] if category in summary[3]]
+        if len(summaries) == 0:
+            continue
+        yield f"## [{date_string}](../{date_string[:7]}/{date_string}.md)\n\n"
+        for summary in summaries:
+            yield render_paper_link(summary, f"../{date_string[:7]}/{date_string}.md")
+        yield "\n"
+
+
+def iter_index_page(days: List[Tuple[str, Dict]], categories: List[str]) -> Iterator[str]:
+    yield "# Personalized Daily ArXiv Papers\n\n"
+    if len(days) > 0:
+        yield f"Latest: [{days[0][0]}](latest.md)\n\n"
+    yield "## Months\n\n"
+    month_counts = {}
+    for date_string, day in days:
+        day_cnt, paper_cnt = month_counts.get(date_string[:7], (0, 0))
+        month_counts[date_string[:7]] = (day_cnt + 1, paper_cnt + len(day["papers"]))
+    for month_string, (day_cnt, paper_cnt) in month_counts.items():
+        yield f"- [{month_string}]({month_string}/index.md) ({day_cnt} days, {paper_cnt} papers)\n"
+    if len(categories) > 0:
+        yield "\n## Categories\n\n"
+        for category in categories:
+            yield f"- [{category}](categories/{get_category_file_name(category)})\n"
+
+
+def find_day_files(output_path) -> Dict[str, str]:
+    # date -> path of each daily output.json
+    day_files = {}
+    for path in glob.glob(os.path.join(output_path, "json", "*", "*-output.json")):
+        match = OUTPUT_FILE_PATTERN.search(path)
+        if match:
+            day_files[f"{match.group(1)}-{match.group(2)}"] = path
+    return day_files
+
+
+def load_manifest(site_path) -> Dict:
+    path = os.path.join(site_path, MANIFEST_NAME)
+    if os.path.exists(path):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") == SITE_VERSION:
+                return manifest
+        except Exception as e:
+            print(f"Failed to load the site manifest, rebuilding the site ({e})")
+    return {"version": SITE_VERSION, "days": {}}
+
+
+def build_site(output_path, site_path=None, force=False) -> Dict[str, int]:
+    """
+    Builds or updates the site of the daily outputs under `output_path`.
+    :return: the numbers of rendered day pages, index pages and removed days
+    """
+    if site_path is None:
+        site_path = os.path.join(output_path, "site")
+    manifest = {"version": SITE_VERSION, "days": {}} if force else load_manifest(site_path)
+    days = manifest["days"]  # date -> {"hash", "size", "mtime", "papers"}
+
+    # find new and changed days, hashing only the files whose size or modification time changed
+    day_files = find_day_files(output_path)
+    changed_dates = set()
+    for date_string, path in day_files.items():
+        stat = os.stat(path)
+        day = days.get(date_string)
+        if day is not None and day["size"] == stat.st_size and day["mtime"] == stat.st_mtime:
+            continue
+        content_hash = hash_file(path)
+        if day is not None and day["hash"] == content_hash and os.path.exists(os.path.join(site_path, date_string[:7], f"{date_string}.md")):
+            day.update(size=stat.st_size, mtime=stat.st_mtime)
+            continue
+
+        with open(path, "r", encoding="utf-8") as f:
+            selected_paper_dict = json.load(f)
+        write_page(os.path.join(site_path, date_string[:7], f"{date_string}.md"), iter_day_page(date_string, selected_paper_dict))
+        days[date_string] = {"hash": content_hash, "size": stat.st_size, "mtime": stat.st_mtime, "papers": summarize_day(selected_paper_dict)}
+        changed_dates.add(date_string)
+
+    # days whose outputs were deleted
+    removed_dates = set(days) - set(day_files)
+    for date_string in removed_dates:
+        page_path = os.path.join(site_path, date_string[:7], f"{date_string}.md")
+        if os.path.exists(page_path):
+            os.remove(page_path)
+        del days[date_string]
+    changed_dates |= removed_dates
+
+    # rebuild the index pages touched by the changed days
+    sorted_days = sorted(days.items(), reverse=True)  # newest first
+    index_cnt = 0
+    if len(changed_dates) > 0 or force:
+        changed_months = {date_string[:7] for date_string in changed_dates} if not force else {date_string[:7] for date_string in days}
+        for month_string in changed_months:
+            month_days = [(date_string, day) for date_string, day in sorted_days if date_string.startswith(month_string)]
+            month_path = os.path.join(site_path, month_string, "index.md")
+            if len(month_days) > 0:
+                write_page(month_path, iter_month_page(month_string, month_days))
+                index_cnt += 1
+            elif os.path.exists(month_path):
+                os.remove(month_path)
+
+        categories = sorted({category for _, day in sorted_days for summary in day["papers"] for category in summary[3]})
+        changed_categories = set(categories) if force else {
+            category
+            for date_string in changed_dates if date_string in days
+            for summary in days[date_string]["papers"] for category in summary[3]
+        }
+        if len(removed_dates) > 0:
+            # the removed days may have been the last ones of some categories
+            changed_categories = set(categories)
+            for path in glob.glob(os.path.join(site_path, "categories", "*.md")):
+                if os.path.basename(path) not in {get_category_file_name(category) for category in categories}:
+                    os.remove(path)
+        for category in changed_categories:
+            write_page(os.path.join(site_path, "categories", get_category_file_name(category)), iter_category_page(category, sorted_days))
+            index_cnt += 1
+
+        write_page(os.path.join(site_path, "index.md"), iter_index_page(sorted_days, categories))
+        index_cnt += 1
+        if len(sorted_days) > 0:
+            latest_date, _ = sorted_days[0]
+            with open(day_files[latest_date], "r", encoding="utf-8") as f:
+                latest_paper_dict = json.load(f)
+            write_page(os.path.join(site_path, "latest.md"), iter_day_page(latest_date, latest_paper_dict, in_month_dir=False))
+            index_cnt += 1
+
+    write_page(os.path.join(site_path, MANIFEST_NAME), [json.dumps(manifest, ensure_ascii=False)])
+    stats = {"days": len(days), "rendered_days": len(changed_dates - removed_dates), "rendered_indexes": index_cnt, "removed_days": len(removed_dates)}
+    print(f"Built site at {site_path}: {stats}")
+    return stats
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    from arxiv_assistant.environment import get_context
+
+    parser = argparse.ArgumentParser(description="Build the multi-page Markdown site of the daily outputs.")
+    parser.add_argument("--force", action="store_true", help="re-render every page")
+    args = parser.parse_args()
+
+    config = get_context().config
+    start_time = time.perf_counter()
+    build_site(config["OUTPUT"]["output_path"], force=args.force)
+    print(f"Done in {time.perf_counter() - start_time:.2f}s")
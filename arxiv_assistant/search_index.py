@@ -0,0 +1,270 @@
+"""
+A SQLite full-text index over the historical outputs, answering "did we score this paper/author/topic before?" without parsing every file.
+
+The index holds one row per (paper, date, profile) from:
+- `output_path`/json/<month>/<date>-output.json (selected papers) of the default profile and of each profile under `output_path`/profiles/,
+- `output_path`/debug/<month>/<date>/filtered_paper_dict.jsonl.gz (scored but filtered papers, if debug dumps are on).
+Titles, abstracts, authors and comments are searchable through FTS5, and the scores are plain columns.
+Files are indexed incrementally: a file is only (re)read if its size or modification time changed,
+and the pipeline updates the index after each run (`update_search_index` in config.ini).
+
+Usage:
+    python -m scripts.search "dark matter halos" --min-score 15
+    python -m scripts.search --author "Kristin McQuinn"
+    python -m scripts.search --id 2502.10001
+"""
+import glob
+import gzip
+import json
+import os
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from arxiv_assistant.utils.io import create_dir
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS papers (
+    id INTEGER PRIMARY KEY,
+    arxiv_id TEXT NOT NULL,
+    date TEXT NOT NULL,
+    profile TEXT NOT NULL,
+    selected INTEGER NOT NULL,
+    score REAL,
+    relevance REAL,
+    novelty REAL,
+    title TEXT,
+    abstract TEXT,
+    authors TEXT,
+    comment TEXT,
+    source TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS papers_arxiv_id ON papers (arxiv_id);
+CREATE INDEX IF NOT EXISTS papers_date ON papers (date);
+CREATE INDEX IF NOT EXISTS papers_source ON papers (source);
+CREATE VIRTUAL TABLE IF NOT EXISTS papers_fts USING fts5(
+    title, abstract, authors, comment,
+    content='papers', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS papers_ai AFTER INSERT ON papers BEGIN
+    INSERT INTO papers_fts (rowid, title, abstract, authors, comment) VALUES (new.id, new.title, new.abstract, new.authors, new.comment);
+END;
+CREATE TRIGGER IF NOT EXISTS papers_ad AFTER DELETE ON papers BEGIN
+    INSERT INTO papers_fts (papers_fts, rowid, title, abstract, authors, comment) VALUES ('delete', old.id, old.title, old.abstract, old.authors, old.comment);
+END;
+"""
+
+OUTPUT_FILE_PATTERN = re.compile(r"(\d{4}-\d{2}-\d{2})-output\.json$")
+FILTERED_FILE_PATTERN = re.compile(r"(\d{4}-\d{2}-\d{2})[/\\]filtered_paper_dict\.(json|jsonl\.gz|jsonl)$")
+AUTHOR_SEPARATOR = "; "
+RESULT_COLUMNS = ("arxiv_id", "date", "profile", "selected", "score", "relevance", "novelty", "title", "authors", "comment")
+
+
+def quote_phrase(string) -> str:
+    # an FTS5 string literal, so that user input is searched as a phrase
+    return '"' + string.replace('"', '""') + '"'
+
+
+def read_records(path) -> Iterable[Dict]:
+    # the paper records of an output.json (a dict keyed by arxiv id) or a debug dump (one record per line)
+    if path.endswith(".jsonl.gz") or path.endswith(".jsonl"):
+        with (gzip.open(path, "rt", encoding="utf-8") if path.endswith(".gz") else open(path, "r", encoding="utf-8")) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        yield from (data.values() if isinstance(data, dict) else data)
+
+
+def get_float(record, key) -> Optional[float]:
+    try:
+        return float(record[key])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def find_output_files(output_path) -> List[Tuple[str, str, str, bool]]:
+    # (path, date, profile, selected) of every indexable file under `output_path`
+    from arxiv_assistant.profiles import DEFAULT_PROFILE_NAME
+
+    roots = [(output_path, DEFAULT_PROFILE_NAME)]
+    roots += [(path, os.path.basename(path)) for path in sorted(glob.glob(os.path.join(output_path, "profiles", "*"))) if os.path.isdir(path)]
+    files = []
+    for root, profile in roots:
+        for path in sorted(glob.glob(os.path.join(root, "json", "*", "*-output.json"))):
+            match = OUTPUT_FILE_PATTERN.search(path)
+            if match:
+                files.append((path, match.group(1), profile, True))
+        for path in sorted(glob.glob(os.path.join(root, "debug", "*", "*", "filtered_paper_dict.*"))):
+            match = FILTERED_FILE_PATTERN.search(path)
+            if match:
+                files.append((path, match.group(1), profile, False))
+    return files
+
+
+class SearchIndex:
+    """
+    The index database, safe to share across threads. Concurrent processes are serialized by SQLite (WAL mode).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if path != ":memory:":
+            create_dir(os.path.dirname(path) or ".")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def index_file(self, path, date, profile, selected: bool, force=False) -> int:
+        # (re)indexes one file if it changed since it was indexed, returns the number of indexed papers
+        stat = os.stat(path)
+        with self._lock:
+            row = self._conn.execute("SELECT size, mtime FROM files WHERE path = ?", (path,)).fetchone()
+            if not force and row is not None and row["size"] == stat.st_size and row["mtime"] == stat.st_mtime:
+                return 0
+            rows = []
+            for record in read_records(path):
+                arxiv_id = record.get("arxiv_id") or record.get("ARXIVID")
+                if arxiv_id is None:
+                    continue
+                rows.append((
+                    arxiv_id, date, profile, int(selected),
+                    get_float(record, "SCORE"), get_float(record, "RELEVANCE"), get_float(record, "NOVELTY"),
+                    record.get("title"), record.get("abstract"), AUTHOR_SEPARATOR.join(record.get("authors") or []), record.get("COMMENT"),
+                    path,
+                ))
+            with self._conn:  # one transaction per file
+                self._conn.execute("DELETE FROM papers WHERE source = ?", (path,))
+                self._conn.executemany(
+                    "INSERT INTO papers (arxiv_id, date, profile, selected, score, relevance, novelty, title, abstract, authors, comment, source) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                self._conn.execute("INSERT OR REPLACE INTO files (path, size, mtime) VALUES (?, ?, ?)", (path, stat.st_size, stat.st_mtime))
+            return len(rows)
+
+    def update(self, output_path, force=False) -> Tuple[int, int]:
+        # indexes the new and changed files under `output_path`, returns the numbers of indexed files and papers
+        file_cnt, paper_cnt = 0, 0
+        for path, date, profile, selected in find_output_files(output_path):
+            try:
+                indexed_cnt = self.index_file(path, date, profile, selected, force=force)
+            except (OSError, ValueError) as e:
+                print(f"Failed to index {path}: {e}")
+                continue
+            if indexed_cnt > 0:
+                file_cnt += 1
+                paper_cnt += indexed_cnt
+        return file_cnt, paper_cnt
+
+    def rebuild(self, output_path) -> Tuple[int, int]:
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM papers")
+                self._conn.execute("DELETE FROM files")
+                self._conn.execute("INSERT INTO papers_fts (papers_fts) VALUES ('rebuild')")
+        return self.update(output_path, force=True)
+
+    def search(
+        self,
+        query: str = None,
+        author: str = None,
+        arxiv_id: str = None,
+        profile: str = None,
+        begin_date: str = None,
+        end_date: str = None,
+        min_score: float = None,
+        selected_only: bool = False,
+        limit: int = 20,
+    ) -> List[Dict]:
+        """
+        Search the indexed papers, ranked by relevance to `query` and `author` if given, or newest first otherwise.
+        :param query: an FTS5 query over titles, abstracts, authors and comments (e.g., `dwarf galaxies`, `"dark matter" NOT halo`)
+        :param author: an author name, matched as a phrase in the authors only
+        :param begin_date: the first date (YYYY-MM-DD), inclusive
+        :param end_date: the last date (YYYY-MM-DD), inclusive
+        :return: a list of dicts with the `RESULT_COLUMNS` (authors as a list)
+        """
+        match_parts = []
+        if query:
+            match_parts.append(f"({query})")
+        if author:
+            match_parts.append(f"authors : {quote_phrase(author)}")
+        conditions, params = [], []
+        if match_parts:
+            conditions.append("papers_fts MATCH ?")
+            params.append(" AND ".join(match_parts))
+        for column, operator, value in (
+            ("arxiv_id", "=", arxiv_id),
+            ("profile", "=", profile),
+            ("date", ">=", begin_date),
+            ("date", "<=", end_date),
+            ("score", ">=", min_score),
+        ):
+            if value is not None:
+                conditions.append(f"papers.{column} {operator} ?")
+                params.append(value)
+        if selected_only:
+            conditions.append("papers.selected = 1")
+
+        columns = ", ".join(f"papers.{column}" for column in RESULT_COLUMNS)
+        if match_parts:
+            sql = f"SELECT {columns} FROM papers_fts JOIN papers ON papers.id = papers_fts.rowid WHERE {' AND '.join(conditions)} ORDER BY bm25(papers_fts), papers.date DESC LIMIT ?"
+        else:
+            sql = f"SELECT {columns} FROM papers{' WHERE ' + ' AND '.join(conditions) if conditions else ''} ORDER BY papers.date DESC, papers.score DESC LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        results = []
+        for row in rows:
+            result = dict(row)
+            result["selected"] = bool(result["selected"])
+            result["authors"] = result["authors"].split(AUTHOR_SEPARATOR) if result["authors"] else []
+            results.append(result)
+        return results
+
+    def count(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+
+
+_search_indexes = {}
+_search_indexes_lock = threading.Lock()
+
+
+def get_search_index_path(config) -> str:
+    cache_path = config["OUTPUT"].get("cache_path", os.path.join(config["OUTPUT"]["output_path"], "cache"))
+    return config["OUTPUT"].get("search_index_path", os.path.join(cache_path, "search_index.sqlite"))
+
+
+def get_search_index(config) -> SearchIndex:
+    # one open index per path, shared by all runs of this process
+    path = get_search_index_path(config)
+    with _search_indexes_lock:
+        if path not in _search_indexes:
+            _search_indexes[path] = SearchIndex(path)
+        return _search_indexes[path]
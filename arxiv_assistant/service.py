@@ -0,0 +1,245 @@
+"""
+A long-running service that keeps clients and caches warm and runs the pipeline as soon as a new day is announced.
+
+Around the daily announcement time (see [SERVICE] in config.ini), the service polls the RSS feed of the first `arxiv_category`
+with conditional requests, so an unchanged feed costs a `304 Not Modified` only.
+Once the feed shows a new announcement date, the pipeline runs with the warm HTTP session, OpenAI and Slack clients and caches.
+A failed run is retried with an exponential backoff (`retry_delay_seconds`, up to `max_retry_delay_seconds`) until the date is finished.
+
+A local control endpoint is served on `host:port`:
+    GET  /status  -> the current state, last poll and last run as JSON
+    POST /run     -> trigger a run now (ignored if a run is in progress), add `?force=1` to rerun an already finished date
+"""
+import json
+import threading
+import time
+import traceback
+from datetime import UTC, datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import requests
+
+from arxiv_assistant.environment import get_context, parse_feed_time
+from arxiv_assistant.pipeline import run_pipeline
+from arxiv_assistant.profiles import get_default_profile, has_outputs
+from arxiv_assistant.utils.cache import load_cache
+
+
+class ArxivService:
+    def __init__(self, config, profiles=None):
+        self.config = config
+        self.profiles = profiles
+        self.service_config = config["SERVICE"] if config.has_section("SERVICE") else {}
+
+        # warm clients and caches, kept for the whole lifetime of the service
+        self.session = requests.Session()
+        self.openai_client = None
+        self.slack_client = None
+        self.author_cache = load_cache(config, "authors")
+        self.llm_cache = load_cache(config, "llm")
+
+        self.area = config["FILTERING"]["arxiv_category"].split(",")[0].strip()
+        self.feed_validators = {}  # ETag and Last-Modified of the last polled feed
+        self.last_feed_date = None
+        self.last_run_date = None
+        self.failed_runs = 0  # consecutive failed runs of `last_feed_date`
+        self.retry_at = None  # the UNIX time of the next retry after a failed run
+
+        self.status = {"state": "idle", "started_at": datetime.now(UTC).isoformat(), "runs": 0, "last_poll": None, "last_run": None, "last_error": None}
+        self.status_lock = threading.Lock()
+        self.run_lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def get_setting(self, key, default):
+        return type(default)(self.service_config.get(key, default))
+
+    def update_status(self, **kwargs):
+        with self.status_lock:
+            self.status.update(kwargs)
+
+    def get_status(self):
+        with self.status_lock:
+            return dict(self.status)
+
+    def warm_up(self):
+        # create the clients once, their connections are reused by every run
+        if self.config["SELECTION"].getboolean("run_openai"):
+            from arxiv_assistant.filters.filter_gpt import create_openai_client
+            self.openai_client = create_openai_client()
+        if self.config["OUTPUT"].getboolean("push_to_slack") and get_context().slack_key is not None:
+            from arxiv_assistant.push_to_slack import create_slack_client
+            self.slack_client = create_slack_client()
+
+    def poll_feed(self):
+        # returns the announcement date of the feed, or None if the feed is not modified since the last poll
+        import feedparser
+
+        url = f"{get_context().arxiv_base_url}/rss/{self.area}"
+        response = self.session.get(url, headers=self.feed_validators, timeout=10)
+        self.update_status(last_poll=datetime.now(UTC).isoformat())
+        if response.status_code == 304:
+            return None
+        response.raise_for_status()
+
+        self.feed_validators = {}
+        if "ETag" in response.headers:
+            self.feed_validators["If-None-Match"] = response.headers["ETag"]
+        if "Last-Modified" in response.headers:
+            self.feed_validators["If-Modified-Since"] = response.headers["Last-Modified"]
+
+        feed = feedparser.parse(response.text)
+        if len(feed.entries) == 0:
+            return None
+        feed_time = parse_feed_time(feed)
+        return feed_time.year, feed_time.month, feed_time.day
+
+    def is_finished(self, now_date):
+        # a date is finished if the outputs of all served profiles exist, e.g. written by a previous process
+        return all(has_outputs(profile, now_date) for profile in self.profiles or [get_default_profile(self.config)])
+
+    def run_once(self, force=False):
+        # runs the pipeline for the currently announced date, returns False if another run is in progress
+        if not self.run_lock.acquire(blocking=False):
+            return False
+        try:
+            self.update_status(state="running")
+            started_at = time.perf_counter()
+            context = get_context()
+            context.reset_now_time()  # resolve the date from this run's feeds
+            if self.last_feed_date is not None and self.last_feed_date == self.last_run_date and not force:
+                print(f"Date {self.last_run_date} is already finished, skipping")
+                return True
+
+            results = run_pipeline(
+                self.config,
+                source="rss",
+                profiles=self.profiles,
+                author_cache=self.author_cache,
+                llm_cache=self.llm_cache,
+                session=self.session,
+                openai_client=self.openai_client,
+                slack_client=self.slack_client,
+            )
+            self.author_cache.save()
+            self.llm_cache.save()
+
+            self.last_run_date = context.now_date
+            self.failed_runs = 0
+            self.retry_at = None
+            self.update_status(
+                runs=self.status["runs"] + 1,
+                last_error=None,
+                last_run={
+                    "date": "-".join(f"{x:02d}" for x in self.last_run_date),
+                    "finished_at": datetime.now(UTC).isoformat(),
+                    "seconds": round(time.perf_counter() - started_at, 2),
+                    "selected": None if results is None else {name: len(v) for name, v in results.items()},
+                },
+            )
+            return True
+        except Exception as e:
+            traceback.print_exc()
+            # retried by the polling loop with an exponential backoff
+            self.failed_runs += 1
+            delay = min(self.get_setting("retry_delay_seconds", 300) * 2 ** (self.failed_runs - 1), self.get_setting("max_retry_delay_seconds", 3600))
+            self.retry_at = time.time() + delay
+            print(f"Run failed {self.failed_runs} times in a row, retrying in {delay:.0f}s")
+            self.update_status(last_error=f"{type(e).__name__}: {e}", retry_at=datetime.fromtimestamp(self.retry_at, UTC).isoformat())
+            return True
+        finally:
+            self.update_status(state="idle")
+            self.run_lock.release()
+
+    def trigger(self, force=False):
+        # runs in the background so that the control endpoint responds immediately
+        if self.run_lock.locked():
+            return False
+        threading.Thread(target=self.run_once, kwargs={"force": force}, daemon=True).start()
+        return True
+
+    def in_announcement_window(self, now_time):
+        # arXiv announces once a day on weekdays, poll frequently only around the announcement time (UTC)
+        hour, minute = [int(x) for x in self.get_setting("announce_time_utc", "00:00").split(":")]
+        announce_time = now_time.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        before = timedelta(minutes=self.get_setting("window_minutes_before", 30))
+        after = timedelta(minutes=self.get_setting("window_minutes_after", 180))
+        for day_offset in (-1, 0, 1):
+            this_announce_time = announce_time + timedelta(days=day_offset)
+            if this_announce_time - before <= now_time <= this_announce_time + after:
+                return True
+        return False
+
+    def loop(self):
+        poll_interval = self.get_setting("poll_interval_seconds", 60)
+        idle_poll_interval = self.get_setting("idle_poll_interval_seconds", 1800)
+        while not self.stop_event.is_set():
+            try:
+                feed_date = self.poll_feed()
+                if feed_date is not None and feed_date != self.last_feed_date:
+                    print(f"New announcement detected in {self.area}: {feed_date}")
+                    self.last_feed_date = feed_date
+                    self.failed_runs = 0
+                    self.retry_at = None
+                    self.update_status(last_feed_date="-".join(f"{x:02d}" for x in feed_date))
+                # the announced date is run until it succeeds, even if the feed is unchanged (304) after a failed run
+                pending = self.last_feed_date is not None and self.last_feed_date != self.last_run_date and not self.is_finished(self.last_feed_date)
+                if pending and (self.retry_at is None or time.time() >= self.retry_at):
+                    self.run_once()
+            except Exception as e:
+                print(f"Failed to poll the feed ({e})")
+                self.update_status(last_error=f"{type(e).__name__}: {e}")
+
+            interval = poll_interval if self.in_announcement_window(datetime.now(UTC)) else idle_poll_interval
+            self.stop_event.wait(interval)
+
+    def serve_control(self):
+        service = self
+
+        class ControlHandler(BaseHTTPRequestHandler):
+            def send_json(self, code, body):
+                data = json.dumps(body).encode("utf-8")
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if urlparse(self.path).path == "/status":
+                    self.send_json(200, service.get_status())
+                else:
+                    self.send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                if url.path == "/run":
+                    force = parse_qs(url.query).get("force", ["0"])[0] in ("1", "true")
+                    started = service.trigger(force=force)
+                    self.send_json(202 if started else 409, {"started": started})
+                else:
+                    self.send_json(404, {"error": "not found"})
+
+            def log_message(self, format, *args):
+                pass
+
+        host = self.get_setting("host", "127.0.0.1")
+        port = self.get_setting("port", 8765)
+        server = ThreadingHTTPServer((host, port), ControlHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        print(f"Control endpoint listening on http://{host}:{port}")
+        return server
+
+    def serve(self):
+        self.warm_up()
+        server = self.serve_control()
+        try:
+            self.loop()
+        except KeyboardInterrupt:
+            print("Stopping the service")
+        finally:
+            self.stop_event.set()
+            server.shutdown()
+            self.author_cache.save()
+            self.llm_cache.save()
+            self.session.close()
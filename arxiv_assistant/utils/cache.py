@@ -0,0 +1,77 @@
+import json
+import os
+import threading
+
+from arxiv_assistant.utils.io import create_dir
+
+
+class JsonCache:
+    """
+    A thread-safe key-value cache that can be shared by concurrent runs (e.g., different dates in a backfill).
+    If `path` is given, the cache is loaded from and saved to a JSON file, so that it survives restarts.
+    Otherwise, it only lives in memory and can hold arbitrary python objects.
+    """
+
+    def __init__(self, path=None, autosave_every=100):
+        self.path = path
+        self.autosave_every = autosave_every
+        self._data = {}
+        self._lock = threading.RLock()
+        self._unsaved_cnt = 0
+
+        if path is not None and os.path.exists(path):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self._data = json.load(f)
+            except Exception as e:
+                print(f"Failed to load cache from {path}, starting from an empty cache ({e})")
+                self._data = {}
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            return self._data.get(key, default)
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._unsaved_cnt += 1
+            if self.path is not None and self.autosave_every > 0 and self._unsaved_cnt >= self.autosave_every:
+                self.save()
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._data:
+                del self._data[key]
+                self._unsaved_cnt += 1
+
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
+
+    def save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            create_dir(os.path.dirname(self.path))
+            # write to a temp file first so that an interrupted run never leaves a broken cache behind
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self._data, f)
+            os.replace(temp_path, self.path)
+            self._unsaved_cnt = 0
+
+
+def load_cache(config, name, persistent=True) -> JsonCache:
+    # caches are stored under `cache_path` in config.ini, one JSON file per cache
+    if not persistent:
+        return JsonCache()
+    cache_path = config["OUTPUT"].get("cache_path", os.path.join(config["OUTPUT"]["output_path"], "cache"))
+    return JsonCache(os.path.join(cache_path, f"{name}.json"))
@@ -0,0 +1,201 @@
+"""
+HTTP record/replay cassettes for reproducing a run.
+
+A cassette is a local proxy that the arXiv, Semantic Scholar, OpenAI and Slack clients are pointed at through their base URLs
+(`ARXIV_BASE_URL`, `S2_BASE_URL`, `OPENAI_BASE_URL`, `SLACK_BASE_URL`):
+- In "record" mode, every request is forwarded to the real service and the exchange is kept, then saved as a gzipped JSONL file on close.
+- In "replay" mode, requests are answered from the saved exchanges and nothing goes to the network.
+  Identical requests (e.g., retries) are answered in the recorded order, and an unknown request gets a 599 error.
+
+Exchanges are matched by service, method, path with query and a hash of the request body, headers are not stored,
+so cassettes never contain API keys. Slack messages are only matched by path and order, as their bodies contain the channel id.
+
+Usage:
+    python main.py --record out/cassettes/2025-02-18.jsonl.gz
+    python main.py --replay out/cassettes/2025-02-18.jsonl.gz
+"""
+import base64
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict
+
+from arxiv_assistant.environment import get_context
+from arxiv_assistant.utils.io import create_dir
+
+# response headers kept in the cassette, the others are regenerated
+KEPT_RESPONSE_HEADERS = ("Content-Type", "ETag", "Last-Modified", "Retry-After")
+# request headers not forwarded upstream, they are set again by the forwarding session
+DROPPED_REQUEST_HEADERS = ("host", "content-length", "connection", "accept-encoding")
+# services whose requests are told apart by their bodies
+BODY_MATCHED_SERVICES = ("arxiv", "s2", "openai")
+# dummy keys used on replay, so that the steps requiring a key are not skipped
+REPLAY_KEYS = {"OPENAI_API_KEY": "replay", "S2_KEY": "replay", "SLACK_KEY": "replay", "SLACK_CHANNEL_ID": "replay"}
+
+
+def get_exchange_key(service, method, path, body: bytes) -> str:
+    if service not in BODY_MATCHED_SERVICES:
+        return f"{service} {method} {path}"
+    return f"{service} {method} {path} {hashlib.sha256(body).hexdigest()[:16]}"
+
+
+def encode_body(body: bytes) -> Dict:
+    try:
+        return {"text": body.decode("utf-8")}
+    except UnicodeDecodeError:
+        return {"base64": base64.b64encode(body).decode("ascii")}
+
+
+def decode_body(encoded: Dict) -> bytes:
+    if "text" in encoded:
+        return encoded["text"].encode("utf-8")
+    return base64.b64decode(encoded["base64"])
+
+
+class Cassette:
+    def __init__(self, path, mode="replay", host="127.0.0.1", port=0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Invalid cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.exchanges = []  # recorded in order
+        self.replay_queues = defaultdict(deque)  # exchange key -> exchanges not replayed yet
+        self.last_replayed = {}  # exchange key -> the last replayed exchange, repeated once its queue runs out
+        self.lock = threading.Lock()
+        self.upstreams = {}  # service -> real base url
+        self.session = None
+        self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        self.server.daemon_threads = True
+
+        if mode == "replay":
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    exchange = json.loads(line)
+                    self.replay_queues[exchange["key"]].append(exchange)
+            print(f"Loaded {sum(len(q) for q in self.replay_queues.values())} exchanges from {path}")
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        # points every client of this process at the proxy, must be called before the clients are created
+        context = get_context()
+        self.upstreams = {
+            "arxiv": context.arxiv_base_url,
+            "s2": context.s2_base_url,
+            "openai": (context.openai_base_url or "https://api.openai.com/v1").rstrip("/"),
+            "slack": context.slack_base_url.rstrip("/"),
+        }
+        os.environ["ARXIV_BASE_URL"] = f"{self.base_url}/arxiv"
+        os.environ["S2_BASE_URL"] = f"{self.base_url}/s2"
+        os.environ["OPENAI_BASE_URL"] = f"{self.base_url}/openai"
+        os.environ["SLACK_BASE_URL"] = f"{self.base_url}/slack/"
+        if self.mode == "record":
+            import requests
+            self.session = requests.Session()
+        else:
+            for key, value in REPLAY_KEYS.items():
+                os.environ.setdefault(key, value)
+
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        print(f"Cassette {self.mode} proxy listening on {self.base_url}")
+        return self
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+        if self.mode == "record":
+            self.session.close()
+            self.save()
+        else:
+            unused_cnt = sum(len(q) for q in self.replay_queues.values())
+            if unused_cnt > 0:
+                print(f"{unused_cnt} recorded exchanges were not replayed")
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
+
+    def save(self):
+        create_dir(os.path.dirname(self.path) or ".")
+        temp_path = f"{self.path}.tmp"
+        with self.lock:
+            exchanges = list(self.exchanges)
+        with gzip.open(temp_path, "wt", encoding="utf-8", compresslevel=9) as f:
+            for exchange in exchanges:
+                f.write(json.dumps(exchange, ensure_ascii=False) + "\n")
+        os.replace(temp_path, self.path)
+        print(f"Recorded {len(exchanges)} exchanges to {self.path} ({os.path.getsize(self.path) / 2 ** 10:.1f} KB)")
+
+    def record(self, service, method, path, headers, body: bytes):
+        response = self.session.request(method, self.upstreams[service] + path, headers=headers, data=body or None, timeout=60)
+        exchange = {
+            "key": get_exchange_key(service, method, path, body),
+            "status": response.status_code,
+            "headers": {key: response.headers[key] for key in KEPT_RESPONSE_HEADERS if key in response.headers},
+            "body": encode_body(response.content),
+        }
+        with self.lock:
+            self.exchanges.append(exchange)
+        return exchange
+
+    def replay(self, service, method, path, body: bytes):
+        key = get_exchange_key(service, method, path, body)
+        with self.lock:
+            if len(self.replay_queues[key]) > 0:
+                self.last_replayed[key] = self.replay_queues[key].popleft()
+            return self.last_replayed.get(key)
+
+    def make_handler(self):
+        cassette = self
+
+        class CassetteHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def handle_request(self, method):
+                service, _, path = self.path.lstrip("/").partition("/")
+                path = "/" + path
+                length = int(self.headers.get("Content-Length", 0))
+                body = self.rfile.read(length) if length > 0 else b""
+
+                if service not in ("arxiv", "s2", "openai", "slack"):
+                    exchange = None
+                elif cassette.mode == "record":
+                    headers = {key: value for key, value in self.headers.items() if key.lower() not in DROPPED_REQUEST_HEADERS}
+                    try:
+                        exchange = cassette.record(service, method, path, headers, body)
+                    except Exception as e:
+                        exchange = {"status": 502, "headers": {"Content-Type": "text/plain"}, "body": {"text": f"Failed to reach {service}: {e}"}}
+                else:
+                    exchange = cassette.replay(service, method, path, body)
+
+                if exchange is None:
+                    exchange = {"status": 599, "headers": {"Content-Type": "text/plain"}, "body": {"text": f"No recorded exchange for {method} {self.path}"}}
+                    print(f"Cassette miss: {method} {self.path}")
+                response_body = decode_body(exchange["body"])
+                self.send_response(exchange["status"])
+                for key, value in exchange["headers"].items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(response_body)))
+                self.end_headers()
+                self.wfile.write(response_body)
+
+            def do_GET(self):
+                self.handle_request("GET")
+
+            def do_POST(self):
+                self.handle_request("POST")
+
+            def log_message(self, format, *args):
+                pass
+
+        return CassetteHandler
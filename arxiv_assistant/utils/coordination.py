@@ -0,0 +1,202 @@
+"""
+Host-wide coordination of the processes sharing one OpenAI key and one Semantic Scholar key
+(e.g., the daily job, a backfill and ad-hoc profile runs on the same host).
+
+With `host_coordination = true`, all processes using the same `cache_path` share a small SQLite database
+(`cache_path`/coordination.sqlite, WAL mode) holding:
+- sliding windows of request and token budgets, so `limit_per_minute`, `tokens_per_minute`
+  and the Semantic Scholar rate hold for the host instead of for each process,
+- claims on in-flight work (an author lookup, or an LLM prompt and so the arXiv ids in it), so a process about to repeat
+  what another one is doing waits for its result instead. Claims expire, so a crashed process never blocks the others for long.
+Otherwise, the same database lives in memory and only coordinates the threads of one process.
+"""
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Any, Tuple
+
+from arxiv_assistant.utils.io import create_dir
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS budget (
+    bucket TEXT NOT NULL,
+    time REAL NOT NULL,
+    amount REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS budget_bucket_time ON budget (bucket, time);
+CREATE TABLE IF NOT EXISTS claims (
+    key TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    expires REAL NOT NULL
+);
+"""
+
+# how long a published result is kept for processes waiting on its claim
+RESULT_TTL = 600.0
+
+
+class HostCoordinator:
+    """
+    Budgets and in-flight claims shared through a SQLite database, safe to share across threads.
+    Budgets use wall-clock time, as it is the only clock shared by processes.
+    """
+
+    def __init__(self, path=":memory:"):
+        self.path = path
+        if path != ":memory:":
+            create_dir(os.path.dirname(path) or ".")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            if path != ":memory:":
+                self._conn.execute("PRAGMA journal_mode=WAL")
+                self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _transaction(self, fn):
+        # runs `fn` in a write transaction, serialized with the other threads and processes
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def get_owner(self) -> str:
+        return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+    # budgets
+
+    def acquire(self, bucket, limit, period=60.0, amount=1.0) -> float:
+        """
+        Blocks until `amount` fits in the budget of `bucket` (at most `limit` within any `period` seconds) and records it.
+        An amount larger than the whole budget is let through once the window is empty. A non-positive `limit` denotes no limit.
+        :return: the seconds spent waiting
+        """
+        if limit <= 0:
+            return 0.0
+        start_time = time.monotonic()
+        while True:
+            def try_acquire(conn):
+                now_time = time.time()
+                conn.execute("DELETE FROM budget WHERE bucket = ? AND time <= ?", (bucket, now_time - period))
+                used, oldest = conn.execute("SELECT TOTAL(amount), MIN(time) FROM budget WHERE bucket = ?", (bucket,)).fetchone()
+                if oldest is None or used + amount <= limit:
+                    conn.execute("INSERT INTO budget (bucket, time, amount) VALUES (?, ?, ?)", (bucket, now_time, amount))
+                    return 0.0
+                return oldest + period - now_time
+
+            wait_time = self._transaction(try_acquire)
+            if wait_time <= 0:
+                return time.monotonic() - start_time
+            time.sleep(min(max(wait_time, 0.01), 1.0))
+
+    def record(self, bucket, amount):
+        # records usage known after the fact (e.g., completion tokens), negative amounts correct an estimate
+        if amount == 0:
+            return
+        self._transaction(lambda conn: conn.execute("INSERT INTO budget (bucket, time, amount) VALUES (?, ?, ?)", (bucket, time.time(), amount)))
+
+    # in-flight claims
+
+    def claim(self, key, ttl=300.0) -> Tuple[bool, bool, Any]:
+        # tries to claim `key`, returns (claimed, has_result, result) where the result was published by another claim
+        def try_claim(conn):
+            now_time = time.time()
+            row = conn.execute("SELECT value FROM results WHERE key = ? AND expires > ?", (key, now_time)).fetchone()
+            if row is not None:
+                return False, True, json.loads(row[0])
+            row = conn.execute("SELECT expires FROM claims WHERE key = ?", (key,)).fetchone()
+            if row is not None and row[0] > now_time:
+                return False, False, None
+            conn.execute("INSERT OR REPLACE INTO claims (key, owner, expires) VALUES (?, ?, ?)", (key, self.get_owner(), now_time + ttl))
+            return True, False, None
+
+        return self._transaction(try_claim)
+
+    def acquire_work(self, key, ttl=300.0, poll_interval=0.1) -> Tuple[bool, Any]:
+        """
+        Blocks until this thread claims `key`, or another claim of it publishes a result.
+        :return: (True, None) if claimed, the caller then does the work and calls `finish_work`,
+            or (False, result) with the result of the other claim
+        """
+        while True:
+            claimed, has_result, result = self.claim(key, ttl=ttl)
+            if claimed:
+                return True, None
+            if has_result:
+                return False, result
+            time.sleep(poll_interval)
+
+    def finish_work(self, key, result: Any = None, publish=False):
+        # releases the claim on `key`, publishing its JSON-serializable `result` to the waiting claims if `publish`
+        def finish(conn):
+            now_time = time.time()
+            conn.execute("DELETE FROM claims WHERE key = ?", (key,))
+            conn.execute("DELETE FROM results WHERE expires <= ?", (now_time,))
+            if publish:
+                conn.execute("INSERT OR REPLACE INTO results (key, value, expires) VALUES (?, ?, ?)", (key, json.dumps(result), now_time + RESULT_TTL))
+
+        self._transaction(finish)
+
+    def discard(self, key):
+        # drops a published result that turned out to be unusable (e.g., an unparsable LLM output)
+        self._transaction(lambda conn: conn.execute("DELETE FROM results WHERE key = ?", (key,)))
+
+
+class SharedRateLimiter:
+    """
+    A `RateLimiter` counterpart whose calls are counted in a bucket of a `HostCoordinator`.
+    """
+
+    def __init__(self, coordinator: HostCoordinator, bucket, limit, period=60.0):
+        self.coordinator = coordinator
+        self.bucket = bucket
+        self.limit = limit
+        self.period = period
+
+    def acquire(self) -> float:
+        return self.coordinator.acquire(self.bucket, self.limit, period=self.period)
+
+
+_coordinator = None
+_coordinator_lock = threading.Lock()
+
+
+def get_coordination_path(config) -> str:
+    # the shared database, or ":memory:" if host coordination is off
+    if not config["OUTPUT"].getboolean("host_coordination", fallback=False):
+        return ":memory:"
+    cache_path = config["OUTPUT"].get("cache_path", os.path.join(config["OUTPUT"]["output_path"], "cache"))
+    return os.path.join(cache_path, "coordination.sqlite")
+
+
+def get_host_coordinator(config=None) -> HostCoordinator:
+    # one coordinator per process, configured by the first caller (or the run context)
+    global _coordinator
+    with _coordinator_lock:
+        if _coordinator is None:
+            if config is None:
+                from arxiv_assistant.environment import get_context
+                config = get_context().config
+            _coordinator = HostCoordinator(get_coordination_path(config))
+        return _coordinator
+
+
+def is_host_coordinated() -> bool:
+    return get_host_coordinator().path != ":memory:"
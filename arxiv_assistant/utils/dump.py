@@ -0,0 +1,230 @@
+"""
+Debug dumps written off the critical path.
+
+With `dump_debug_file = true`, the papers, authors, LLM batches and results of a run are dumped to `out/debug/<month>/<date>/`.
+Instead of indented JSON written in place, each dump is handed to a background writer thread and streamed as one JSON record per line,
+gzipped with `debug_compress_level` (e.g., `all_papers.jsonl.gz`, read with `zcat` or `gzip.open`; level 0 writes plain `.jsonl`).
+Records are serialized with `orjson` if it is installed, and with the standard `json` module otherwise.
+
+After each run, `out/debug` is pruned in the background: date dirs last written more than `debug_retention_days` ago are deleted,
+then the least recently written ones until the dir is below `debug_max_size_mb`, so debug mode can stay on in production.
+"""
+import dataclasses
+import gzip
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+from typing import Any, Callable, Iterable, Tuple
+
+DATE_DIR_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+
+_orjson = None
+_orjson_checked = False
+
+
+def get_orjson():
+    # the optional fast backend, None if not installed
+    global _orjson, _orjson_checked
+    if not _orjson_checked:
+        try:
+            import orjson
+            _orjson = orjson
+        except ImportError:
+            _orjson = None
+        _orjson_checked = True
+    return _orjson
+
+
+def to_jsonable(obj) -> Any:
+    # the fallback for types unknown to the JSON backends
+    if hasattr(obj, "to_dict"):  # Paper, PaperResult
+        return obj.to_dict()
+    if dataclasses.is_dataclass(obj):
+        return dataclasses.asdict(obj)
+    if isinstance(obj, (set, frozenset, tuple)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps_line(record) -> bytes:
+    # one record as a line of JSON
+    orjson = get_orjson()
+    if orjson is not None:
+        return orjson.dumps(record, default=to_jsonable, option=orjson.OPT_APPEND_NEWLINE | orjson.OPT_NON_STR_KEYS)
+    return (json.dumps(record, default=to_jsonable, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def get_dump_path(path, compress_level) -> str:
+    # "all_papers" -> "all_papers.jsonl.gz"
+    return f"{path}.jsonl.gz" if compress_level > 0 else f"{path}.jsonl"
+
+
+def open_for_dump(path, compress_level):
+    if compress_level > 0:
+        return gzip.open(path, "wb", compresslevel=compress_level)
+    return open(path, "wb")
+
+
+class DumpWriter:
+    """
+    A background thread writing the queued dumps in order.
+    Writes are atomic (to a temp file first), and a failing write is reported without failing the run.
+    The queue is bounded, so a slow disk slows down the run instead of holding every pending dump in memory.
+    """
+
+    def __init__(self, max_pending=64):
+        self._queue = queue.Queue(maxsize=max_pending)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="dump-writer", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            task, description = self._queue.get()
+            try:
+                task()
+            except Exception as e:
+                print(f"Failed to write {description}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def submit(self, task: Callable, description: str = "dump"):
+        self._ensure_started()
+        self._queue.put((task, description))
+
+    def write_records(self, path, records: Iterable, compress_level=1) -> str:
+        # dumps `records` (one JSON line each) to `path` + ".jsonl[.gz]", returns the final path
+        records = list(records)  # a snapshot, the records are serialized in the background
+        dump_path = get_dump_path(path, compress_level)
+
+        def write():
+            temp_path = f"{dump_path}.tmp"
+            with open_for_dump(temp_path, compress_level) as f:
+                for record in records:
+                    f.write(dumps_line(record))
+            os.replace(temp_path, dump_path)
+
+        self.submit(write, dump_path)
+        return dump_path
+
+    def write_text(self, path, text: str, compress_level=1) -> str:
+        # dumps raw text (e.g., a fetched feed) to `path` [+ ".gz"], returns the final path
+        dump_path = f"{path}.gz" if compress_level > 0 else path
+
+        def write():
+            temp_path = f"{dump_path}.tmp"
+            with open_for_dump(temp_path, compress_level) as f:
+                f.write(text.encode("utf-8"))
+            os.replace(temp_path, dump_path)
+
+        self.submit(write, dump_path)
+        return dump_path
+
+    def flush(self):
+        # blocks until every queued dump is written
+        if self._thread is not None:
+            self._queue.join()
+
+
+# shared by all runs of this process
+_dump_writer = DumpWriter()
+
+
+def get_dump_writer() -> DumpWriter:
+    return _dump_writer
+
+
+def get_dump_options(config) -> Tuple[bool, int]:
+    # whether to dump debug files, and the gzip level of the dumps
+    return config["OUTPUT"].getboolean("dump_debug_file"), config["OUTPUT"].getint("debug_compress_level", fallback=1)
+
+
+def get_dir_size(path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for file in files:
+            try:
+                total += os.path.getsize(os.path.join(root, file))
+            except OSError:
+                pass
+    return total
+
+
+def prune_debug_dir(debug_dir, retention_days=30, max_size_mb=0, keep_dates: Iterable[str] = (), now: float = None) -> int:
+    """
+    Deletes the date dirs (`debug_dir`/<month>/<date>/) last written more than `retention_days` ago,
+    then the least recently written ones until `debug_dir` is below `max_size_mb`. Non-positive values disable either rule.
+    Dirs are aged by when they were written rather than by their dates, so a backfill of old dates keeps its dumps.
+    Dates in `keep_dates` (e.g., the date of the current run) are never deleted.
+    :return: the number of deleted date dirs
+    """
+    if not os.path.isdir(debug_dir):
+        return 0
+    if now is None:
+        now = time.time()
+    keep_dates = set(keep_dates)
+
+    date_dirs = []  # (last written, date string, path), least recently written first
+    for month in os.listdir(debug_dir):
+        month_dir = os.path.join(debug_dir, month)
+        if not os.path.isdir(month_dir):
+            continue
+        for date_string in os.listdir(month_dir):
+            path = os.path.join(month_dir, date_string)
+            if DATE_DIR_PATTERN.match(date_string) and os.path.isdir(path):
+                date_dirs.append((os.path.getmtime(path), date_string, path))
+    date_dirs.sort()
+
+    deleted = set()
+    if retention_days > 0:
+        oldest_kept = now - retention_days * 86400
+        for written, date_string, path in date_dirs:
+            if written < oldest_kept and date_string not in keep_dates:
+                shutil.rmtree(path, ignore_errors=True)
+                deleted.add(path)
+
+    if max_size_mb > 0:
+        sizes = {path: get_dir_size(path) for _, _, path in date_dirs if path not in deleted}
+        total_size = sum(sizes.values())
+        for _, date_string, path in date_dirs:
+            if total_size <= max_size_mb * 2 ** 20:
+                break
+            if path in deleted or date_string in keep_dates:
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            deleted.add(path)
+            total_size -= sizes[path]
+
+    # drop emptied month dirs
+    for month in os.listdir(debug_dir):
+        month_dir = os.path.join(debug_dir, month)
+        if os.path.isdir(month_dir) and len(os.listdir(month_dir)) == 0:
+            os.rmdir(month_dir)
+
+    if len(deleted) > 0:
+        print(f"Pruned {len(deleted)} debug dirs from {debug_dir}")
+    return len(deleted)
+
+
+def submit_debug_pruning(config, output_paths: Iterable[str], keep_dates: Iterable[str] = ()):
+    # prunes `output_path`/debug of every given output path in the background
+    retention_days = config["OUTPUT"].getint("debug_retention_days", fallback=30)
+    max_size_mb = config["OUTPUT"].getint("debug_max_size_mb", fallback=0)
+    if retention_days <= 0 and max_size_mb <= 0:
+        return
+    keep_dates = tuple(keep_dates)
+    for output_path in dict.fromkeys(output_paths):
+        debug_dir = os.path.join(output_path, "debug")
+        get_dump_writer().submit(
+            lambda debug_dir=debug_dir: prune_debug_dir(debug_dir, retention_days, max_size_mb, keep_dates=keep_dates),
+            f"pruning of {debug_dir}",
+        )
@@ -64,5 +64,25 @@ def copy_file_or_dir(source_path, target_dir, print_info=False, suppress_errors=
             raise e
 
 
+def get_output_file_formats(output_path, now_date, create=True):
+    # builds the debug/md/json file formats for a given date, e.g. "out/json/2025-01/2025-01-17-{}"
+    year, month, day = now_date
+    month_string = f"{year}-{format(month, '02d')}"
+    date_string = f"{month_string}-{format(day, '02d')}"
+
+    debug_dir = os.path.join(output_path, "debug", month_string, date_string)
+    md_dir = os.path.join(output_path, "md", month_string)
+    json_dir = os.path.join(output_path, "json", month_string)
+    if create:
+        create_dir(debug_dir)
+        create_dir(md_dir)
+        create_dir(json_dir)
+
+    debug_file_format = os.path.join(debug_dir, "{}")
+    md_file_format = os.path.join(md_dir, f"{date_string}-" + "{}")
+    json_file_format = os.path.join(json_dir, f"{date_string}-" + "{}")
+    return debug_file_format, md_file_format, json_file_format
+
+
 def add_prefix_to_lines(s, prefix):
     return '\n'.join(prefix + line for line in s.splitlines())
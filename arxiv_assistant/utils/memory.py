@@ -0,0 +1,81 @@
+"""
+A memory ceiling for large days and long backfills (`max_rss_mb` in config.ini).
+
+The resident set size of the process is checked after each memory-heavy stage: above the ceiling, garbage is collected first,
+and a warning is printed if that is not enough. Backfills also ask for headroom before starting each date,
+so dates only run concurrently while the process stays below the ceiling (one date always runs, so a backfill never stalls).
+"""
+import gc
+import os
+import threading
+
+_page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def get_rss_mb() -> float:
+    # the current resident set size, or the peak one where /proc is not available
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * _page_size / 2 ** 20
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+class MemoryGuard:
+    def __init__(self, max_rss_mb=0):
+        self.max_rss_mb = max_rss_mb
+        self.peak_rss_mb = 0.0
+        self._active_cnt = 0
+        self._condition = threading.Condition()
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_rss_mb > 0
+
+    def check(self, stage="", warn=True) -> bool:
+        # returns False if the process stays above the ceiling after collecting garbage
+        if not self.enabled:
+            return True
+        rss_mb = get_rss_mb()
+        if rss_mb > self.max_rss_mb:
+            gc.collect()
+            rss_mb = get_rss_mb()
+        self.peak_rss_mb = max(self.peak_rss_mb, rss_mb)
+        if rss_mb > self.max_rss_mb:
+            if warn:
+                print(f"Warning: RSS is {rss_mb:.0f} MB after {stage or 'a stage'}, above the ceiling of {self.max_rss_mb} MB")
+            return False
+        return True
+
+    def acquire(self, poll_interval=1.0):
+        # blocks until there is headroom below the ceiling, or no other holder is running
+        with self._condition:
+            while self.enabled and self._active_cnt > 0 and not self.check(warn=False):
+                self._condition.wait(timeout=poll_interval)
+            self._active_cnt += 1
+
+    def release(self):
+        with self._condition:
+            self._active_cnt -= 1
+            self._condition.notify_all()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *args):
+        self.release()
+
+
+_memory_guards = {}
+_memory_guards_lock = threading.Lock()
+
+
+def get_memory_guard(config) -> MemoryGuard:
+    # one guard per ceiling, shared by all runs of this process
+    max_rss_mb = config["OUTPUT"].getint("max_rss_mb", fallback=0)
+    with _memory_guards_lock:
+        if max_rss_mb not in _memory_guards:
+            _memory_guards[max_rss_mb] = MemoryGuard(max_rss_mb)
+        return _memory_guards[max_rss_mb]
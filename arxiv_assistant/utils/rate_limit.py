@@ -0,0 +1,33 @@
+import threading
+import time
+from collections import deque
+
+
+class RateLimiter:
+    """
+    A thread-safe limiter that allows at most `limit` calls within any `period` seconds.
+    A non-positive `limit` denotes no limit.
+    The same limiter should be shared by all threads calling the same API so that the limit holds globally.
+    """
+
+    def __init__(self, limit, period=60.0):
+        self.limit = limit
+        self.period = period
+        self._call_times = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        # blocks until a call is allowed, returns the seconds spent waiting
+        if self.limit <= 0:
+            return 0.0
+        start_time = time.monotonic()
+        while True:
+            with self._lock:
+                now_time = time.monotonic()
+                while len(self._call_times) > 0 and now_time - self._call_times[0] >= self.period:
+                    self._call_times.popleft()
+                if len(self._call_times) < self.limit:
+                    self._call_times.append(now_time)
+                    return now_time - start_time
+                wait_time = self.period - (now_time - self._call_times[0])
+            time.sleep(max(wait_time, 0.01))
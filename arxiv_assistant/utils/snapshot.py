@@ -0,0 +1,276 @@
+"""
+Portable snapshots of the persistent caches, for runners that start empty (e.g., GitHub Actions).
+
+`export_snapshot` packs the JSON caches under `cache_path` (authors, LLM outputs, the Slack delivery ledger and the backfill progress)
+and the rows of the persistent SQLite stores (`STORE_NAMES`: the scored papers of the near-duplicate index and the batch history of the stage planner)
+into one gzipped JSON Lines file: a header with the format version, then one `[cache, key, stamp, value]` record per entry, newest first,
+then a footer with the entry count, so a truncated file is detected. Entries can be pruned
+- by age: JSON cache entries with their own update time (author lookups) and store rows are stamped with it, the other JSON cache entries
+  when first exported and again whenever their value changed since the last export (stamps and value checksums are kept in
+  `cache_path`/snapshot_stamps.json, the stamps are carried by the snapshot), and entries older than `max_age_days` are left out,
+- by profile: with `profiles`, only the LLM outputs and near-duplicate scores of the topic prompts of these profiles
+  (tagged in the LLM cache, untagged entries are kept) and their Slack deliveries are kept,
+- by size: entries are written newest first, and the oldest ones are left out once the file would grow beyond `max_size_mb`.
+
+`import_snapshot` merges a snapshot into the local caches and stores, local entries win. Snapshots of an unknown format version are ignored,
+as a cache miss only costs a lookup. The other SQLite stores are not included: the search index and the OAI-PMH harvest (`oai_harvest.sqlite`) are rebuilt
+by indexing and harvesting again (a backfill on a fresh runner harvests its whole range once), the work queue and coordination are transient.
+"""
+import gzip
+import json
+import os
+import time
+import zlib
+from typing import Dict, List, Optional, Tuple
+
+from arxiv_assistant.utils.dump import dumps_line, get_orjson
+from arxiv_assistant.utils.io import create_dir
+
+SNAPSHOT_FORMAT = "arxiv-assistant-cache-snapshot"
+SNAPSHOT_VERSION = 2
+READABLE_VERSIONS = (1, 2)  # version 1 had the JSON caches only
+CACHE_NAMES = ("authors", "llm", "slack_ledger", "backfill_state")
+STORE_NAMES = ("near_duplicates", "stage_stats")
+STAMPS_NAME = "snapshot_stamps.json"
+# room for the compressor's pending output and the footer when bounding the size
+SIZE_MARGIN_BYTES = 256 * 1024
+
+
+def get_cache_path(config) -> str:
+    return config["OUTPUT"].get("cache_path", os.path.join(config["OUTPUT"]["output_path"], "cache"))
+
+
+def get_snapshot_path(config) -> str:
+    return config["OUTPUT"].get("snapshot_path", os.path.join(config["OUTPUT"]["output_path"], "cache_snapshot.jsonl.gz"))
+
+
+def get_store_path(config, store_name) -> str:
+    from arxiv_assistant.filters.near_duplicates import get_near_duplicate_index_path
+    from arxiv_assistant.filters.stage_planner import get_stage_stats_path
+
+    return {
+        "near_duplicates": get_near_duplicate_index_path,
+        "stage_stats": get_stage_stats_path,
+    }[store_name](config)
+
+
+def open_store(config, store_name):
+    # the store at its configured path, whether or not it is enabled, it has `export_entries`, `import_entries` and `close`
+    from arxiv_assistant.filters.near_duplicates import NearDuplicateIndex
+    from arxiv_assistant.filters.stage_planner import StageStats
+
+    return {
+        "near_duplicates": NearDuplicateIndex,
+        "stage_stats": StageStats,
+    }[store_name](get_store_path(config, store_name))
+
+
+def loads(line):
+    orjson = get_orjson()
+    return orjson.loads(line) if orjson is not None else json.loads(line)
+
+
+def read_json(path) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "rb") as f:
+            return loads(f.read())
+    except Exception as e:
+        print(f"Failed to load {path}, ignoring it ({e})")
+        return {}
+
+
+def write_json(path, data: Dict):
+    # atomic like `JsonCache.save`, but with the fast backend, as the LLM cache can be large
+    create_dir(os.path.dirname(path) or ".")
+    temp_path = f"{path}.tmp"
+    orjson = get_orjson()
+    with open(temp_path, "wb") as f:
+        if orjson is not None:
+            f.write(orjson.dumps(data))
+        else:
+            f.write(json.dumps(data).encode("utf-8"))
+    os.replace(temp_path, path)
+
+
+def get_checksum(value) -> int:
+    return zlib.crc32(json.dumps(value, sort_keys=True).encode("utf-8"))
+
+
+def get_stamp(value, old_stamp, now_time) -> Tuple[float, int]:
+    # (stamp, checksum) of a JSON cache entry given its stamp of the last export ([stamp, checksum], a bare stamp in older stamp files, or None)
+    checksum = get_checksum(value)
+    if isinstance(value, dict) and isinstance(value.get("time"), (int, float)):
+        return value["time"], checksum  # e.g. {"time": ..., "authors": ...} of the author cache
+    if old_stamp is None:
+        return now_time, checksum
+    if isinstance(old_stamp, (int, float)):
+        return old_stamp, checksum
+    return (old_stamp[0] if old_stamp[1] == checksum else now_time), checksum
+
+
+def get_profile_filter(profiles):
+    # (topic tags, profile names, scoring tags) of the LLM outputs, Slack deliveries and near-duplicate scores to keep, None keeps everything
+    if profiles is None:
+        return None
+    from arxiv_assistant.filters.filter_gpt import get_topic_tag
+    from arxiv_assistant.filters.near_duplicates import get_scoring_tag
+
+    return (
+        {get_topic_tag(profile.topic_prompt) for profile in profiles},
+        {profile.name for profile in profiles},
+        {get_scoring_tag(profile.topic_prompt, profile.score_prompt, profile.config["SELECTION"]["model"]) for profile in profiles},
+    )
+
+
+def keep_entry(cache_name, key, value, profile_filter) -> bool:
+    if profile_filter is None:
+        return True
+    topic_tags, profile_names, scoring_tags = profile_filter
+    if cache_name == "llm" and isinstance(value, dict) and value.get("tag") is not None:
+        return value["tag"] in topic_tags
+    if cache_name == "near_duplicates":
+        return key.split("/", 1)[0] in scoring_tags  # "<scoring tag>/<arxiv id>"
+    if cache_name == "slack_ledger":
+        return key.rsplit("/", 1)[-1] in profile_names  # "<date>/<channel>/<profile>"
+    return True
+
+
+def export_snapshot(config, path=None, max_age_days: float = 0, max_size_mb: float = 0, profiles: Optional[List] = None) -> Dict[str, int]:
+    """
+    Writes the snapshot of the caches under `cache_path` to `path` (default: `snapshot_path`).
+    A non-positive `max_age_days` or `max_size_mb` denotes no limit, `profiles` (a list of `Profile`) limits the profile-specific entries.
+    :return: the numbers of exported entries and of entries left out by age, profile and size
+    """
+    if path is None:
+        path = get_snapshot_path(config)
+    cache_path = get_cache_path(config)
+    now_time = time.time()
+    profile_filter = get_profile_filter(profiles)
+    stamps = read_json(os.path.join(cache_path, STAMPS_NAME))
+
+    # stamp the new entries and prune the old ones
+    records = []
+    stats = {"exported": 0, "too_old": 0, "other_profiles": 0, "too_large": 0}
+    new_stamps = {}
+    for cache_name in CACHE_NAMES:
+        data = read_json(os.path.join(cache_path, f"{cache_name}.json"))
+        cache_stamps = stamps.get(cache_name, {})
+        new_stamps[cache_name] = {}
+        for key, value in data.items():
+            stamp, checksum = get_stamp(value, cache_stamps.get(key), now_time)
+            new_stamps[cache_name][key] = [stamp, checksum]
+            if max_age_days > 0 and now_time - stamp > max_age_days * 86400:
+                stats["too_old"] += 1
+            elif not keep_entry(cache_name, key, value, profile_filter):
+                stats["other_profiles"] += 1
+            else:
+                records.append((cache_name, key, stamp, value))
+    for store_name in STORE_NAMES:
+        if not os.path.exists(get_store_path(config, store_name)):
+            continue
+        store = open_store(config, store_name)
+        try:
+            for key, stamp, value in store.export_entries():
+                if max_age_days > 0 and now_time - stamp > max_age_days * 86400:
+                    stats["too_old"] += 1
+                elif not keep_entry(store_name, key, value, profile_filter):
+                    stats["other_profiles"] += 1
+                else:
+                    records.append((store_name, key, stamp, value))
+        finally:
+            store.close()
+    records.sort(key=lambda record: record[2], reverse=True)  # stable, so entries of one stamp keep the cache order
+
+    create_dir(os.path.dirname(path) or ".")
+    temp_path = f"{path}.tmp"
+    max_size = max_size_mb * 1024 * 1024
+    with open(temp_path, "wb") as raw_file:
+        with gzip.GzipFile(fileobj=raw_file, mode="wb", compresslevel=6) as f:
+            f.write(dumps_line({
+                "format": SNAPSHOT_FORMAT,
+                "version": SNAPSHOT_VERSION,
+                "created": now_time,
+                "profiles": sorted(profile_filter[1]) if profile_filter is not None else None,
+            }))
+            for i, (cache_name, key, stamp, value) in enumerate(records):
+                if max_size > 0 and raw_file.tell() + SIZE_MARGIN_BYTES > max_size:
+                    stats["too_large"] = len(records) - i
+                    break
+                f.write(dumps_line([cache_name, key, stamp, value]))
+                stats["exported"] += 1
+            f.write(dumps_line({"end": True, "entries": stats["exported"]}))
+    os.replace(temp_path, path)
+    write_json(os.path.join(cache_path, STAMPS_NAME), new_stamps)
+
+    print(f"Exported {stats['exported']} cache entries to {path} ({os.path.getsize(path) / 1024 / 1024:.2f} MB), left out: "
+          f"{stats['too_old']} older than {max_age_days} days, {stats['other_profiles']} of other profiles, {stats['too_large']} over {max_size_mb} MB")
+    return stats
+
+
+def import_snapshot(config, path=None) -> Dict[str, int]:
+    """
+    Merges the snapshot at `path` (default: `snapshot_path`) into the caches under `cache_path`, keeping the local entries.
+    :return: the number of imported entries per cache, empty if the snapshot is missing, unreadable or of another version
+    """
+    if path is None:
+        path = get_snapshot_path(config)
+    if not os.path.exists(path):
+        print(f"No cache snapshot at {path}, starting from the local caches")
+        return {}
+
+    snapshot = {cache_name: {} for cache_name in CACHE_NAMES + STORE_NAMES}
+    snapshot_stamps = {cache_name: {} for cache_name in CACHE_NAMES + STORE_NAMES}
+    try:
+        with gzip.open(path, "rb") as f:
+            header = loads(f.readline())
+            if header.get("format") != SNAPSHOT_FORMAT or header.get("version") not in READABLE_VERSIONS:
+                print(f"Ignoring the cache snapshot at {path}, its version {header.get('version')} is not one of {READABLE_VERSIONS}")
+                return {}
+            footer = None
+            for line in f:
+                record = loads(line)
+                if isinstance(record, dict):
+                    footer = record
+                    break
+                cache_name, key, stamp, value = record
+                if cache_name in snapshot:
+                    snapshot[cache_name][key] = value
+                    snapshot_stamps[cache_name][key] = stamp
+        if footer is None or footer.get("entries") != sum(len(data) for data in snapshot.values()):
+            raise ValueError("the snapshot is truncated")
+    except Exception as e:
+        print(f"Failed to import the cache snapshot at {path}, starting from the local caches ({e})")
+        return {}
+
+    cache_path = get_cache_path(config)
+    stamps_path = os.path.join(cache_path, STAMPS_NAME)
+    stamps = read_json(stamps_path)
+    stats = {}
+    for cache_name in CACHE_NAMES:
+        if len(snapshot[cache_name]) == 0:
+            continue
+        cache_file = os.path.join(cache_path, f"{cache_name}.json")
+        local_data = read_json(cache_file)
+        new_keys = [key for key in snapshot[cache_name] if key not in local_data]
+        if len(new_keys) > 0:
+            # on a fresh runner there are no local entries, and the snapshot is written as is
+            data = snapshot[cache_name] if len(local_data) == 0 else {**snapshot[cache_name], **local_data}
+            write_json(cache_file, data)
+        cache_stamps = stamps.setdefault(cache_name, {})
+        for key in new_keys:
+            cache_stamps.setdefault(key, [snapshot_stamps[cache_name][key], get_checksum(snapshot[cache_name][key])])
+        stats[cache_name] = len(new_keys)
+    write_json(stamps_path, stamps)
+    for store_name in STORE_NAMES:
+        if len(snapshot[store_name]) == 0:
+            continue
+        store = open_store(config, store_name)
+        try:
+            stats[store_name] = store.import_entries((key, snapshot_stamps[store_name][key], value) for key, value in snapshot[store_name].items())
+        finally:
+            store.close()
+
+    print(f"Imported cache entries from {path} (created {time.strftime('%Y-%m-%d %H:%M', time.gmtime(header['created']))} UTC): {stats}")
+    return stats
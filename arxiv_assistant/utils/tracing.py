@@ -0,0 +1,218 @@
+"""
+A lightweight tracing layer recording a span for each fetch, author lookup, LLM batch, parse, render and push.
+
+Tracing is disabled by default and every span is then a shared no-op, so the instrumentation costs almost nothing.
+When enabled (`python main.py --trace`), each span records its wall time and optional counters (bytes, tokens, retries, queue wait),
+and `write_report` dumps a Chrome trace (open it in chrome://tracing or https://ui.perfetto.dev) and a summary table.
+Stage spans (`tracer.stage`) can additionally capture cProfile stats and tracemalloc peaks.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+COUNTER_FIELDS = ("bytes", "prompt_tokens", "completion_tokens", "retries", "queue_wait")
+
+
+class Span:
+    __slots__ = ("name", "category", "start", "end", "thread_id", "args")
+
+    def __init__(self, name, category, args=None):
+        self.name = name
+        self.category = category
+        self.start = time.perf_counter()
+        self.end = None
+        self.thread_id = threading.get_ident()
+        self.args = dict(args) if args else {}
+
+    def add(self, **counters):
+        # accumulates counters such as bytes=..., prompt_tokens=..., queue_wait=...
+        for key, value in counters.items():
+            self.args[key] = self.args.get(key, 0) + value
+
+    def set(self, **kwargs):
+        self.args.update(kwargs)
+
+    def attempt(self):
+        # marks an attempt of a retried call, every attempt after the first counts as a retry
+        if self.args.get("_attempted", False):
+            self.add(retries=1)
+        self.args["_attempted"] = True
+
+    @property
+    def duration(self):
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+
+class NullSpan:
+    # returned when tracing is disabled, ignores everything
+    __slots__ = ()
+
+    def add(self, **counters):
+        pass
+
+    def set(self, **kwargs):
+        pass
+
+    def attempt(self):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.cpu_profile = False
+        self.memory_profile = False
+        self.origin = time.perf_counter()
+        self.spans: List[Span] = []
+        self.stage_stats: Dict[str, Dict] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def enable(self, cpu_profile=False, memory_profile=False):
+        self.enabled = True
+        self.cpu_profile = cpu_profile
+        self.memory_profile = memory_profile
+        self.origin = time.perf_counter()
+        if memory_profile:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    def current_span(self):
+        stack = getattr(self._local, "stack", None)
+        if not self.enabled or not stack:
+            return NULL_SPAN
+        return stack[-1]
+
+    @contextmanager
+    def span(self, name, category="", **args):
+        if not self.enabled:
+            yield NULL_SPAN
+            return
+        span = Span(name, category, args)
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(span)
+        try:
+            yield span
+        finally:
+            span.end = time.perf_counter()
+            stack.pop()
+            span.args.pop("_attempted", None)
+            with self._lock:
+                self.spans.append(span)
+
+    @contextmanager
+    def stage(self, name, **args):
+        # a top-level pipeline stage, optionally profiled with cProfile and tracemalloc
+        if not self.enabled:
+            yield NULL_SPAN
+            return
+        profiler = None
+        if self.cpu_profile:
+            import cProfile
+            profiler = cProfile.Profile()
+            try:
+                profiler.enable()
+            except ValueError:  # another profiler is active in this interpreter (stages running concurrently)
+                profiler = None
+        if self.memory_profile:
+            import tracemalloc
+            tracemalloc.reset_peak()
+            memory_before = tracemalloc.get_traced_memory()[0]
+
+        with self.span(name, "stage", **args) as span:
+            try:
+                yield span
+            finally:
+                stats = {}
+                if profiler is not None:
+                    profiler.disable()
+                    stats["cprofile"] = profiler
+                if self.memory_profile:
+                    memory_after, memory_peak = tracemalloc.get_traced_memory()
+                    span.set(memory_delta=memory_after - memory_before, memory_peak=memory_peak)
+                with self._lock:
+                    self.stage_stats.setdefault(name, []).append(stats)
+
+    def to_chrome_trace(self) -> Dict:
+        pid = os.getpid()
+        events = []
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            events.append({
+                "name": span.name,
+                "cat": span.category,
+                "ph": "X",
+                "ts": round((span.start - self.origin) * 1e6, 1),
+                "dur": round(span.duration * 1e6, 1),
+                "pid": pid,
+                "tid": span.thread_id,
+                "args": span.args,
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def summarize(self) -> List[Dict]:
+        # aggregates spans by category and name
+        summary = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            key = (span.category, span.name)
+            row = summary.setdefault(key, {"category": span.category, "name": span.name, "count": 0, "total_s": 0.0, "max_s": 0.0, **{field: 0 for field in COUNTER_FIELDS}, "memory_peak": 0})
+            row["count"] += 1
+            row["total_s"] += span.duration
+            row["max_s"] = max(row["max_s"], span.duration)
+            for field in COUNTER_FIELDS:
+                row[field] += span.args.get(field, 0)
+            row["memory_peak"] = max(row["memory_peak"], span.args.get("memory_peak", 0))
+        rows = sorted(summary.values(), key=lambda x: x["total_s"], reverse=True)
+        for row in rows:
+            row["mean_s"] = row["total_s"] / row["count"]
+        return rows
+
+    def write_report(self, debug_file_format):
+        # writes profile_trace.json, profile_summary.md and one profile_<stage>.prof per profiled stage
+        from tabulate import tabulate
+
+        with open(debug_file_format.format("profile_trace.json"), "w") as outfile:
+            json.dump(self.to_chrome_trace(), outfile)
+
+        rows = self.summarize()
+        headers = ["Category", "Name", "Count", "Total (s)", "Mean (s)", "Max (s)", "Bytes", "Prompt tokens", "Completion tokens", "Retries", "Queue wait (s)", "Memory peak (MB)"]
+        data = [
+            [row["category"], row["name"], row["count"], round(row["total_s"], 3), round(row["mean_s"], 4), round(row["max_s"], 3), row["bytes"], row["prompt_tokens"], row["completion_tokens"], row["retries"], round(row["queue_wait"], 3), round(row["memory_peak"] / 2 ** 20, 2)]
+            for row in rows
+        ]
+        summary_string = tabulate(data, headers=headers, tablefmt="github")
+        with open(debug_file_format.format("profile_summary.md"), "w") as outfile:
+            outfile.write(summary_string + "\n")
+
+        if self.cpu_profile:
+            import pstats
+            for name, stats_list in self.stage_stats.items():
+                profilers = [stats["cprofile"] for stats in stats_list if "cprofile" in stats]
+                if len(profilers) == 0:
+                    continue
+                merged = pstats.Stats(profilers[0])
+                for profiler in profilers[1:]:
+                    merged.add(profiler)
+                merged.dump_stats(debug_file_format.format(f"profile_{name}.prof"))
+
+        print(summary_string)
+        print(f"Profile written to {debug_file_format.format('profile_trace.json')}")
+
+
+_tracer = Tracer()
+
+
+def get_tracer() -> Tracer:
+    return _tracer
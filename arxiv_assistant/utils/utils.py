@@ -1,29 +1,77 @@
 import dataclasses
 import json
 import re
+import sys
+from collections.abc import Mapping
 from dataclasses import dataclass
-from typing import List, Optional, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 
 class EnhancedJSONEncoder(json.JSONEncoder):
     def default(self, o):
+        if isinstance(o, (Paper, PaperResult)):
+            return o.to_dict()
         if dataclasses.is_dataclass(o):
             return dataclasses.asdict(o)
         return super().default(o)
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class Paper:
     # paper class should track the list of authors, paper title, abstract, arxiv id
-    authors: List[str]
+    # immutable and slotted to stay small on large days, author names are interned since they recur across papers and feeds
+    authors: Tuple[str, ...]
     title: str
     abstract: str
     arxiv_id: str
 
+    def __post_init__(self):
+        object.__setattr__(self, "authors", tuple(sys.intern(author) for author in self.authors))
+
     # add a hash function using arxiv_id
     def __hash__(self):
         return hash(self.arxiv_id)
 
+    def to_dict(self) -> Dict:
+        # a shallow dict, unlike `dataclasses.asdict` which deep-copies the authors
+        return {"authors": self.authors, "title": self.title, "abstract": self.abstract, "arxiv_id": self.arxiv_id}
+
+
+PAPER_FIELDS = ("authors", "title", "abstract", "arxiv_id")
+
+
+class PaperResult(Mapping):
+    """
+    The result of a selection or filtering stage for one paper: the fields set by the stage (e.g., COMMENT, SCORE, RELEVANCE)
+    and a reference to the paper instead of a copy of it.
+    It reads like the merged dict `{**fields, **dataclasses.asdict(paper)}`, so renderers can index it as before.
+    """
+    __slots__ = ("paper", "fields")
+
+    def __init__(self, paper: Paper, fields: Dict = None):
+        self.paper = paper
+        self.fields = fields if fields is not None else {}
+
+    def __getitem__(self, key):
+        if key in PAPER_FIELDS:
+            return getattr(self.paper, key)
+        return self.fields[key]
+
+    def __iter__(self):
+        for key in self.fields:
+            if key not in PAPER_FIELDS:
+                yield key
+        yield from PAPER_FIELDS
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __repr__(self):
+        return f"PaperResult({self.paper.arxiv_id}, {self.fields})"
+
+    def to_dict(self) -> Dict:
+        return {**self.fields, **self.paper.to_dict()}
+
 
 def is_earlier(ts1, ts2):
     # compares two arxiv ids, returns true if ts1 is older than ts2
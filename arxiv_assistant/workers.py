@@ -0,0 +1,636 @@
+"""
+Sharded execution of the pipeline over a durable work queue, to spread big backfills over several processes or machines.
+
+A coordinator (`python -m scripts.workers submit ...`) records one run per date in a SQLite queue on shared storage,
+and any number of workers (`python -m scripts.workers work`) claim its tasks under a lease:
+1. `fetch`: the papers of one arXiv category,
+2. `authors`: the Semantic Scholar lookups for a chunk of papers (only if a profile matches authors),
+3. `score`: the LLM filtering of a chunk of papers for one profile, taken in the priority order of `filters/priority.py`,
+4. `merge`: the usual `output.json`/`output.md` (and Slack messages) of one profile, from the results of the other tasks.
+The worker finishing the last task of a stage plans the next one in the same transaction, so no process has to stay up besides the workers
+(a failing plan fails the run).
+Workers renew the leases of their tasks while running them: the tasks of a worker that died are leased again once their lease expires,
+and a task failing `MAX_ATTEMPTS` times fails its run. Results are only accepted from the current lease holder.
+Score chunks are whole multiples of the batch size of the full day, so the LLM prompts (and the LLM cache) match a single-process run.
+
+Workers need the same configs and prompts, and the queue and `output_path` on storage shared by all of them.
+"""
+import configparser
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import traceback
+from typing import Callable, Dict, List, Optional, Tuple
+
+from arxiv_assistant.utils.io import create_dir
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    params TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    state TEXT NOT NULL,
+    created REAL NOT NULL,
+    finished REAL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, id);
+CREATE INDEX IF NOT EXISTS tasks_run_kind ON tasks (run_id, kind);
+"""
+
+STAGES = ("fetch", "authors", "score", "merge")
+FINAL_STAGES = ("done", "empty", "failed")
+MAX_ATTEMPTS = 3
+AUTHOR_CHUNK_PAPERS = 500
+SCORE_CHUNK_BATCHES = 8  # LLM batches per score task
+
+
+class WorkQueue:
+    """
+    Runs and their tasks in a SQLite database, safe to share across threads and processes (WAL mode).
+    Task statuses are `pending`, `leased`, `done` and `failed`, run stages are `STAGES` followed by one of `FINAL_STAGES`.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        create_dir(os.path.dirname(path) or ".")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=60, check_same_thread=False, isolation_level=None)
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _transaction(self, fn):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    @staticmethod
+    def _insert_tasks(conn, run_id, tasks: List[Tuple[str, Dict]]):
+        conn.executemany(
+            "INSERT INTO tasks (run_id, kind, payload, status) VALUES (?, ?, ?, 'pending')",
+            [(run_id, kind, json.dumps(payload)) for kind, payload in tasks],
+        )
+
+    def add_run(self, params: Dict, fetch_payloads: List[Dict]) -> int:
+        def add(conn):
+            run_id = conn.execute(
+                "INSERT INTO runs (params, stage, state, created) VALUES (?, 'fetch', '{}', ?)", (json.dumps(params), time.time())
+            ).lastrowid
+            self._insert_tasks(conn, run_id, [("fetch", payload) for payload in fetch_payloads])
+            return run_id
+
+        return self._transaction(add)
+
+    def find_run(self, key: str) -> Optional[Dict]:
+        # the latest run submitted with `key` in its params (e.g., a date), to avoid submitting it twice
+        with self._lock:
+            rows = self._conn.execute("SELECT id, params, stage FROM runs ORDER BY id DESC").fetchall()
+        for run_id, params, stage in rows:
+            if json.loads(params).get("key") == key:
+                return {"id": run_id, "stage": stage}
+        return None
+
+    def lease(self, owner, lease_seconds=300.0) -> Optional[Dict]:
+        # claims the oldest pending task (or one whose lease expired) of an unfinished run
+        def try_lease(conn):
+            while True:
+                now_time = time.time()
+                row = conn.execute(
+                    "SELECT tasks.id, tasks.run_id, tasks.kind, tasks.payload, tasks.attempts FROM tasks JOIN runs ON runs.id = tasks.run_id "
+                    "WHERE runs.finished IS NULL AND (tasks.status = 'pending' OR (tasks.status = 'leased' AND tasks.lease_expires < ?)) "
+                    "ORDER BY tasks.id LIMIT 1",
+                    (now_time,),
+                ).fetchone()
+                if row is None:
+                    return None
+                task_id, run_id, kind, payload, attempts = row
+                if attempts >= MAX_ATTEMPTS:
+                    # the last lease expired, its worker likely died on it
+                    self._fail_run(conn, task_id, run_id, "lease expired")
+                    continue
+                conn.execute(
+                    "UPDATE tasks SET status = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE id = ?",
+                    (owner, now_time + lease_seconds, task_id),
+                )
+                return {"id": task_id, "run_id": run_id, "kind": kind, "payload": json.loads(payload), "attempts": attempts + 1}
+
+        return self._transaction(try_lease)
+
+    def renew(self, task_id, owner, lease_seconds=300.0) -> bool:
+        def try_renew(conn):
+            return conn.execute(
+                "UPDATE tasks SET lease_expires = ? WHERE id = ? AND owner = ? AND status = 'leased'", (time.time() + lease_seconds, task_id, owner)
+            ).rowcount == 1
+
+        return self._transaction(try_renew)
+
+    def complete(self, task_id, owner, result, plan: Callable = None) -> bool:
+        """
+        Marks the task done, and with `plan` (see `advance`) moves its run to the next stage in the same transaction,
+        so a worker dying in between cannot leave a run whose stage is done but never planned.
+        :return: False if the lease was lost (expired and taken by another worker), the result is then dropped
+        """
+        def try_complete(conn):
+            row = conn.execute("SELECT run_id FROM tasks WHERE id = ? AND owner = ? AND status = 'leased'", (task_id, owner)).fetchone()
+            if row is None:
+                return False
+            conn.execute("UPDATE tasks SET status = 'done', result = ?, lease_expires = NULL WHERE id = ?", (json.dumps(result), task_id))
+            if plan is not None:
+                self._advance(conn, row[0], plan)
+            return True
+
+        return self._transaction(try_complete)
+
+    @staticmethod
+    def _fail_run(conn, task_id, run_id, error):
+        conn.execute("UPDATE tasks SET status = 'failed', error = ? WHERE id = ?", (error, task_id))
+        conn.execute("UPDATE runs SET stage = 'failed', finished = ? WHERE id = ?", (time.time(), run_id))
+
+    def fail(self, task_id, owner, error: str) -> str:
+        # puts the task back for another attempt, or fails it and its run after `MAX_ATTEMPTS`, returns the new status
+        def try_fail(conn):
+            row = conn.execute("SELECT run_id, attempts FROM tasks WHERE id = ? AND owner = ? AND status = 'leased'", (task_id, owner)).fetchone()
+            if row is None:
+                return "lost"
+            run_id, attempts = row
+            if attempts >= MAX_ATTEMPTS:
+                self._fail_run(conn, task_id, run_id, error)
+                return "failed"
+            conn.execute("UPDATE tasks SET status = 'pending', owner = NULL, lease_expires = NULL, error = ? WHERE id = ?", (error, task_id))
+            return "pending"
+
+        return self._transaction(try_fail)
+
+    def advance(self, run_id, plan: Callable[[str, Dict, Dict, List[Dict]], Tuple[str, Dict, List[Tuple[str, Dict]]]]) -> str:
+        """
+        Moves the run to its next stage once every task of its current stage is done.
+        `plan(stage, params, state, results)` returns the next stage, the new state and the tasks of the next stage.
+        Stages without tasks are planned through right away. Planning holds the write lock, so it happens once.
+        A failing `plan` fails the run (its error is kept in the run state as `error`) instead of leaving it stuck.
+        :return: the stage of the run
+        """
+        return self._transaction(lambda conn: self._advance(conn, run_id, plan))
+
+    def _advance(self, conn, run_id, plan) -> str:
+        params, stage, state = conn.execute("SELECT params, stage, state FROM runs WHERE id = ?", (run_id,)).fetchone()
+        params, state = json.loads(params), json.loads(state)
+        while stage in STAGES:
+            open_cnt = conn.execute("SELECT COUNT(*) FROM tasks WHERE run_id = ? AND kind = ? AND status != 'done'", (run_id, stage)).fetchone()[0]
+            if open_cnt > 0:
+                return stage
+            results = [json.loads(row[0]) for row in conn.execute("SELECT result FROM tasks WHERE run_id = ? AND kind = ? ORDER BY id", (run_id, stage))]
+            try:
+                stage, state, tasks = plan(stage, params, state, results)
+            except Exception as e:
+                traceback.print_exc()
+                stage, state, tasks = "failed", {**state, "error": f"planning after {stage} failed: {type(e).__name__}: {e}"}, []
+            conn.execute(
+                "UPDATE runs SET stage = ?, state = ?, finished = ? WHERE id = ?",
+                (stage, json.dumps(state), time.time() if stage in FINAL_STAGES else None, run_id),
+            )
+            self._insert_tasks(conn, run_id, tasks)
+        return stage
+
+    def get_run(self, run_id) -> Dict:
+        with self._lock:
+            params, stage, state, created = self._conn.execute("SELECT params, stage, state, created FROM runs WHERE id = ?", (run_id,)).fetchone()
+        return {"id": run_id, "params": json.loads(params), "stage": stage, "state": json.loads(state), "created": created}
+
+    def get_status(self) -> List[Dict]:
+        # the stage and task counts by kind and status of each run
+        with self._lock:
+            runs = self._conn.execute("SELECT id, params, stage, created, finished FROM runs ORDER BY id").fetchall()
+            counts = self._conn.execute("SELECT run_id, kind, status, COUNT(*) FROM tasks GROUP BY run_id, kind, status").fetchall()
+        statuses = {}
+        for run_id, params, stage, created, finished in runs:
+            statuses[run_id] = {"id": run_id, "key": json.loads(params).get("key"), "stage": stage, "created": created, "finished": finished, "tasks": {}}
+        for run_id, kind, status, count in counts:
+            statuses[run_id]["tasks"].setdefault(kind, {})[status] = count
+        return list(statuses.values())
+
+    def is_idle(self) -> bool:
+        # True if no unfinished run has tasks left to lease
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM tasks JOIN runs ON runs.id = tasks.run_id WHERE runs.finished IS NULL AND tasks.status IN ('pending', 'leased')"
+            ).fetchone()[0] == 0
+
+
+def get_work_queue_path(config) -> str:
+    cache_path = config["OUTPUT"].get("cache_path", os.path.join(config["OUTPUT"]["output_path"], "cache"))
+    return config["OUTPUT"].get("work_queue_path", os.path.join(cache_path, "work_queue.sqlite"))
+
+
+def copy_config(config) -> configparser.ConfigParser:
+    copied = configparser.ConfigParser()
+    copied.read_dict({section: dict(config[section]) for section in config.sections()})
+    return copied
+
+
+def submit_run(
+    queue: WorkQueue,
+    config,
+    key: str,
+    now_date: Tuple[int, int, int] = None,  # year, month, day, resolved from the feeds for the "rss" source if None
+    source: str = "rss",
+    begin_date: Tuple[int, int, int] = None,
+    end_date: Tuple[int, int, int] = None,
+    profiles_arg: str = None,
+    header: str = None,
+    copy_to_latest: bool = False,
+) -> int:
+    # records a run with one fetch task per arXiv category
+    params = {
+        "key": key,
+        "now_date": now_date,
+        "source": source,
+        "begin_date": begin_date,
+        "end_date": end_date,
+        "profiles": profiles_arg,
+        "header": header,
+        "copy_to_latest": copy_to_latest,
+    }
+    areas = [s.strip() for s in config["FILTERING"]["arxiv_category"].split(",")]
+    return queue.add_run(params, [{"area": area} for area in areas])
+
+
+def paper_from_dict(paper_dict):
+    from arxiv_assistant.utils.utils import Paper
+    return Paper(**paper_dict)
+
+
+def results_to_fields(results: Dict) -> Dict[str, Dict]:
+    # arxiv id -> fields of each `PaperResult`, the papers themselves are in the run state
+    return {arxiv_id: result.fields for arxiv_id, result in results.items()}
+
+
+class Planner:
+    """
+    Plans the next stage of a run from the results of the current one (see `WorkQueue.advance`).
+    """
+
+    def __init__(self, config):
+        self.config = config
+
+    def __call__(self, stage, params, state, results):
+        return getattr(self, f"after_{stage}")(params, state, results)
+
+    def get_profiles(self, params):
+        from arxiv_assistant.profiles import get_default_profile, load_profiles_from_arg
+        return load_profiles_from_arg(self.config, params["profiles"]) or [get_default_profile(self.config)]
+
+    def after_fetch(self, params, state, results):
+        papers, areas = {}, {}
+        for result in results:  # in the order of the categories
+            areas[result["area"]] = [paper["arxiv_id"] for paper in result["papers"]]
+            for paper in result["papers"]:
+                papers.setdefault(paper["arxiv_id"], paper)
+        now_date = params["now_date"] or next((result["now_date"] for result in results if result.get("now_date")), None)
+        state = {"now_date": now_date, "entry_cnt": sum(result["entry_cnt"] for result in results), "papers": papers, "areas": areas}
+        if len(papers) == 0:
+            print(f"No papers found for run {params['key']}")
+            return "empty", state, []
+
+        if any(profile.config["SELECTION"].getboolean("run_author_match") for profile in self.get_profiles(params)):
+            arxiv_ids = list(papers)
+            tasks = [
+                ("authors", {"papers": [papers[arxiv_id] for arxiv_id in arxiv_ids[i:i + AUTHOR_CHUNK_PAPERS]]})
+                for i in range(0, len(arxiv_ids), AUTHOR_CHUNK_PAPERS)
+            ]
+            return "authors", state, tasks
+        return self.plan_scores(params, state, {})
+
+    def after_authors(self, params, state, results):
+        all_authors = {}
+        for result in results:
+            all_authors.update(result["authors"])
+        return self.plan_scores(params, state, all_authors)
+
+    def plan_scores(self, params, state, all_authors):
+        # selects by author, applies the rules and filters by h-index here (set lookups), then splits the LLM work into chunks
+        from arxiv_assistant.filters.filter_author import AuthorIndex, filter_papers_by_hindex, select_by_author
+        from arxiv_assistant.environment import get_context
+        from arxiv_assistant.filters.filter_gpt import get_batch_size, get_postfix_prompt_abstract, plan_stages
+        from arxiv_assistant.filters.filter_rules import apply_rules, get_rule_set
+        from arxiv_assistant.filters.priority import PriorityScorer, parse_category_weights
+        from arxiv_assistant.filters.watchlist import WatchlistIndex
+
+        paper_list = [paper_from_dict(paper) for paper in state["papers"].values()]
+        paper_categories = {}
+        for area, arxiv_ids in state["areas"].items():
+            for arxiv_id in arxiv_ids:
+                paper_categories.setdefault(arxiv_id, []).append(area)
+        author_index = AuthorIndex(all_authors)
+        state["profiles"] = {}
+        tasks = []
+        for profile in self.get_profiles(params):
+            config = profile.config
+            remaining_papers = paper_list
+            selected_results, filtered_results = {}, {}
+            forced_papers = []
+            if config["SELECTION"].getboolean("run_author_match"):
+                remaining_papers, selected_results = select_by_author(all_authors, remaining_papers, profile.author_id_set, config, author_index=author_index)
+            rule_set = get_rule_set(profile.rules_text) if config["SELECTION"].getboolean("run_rules", fallback=True) else None
+            if rule_set is not None:
+                remaining_papers, included_results, filtered_results, forced_papers, _ = apply_rules(
+                    rule_set, remaining_papers, paper_categories, include_score=float(config["SELECTION"]["author_match_score"]),
+                )
+                selected_results = {**selected_results, **included_results}
+            if config["SELECTION"].getboolean("run_author_match"):
+                remaining_papers, hindex_results = filter_papers_by_hindex(all_authors, remaining_papers, config, author_index=author_index)
+                filtered_results = {**filtered_results, **hindex_results}
+            state["profiles"][profile.name] = {
+                "selected": results_to_fields(selected_results),
+                "filtered": results_to_fields(filtered_results),
+                "costs": [0.0, 0.0, 0, 0, 0],
+                "unscored": [],
+            }
+            if not config["SELECTION"].getboolean("run_openai") or len(remaining_papers) + len(forced_papers) == 0:
+                continue
+
+            if config["SELECTION"].getboolean("prioritize_scoring", fallback=True):
+                remaining_papers = PriorityScorer(
+                    profile.topic_prompt,
+                    remaining_papers,
+                    watchlist=WatchlistIndex(profile.author_names),
+                    author_index=author_index,
+                    category_weights=parse_category_weights(config["SELECTION"].get("category_weights", fallback="")),
+                    paper_categories=paper_categories,
+                ).order(remaining_papers)
+            # the stages and batch sizes are planned once for the whole day
+            context = get_context()
+            stage_plan = plan_stages(
+                forced_papers, remaining_papers, context.system_prompt, profile.topic_prompt, profile.score_prompt,
+                context.postfix_prompt_title, get_postfix_prompt_abstract(config), config,
+            )
+            if stage_plan is not None:
+                config = stage_plan.apply(config)
+                state["profiles"][profile.name]["stage_plan"] = {
+                    "description": stage_plan.describe(),
+                    "predicted_cost": stage_plan.predicted_cost,
+                    "predicted_seconds": stage_plan.predicted_seconds,
+                }
+
+            # the papers forced by rules are scored first, and are never filtered by titles
+            forced_ids = [paper.arxiv_id for paper in forced_papers]
+            remaining_papers = forced_papers + remaining_papers
+            batch_size = get_batch_size(int(config["SELECTION"]["abstract_batch_size"]), len(remaining_papers), config)
+            chunk_size = batch_size * SCORE_CHUNK_BATCHES
+            for i in range(0, len(remaining_papers), chunk_size):
+                tasks.append(("score", {
+                    "profile": profile.name,
+                    "batch_size": batch_size,
+                    "run_title_filter": config["SELECTION"].getboolean("run_title_filter"),
+                    "title_batch_size": int(config["SELECTION"]["title_batch_size"]),
+                    "papers": [paper.to_dict() for paper in remaining_papers[i:i + chunk_size]],
+                    "forced": forced_ids[i:i + chunk_size],
+                }))
+        if len(tasks) == 0:
+            return self.after_score(params, state, [])
+        return "score", state, tasks
+
+    def after_score(self, params, state, results):
+        for result in results:
+            profile_state = state["profiles"][result["profile"]]
+            profile_state["selected"].update(result["selected"])
+            profile_state["filtered"].update(result["filtered"])
+            profile_state["costs"] = [a + b for a, b in zip(profile_state["costs"], result["costs"])]
+            profile_state["unscored"].extend(result["unscored"])
+        self.record_stage_plans(state)
+        return "merge", state, [("merge", {"profile": name}) for name in state["profiles"]]
+
+    def record_stage_plans(self, state):
+        # the predicted and actual costs of the planned profiles, like a single-process run (the wall time of the chunks is not comparable)
+        from arxiv_assistant.filters.stage_planner import get_stage_stats
+
+        stage_stats = get_stage_stats(self.config)
+        for name, profile_state in state["profiles"].items():
+            if stage_stats is None or "stage_plan" not in profile_state:
+                continue
+            stage_plan = profile_state["stage_plan"]
+            actual_cost = profile_state["costs"][0] + profile_state["costs"][1]
+            print(f"Stage plan of profile {name}: {stage_plan['description']}, predicted ${stage_plan['predicted_cost'] or 0:.4f}, actual ${actual_cost:.4f}")
+            stage_stats.record_plan(
+                self.config["SELECTION"]["model"], len(state["papers"]), stage_plan["description"], stage_plan["predicted_cost"], stage_plan["predicted_seconds"], actual_cost, None,
+            )
+
+    def after_merge(self, params, state, results):
+        print(f"Run {params['key']} is done: " + ", ".join(f"{result['profile']}: {result['selected_cnt']} papers" for result in results))
+        return "done", state, []
+
+
+class Worker:
+    """
+    Leases and runs tasks until the queue is idle (or forever, for a long-running worker).
+    """
+
+    def __init__(self, config, queue: WorkQueue, name: str = None, lease_seconds=300.0, poll_interval=2.0):
+        from arxiv_assistant.utils.cache import load_cache
+
+        self.config = config
+        self.queue = queue
+        self.owner = f"{socket.gethostname()}:{os.getpid()}" + (f":{name}" if name else "")
+        self.lease_seconds = lease_seconds
+        self.poll_interval = poll_interval
+        self.planner = Planner(config)
+        self.author_cache = load_cache(config, "authors")
+        self.llm_cache = load_cache(config, "llm")
+        self._run_cache = {}  # run id -> (stage, run), the state only changes between stages
+        self.task_cnt = 0
+
+    def get_run(self, run_id, stage):
+        cached = self._run_cache.get(run_id)
+        if cached is None or cached[0] != stage:
+            run = self.queue.get_run(run_id)
+            self._run_cache[run_id] = (stage, run)
+            return run
+        return cached[1]
+
+    def run(self, exit_when_idle=True) -> int:
+        # returns the number of tasks run
+        while True:
+            task = self.queue.lease(self.owner, self.lease_seconds)
+            if task is None:
+                if exit_when_idle and self.queue.is_idle():
+                    break
+                time.sleep(self.poll_interval)
+                continue
+            self.run_task(task)
+        self.save_caches()
+        return self.task_cnt
+
+    def run_task(self, task):
+        print(f"[{self.owner}] Running task {task['id']} ({task['kind']}) of run {task['run_id']}, attempt {task['attempts']}")
+        stop_renewing = threading.Event()
+
+        def renew():
+            while not stop_renewing.wait(self.lease_seconds / 3):
+                if not self.queue.renew(task["id"], self.owner, self.lease_seconds):
+                    print(f"[{self.owner}] Lost the lease of task {task['id']}")
+                    return
+
+        renewer = threading.Thread(target=renew, daemon=True)
+        renewer.start()
+        try:
+            run = self.get_run(task["run_id"], task["kind"])
+            result = getattr(self, f"run_{task['kind']}")(run, task["payload"], task["id"])
+        except Exception as e:
+            traceback.print_exc()
+            status = self.queue.fail(task["id"], self.owner, f"{type(e).__name__}: {e}")
+            print(f"[{self.owner}] Task {task['id']} failed ({status})")
+            return
+        finally:
+            stop_renewing.set()
+            renewer.join()
+        self.task_cnt += 1
+        self.queue.complete(task["id"], self.owner, result, plan=self.planner)
+        self.save_caches()
+
+    def save_caches(self):
+        self.author_cache.save()
+        self.llm_cache.save()
+
+    def get_debug_file_format(self, output_path, now_date, task_id):
+        from arxiv_assistant.utils.io import get_output_file_formats
+
+        if now_date is None:
+            return None
+        debug_file_format, _, _ = get_output_file_formats(output_path, tuple(now_date))
+        # a suffix per task, e.g. "gpt_paper_batches_12", so that the chunks of a day do not overwrite each other
+        return debug_file_format.format("{}" + f"_{task_id}")
+
+    def run_fetch(self, run, payload, task_id):
+        from arxiv_assistant.apis.arxiv import get_papers_from_arxiv
+        from arxiv_assistant.environment import get_context
+
+        params = run["params"]
+        if params["now_date"] is None:
+            get_context().reset_now_time()  # resolve the date from this task's feed, not from an earlier run of this worker
+        config = copy_config(self.config)
+        config["FILTERING"]["arxiv_category"] = payload["area"]
+        entry_cnt, arxiv_paper_dict = get_papers_from_arxiv(
+            config,
+            source=params["source"],
+            begin_date=tuple(params["begin_date"]) if params["begin_date"] else None,
+            end_date=tuple(params["end_date"]) if params["end_date"] else None,
+            debug_file_format=self.get_debug_file_format(config["OUTPUT"]["output_path"], params["now_date"], task_id),
+            keep_entries=False,
+        )
+        return {
+            "area": payload["area"],
+            "entry_cnt": entry_cnt,
+            "papers": [paper.to_dict() for paper in arxiv_paper_dict.get(payload["area"], [])],
+            "now_date": get_context().now_date if params["now_date"] is None else None,
+        }
+
+    def run_authors(self, run, payload, task_id):
+        from arxiv_assistant.apis.semantic_scholar import get_authors
+        from arxiv_assistant.environment import get_context
+        from arxiv_assistant.filters.watchlist import WatchlistIndex, get_authors_watchlist_first
+
+        paper_list = [paper_from_dict(paper) for paper in payload["papers"]]
+        author_profiles = [profile for profile in self.planner.get_profiles(run["params"]) if profile.config["SELECTION"].getboolean("run_author_match")]
+        s2_api_key = get_context().s2_api_key
+        if self.config["SELECTION"].getboolean("watchlist_first_lookup", fallback=True):
+            watchlist = WatchlistIndex(name for profile in author_profiles for name in profile.author_names)
+            h_cutoff = max(float(profile.config["FILTERING"]["h_cutoff"]) for profile in author_profiles)
+            all_authors = get_authors_watchlist_first(paper_list, watchlist, h_cutoff, s2_api_key, self.config, cache=self.author_cache)
+        else:
+            all_authors = get_authors(list(dict.fromkeys(author for paper in paper_list for author in paper.authors)), s2_api_key, config=self.config, cache=self.author_cache)
+        return {"authors": all_authors}
+
+    def run_score(self, run, payload, task_id):
+        from arxiv_assistant.environment import get_context
+        from arxiv_assistant.filters.filter_gpt import filter_by_gpt, get_postfix_prompt_abstract
+        from arxiv_assistant.filters.priority import get_scoring_deadline
+
+        context = get_context()
+        profile = {profile.name: profile for profile in self.planner.get_profiles(run["params"])}[payload["profile"]]
+        # the batch size of the whole day, so that the batches are those of a single-process run
+        config = copy_config(profile.config)
+        config["SELECTION"]["adaptive_batch_size"] = "false"
+        config["SELECTION"]["abstract_batch_size"] = str(payload["batch_size"])
+        config["SELECTION"]["run_title_filter"] = str(payload.get("run_title_filter", config["SELECTION"].getboolean("run_title_filter"))).lower()
+        config["SELECTION"]["title_batch_size"] = str(payload.get("title_batch_size", config["SELECTION"]["title_batch_size"]))
+        config["SELECTION"]["plan_stages"] = "false"  # planned for the whole day by `Planner.plan_scores`
+        forced_ids = set(payload.get("forced", []))
+        paper_list = [paper_from_dict(paper) for paper in payload["papers"]]
+        selected_results, filtered_results, prompt_cost, completion_cost, prompt_tokens, completion_tokens, unscored_papers, saved_completion_tokens = filter_by_gpt(
+            [paper for paper in paper_list if paper.arxiv_id not in forced_ids],
+            context.system_prompt,
+            profile.topic_prompt,
+            profile.score_prompt,
+            context.postfix_prompt_title,
+            get_postfix_prompt_abstract(config),
+            config,
+            llm_cache=self.llm_cache,
+            debug_file_format=self.get_debug_file_format(profile.output_path, run["state"]["now_date"], task_id),
+            deadline=get_scoring_deadline(config, start_time=run["created"]),
+            forced_papers=[paper for paper in paper_list if paper.arxiv_id in forced_ids],
+        )
+        return {
+            "profile": profile.name,
+            "selected": results_to_fields(selected_results),
+            "filtered": results_to_fields(filtered_results),
+            "costs": [prompt_cost, completion_cost, prompt_tokens, completion_tokens, saved_completion_tokens],
+            "unscored": [paper.arxiv_id for paper in unscored_papers],
+        }
+
+    def run_merge(self, run, payload, task_id):
+        from arxiv_assistant.pipeline import write_profile_outputs
+        from arxiv_assistant.push_to_slack import get_slack_delivery
+        from arxiv_assistant.renderers.render_site import build_site
+        from arxiv_assistant.search_index import get_search_index
+        from arxiv_assistant.utils.utils import PaperResult
+
+        params, state = run["params"], run["state"]
+        profile = {profile.name: profile for profile in self.planner.get_profiles(params)}[payload["profile"]]
+        profile_state = state["profiles"][profile.name]
+        papers = {arxiv_id: paper_from_dict(paper) for arxiv_id, paper in state["papers"].items()}
+        arxiv_paper_dict = {area: [papers[arxiv_id] for arxiv_id in arxiv_ids] for area, arxiv_ids in state["areas"].items()}
+        selected_paper_dict = write_profile_outputs(
+            profile,
+            tuple(state["now_date"]),
+            state["entry_cnt"],
+            arxiv_paper_dict,
+            {arxiv_id: PaperResult(papers[arxiv_id], fields) for arxiv_id, fields in profile_state["selected"].items()},
+            {arxiv_id: PaperResult(papers[arxiv_id], fields) for arxiv_id, fields in profile_state["filtered"].items()},
+            tuple(profile_state["costs"]),
+            header=params["header"],
+            copy_to_latest=params["copy_to_latest"],
+            unscored_papers=[papers[arxiv_id] for arxiv_id in profile_state["unscored"]],
+        )
+        get_slack_delivery().wait()
+
+        # keep the search index and the site up to date as the pipeline does
+        if self.config["OUTPUT"].getboolean("update_search_index", fallback=True):
+            get_search_index(self.config).update(self.config["OUTPUT"]["output_path"])
+        if profile.config["OUTPUT"].getboolean("build_site", fallback=True) and profile.config["OUTPUT"].getboolean("dump_json"):
+            build_site(profile.output_path)
+        return {"profile": profile.name, "selected_cnt": len(selected_paper_dict)}
@@ -0,0 +1,292 @@
+"""
+Offline end-to-end benchmark of `main.py`.
+
+For each day size, a synthetic day is served by the local stand-ins (see `benchmarks/stand_ins.py`), and the unmodified
+`main.py --trace` runs against it in a scratch directory with a copy of the configs and prompts.
+Throughput and peak RSS of the whole run, time (and optionally memory) per stage, and latency percentiles per span category
+are read from the run's trace and written to `benchmarks/results/`. Pass `--compare` with an earlier result file to flag regressions.
+
+Examples:
+    python -m benchmarks.run_e2e --sizes 100,1000,20000
+    python -m benchmarks.run_e2e --sizes 1000 --latency 0.05 --jitter 0.05 --throttle-rate 0.05 --malformed-rate 0.1
+    python -m benchmarks.run_e2e --sizes 100,1000,20000 --compare benchmarks/results/baseline.json
+"""
+import argparse
+import configparser
+import glob
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from typing import Dict, List
+
+from benchmarks.stand_ins import StandInServer
+from benchmarks.synthetic import generate_day
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+LATENCY_CATEGORIES = ("fetch", "author", "llm", "parse", "push")
+# absolute growth ignored as noise when comparing, by metric unit
+MIN_DELTAS = {"ms": 5.0, "mb": 5.0, "s": 0.05}
+
+
+def percentile(values: List[float], q) -> float:
+    # nearest-rank percentile
+    if len(values) == 0:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(round(q / 100 * (len(values) - 1))), len(values) - 1)]
+
+
+def read_watched_authors(authors_path) -> Dict[str, str]:
+    from arxiv_assistant.environment import parse_authors
+
+    with open(authors_path, "r", encoding="utf-8") as f:
+        names, ids = parse_authors(f.readlines())
+    return dict(zip(names, ids))
+
+
+def prepare_workdir(workdir, args, categories):
+    # copies the configs and prompts, then points the config at the scratch dir and the benchmark options
+    shutil.copytree(os.path.join(REPO_DIR, "configs"), os.path.join(workdir, "configs"))
+    shutil.copytree(os.path.join(REPO_DIR, "prompts"), os.path.join(workdir, "prompts"))
+
+    config = configparser.ConfigParser()
+    config.read(os.path.join(workdir, "configs", "config.ini"))
+    config["SELECTION"]["run_author_match"] = str(args.author_match).lower()
+    config["SELECTION"]["run_openai"] = "true"
+    config["SELECTION"]["run_title_filter"] = str(args.title_filter).lower()
+    config["SELECTION"]["output_protocol"] = args.output_protocol
+    config["SELECTION"]["limit_per_minute"] = str(args.limit_per_minute)
+    config["FILTERING"]["arxiv_category"] = ", ".join(categories)
+    config["OUTPUT"]["output_path"] = "out/"
+    config["OUTPUT"]["cache_path"] = "out/cache/"
+    config["OUTPUT"]["dump_debug_file"] = str(args.dump_debug).lower()
+    config["OUTPUT"]["push_to_slack"] = str(args.slack).lower()
+    config["SELECTION"]["scoring_budget_minutes"] = str(args.scoring_budget_minutes)
+    config["OUTPUT"]["low_memory"] = str(args.low_memory).lower()
+    config["OUTPUT"]["max_rss_mb"] = str(args.max_rss_mb)
+    with open(os.path.join(workdir, "configs", "config.ini"), "w") as f:
+        config.write(f)
+
+
+def run_main(workdir, environment, trace_option, log_path):
+    # runs main.py in its own process, returns (return code, wall seconds, peak RSS in MB)
+    env = {**os.environ, **environment, "PYTHONPATH": REPO_DIR}
+    with open(log_path, "w") as log:
+        start_time = time.perf_counter()
+        process = subprocess.Popen([sys.executable, os.path.join(REPO_DIR, "main.py"), "--trace", trace_option], cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+        _, status, usage = os.wait4(process.pid, 0)
+        wall_time = time.perf_counter() - start_time
+    return os.waitstatus_to_exitcode(status), wall_time, usage.ru_maxrss / 1024  # ru_maxrss is in KB on Linux
+
+
+def summarize_trace(trace_path, num_papers) -> Dict:
+    with open(trace_path, "r") as f:
+        events = json.load(f)["traceEvents"]
+
+    stages = {}
+    for event in events:
+        if event["cat"] != "stage":
+            continue
+        stage = stages.setdefault(event["name"], {"seconds": 0.0, "memory_peak_mb": 0.0})
+        stage["seconds"] += event["dur"] / 1e6
+        stage["memory_peak_mb"] = max(stage["memory_peak_mb"], event["args"].get("memory_peak", 0) / 2 ** 20)
+    for stage in stages.values():
+        stage["papers_per_s"] = num_papers / stage["seconds"] if stage["seconds"] > 0 else None
+        stage["seconds"] = round(stage["seconds"], 4)
+        stage["memory_peak_mb"] = round(stage["memory_peak_mb"], 2)
+
+    latency = {}
+    for category in LATENCY_CATEGORIES:
+        category_events = [event for event in events if event["cat"] == category]
+        if len(category_events) == 0:
+            continue
+        durations = [event["dur"] / 1e3 for event in category_events]
+        latency[category] = {
+            "count": len(category_events),
+            "p50_ms": round(percentile(durations, 50), 3),
+            "p90_ms": round(percentile(durations, 90), 3),
+            "p99_ms": round(percentile(durations, 99), 3),
+            "max_ms": round(max(durations), 3),
+            "retries": sum(event["args"].get("retries", 0) for event in category_events),
+            "queue_wait_s": round(sum(event["args"].get("queue_wait", 0) for event in category_events), 3),
+            "bytes": sum(event["args"].get("bytes", 0) for event in category_events),
+        }
+
+    tokens = {
+        "prompt_tokens": sum(event["args"].get("prompt_tokens", 0) for event in events if event["cat"] == "llm"),
+        "completion_tokens": sum(event["args"].get("completion_tokens", 0) for event in events if event["cat"] == "llm"),
+    }
+    return {"stages": stages, "latency": latency, "tokens": tokens}
+
+
+def run_one_size(num_papers, args) -> Dict:
+    watched_authors = read_watched_authors(os.path.join(REPO_DIR, "configs", "authors.txt"))
+    day = generate_day(num_papers, seed=args.seed, watched_authors=watched_authors)
+    pipeline_papers = sum(1 for paper in day.papers if paper.announce_type == "new")  # replacements are dropped by `announce_type`
+
+    workdir = tempfile.mkdtemp(prefix=f"arxiv-bench-{num_papers}-")
+    prepare_workdir(workdir, args, day.categories)
+    trace_option = ",".join(["trace"] + (["cpu"] if args.cpu else []) + (["memory"] if args.memory else []))
+    server = StandInServer(
+        day,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        malformed_rate=args.malformed_rate,
+        fault_targets=[s.strip() for s in args.fault_targets.split(",") if s.strip()],
+        seed=args.seed,
+    )
+    environment = server.environment()
+    if args.author_match:
+        environment["S2_KEY"] = "benchmark"  # uses the keyed (faster) Semantic Scholar rate limit
+
+    print(f"Running {num_papers} papers ({pipeline_papers} new) in {workdir}")
+    with server:
+        returncode, wall_time, peak_rss_mb = run_main(workdir, environment, trace_option, os.path.join(workdir, "main.log"))
+        requests_stats = server.get_stats()
+
+    result = {
+        "papers": num_papers,
+        "pipeline_papers": pipeline_papers,
+        "returncode": returncode,
+        "wall_s": round(wall_time, 3),
+        "papers_per_s": round(pipeline_papers / wall_time, 2),
+        "peak_rss_mb": round(peak_rss_mb, 1),
+        "requests": requests_stats,
+    }
+    trace_paths = glob.glob(os.path.join(workdir, "out", "debug", "*", "*", "profile_trace.json"))
+    if returncode != 0 or len(trace_paths) == 0:
+        print(f"Run failed with return code {returncode}, see {os.path.join(workdir, 'main.log')}")
+        return result
+    result.update(summarize_trace(trace_paths[0], pipeline_papers))
+
+    if not args.keep_workdir:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return result
+
+
+def flatten_metrics(run: Dict) -> Dict[str, float]:
+    # the metrics compared between results, all of them "lower is better"
+    metrics = {"wall_s": run["wall_s"], "peak_rss_mb": run["peak_rss_mb"]}
+    for name, stage in run.get("stages", {}).items():
+        metrics[f"stage {name} s"] = stage["seconds"]
+        if stage["memory_peak_mb"] > 0:
+            metrics[f"stage {name} memory_peak_mb"] = stage["memory_peak_mb"]
+    for category, latency in run.get("latency", {}).items():
+        metrics[f"{category} p50_ms"] = latency["p50_ms"]
+        metrics[f"{category} p99_ms"] = latency["p99_ms"]
+    return metrics
+
+
+def get_min_delta(metric) -> float:
+    if metric.endswith("_ms"):
+        return MIN_DELTAS["ms"]
+    if metric.endswith("mb"):
+        return MIN_DELTAS["mb"]
+    return MIN_DELTAS["s"]
+
+
+def compare_results(result: Dict, baseline: Dict, threshold=0.2) -> List[List]:
+    """
+    Compare each metric of each day size against the baseline.
+    A metric regresses if it grows by more than `threshold` (relative) and by more than its `MIN_DELTAS` (absolute, to ignore noise on tiny values).
+    :return: table rows of [papers, metric, baseline, current, change, regressed]
+    """
+    baseline_runs = {run["papers"]: run for run in baseline["runs"]}
+    rows = []
+    for run in result["runs"]:
+        if run["papers"] not in baseline_runs:
+            continue
+        baseline_metrics = flatten_metrics(baseline_runs[run["papers"]])
+        for metric, value in flatten_metrics(run).items():
+            if metric not in baseline_metrics:
+                continue
+            baseline_value = baseline_metrics[metric]
+            change = (value - baseline_value) / baseline_value if baseline_value > 0 else 0.0
+            regressed = change > threshold and value - baseline_value > get_min_delta(metric)
+            rows.append([run["papers"], metric, baseline_value, value, f"{change:+.1%}", "REGRESSION" if regressed else ""])
+    return rows
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the offline end-to-end benchmark of main.py against local stand-in services.")
+    parser.add_argument("--sizes", type=str, default="100,1000,5000,20000", help="comma-separated numbers of papers per synthetic day")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every stand-in response")
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra uniformly random seconds added to every stand-in response")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="rate of 500 responses")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="rate of 429 responses")
+    parser.add_argument("--retry-after", type=int, default=1, help="`Retry-After` seconds of 429 responses")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="rate of malformed LLM outputs")
+    parser.add_argument("--fault-targets", type=str, default="s2,openai", help="services receiving errors, 429s and malformed outputs (arxiv, s2, openai, slack)")
+    parser.add_argument("--limit-per-minute", type=int, default=-1, help="`limit_per_minute` of the benchmarked config")
+    parser.add_argument("--author-match", action="store_true", help="run author matching (one Semantic Scholar query per distinct author)")
+    parser.add_argument("--title-filter", action="store_true", help="run the title filter before the abstract filter")
+    parser.add_argument("--output-protocol", type=str, default="jsonl", choices=["jsonl", "compact"], help="`output_protocol` of the benchmarked config")
+    parser.add_argument("--slack", action="store_true", help="push the results to the Slack stand-in")
+    parser.add_argument("--dump-debug", action="store_true", help="enable `dump_debug_file`")
+    parser.add_argument("--scoring-budget-minutes", type=float, default=0, help="`scoring_budget_minutes` of the benchmarked config")
+    parser.add_argument("--low-memory", action="store_true", help="enable `low_memory`")
+    parser.add_argument("--max-rss-mb", type=int, default=0, help="`max_rss_mb` of the benchmarked config")
+    parser.add_argument("--cpu", action="store_true", help="capture cProfile stats per stage (kept in the scratch dir with --keep-workdir)")
+    parser.add_argument("--memory", action="store_true", help="capture tracemalloc peaks per stage (slows the run down)")
+    parser.add_argument("--keep-workdir", action="store_true", help="keep the scratch dirs with logs and outputs")
+    parser.add_argument("--label", type=str, default=None, help="name of the result file (default: timestamp)")
+    parser.add_argument("--output-dir", type=str, default=os.path.join(REPO_DIR, "benchmarks", "results"))
+    parser.add_argument("--compare", type=str, default=None, help="a previous result file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="relative growth of a metric counted as a regression")
+    args = parser.parse_args()
+
+    from tabulate import tabulate
+
+    result = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": get_git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": {key: value for key, value in vars(args).items() if key not in ("output_dir", "compare", "label", "keep_workdir")},
+        "runs": [run_one_size(int(size), args) for size in args.sizes.split(",")],
+    }
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    result_path = os.path.join(args.output_dir, f"{args.label or datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(result_path, "w") as f:
+        json.dump(result, f, indent=4)
+
+    headers = ["Papers", "Wall (s)", "Papers/s", "Peak RSS (MB)"] + [f"{c} p50/p99 (ms)" for c in LATENCY_CATEGORIES]
+    data = [
+        [run["papers"], run["wall_s"], run["papers_per_s"], run["peak_rss_mb"]]
+        + [f"{run['latency'][c]['p50_ms']}/{run['latency'][c]['p99_ms']}" if c in run.get("latency", {}) else "" for c in LATENCY_CATEGORIES]
+        for run in result["runs"]
+    ]
+    print(tabulate(data, headers=headers, tablefmt="github"))
+    stage_names = sorted({name for run in result["runs"] for name in run.get("stages", {})})
+    data = [[run["papers"]] + [run["stages"][name]["seconds"] if name in run.get("stages", {}) else "" for name in stage_names] for run in result["runs"]]
+    print(tabulate(data, headers=["Papers"] + [f"{name} (s)" for name in stage_names], tablefmt="github"))
+    print(f"Results written to {result_path}")
+
+    failed = any(run["returncode"] != 0 for run in result["runs"])
+    if args.compare is not None:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        rows = compare_results(result, baseline, threshold=args.threshold)
+        print(tabulate(rows, headers=["Papers", "Metric", "Baseline", "Current", "Change", ""], tablefmt="github"))
+        regressions = [row for row in rows if row[-1]]
+        print(f"{len(regressions)} regressions beyond {args.threshold:.0%} against {args.compare}")
+        failed = failed or len(regressions) > 0
+    sys.exit(1 if failed else 0)
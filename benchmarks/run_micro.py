@@ -0,0 +1,301 @@
+"""
+Micro-benchmarks of the functions run once per paper or per LLM batch, without any service.
+
+Fixtures are built from a synthetic day (see `benchmarks/synthetic.py`, with the long author lists of large collaborations)
+at each size before timing: RSS entries parsed by feedparser from the stand-in feed, Semantic Scholar aliases of every author
+with the watched authors of `configs/authors.txt`, LLM outputs of the stand-in in both output protocols with a share of truncated
+(malformed) answers, and scored paper dicts for the renderers. Each case is timed `--repeats` times with the garbage collector off,
+and the fastest repeat is kept, as it is the least disturbed by the machine.
+Results are written to `benchmarks/results/`. Pass `--compare` with an earlier result file, e.g. the stored `micro_baseline.json`,
+to flag regressions.
+
+Examples:
+    python -m benchmarks.run_micro --sizes 1000,10000
+    python -m benchmarks.run_micro --sizes 1000,10000,100000 --compare benchmarks/results/micro_baseline.json
+    python -m benchmarks.run_micro --cases parse_chatgpt,parse_compact_output --repeats 10
+    python -m benchmarks.run_micro --sizes 1000,10000,100000 --label micro_baseline   # refresh the stored baseline
+"""
+import argparse
+import configparser
+import gc
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks.run_e2e import REPO_DIR, get_git_commit, read_watched_authors
+from benchmarks.stand_ins import answer_compact_prompt, answer_prompt, render_rss, search_author
+from benchmarks.synthetic import generate_day
+
+# a share of the LLM outputs are truncated in the middle of a line, like answers cut by `max_tokens`
+MALFORMED_RATE = 0.1
+# feedparser takes about a millisecond per entry, so larger days reuse the entries of a feed of this size
+MAX_PARSED_ENTRIES = 2000
+# absolute growth of the fastest repeat ignored as noise when comparing
+MIN_DELTA_S = 0.002
+
+
+class Case:
+    """
+    A benchmarked function: `setup(fixtures)` returns the arguments of one repeat (untimed), `run(*arguments)` is timed.
+    """
+
+    def __init__(self, name: str, run: Callable, setup: Callable, unit: str):
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.unit = unit  # what `items` counts, e.g. "papers" or "batches"
+
+
+def load_config():
+    config = configparser.ConfigParser()
+    config.read(os.path.join(REPO_DIR, "configs", "config.ini"))
+    config["OUTPUT"]["debug_messages"] = "false"
+    config["FILTERING"]["h_cutoff"] = "5"  # so that both branches of the h-index filter run
+    return config
+
+
+def read_prompt(name) -> str:
+    with open(os.path.join(REPO_DIR, "prompts", name), "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def build_fixtures(num_papers, seed) -> Dict:
+    import feedparser
+
+    from arxiv_assistant.filters.filter_gpt import get_paper_handle, paper_to_compact_string, paper_to_string, parse_chatgpt
+    from arxiv_assistant.utils.utils import Paper
+
+    config = load_config()
+    watched_authors = read_watched_authors(os.path.join(REPO_DIR, "configs", "authors.txt"))
+    day = generate_day(num_papers, seed=seed, watched_authors=watched_authors)
+    papers = [Paper(authors=paper.authors, title=paper.title, abstract=paper.abstract, arxiv_id=paper.arxiv_id) for paper in day.papers]
+    papers_by_id = {paper.arxiv_id: paper for paper in papers}
+
+    # RSS entries of the first category, cycled up to the size of the day
+    parsed_day = generate_day(min(num_papers, MAX_PARSED_ENTRIES), categories=day.categories[:1], cross_list_rate=0, seed=seed)
+    feed_entries = feedparser.parse(render_rss(parsed_day, day.categories[0]).decode("utf-8")).entries
+    rss_entries = [feed_entries[i % len(feed_entries)] for i in range(num_papers)]
+
+    all_authors = {}
+    for paper in papers:
+        for author in paper.authors:
+            if author not in all_authors:
+                all_authors[author] = search_author(day, author)["data"]
+
+    # LLM outputs, one per abstract batch
+    batch_size = int(config["SELECTION"]["abstract_batch_size"])
+    batches = [papers[i:i + batch_size] for i in range(0, len(papers), batch_size)]
+    batch_strings = [[paper_to_string(paper) for paper in batch] for batch in batches]
+    title_ids = {paper.title: paper.arxiv_id for paper in papers}
+    jsonl_outputs = []
+    compact_outputs = []
+    for i, (batch, batch_string) in enumerate(zip(batches, batch_strings)):
+        malformed = i % round(1 / MALFORMED_RATE) == 0
+        jsonl_outputs.append(answer_prompt("\n\n".join(batch_string), malformed=malformed))
+        handles = [get_paper_handle(j) for j in range(len(batch))]
+        compact_prompt = "\n\n".join(paper_to_compact_string(paper, handle) for paper, handle in zip(batch, handles))
+        compact_papers = [(handle, paper.title) for handle, paper in zip(handles, batch)]
+        compact_outputs.append((answer_compact_prompt(compact_prompt, compact_papers, title_ids, malformed=malformed), dict(zip(handles, [paper.arxiv_id for paper in batch]))))
+
+    # the parsed scores of the papers, as written to the outputs
+    scored_dicts = []
+    for jdict in (jdict for output in jsonl_outputs for jdict in parse_chatgpt(output, config)[0]):
+        paper = papers_by_id[jdict["ARXIVID"]]
+        scored_dicts.append({**paper.to_dict(), **jdict, "SCORE": jdict["RELEVANCE"] + jdict["NOVELTY"]})
+
+    return {
+        "config": config,
+        "papers": papers,
+        "rss_entries": rss_entries,
+        "all_authors": all_authors,
+        "author_targets": list(watched_authors.values()),
+        "batch_strings": batch_strings,
+        "prompts": (read_prompt("paper_topics.txt"), read_prompt("score_criteria.txt"), read_prompt("postfix_prompt_abstract.txt")),
+        "jsonl_outputs": jsonl_outputs,
+        "compact_outputs": compact_outputs,
+        "scored_dicts": scored_dicts,
+    }
+
+
+def get_cases() -> List[Case]:
+    from arxiv_assistant.apis.arxiv import paper_from_rss_entry
+    from arxiv_assistant.filters.filter_author import AuthorIndex, filter_papers_by_hindex, select_by_author
+    from arxiv_assistant.filters.filter_gpt import get_user_prompt_for_abstract_filtering, paper_to_string, parse_chatgpt, parse_compact_output
+    from arxiv_assistant.push_to_slack import render_paper
+    from arxiv_assistant.renderers.render_daily import render_paper_content
+
+    return [
+        Case("paper_to_string", lambda papers: [paper_to_string(paper) for paper in papers], lambda f: (f["papers"],), "papers"),
+        Case(
+            "get_user_prompt_for_abstract_filtering",
+            lambda prompts, batch_strings: [get_user_prompt_for_abstract_filtering(*prompts, batch_string) for batch_string in batch_strings],
+            lambda f: (f["prompts"], f["batch_strings"]),
+            "batches",
+        ),
+        Case(
+            "parse_chatgpt",
+            lambda outputs, config: [parse_chatgpt(output, config) for output in outputs],
+            lambda f: (f["jsonl_outputs"], f["config"]),
+            "batches",
+        ),
+        Case(
+            "parse_compact_output",
+            lambda outputs, config: [parse_compact_output(output, handle_ids, config) for output, handle_ids in outputs],
+            lambda f: (f["compact_outputs"], f["config"]),
+            "batches",
+        ),
+        Case("paper_from_rss_entry", lambda entries: [paper_from_rss_entry(entry) for entry in entries], lambda f: (f["rss_entries"],), "papers"),
+        Case("author_index", lambda all_authors: AuthorIndex(all_authors), lambda f: (f["all_authors"],), "names"),
+        # a fresh index per repeat for the filters, as its per-paper lookups are cached
+        Case(
+            "select_by_author",
+            lambda f, index: select_by_author(f["all_authors"], f["papers"], f["author_targets"], f["config"], author_index=index),
+            lambda f: (f, AuthorIndex(f["all_authors"])),
+            "papers",
+        ),
+        Case(
+            "filter_papers_by_hindex",
+            lambda f, index: filter_papers_by_hindex(f["all_authors"], f["papers"], f["config"], author_index=index),
+            lambda f: (f, AuthorIndex(f["all_authors"])),
+            "papers",
+        ),
+        Case("render_paper_content", lambda dicts: [render_paper_content(d, i) for i, d in enumerate(dicts)], lambda f: (f["scored_dicts"],), "papers"),
+        Case("slack render_paper", lambda dicts: [render_paper(d, i) for i, d in enumerate(dicts)], lambda f: (f["scored_dicts"],), "papers"),
+    ]
+
+
+def count_items(case: Case, fixtures: Dict) -> int:
+    if case.unit == "batches":
+        return len(fixtures["batch_strings"])
+    if case.unit == "names":
+        return len(fixtures["all_authors"])
+    return len(fixtures["papers"])
+
+
+def time_case(case: Case, fixtures: Dict, repeats: int) -> Tuple[float, float]:
+    # (fastest, median) seconds over the repeats
+    seconds = []
+    for _ in range(repeats):
+        arguments = case.setup(fixtures)
+        gc.collect()
+        gc.disable()
+        try:
+            start_time = time.perf_counter()
+            case.run(*arguments)
+            seconds.append(time.perf_counter() - start_time)
+        finally:
+            gc.enable()
+    seconds.sort()
+    return seconds[0], seconds[len(seconds) // 2]
+
+
+def run_one_size(num_papers, cases: List[Case], args) -> Dict:
+    start_time = time.perf_counter()
+    fixtures = build_fixtures(num_papers, args.seed)
+    print(f"Built the fixtures of {num_papers} papers in {time.perf_counter() - start_time:.1f}s")
+
+    results = {}
+    for case in cases:
+        # repeats are fewer on large days, their timings are steadier
+        repeats = args.repeats if num_papers < 100000 else max(args.repeats // 2, 1)
+        min_s, median_s = time_case(case, fixtures, repeats)
+        items = count_items(case, fixtures)
+        results[case.name] = {
+            "unit": case.unit,
+            "items": items,
+            "repeats": repeats,
+            "min_s": round(min_s, 5),
+            "median_s": round(median_s, 5),
+            "us_per_item": round(min_s / items * 1e6, 3) if items > 0 else 0.0,
+        }
+        print(f"{num_papers} papers, {case.name}: {min_s:.4f}s ({results[case.name]['us_per_item']} us per item, {items} {case.unit})")
+
+    # the Python string functions are under test, not the fixtures
+    del fixtures
+    gc.collect()
+    return {"papers": num_papers, "cases": results}
+
+
+def compare_results(result: Dict, baseline: Dict, threshold=0.25) -> List[List]:
+    """
+    Compare the fastest repeat of each case and day size against the baseline.
+    A case regresses if it grows by more than `threshold` (relative) and by more than `MIN_DELTA_S` (absolute, to ignore noise on tiny values).
+    :return: table rows of [papers, case, baseline, current, change, regressed]
+    """
+    baseline_runs = {run["papers"]: run for run in baseline["runs"]}
+    rows = []
+    for run in result["runs"]:
+        if run["papers"] not in baseline_runs:
+            continue
+        baseline_cases = baseline_runs[run["papers"]]["cases"]
+        for name, case in run["cases"].items():
+            if name not in baseline_cases:
+                continue
+            baseline_value = baseline_cases[name]["min_s"]
+            value = case["min_s"]
+            change = (value - baseline_value) / baseline_value if baseline_value > 0 else 0.0
+            regressed = change > threshold and value - baseline_value > MIN_DELTA_S
+            rows.append([run["papers"], name, baseline_value, value, f"{change:+.1%}", "REGRESSION" if regressed else ""])
+    return rows
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the micro-benchmarks of the per-paper and per-batch functions.")
+    parser.add_argument("--sizes", type=str, default="1000,10000,100000", help="comma-separated numbers of papers per synthetic day")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeats", type=int, default=5, help="timed repeats of each case (halved for 100k papers and more)")
+    parser.add_argument("--cases", type=str, default=None, help="comma-separated case names to run (default: all)")
+    parser.add_argument("--label", type=str, default=None, help="name of the result file (default: micro-<timestamp>)")
+    parser.add_argument("--output-dir", type=str, default=os.path.join(REPO_DIR, "benchmarks", "results"))
+    parser.add_argument("--compare", type=str, default=None, help="a previous result file to compare against")
+    parser.add_argument("--threshold", type=float, default=0.25, help="relative growth of a case counted as a regression")
+    args = parser.parse_args()
+
+    from tabulate import tabulate
+
+    cases = get_cases()
+    if args.cases is not None:
+        names = {name.strip() for name in args.cases.split(",")}
+        unknown_names = names - {case.name for case in cases}
+        if len(unknown_names) > 0:
+            parser.error(f"unknown cases {sorted(unknown_names)}, expected some of {[case.name for case in cases]}")
+        cases = [case for case in cases if case.name in names]
+
+    result = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": get_git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": {key: value for key, value in vars(args).items() if key not in ("output_dir", "compare", "label")},
+        "runs": [run_one_size(int(size), cases, args) for size in args.sizes.split(",")],
+    }
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    result_path = os.path.join(args.output_dir, f"{args.label or 'micro-' + datetime.now().strftime('%Y%m%d-%H%M%S')}.json")
+    with open(result_path, "w") as f:
+        json.dump(result, f, indent=4)
+
+    sizes = [run["papers"] for run in result["runs"]]
+    data = [
+        [case.name, case.unit] + [
+            f"{run['cases'][case.name]['min_s']:.4f} ({run['cases'][case.name]['us_per_item']})" for run in result["runs"]
+        ]
+        for case in cases
+    ]
+    print(tabulate(data, headers=["Case", "Per"] + [f"{size} papers: s (us per item)" for size in sizes], tablefmt="github"))
+    print(f"Results written to {result_path}")
+
+    failed = False
+    if args.compare is not None:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+        rows = compare_results(result, baseline, threshold=args.threshold)
+        print(tabulate(rows, headers=["Papers", "Case", "Baseline (s)", "Current (s)", "Change", ""], tablefmt="github"))
+        regressions = [row for row in rows if row[-1]]
+        print(f"{len(regressions)} regressions beyond {args.threshold:.0%} against {args.compare}")
+        failed = len(regressions) > 0
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,147 @@
+"""
+Local multi-process harness of the sharded workers (see `arxiv_assistant/workers.py`).
+
+A synthetic day is served by the local stand-ins and backfilled twice in scratch directories:
+once by the single-process backfill (`python -m scripts.backfill`), and once by `python -m scripts.workers local` with N worker processes.
+The selected papers and scores of both `output.json` files must match. Some workers can be killed mid-run (`--kill`)
+to check that their leased tasks are taken over once their leases expire.
+
+Examples:
+    python -m benchmarks.run_workers --papers 2000 --workers 4
+    python -m benchmarks.run_workers --papers 2000 --workers 4 --latency 0.02 --kill 1 --lease 5
+"""
+import argparse
+import glob
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+from benchmarks.run_e2e import REPO_DIR, prepare_workdir, read_watched_authors
+from benchmarks.stand_ins import StandInServer
+from benchmarks.synthetic import generate_day
+
+
+def get_announce_date() -> date:
+    # the last weekday, any date works with the stand-ins
+    this_date = date.today() - timedelta(days=1)
+    while this_date.weekday() >= 5:
+        this_date -= timedelta(days=1)
+    return this_date
+
+
+def run_command(command, workdir, environment, log_path) -> float:
+    env = {**os.environ, **environment, "PYTHONPATH": REPO_DIR}
+    start_time = time.perf_counter()
+    with open(log_path, "w") as log:
+        returncode = subprocess.run(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT).returncode
+    if returncode != 0:
+        raise RuntimeError(f"{' '.join(command)} failed with return code {returncode}, see {log_path}")
+    return time.perf_counter() - start_time
+
+
+def run_killed_workers(workdir, environment, log_path, queue_path, workers, kill, lease) -> float:
+    # starts `workers` processes, kills `kill` of them once they hold tasks, and starts a fresh one to finish with the rest
+    env = {**os.environ, **environment, "PYTHONPATH": REPO_DIR}
+    start_time = time.perf_counter()
+    with open(log_path, "w") as log:
+        def start(name):
+            command = [sys.executable, "-m", "scripts.workers", "--queue", queue_path, "work", "--name", name, "--lease", str(lease)]
+            return subprocess.Popen(command, cwd=workdir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+        processes = [start(f"local{i}") for i in range(workers)]
+        time.sleep(2.0)
+        for process in processes[:kill]:
+            process.kill()
+        # the survivors may exit before the killed leases expire, so one more worker keeps polling until the queue is idle
+        time.sleep(lease)
+        processes.append(start("takeover"))
+        failed_cnt = sum(process.wait() not in (0, -9) for process in processes)
+    if failed_cnt > 0:
+        raise RuntimeError(f"{failed_cnt} workers failed, see {log_path}")
+    return time.perf_counter() - start_time
+
+
+def load_output(workdir):
+    paths = glob.glob(os.path.join(workdir, "out", "json", "*", "*-output.json"))
+    if len(paths) != 1:
+        raise RuntimeError(f"Expected one output.json in {workdir}, found {len(paths)}")
+    with open(paths[0], "r") as f:
+        return json.load(f)
+
+
+def compare_outputs(single, sharded):
+    # the same papers with the same scores, the order of ties may differ
+    differences = []
+    for arxiv_id in sorted(set(single) | set(sharded)):
+        if arxiv_id not in sharded:
+            differences.append(f"{arxiv_id} only selected by the single process")
+        elif arxiv_id not in single:
+            differences.append(f"{arxiv_id} only selected by the workers")
+        elif single[arxiv_id].get("SCORE") != sharded[arxiv_id].get("SCORE"):
+            differences.append(f"{arxiv_id} scored {single[arxiv_id].get('SCORE')} and {sharded[arxiv_id].get('SCORE')}")
+    return differences
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare a sharded backfill with local worker processes against the single-process backfill.")
+    parser.add_argument("--papers", type=int, default=2000, help="number of papers of the synthetic day")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every stand-in response")
+    parser.add_argument("--author-match", action="store_true", help="run author matching")
+    parser.add_argument("--title-filter", action="store_true", help="run the title filter before the abstract filter")
+    parser.add_argument("--kill", type=int, default=0, help="number of workers killed mid-run")
+    parser.add_argument("--lease", type=float, default=10.0, help="lease of the workers in seconds")
+    parser.add_argument("--keep-workdir", action="store_true")
+    args = parser.parse_args()
+
+    day = generate_day(args.papers, seed=args.seed, watched_authors=read_watched_authors(os.path.join(REPO_DIR, "configs", "authors.txt")))
+    bench_args = argparse.Namespace(
+        author_match=args.author_match, title_filter=args.title_filter, output_protocol="jsonl", limit_per_minute=-1, dump_debug=False, slack=False,
+        scoring_budget_minutes=0, low_memory=False, max_rss_mb=0,
+    )
+    announce_date = get_announce_date().isoformat()
+    single_dir = tempfile.mkdtemp(prefix="arxiv-workers-single-")
+    sharded_dir = tempfile.mkdtemp(prefix="arxiv-workers-sharded-")
+    for workdir in (single_dir, sharded_dir):
+        prepare_workdir(workdir, bench_args, day.categories)
+
+    with StandInServer(day, latency=args.latency, seed=args.seed) as server:
+        environment = server.environment()
+        if args.author_match:
+            environment["S2_KEY"] = "benchmark"
+        single_time = run_command(
+            [sys.executable, "-m", "scripts.backfill", "--begin", announce_date, "--workers", "1"],
+            single_dir, environment, os.path.join(single_dir, "backfill.log"),
+        )
+        print(f"Single process: {single_time:.2f}s")
+
+        queue_path = os.path.join(sharded_dir, "out", "cache", "work_queue.sqlite")
+        if args.kill > 0:
+            run_command([sys.executable, "-m", "scripts.workers", "submit", "--begin", announce_date], sharded_dir, environment, os.path.join(sharded_dir, "submit.log"))
+            sharded_time = run_killed_workers(sharded_dir, environment, os.path.join(sharded_dir, "workers.log"), queue_path, args.workers, args.kill, args.lease)
+        else:
+            sharded_time = run_command(
+                [sys.executable, "-m", "scripts.workers", "local", "--workers", str(args.workers), "--begin", announce_date],
+                sharded_dir, environment, os.path.join(sharded_dir, "workers.log"),
+            )
+        print(f"{args.workers} workers{f' ({args.kill} killed)' if args.kill > 0 else ''}: {sharded_time:.2f}s")
+
+    single_output, sharded_output = load_output(single_dir), load_output(sharded_dir)
+    differences = compare_outputs(single_output, sharded_output)
+    print(f"Selected papers: {len(single_output)} (single process), {len(sharded_output)} (workers)")
+    if differences:
+        print(f"{len(differences)} differences:\n" + "\n".join(differences[:20]))
+    else:
+        print("The outputs match")
+    if args.keep_workdir:
+        print(f"Kept {single_dir} and {sharded_dir}")
+    else:
+        shutil.rmtree(single_dir, ignore_errors=True)
+        shutil.rmtree(sharded_dir, ignore_errors=True)
+    sys.exit(1 if differences else 0)
@@ -0,0 +1,391 @@
+"""
+Local stand-ins for every external service the pipeline talks to, served from one threaded HTTP server:
+    GET  /rss/<area>                  arXiv RSS 2.0 feed of a synthetic day
+    GET  /api/query                   arXiv API (Atom) search, `cat:<area>` queries only
+    GET  /oai2                        arXiv OAI-PMH `ListRecords` (arXiv metadata format), paged with resumption tokens
+    GET  /graph/v1/author/search      Semantic Scholar author search
+    POST /v1/chat/completions         OpenAI chat completions, answering title and abstract prompts in the expected formats
+    POST /api/chat.postMessage        Slack
+
+Latency, jitter, server errors, 429 throttling (with `Retry-After`) and malformed LLM outputs are injected at configurable rates
+for the services in `fault_targets`. All randomness is seeded, so two runs with the same options see the same faults.
+"""
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from collections import Counter
+from datetime import timedelta
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Iterable
+from urllib.parse import parse_qs, urlparse
+from xml.sax.saxutils import escape
+
+from benchmarks.synthetic import SyntheticDay
+
+ARXIV_ID_PATTERN = re.compile(r"ArXiv ID: (\S+)")
+COMPACT_PAPER_PATTERN = re.compile(r"^Paper: (\S+)\nTitle: (.*)$", re.MULTILINE)
+COMPACT_CUTOFF_PATTERN = re.compile(r"RELEVANCE is at least (\d+) and NOVELTY is at least (\d+)")
+
+
+def stable_hash(string) -> int:
+    return zlib.crc32(string.encode("utf-8"))
+
+
+def render_rss(day: SyntheticDay, area) -> bytes:
+    published = format_datetime(day.announce_time)
+    items = []
+    for paper, announce_type in day.feed_papers(area):
+        categories = [paper.primary_category] + paper.cross_categories
+        items.append(
+            "<item>"
+            f"<title>{escape(paper.title)}</title>"
+            f"<link>https://arxiv.org/abs/{paper.arxiv_id}</link>"
+            f"<description>{escape(f'arXiv:{paper.arxiv_id}v1 Announce Type: {announce_type} ' + chr(10) + 'Abstract: ' + paper.abstract)}</description>"
+            f"<guid isPermaLink=\"false\">oai:arXiv.org:{paper.arxiv_id}v1</guid>"
+            + "".join(f"<category>{category}</category>" for category in categories)
+            + f"<pubDate>{published}</pubDate>"
+            f"<arxiv:announce_type>{announce_type}</arxiv:announce_type>"
+            "<dc:rights>http://creativecommons.org/licenses/by/4.0/</dc:rights>"
+            f"<dc:creator>{escape(', '.join(paper.authors))}</dc:creator>"
+            "</item>"
+        )
+    return (
+        "<?xml version='1.0' encoding='UTF-8'?>\n"
+        "<rss xmlns:arxiv=\"http://arxiv.org/schemas/atom\" xmlns:dc=\"http://purl.org/dc/elements/1.1/\" "
+        "xmlns:atom=\"http://www.w3.org/2005/Atom\" xmlns:content=\"http://purl.org/rss/1.0/modules/content/\" version=\"2.0\">"
+        f"<channel><title>{area} updates on arXiv.org</title><link>http://rss.arxiv.org/rss/{area}</link>"
+        f"<description>{area} updates on the arXiv.org e-print archive.</description>"
+        f"<lastBuildDate>{published}</lastBuildDate><language>en-us</language>"
+        + "".join(items)
+        + "</channel></rss>"
+    ).encode("utf-8")
+
+
+def render_atom(day: SyntheticDay, area) -> bytes:
+    entries = []
+    for paper, _ in day.feed_papers(area):
+        entries.append(
+            "<entry>"
+            f"<id>http://arxiv.org/abs/{paper.arxiv_id}v1</id>"
+            f"<title>{escape(paper.title)}</title>"
+            f"<summary>{escape(paper.abstract)}</summary>"
+            + "".join(f"<author><name>{escape(author)}</name></author>" for author in paper.authors)
+            + f"<arxiv:primary_category term=\"{paper.primary_category}\" scheme=\"http://arxiv.org/schemas/atom\"/>"
+            "</entry>"
+        )
+    return (
+        "<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n"
+        "<feed xmlns=\"http://www.w3.org/2005/Atom\" xmlns:arxiv=\"http://arxiv.org/schemas/atom\">"
+        f"<title>arXiv Query: cat:{area}</title>"
+        + "".join(entries)
+        + "</feed>"
+    ).encode("utf-8")
+
+
+def get_archive_set(category) -> str:
+    archive = category.split(".")[0]
+    return archive if archive in ("cs", "math", "stat", "econ", "eess", "q-bio", "q-fin") else f"physics:{archive}"
+
+
+def render_oai(day: SyntheticDay, params, page_size) -> bytes:
+    # every paper has the announcement date as its datestamp and is listed in the sets of all its categories
+    # the resumption token is "<set>|<from>|<until>|<offset>"
+    if "resumptionToken" in params:
+        set_spec, from_date, until_date, offset = params["resumptionToken"].split("|")
+        offset = int(offset)
+    else:
+        set_spec, from_date, until_date, offset = params.get("set", ""), params.get("from", "0000-00-00"), params.get("until", "9999-99-99"), 0
+    datestamp = day.announce_time.date()
+    papers = [
+        paper for paper in day.papers
+        if from_date <= datestamp.isoformat() <= until_date and set_spec in {get_archive_set(c) for c in [paper.primary_category] + paper.cross_categories}
+    ]
+    head = (
+        "<?xml version=\"1.0\" encoding=\"UTF-8\"?>\n"
+        "<OAI-PMH xmlns=\"http://www.openarchives.org/OAI/2.0/\"><responseDate>2025-02-19T00:00:00Z</responseDate><request>http://export.arxiv.org/oai2</request>"
+    )
+    if len(papers) == 0:
+        return (head + "<error code=\"noRecordsMatch\">No records</error></OAI-PMH>").encode("utf-8")
+    records = []
+    for paper in papers[offset:offset + page_size]:
+        created = datestamp - timedelta(days=30 if paper.announce_type == "replace" else 1)
+        authors = "".join(
+            f"<author><keyname>{escape(author.split(' ', 1)[-1])}</keyname><forenames>{escape(author.split(' ', 1)[0])}</forenames></author>"
+            for author in paper.authors
+        )
+        records.append(
+            "<record><header>"
+            f"<identifier>oai:arXiv.org:{paper.arxiv_id}</identifier><datestamp>{datestamp.isoformat()}</datestamp><setSpec>{set_spec}</setSpec>"
+            "</header><metadata><arXiv xmlns=\"http://arxiv.org/OAI/arXiv/\">"
+            f"<id>{paper.arxiv_id}</id><created>{created.isoformat()}</created>"
+            + (f"<updated>{(datestamp - timedelta(days=1)).isoformat()}</updated>" if paper.announce_type == "replace" else "")
+            + f"<authors>{authors}</authors><title>{escape(paper.title)}</title>"
+            f"<categories>{' '.join([paper.primary_category] + paper.cross_categories)}</categories>"
+            f"<abstract>{escape(paper.abstract)}</abstract>"
+            "</arXiv></metadata></record>"
+        )
+    next_offset = offset + page_size
+    token = f"{set_spec}|{from_date}|{until_date}|{next_offset}" if next_offset < len(papers) else ""
+    return (
+        head + "<ListRecords>" + "".join(records)
+        + f"<resumptionToken cursor=\"{offset}\" completeListSize=\"{len(papers)}\">{escape(token)}</resumptionToken>"
+        + "</ListRecords></OAI-PMH>"
+    ).encode("utf-8")
+
+
+def search_author(day: SyntheticDay, name):
+    # one to three candidates per name, watched authors resolve to their ids first
+    rng = random.Random(stable_hash(name))
+    data = []
+    if name in day.watched_authors:
+        data.append({"authorId": day.watched_authors[name], "name": name, "hIndex": rng.randint(10, 80)})
+    for i in range(rng.randint(0 if len(data) > 0 else 1, 2)):
+        data.append({"authorId": str(stable_hash(f"{name}/{i}")), "name": name, "hIndex": int(rng.paretovariate(1.2)) - 1})
+    return {"total": len(data), "offset": 0, "data": data}
+
+
+def answer_prompt(user_prompt, malformed=False, title_ids=None) -> str:
+    # answers like a model would, scores are derived from the arxiv id so that reruns agree
+    # (papers of the compact output protocol are identified by handles, and their arxiv id is looked up in `title_ids`)
+    compact_papers = COMPACT_PAPER_PATTERN.findall(user_prompt)
+    if len(compact_papers) > 0:
+        return answer_compact_prompt(user_prompt, compact_papers, title_ids or {}, malformed=malformed)
+    arxiv_ids = ARXIV_ID_PATTERN.findall(user_prompt)
+    if "\nAbstract: " not in user_prompt:
+        # title filtering: a JSON list of irrelevant papers
+        if malformed:
+            return "Here are the irrelevant papers: " + ", ".join(arxiv_ids[:3])
+        return json.dumps([arxiv_id for arxiv_id in arxiv_ids if stable_hash(arxiv_id) % 5 == 0])
+
+    # abstract filtering: JSONL lines of scores
+    lines = []
+    for arxiv_id in arxiv_ids:
+        rng = random.Random(stable_hash(arxiv_id))
+        lines.append(json.dumps({
+            "ARXIVID": arxiv_id,
+            "COMMENT": "Matches criterion 2 on simulations of galaxy formation." if rng.random() < 0.2 else "No close criterion match.",
+            "RELEVANCE": rng.randint(1, 10),
+            "NOVELTY": rng.randint(1, 10),
+        }))
+    if malformed and len(lines) > 0:
+        # a truncated answer: the last lines are missing and one line is cut in the middle
+        lines = lines[:len(lines) // 2 + 1]
+        lines[-1] = lines[-1][:len(lines[-1]) // 2]
+    return "```jsonl\n" + "\n".join(lines) + "\n```"
+
+
+def answer_compact_prompt(user_prompt, compact_papers, title_ids, malformed=False) -> str:
+    # the scores of `answer_prompt`, as HANDLE|RELEVANCE|NOVELTY|COMMENT lines with comments only above the cutoffs of the prompt
+    cutoffs = COMPACT_CUTOFF_PATTERN.search(user_prompt)
+    relevance_cutoff, novelty_cutoff = (int(cutoffs.group(1)), int(cutoffs.group(2))) if cutoffs is not None else (0, 0)
+    lines = []
+    for handle, title in compact_papers:
+        rng = random.Random(stable_hash(title_ids.get(title, title)))
+        comment = "Matches criterion 2 on simulations of galaxy formation." if rng.random() < 0.2 else "No close criterion match."
+        relevance, novelty = rng.randint(1, 10), rng.randint(1, 10)
+        if relevance >= relevance_cutoff and novelty >= novelty_cutoff:
+            lines.append(f"{handle}|{relevance}|{novelty}|{comment}")
+        else:
+            lines.append(f"{handle}|{relevance}|{novelty}")
+    if malformed and len(lines) > 0:
+        lines = lines[:len(lines) // 2 + 1]
+        lines[-1] = lines[-1][:len(lines[-1]) // 2]
+    return "\n".join(lines)
+
+
+def count_tokens(text) -> int:
+    # rough estimate, about 4 characters per token
+    return max(len(text) // 4, 1)
+
+
+class StandInServer:
+    def __init__(
+        self,
+        day: SyntheticDay,
+        host="127.0.0.1",
+        port=0,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        throttle_rate=0.0,
+        retry_after=1,
+        malformed_rate=0.0,
+        fault_targets: Iterable[str] = ("s2", "openai"),
+        seed=0,
+        oai_page_size=1000,
+    ):
+        self.day = day
+        self.oai_page_size = oai_page_size
+        self.title_ids = {paper.title: paper.arxiv_id for paper in day.papers}
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.malformed_rate = malformed_rate
+        self.fault_targets = set(fault_targets)
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.stats = Counter()  # (service, outcome) -> count
+        self.stats_lock = threading.Lock()
+        self.rendered = {}  # rendered feeds are reused across requests
+        self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def environment(self):
+        # environment variables pointing the pipeline at this server
+        return {
+            "ARXIV_BASE_URL": self.base_url,
+            "S2_BASE_URL": self.base_url,
+            "OPENAI_BASE_URL": f"{self.base_url}/v1",
+            "OPENAI_API_KEY": "benchmark",
+            "SLACK_BASE_URL": f"{self.base_url}/api/",
+            "SLACK_KEY": "xoxb-benchmark",
+            "SLACK_CHANNEL_ID": "CBENCHMARK",
+        }
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def random(self) -> float:
+        with self.rng_lock:
+            return self.rng.random()
+
+    def record(self, service, outcome):
+        with self.stats_lock:
+            self.stats[(service, outcome)] += 1
+
+    def get_stats(self):
+        with self.stats_lock:
+            return {f"{service} {outcome}": count for (service, outcome), count in sorted(self.stats.items())}
+
+    def get_feed(self, kind, area) -> bytes:
+        key = (kind, area)
+        if key not in self.rendered:
+            self.rendered[key] = render_rss(self.day, area) if kind == "rss" else render_atom(self.day, area)
+        return self.rendered[key]
+
+    def make_handler(self):
+        stand_in = self
+
+        class StandInHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like the real services
+            disable_nagle_algorithm = True  # headers and body are written separately, avoid the delayed-ACK stall
+
+            def send_body(self, code, body: bytes, content_type, headers=None):
+                self.send_response(code)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def send_json(self, code, body, headers=None):
+                self.send_body(code, json.dumps(body).encode("utf-8"), "application/json", headers)
+
+            def read_body(self):
+                length = int(self.headers.get("Content-Length", 0))
+                return self.rfile.read(length) if length > 0 else b""
+
+            def inject_faults(self, service) -> bool:
+                # sleeps for the configured latency, then possibly answers with an error, returns True if it did
+                delay = stand_in.latency + stand_in.jitter * stand_in.random()
+                if delay > 0:
+                    time.sleep(delay)
+                if service not in stand_in.fault_targets:
+                    return False
+                if stand_in.random() < stand_in.throttle_rate:
+                    stand_in.record(service, "429")
+                    self.send_json(429, {"error": {"message": "Rate limit exceeded", "type": "rate_limit"}}, {"Retry-After": str(stand_in.retry_after)})
+                    return True
+                if stand_in.random() < stand_in.error_rate:
+                    stand_in.record(service, "500")
+                    self.send_json(500, {"error": {"message": "Internal server error", "type": "server_error"}})
+                    return True
+                return False
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = parse_qs(url.query)
+                if url.path.startswith("/rss/"):
+                    if not self.inject_faults("arxiv"):
+                        stand_in.record("arxiv", "200")
+                        self.send_body(200, stand_in.get_feed("rss", url.path[len("/rss/"):]), "application/rss+xml")
+                elif url.path == "/api/query":
+                    if not self.inject_faults("arxiv"):
+                        # search_query looks like "cat:<area> AND submittedDate:[...]"
+                        area = query.get("search_query", [""])[0].split(" ")[0].replace("cat:", "")
+                        stand_in.record("arxiv", "200")
+                        self.send_body(200, stand_in.get_feed("atom", area), "application/atom+xml")
+                elif url.path == "/oai2":
+                    if not self.inject_faults("arxiv"):
+                        stand_in.record("arxiv", "200")
+                        params = {key: values[0] for key, values in query.items()}
+                        self.send_body(200, render_oai(stand_in.day, params, stand_in.oai_page_size), "text/xml")
+                elif url.path == "/graph/v1/author/search":
+                    if not self.inject_faults("s2"):
+                        stand_in.record("s2", "200")
+                        self.send_json(200, search_author(stand_in.day, query.get("query", [""])[0]))
+                else:
+                    self.send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                body = self.read_body()
+                if url.path == "/v1/chat/completions":
+                    if self.inject_faults("openai"):
+                        return
+                    request = json.loads(body)
+                    prompt = "\n".join(message["content"] for message in request["messages"])
+                    user_prompt = request["messages"][-1]["content"]
+                    malformed = "openai" in stand_in.fault_targets and stand_in.random() < stand_in.malformed_rate
+                    content = answer_prompt(user_prompt, malformed=malformed, title_ids=stand_in.title_ids)
+                    stand_in.record("openai", "malformed" if malformed else "200")
+                    prompt_tokens, completion_tokens = count_tokens(prompt), count_tokens(content)
+                    self.send_json(200, {
+                        "id": f"chatcmpl-{stable_hash(user_prompt)}",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": request["model"],
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                        "usage": {
+                            "prompt_tokens": prompt_tokens,
+                            "completion_tokens": completion_tokens,
+                            "total_tokens": prompt_tokens + completion_tokens,
+                            "prompt_tokens_details": {"cached_tokens": 0},
+                        },
+                    })
+                elif url.path == "/api/chat.postMessage":
+                    if not self.inject_faults("slack"):
+                        stand_in.record("slack", "200")
+                        self.send_json(200, {"ok": True, "channel": "CBENCHMARK", "ts": f"{time.time():.6f}"})
+                else:
+                    self.send_json(404, {"error": "not found"})
+
+            def log_message(self, format, *args):
+                pass
+
+        return StandInHandler
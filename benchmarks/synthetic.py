@@ -0,0 +1,118 @@
+"""
+Deterministic synthetic arXiv days for the offline benchmarks.
+
+A day is a list of papers, each with a primary category and optional cross-lists into other categories of the day,
+so the same paper shows up in several feeds exactly like on arXiv.
+Author lists follow the long-tailed shape of astro-ph: most papers have a handful of authors,
+while a few collaboration papers carry hundreds of them.
+"""
+import random
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Tuple
+
+FIRST_NAMES = [
+    "Adam", "Alice", "Amir", "Ana", "Benjamin", "Carla", "Chen", "Daniel", "David", "Elena", "Emma", "Fatima", "Felix", "Giulia",
+    "Hannah", "Hiroshi", "Ines", "Ivan", "Jakub", "James", "Jia", "Jonas", "Julia", "Kai", "Laura", "Lucas", "Maria", "Mateo",
+    "Mei", "Mohammed", "Nadia", "Noah", "Olga", "Pablo", "Priya", "Rafael", "Sara", "Sofia", "Takumi", "Thomas", "Wei", "Yuki",
+    "Zoe", "José", "Søren", "Zoë", "Łukasz", "Nuño", "Chloé", "René",
+]
+LAST_NAMES = [
+    "Anderson", "Bauer", "Becker", "Chen", "Costa", "Dubois", "Fischer", "Garcia", "Gupta", "Hansen", "Ito", "Jensen", "Kim",
+    "Kowalski", "Kumar", "Li", "Liu", "Lopez", "Martin", "Meyer", "Moreau", "Müller", "Nakamura", "Nguyen", "Novak", "Olsen",
+    "Park", "Petrov", "Rossi", "Sato", "Schmidt", "Silva", "Singh", "Smith", "Suzuki", "Tanaka", "Wang", "Weber", "Wu", "Yamamoto",
+    "Zhang", "Zhao", "García-Pérez", "van der Berg", "O'Brien", "Ødegaard",
+]
+WORDS = [
+    "galaxy", "galaxies", "dark", "matter", "energy", "cosmological", "simulation", "simulations", "star", "formation", "stellar",
+    "mass", "halo", "halos", "redshift", "survey", "spectroscopic", "photometric", "observations", "cluster", "clusters",
+    "supernova", "black", "hole", "accretion", "disk", "magnetic", "field", "turbulence", "gas", "interstellar", "medium",
+    "emission", "absorption", "lensing", "weak", "strong", "gravitational", "waves", "neutron", "merger", "binary", "pulsar",
+    "radio", "X-ray", "infrared", "ultraviolet", "telescope", "instrument", "calibration", "pipeline", "model", "models",
+    "parameter", "constraints", "power", "spectrum", "bispectrum", "inflation", "reionization", "metallicity", "dwarf",
+    "satellite", "Milky", "Way", "feedback", "outflow", "jet", "relativistic", "shock", "cosmic", "ray", "neutrino",
+    "we", "present", "show", "find", "that", "the", "of", "and", "in", "with", "a", "new", "using", "from", "to", "our",
+    "results", "suggest", "these", "this", "which", "for", "on", "by", "is", "are", "$z \\sim 2$", "$\\Lambda$CDM", "<0.1",
+]
+CATEGORIES = ["astro-ph.CO", "astro-ph.GA", "astro-ph.HE", "astro-ph.IM", "astro-ph.SR", "astro-ph.EP", "gr-qc", "physics.comp-ph"]
+ANNOUNCE_TIME = datetime(2025, 2, 18, tzinfo=timezone(timedelta(hours=-5)))
+
+
+@dataclass
+class SyntheticPaper:
+    arxiv_id: str
+    title: str
+    abstract: str
+    authors: List[str]
+    primary_category: str
+    cross_categories: List[str] = field(default_factory=list)
+    announce_type: str = "new"  # "new" or "replace"
+
+
+@dataclass
+class SyntheticDay:
+    papers: List[SyntheticPaper]
+    categories: List[str]
+    announce_time: datetime
+    watched_authors: Dict[str, str]  # name -> author id, planted into some papers
+
+    def feed_papers(self, category) -> List[Tuple[SyntheticPaper, str]]:
+        # the papers of one category feed with their announce type in that feed
+        result = []
+        for paper in self.papers:
+            if paper.primary_category == category:
+                result.append((paper, paper.announce_type))
+            elif category in paper.cross_categories:
+                result.append((paper, "cross" if paper.announce_type == "new" else "replace-cross"))
+        return result
+
+
+def make_name(rng) -> str:
+    first = rng.choice(FIRST_NAMES)
+    if rng.random() < 0.3:
+        first = f"{first} {rng.choice('ABCDEFGHJKLMNPRSTW')}."
+    return f"{first} {rng.choice(LAST_NAMES)}"
+
+
+def make_text(rng, length) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(length))
+
+
+def make_author_count(rng) -> int:
+    # mostly small teams, a long tail of large collaborations
+    if rng.random() < 0.02:
+        return rng.randint(100, 600)
+    return min(int(rng.lognormvariate(1.3, 0.8)) + 1, 60)
+
+
+def generate_day(num_papers, categories=None, seed=0, cross_list_rate=0.3, replace_rate=0.15, watched_authors=None, watched_rate=0.01) -> SyntheticDay:
+    """
+    Generate a deterministic day of `num_papers` papers over `categories`.
+    `watched_authors` (name -> author id) are planted as co-authors of about `watched_rate` of the papers.
+    """
+    rng = random.Random(seed)
+    if categories is None:
+        categories = CATEGORIES[:5]
+    if watched_authors is None:
+        watched_authors = {}
+    watched_names = list(watched_authors.keys())
+
+    papers = []
+    for i in range(num_papers):
+        primary_category = rng.choice(categories)
+        cross_categories = []
+        if rng.random() < cross_list_rate:
+            cross_categories = rng.sample([c for c in categories if c != primary_category], k=min(rng.randint(1, 2), len(categories) - 1))
+        authors = [make_name(rng) for _ in range(make_author_count(rng))]
+        if len(watched_names) > 0 and rng.random() < watched_rate:
+            authors.insert(rng.randrange(len(authors) + 1), rng.choice(watched_names))
+        papers.append(SyntheticPaper(
+            arxiv_id=f"2502.{i + 10000:05d}",
+            title=make_text(rng, rng.randint(6, 18)).capitalize(),
+            abstract=make_text(rng, rng.randint(120, 280)).capitalize() + ".",
+            authors=authors,
+            primary_category=primary_category,
+            cross_categories=cross_categories,
+            announce_type="replace" if rng.random() < replace_rate else "new",
+        ))
+    return SyntheticDay(papers=papers, categories=list(categories), announce_time=ANNOUNCE_TIME, watched_authors=dict(watched_authors))
@@ -1,134 +1,68 @@
-import json
+import argparse
 import os
 
-from arxiv_assistant.apis.arxiv import get_papers_from_arxiv
-from arxiv_assistant.apis.semantic_scholar import get_authors
-from arxiv_assistant.environment import AUTHOR_ID_SET, SYSTEM_PROMPT, CONFIG, NOW_DAY, NOW_MONTH, NOW_YEAR, OUTPUT_DEBUG_FILE_FORMAT, OUTPUT_JSON_FILE_FORMAT, OUTPUT_MD_FILE_FORMAT, POSTFIX_PROMPT_ABSTRACT, POSTFIX_PROMPT_TITLE, S2_API_KEY, SCORE_PROMPT, SLACK_KEY, TOPIC_PROMPT
-from arxiv_assistant.filters.filter_author import filter_papers_by_hindex, select_by_author
-from arxiv_assistant.filters.filter_gpt import filter_by_gpt
-from arxiv_assistant.push_to_slack import push_to_slack
-from arxiv_assistant.renderers.render_daily import render_daily_md
-from arxiv_assistant.utils.io import copy_file_or_dir, delete_file_or_dir
-from arxiv_assistant.utils.utils import EnhancedJSONEncoder
+from arxiv_assistant.environment import get_context
+from arxiv_assistant.pipeline import run_pipeline
+from arxiv_assistant.profiles import load_profiles_from_arg
+from arxiv_assistant.push_to_slack import get_slack_delivery
+from arxiv_assistant.utils.cache import load_cache
+from arxiv_assistant.utils.dump import get_dump_writer
+from arxiv_assistant.utils.tracing import get_tracer
 
 if __name__ == "__main__":
-    # get the paper list from arxiv
-    all_entries, arxiv_paper_dict = get_papers_from_arxiv(CONFIG, source="rss")
-    paper_list = list(set(v for area_papers in arxiv_paper_dict.values() for v in area_papers))
-    print("Total number of papers:" + str(len(paper_list)))
-    if len(paper_list) == 0:
-        print("No papers found")
-        exit(0)
-
-    # get the author list from papers
-    if CONFIG["SELECTION"].getboolean("run_author_match"):
-        all_authors = set()
-        for paper in paper_list:
-            all_authors.update(set(paper.authors))
-        print("Getting author info for " + str(len(all_authors)) + " authors")
-        all_authors = get_authors(list(all_authors), S2_API_KEY, config=CONFIG)
-    else:
-        print("Skipping author info")
-        all_authors = {}
-
-    # dump all papers for debugging
-    if CONFIG["OUTPUT"].getboolean("dump_debug_file"):
-        with open(OUTPUT_DEBUG_FILE_FORMAT.format("config.json"), "w") as outfile:
-            json.dump({section: dict(CONFIG[section]) for section in CONFIG.sections()}, outfile, cls=EnhancedJSONEncoder, indent=4)
-        with open(OUTPUT_DEBUG_FILE_FORMAT.format("author_id_set.json"), "w") as outfile:
-            json.dump(list(AUTHOR_ID_SET), outfile, cls=EnhancedJSONEncoder, indent=4)
-        with open(OUTPUT_DEBUG_FILE_FORMAT.format("all_papers.json"), "w") as outfile:
-            json.dump(paper_list, outfile, cls=EnhancedJSONEncoder, indent=4)
-        with open(OUTPUT_DEBUG_FILE_FORMAT.format("all_authors.json"), "w") as outfile:
-            json.dump(all_authors, outfile, cls=EnhancedJSONEncoder, indent=4)
-
-    # initialize vars for filtering
-    selected_paper_dict = {}
-    filtered_paper_dict = {}  # NOTE: NOT USED HERE
-
-    # select papers by author
-    if CONFIG["SELECTION"].getboolean("run_author_match"):
-        paper_list, selected_results = select_by_author(
-            all_authors,
-            paper_list,
-            AUTHOR_ID_SET,
-            CONFIG
-        )
-        selected_paper_dict.update(selected_results)
-    else:
-        print("Skipping selection by author")
-
-    # filter papers by h-index
-    if CONFIG["SELECTION"].getboolean("run_author_match"):
-        paper_list, filtered_results = filter_papers_by_hindex(
-            all_authors,
-            paper_list,
-            CONFIG
-        )
-        filtered_paper_dict.update(filtered_results)
-    else:
-        print("Skipping h-index filtering")
+    parser = argparse.ArgumentParser(description="Run the daily arXiv paper assistant.")
+    parser.add_argument("--serve", action="store_true", help="run as a long-running service that runs the pipeline whenever a new day is announced")
+    parser.add_argument("--trace", type=str, nargs="?", const="trace", default=None, help="write a Chrome trace and a summary table to the debug dir, add \"cpu\" and/or \"memory\" (e.g. `--trace cpu,memory`) to capture cProfile/tracemalloc per stage")
+    parser.add_argument("--profiles", type=str, default=None, help="comma-separated profile names under `profiles_path`, or \"all\" (default: the single default profile)")
+    parser.add_argument("--record", type=str, default=None, help="record every arXiv, Semantic Scholar, OpenAI and Slack exchange of this run to a cassette file (e.g. `out/cassettes/2025-02-18.jsonl.gz`)")
+    parser.add_argument("--replay", type=str, default=None, help="rerun from a recorded cassette file without any network access, the outputs are written under `output_path`/replay/")
+    args = parser.parse_args()
 
-    # filter papers by GPT
-    if CONFIG["SELECTION"].getboolean("run_openai"):
-        selected_results, filtered_results, total_prompt_cost, total_completion_cost, total_prompt_tokens, total_completion_tokens = filter_by_gpt(
-            paper_list,
-            SYSTEM_PROMPT,
-            TOPIC_PROMPT,
-            SCORE_PROMPT,
-            POSTFIX_PROMPT_TITLE,
-            POSTFIX_PROMPT_ABSTRACT,
-            CONFIG,
-        )
-        selected_paper_dict.update(selected_results)
-        filtered_paper_dict.update(filtered_results)
-    else:
-        total_prompt_cost, total_completion_cost, total_prompt_tokens, total_completion_tokens = 0.0, 0.0, 0, 0
-        print("Skipping GPT filtering")
+    if args.trace is not None:
+        trace_options = {s.strip() for s in args.trace.split(",")}
+        get_tracer().enable(cpu_profile="cpu" in trace_options, memory_profile="memory" in trace_options)
 
-    # sort the papers by relevance and novelty
-    selected_paper_dict = {
-        k: v
-        for k, v in sorted(
-            selected_paper_dict.items(),
-            key=lambda x: (x[1].get("SCORE", 0), x[1].get("RELEVANCE", 0)),  # sort first by total scores then by relevance
-            reverse=True
-        )
-    }
-
-    # dump filtered & selected papers for debugging
-    if CONFIG["OUTPUT"].getboolean("dump_debug_file"):
-        with open(OUTPUT_DEBUG_FILE_FORMAT.format("selected_paper_dict.json"), "w") as outfile:
-            json.dump(selected_paper_dict, outfile, cls=EnhancedJSONEncoder, indent=4)
-        with open(OUTPUT_DEBUG_FILE_FORMAT.format("filtered_paper_dict.json"), "w") as outfile:
-            json.dump(filtered_paper_dict, outfile, cls=EnhancedJSONEncoder, indent=4)
-
-    if CONFIG["OUTPUT"].getboolean("dump_json"):
-        with open(OUTPUT_JSON_FILE_FORMAT.format("output.json"), "w") as outfile:
-            json.dump(selected_paper_dict, outfile, indent=4)
+    context = get_context()
+    cassette = None
+    if args.record is not None or args.replay is not None:
+        from arxiv_assistant.utils.cassette import Cassette
+        if args.replay is not None:
+            # keep the outputs of the recorded run untouched
+            context.config["OUTPUT"]["output_path"] = os.path.join(context.config["OUTPUT"]["output_path"], "replay")
+            cassette = Cassette(args.replay, mode="replay").start()
+        else:
+            cassette = Cassette(args.record, mode="record").start()
+    context.describe()
+    profiles = load_profiles_from_arg(context.config, args.profiles)
 
-    if CONFIG["OUTPUT"].getboolean("dump_md"):
-        head_table = {
-            "headers": [f"*[{CONFIG['SELECTION']['model']}]*", "Prompt", "Completion", "Total"],
-            "data": [
-                ["**Token**", total_prompt_tokens, total_completion_tokens, total_prompt_tokens + total_completion_tokens],
-                ["**Cost**", f"${round(total_prompt_cost, 2)}", f"${round(total_completion_cost, 2)}", f"${round(total_prompt_cost + total_completion_cost, 2)}"],
-            ]
-        }
-        with open(OUTPUT_MD_FILE_FORMAT.format("output.md"), "w") as f:
-            f.write(render_daily_md(all_entries, arxiv_paper_dict, selected_paper_dict, now_date=(NOW_YEAR, NOW_MONTH, NOW_DAY), prompts=(SYSTEM_PROMPT, POSTFIX_PROMPT_ABSTRACT, SCORE_PROMPT, TOPIC_PROMPT), head_table=head_table))
+    if args.serve:
+        from arxiv_assistant.service import ArxivService
+        ArxivService(context.config, profiles).serve()
+        exit(0)
 
-    # only push to slack for non-empty dicts
-    if CONFIG["OUTPUT"].getboolean("push_to_slack"):
-        if SLACK_KEY is None:
-            print("Warning: push_to_slack is true, but SLACK_KEY is not set - not pushing to slack")
-        else:
-            push_to_slack(selected_paper_dict)
+    # cached author lookups and LLM outputs are reused across runs (and restored by `python -m scripts.snapshot import` on fresh runners),
+    # except when recording or replaying, where every exchange has to go through the cassette
+    # (so scores are not reused either, and the stages and batch sizes are the configured ones)
+    author_cache = load_cache(context.config, "authors", persistent=cassette is None)
+    llm_cache = load_cache(context.config, "llm", persistent=cassette is None)
+    if cassette is not None:
+        context.config["SELECTION"]["reuse_scores"] = "false"
+        context.config["SELECTION"]["plan_stages"] = "false"
 
-    # copy files
-    copy_file_or_dir(OUTPUT_MD_FILE_FORMAT.format("output.md"), CONFIG["OUTPUT"]["output_path"], print_info=True)
-    delete_file_or_dir(os.path.join(CONFIG["OUTPUT"]["output_path"], "output.md"))
-    os.rename(
-        os.path.join(CONFIG["OUTPUT"]["output_path"], os.path.basename(OUTPUT_MD_FILE_FORMAT.format("output.md"))),
-        os.path.join(CONFIG["OUTPUT"]["output_path"], "output.md"),
-    )
+    # the date is resolved from the fetched RSS feeds
+    try:
+        results = run_pipeline(context.config, source="rss", profiles=profiles, author_cache=author_cache, llm_cache=llm_cache)
+    finally:
+        author_cache.save()
+        llm_cache.save()
+        # debug dumps are written on a daemon thread, which does not outlive the process
+        get_dump_writer().flush()
+        # Slack deliveries run in the background during the run
+        with get_tracer().stage("push"):
+            get_slack_delivery().wait()
+        if cassette is not None:
+            cassette.close()
+    if args.trace is not None:
+        get_tracer().write_report(context.output_debug_file_format)
+    if results is None:
+        exit(0)
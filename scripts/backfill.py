@@ -0,0 +1,190 @@
+"""
+Backfill the outputs for dates missing from `out/json`.
+
+Usage (from the repo root):
+    python -m scripts.backfill --begin 2025-05-16 --end 2025-05-23 --workers 4
+    python -m scripts.backfill --begin 2025-04-01 --end 2025-05-23 --source oai
+
+Papers announced on a date are those submitted since the previous announcement, so each date is searched through the arXiv API
+over the submission window ending on the day before (e.g., Friday to Sunday for a Monday).
+With `--source oai`, the arXiv archives of all categories are first harvested through OAI-PMH for the whole range in a few bulk requests
+(see `arxiv_assistant/apis/arxiv_oai.py`), then each date reads the records announced that day, with their announce types.
+Dates are processed concurrently and share the fetch, author and LLM caches, while the rate limits of Semantic Scholar and OpenAI hold globally.
+Finished dates are recorded per profile, so an interrupted backfill can be restarted with the same command without redoing them,
+and a backfill of other profiles still runs the dates finished for the first ones.
+With `max_rss_mb` set in config.ini, a date only starts while the process is below that memory ceiling (or no other date is running),
+and with `low_memory = true`, the raw feed entries are neither kept nor shared between dates.
+"""
+import argparse
+import traceback
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from typing import List, Tuple
+
+from arxiv_assistant.apis.arxiv import harvest_arxiv_oai
+from arxiv_assistant.environment import get_context
+from arxiv_assistant.pipeline import run_pipeline
+from arxiv_assistant.profiles import DEFAULT_PROFILE_NAME, get_default_profile, has_outputs, load_profiles_from_arg
+from arxiv_assistant.push_to_slack import get_slack_delivery
+from arxiv_assistant.utils.cache import load_cache
+from arxiv_assistant.utils.memory import get_memory_guard
+
+
+def to_tuple(d: date) -> Tuple[int, int, int]:
+    return d.year, d.month, d.day
+
+
+def get_search_window(announce_date: date) -> Tuple[date, date]:
+    # arXiv announces on weekdays, each announcement covers the submissions since the previous announcement
+    begin_date = announce_date - timedelta(days=1)
+    while begin_date.weekday() >= 5:  # Saturday or Sunday
+        begin_date -= timedelta(days=1)
+    end_date = announce_date - timedelta(days=1)
+    return begin_date, end_date
+
+
+def get_fetch_window(announce_date: date, source: str) -> Tuple[date, date]:
+    # the submission window searched through the arXiv API, or the announcement date itself for the OAI-PMH datestamps
+    if source == "oai":
+        return announce_date, announce_date
+    return get_search_window(announce_date)
+
+
+def get_header(search_begin_date: date, search_end_date: date) -> str:
+    if search_begin_date == search_end_date:
+        period = f"announced on {search_begin_date.isoformat()}"
+    else:
+        period = f"from {search_begin_date.isoformat()} to {search_end_date.isoformat()}"
+    return (
+        f"> This is a remedial run for missed papers {period}.\n"
+        f"> \n"
+        f"> Results generated on {date.today().isoformat()}."
+    )
+
+
+def is_profile_finished(announce_date: date, profile, state) -> bool:
+    # the state holds "<date>/<profile>": "done", or "<date>": "done" for the default profile in backfills before profiles were recorded
+    if has_outputs(profile, to_tuple(announce_date)) or state.get(f"{announce_date.isoformat()}/{profile.name}") == "done":
+        return True
+    return profile.name == DEFAULT_PROFILE_NAME and state.get(announce_date.isoformat()) == "done"
+
+
+def find_missing_dates(config, begin_date: date, end_date: date, state, profiles=None) -> List[date]:
+    # the dates without papers ("empty") are finished for every profile, the others once all `profiles` are finished
+    if profiles is None:
+        profiles = [get_default_profile(config)]
+    missing_dates = []
+    this_date = begin_date
+    while this_date <= end_date:
+        if this_date.weekday() < 5:  # no announcements on weekends
+            finished = state.get(this_date.isoformat()) == "empty" or all(is_profile_finished(this_date, profile, state) for profile in profiles)
+            if not finished:
+                missing_dates.append(this_date)
+        this_date += timedelta(days=1)
+    return missing_dates
+
+
+def backfill_one_date(config, announce_date: date, profiles, state, fetch_cache, author_cache, llm_cache, source="api"):
+    # wait for memory headroom before starting another date
+    with get_memory_guard(config):
+        return _backfill_one_date(config, announce_date, profiles, state, fetch_cache, author_cache, llm_cache, source)
+
+
+def _backfill_one_date(config, announce_date: date, profiles, state, fetch_cache, author_cache, llm_cache, source="api"):
+    search_begin_date, search_end_date = get_fetch_window(announce_date, source)
+    print(f"Start backfilling for date: {announce_date} (searching {search_begin_date} - {search_end_date})")
+
+    header = get_header(search_begin_date, search_end_date)
+    results = run_pipeline(
+        config,
+        now_date=to_tuple(announce_date),
+        source=source,
+        begin_date=to_tuple(search_begin_date),
+        end_date=to_tuple(search_end_date),
+        header=header,
+        copy_to_latest=False,
+        profiles=profiles,
+        fetch_cache=fetch_cache,
+        author_cache=author_cache,
+        llm_cache=llm_cache,
+    )
+
+    # record the progress so that restarting the backfill will skip this date for these profiles
+    if results is None:
+        state.set(announce_date.isoformat(), "empty")
+    else:
+        for profile_name in results:
+            state.set(f"{announce_date.isoformat()}/{profile_name}", "done")
+    state.save()
+    author_cache.save()
+    llm_cache.save()
+    return results
+
+
+def backfill(config, begin_date: date, end_date: date, workers: int = 4, force: bool = False, profiles=None, source: str = "api"):
+    state = load_cache(config, "backfill_state")
+    if config["OUTPUT"].getboolean("low_memory", fallback=False):
+        fetch_cache = None  # the fetched papers of every date would stay in memory until the end of the backfill
+    else:
+        fetch_cache = load_cache(config, "fetch", persistent=False)  # raw entries are not serializable, so only share them in memory
+    author_cache = load_cache(config, "authors")
+    llm_cache = load_cache(config, "llm")
+
+    if force:
+        dates = [begin_date + timedelta(days=i) for i in range((end_date - begin_date).days + 1)]
+        dates = [d for d in dates if d.weekday() < 5]
+    else:
+        dates = find_missing_dates(config, begin_date, end_date, state, profiles=profiles)
+    print(f"Found {len(dates)} dates to backfill: {[d.isoformat() for d in dates]}")
+    if len(dates) == 0:
+        return {}
+    if source == "oai":
+        # one bulk harvest of the whole range, instead of one per date
+        harvest_arxiv_oai(config, to_tuple(min(dates)), to_tuple(max(dates)))
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        futures = {
+            executor.submit(backfill_one_date, config, d, profiles, state, fetch_cache, author_cache, llm_cache, source): d
+            for d in dates
+        }
+        for future in as_completed(futures):
+            this_date = futures[future]
+            try:
+                profile_results = future.result()
+                results[this_date.isoformat()] = "empty" if profile_results is None else sum(len(v) for v in profile_results.values())
+            except Exception as e:
+                # one failed date should not stop the others, it will be retried in the next backfill
+                print(f"Failed to backfill {this_date}: {e}")
+                traceback.print_exc()
+                results[this_date.isoformat()] = "failed"
+
+    get_slack_delivery().wait()
+    author_cache.save()
+    llm_cache.save()
+
+    print(f"###################################################################")
+    print(f"Backfill summary:")
+    for date_string, result in sorted(results.items()):
+        print(f"{date_string}: {result if isinstance(result, str) else f'{result} papers selected'}")
+    return results
+
+
+def parse_date(string) -> date:
+    return datetime.strptime(string, "%Y-%m-%d").date()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill the outputs for dates missing from out/json.")
+    parser.add_argument("--begin", type=parse_date, required=True, help="first announcement date to backfill (YYYY-MM-DD)")
+    parser.add_argument("--end", type=parse_date, default=None, help="last announcement date to backfill (YYYY-MM-DD), defaults to `--begin`")
+    parser.add_argument("--workers", type=int, default=4, help="number of dates processed concurrently")
+    parser.add_argument("--force", action="store_true", help="rerun all dates in the range even if their outputs exist")
+    parser.add_argument("--profiles", type=str, default=None, help="comma-separated profile names under `profiles_path`, or \"all\" (default: the single default profile)")
+    parser.add_argument("--source", type=str, choices=["api", "oai"], default="api", help="search the arXiv API per date, or harvest the range through OAI-PMH")
+    args = parser.parse_args()
+
+    config = get_context().config
+    profiles = load_profiles_from_arg(config, args.profiles)
+
+    backfill(config, args.begin, args.end if args.end is not None else args.begin, workers=args.workers, force=args.force, profiles=profiles, source=args.source)
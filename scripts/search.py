@@ -0,0 +1,80 @@
+"""
+Search the papers scored on past days.
+
+Usage (from the repo root):
+    python -m scripts.search "dark matter halos" --min-score 15
+    python -m scripts.search --author "Kristin McQuinn" --begin 2025-01-01
+    python -m scripts.search --id 2502.10001
+    python -m scripts.search --rebuild
+
+The index is updated with the new outputs under `output_path` before each search (see `arxiv_assistant/search_index.py`).
+"""
+import argparse
+import json
+import time
+
+from arxiv_assistant.environment import get_context
+from arxiv_assistant.search_index import get_search_index
+
+
+def shorten(string, width) -> str:
+    return string if len(string) <= width else string[:width - 3] + "..."
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Search the papers scored on past days.")
+    parser.add_argument("query", type=str, nargs="?", default=None, help="FTS5 query over titles, abstracts, authors and comments (e.g. `\"dwarf galaxies\" NOT simulation`)")
+    parser.add_argument("--author", type=str, default=None, help="author name, matched as a phrase")
+    parser.add_argument("--id", type=str, default=None, help="arXiv id")
+    parser.add_argument("--profile", type=str, default=None, help="profile name")
+    parser.add_argument("--begin", type=str, default=None, help="first date (YYYY-MM-DD)")
+    parser.add_argument("--end", type=str, default=None, help="last date (YYYY-MM-DD)")
+    parser.add_argument("--min-score", type=float, default=None, help="minimum total score")
+    parser.add_argument("--selected", action="store_true", help="only papers that were selected (not filtered by score)")
+    parser.add_argument("--limit", type=int, default=20, help="maximum number of results")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON lines")
+    parser.add_argument("--no-update", action="store_true", help="search without indexing new outputs first")
+    parser.add_argument("--rebuild", action="store_true", help="rebuild the index from all outputs")
+    args = parser.parse_args()
+
+    config = get_context().config
+    index = get_search_index(config)
+    output_path = config["OUTPUT"]["output_path"]
+
+    start_time = time.perf_counter()
+    if args.rebuild:
+        file_cnt, paper_cnt = index.rebuild(output_path)
+    elif not args.no_update:
+        file_cnt, paper_cnt = index.update(output_path)
+    else:
+        file_cnt, paper_cnt = 0, 0
+    if file_cnt > 0:
+        print(f"Indexed {paper_cnt} papers from {file_cnt} files in {time.perf_counter() - start_time:.2f}s ({index.count()} in total)")
+    if args.query is None and args.author is None and args.id is None and args.rebuild:
+        exit(0)
+
+    start_time = time.perf_counter()
+    results = index.search(
+        query=args.query,
+        author=args.author,
+        arxiv_id=args.id,
+        profile=args.profile,
+        begin_date=args.begin,
+        end_date=args.end,
+        min_score=args.min_score,
+        selected_only=args.selected,
+        limit=args.limit,
+    )
+    elapsed_ms = (time.perf_counter() - start_time) * 1000
+
+    if args.json:
+        for result in results:
+            print(json.dumps(result, ensure_ascii=False))
+    else:
+        from tabulate import tabulate
+        data = [
+            [result["date"], result["profile"], result["arxiv_id"], result["score"], "" if result["selected"] else "filtered", shorten(result["title"] or "", 70), shorten(", ".join(result["authors"]), 40)]
+            for result in results
+        ]
+        print(tabulate(data, headers=["Date", "Profile", "arXiv ID", "Score", "", "Title", "Authors"], tablefmt="github", disable_numparse=True))
+    print(f"{len(results)} results in {elapsed_ms:.1f} ms")
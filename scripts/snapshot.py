@@ -0,0 +1,39 @@
+"""
+Export the persistent caches to one compressed snapshot file, or restore them from it (see `arxiv_assistant/utils/snapshot.py`).
+
+Usage (from the repo root):
+    python -m scripts.snapshot export --max-age-days 60 --max-size-mb 100   # writes `snapshot_path`
+    python -m scripts.snapshot export out/dwarfs.jsonl.gz --profiles dwarf_galaxies
+    python -m scripts.snapshot import                                        # merges `snapshot_path` into `cache_path`
+
+On GitHub Actions, import before `python main.py` and export after it, keeping the file with `actions/cache`
+or on the `auto_update` branch (see `.github/workflows/cron_runs.yaml`).
+"""
+import argparse
+import time
+
+from arxiv_assistant.environment import get_context
+from arxiv_assistant.profiles import load_profiles_from_arg
+from arxiv_assistant.utils.snapshot import export_snapshot, import_snapshot
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export or import a snapshot of the persistent caches.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export", help="write the caches under `cache_path` to a snapshot")
+    export_parser.add_argument("path", type=str, nargs="?", default=None, help="snapshot file (default: `snapshot_path`)")
+    export_parser.add_argument("--max-age-days", type=float, default=None, help="leave out entries first exported longer ago (default: `snapshot_max_age_days`)")
+    export_parser.add_argument("--max-size-mb", type=float, default=None, help="leave out the oldest entries beyond this size (default: `snapshot_max_size_mb`)")
+    export_parser.add_argument("--profiles", type=str, default=None, help="comma-separated profile names, or \"all\", whose LLM outputs and Slack deliveries are kept (default: every entry)")
+    import_parser = subparsers.add_parser("import", help="merge a snapshot into the caches under `cache_path`")
+    import_parser.add_argument("path", type=str, nargs="?", default=None, help="snapshot file (default: `snapshot_path`)")
+    args = parser.parse_args()
+
+    config = get_context().config
+    start_time = time.perf_counter()
+    if args.command == "export":
+        max_age_days = args.max_age_days if args.max_age_days is not None else config["OUTPUT"].getfloat("snapshot_max_age_days", fallback=0)
+        max_size_mb = args.max_size_mb if args.max_size_mb is not None else config["OUTPUT"].getfloat("snapshot_max_size_mb", fallback=0)
+        export_snapshot(config, args.path, max_age_days=max_age_days, max_size_mb=max_size_mb, profiles=load_profiles_from_arg(config, args.profiles))
+    else:
+        import_snapshot(config, args.path)
+    print(f"Done in {time.perf_counter() - start_time:.2f}s")
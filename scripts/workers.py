@@ -0,0 +1,125 @@
+"""
+Run the pipeline as tasks of a shared work queue, spread over several processes or machines (see `arxiv_assistant/workers.py`).
+
+Usage (from the repo root):
+    python -m scripts.workers submit --begin 2025-05-16 --end 2025-05-23   # one run per missing date, through the arXiv API
+    python -m scripts.workers submit --rss                                  # today's announcement, through the RSS feeds
+    python -m scripts.workers submit --begin 2025-04-01 --end 2025-05-23 --source oai   # harvested through OAI-PMH before submitting
+    python -m scripts.workers work                                          # on each machine, until the queue is idle
+    python -m scripts.workers status
+    python -m scripts.workers local --workers 4 --begin 2025-05-16 --end 2025-05-23   # submit, then run 4 local worker processes
+
+The queue defaults to `cache_path`/work_queue.sqlite, point `--queue` (or `work_queue_path` in config.ini) at shared storage for several machines.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+from datetime import timedelta
+
+from arxiv_assistant.apis.arxiv import harvest_arxiv_oai
+from arxiv_assistant.environment import get_context
+from arxiv_assistant.workers import Worker, WorkQueue, get_work_queue_path, submit_run
+from scripts.backfill import get_fetch_window, get_header, parse_date, to_tuple
+
+
+def submit(config, queue: WorkQueue, args):
+    from arxiv_assistant.utils.io import get_output_file_formats
+
+    if args.rss:
+        run_id = submit_run(queue, config, f"rss-{time.strftime('%Y-%m-%d')}", source="rss", profiles_arg=args.profiles, copy_to_latest=True)
+        print(f"Submitted run {run_id} for today's announcement")
+        return
+
+    end_date = args.end if args.end is not None else args.begin
+    if args.source == "oai":
+        # one bulk harvest of the whole range into `cache_path`, the fetch tasks of each date then read the harvested records
+        harvest_arxiv_oai(config, to_tuple(args.begin), to_tuple(end_date))
+    this_date = args.begin
+    while this_date <= end_date:
+        if this_date.weekday() < 5:  # no announcements on weekends
+            key = this_date.isoformat()
+            _, _, json_file_format = get_output_file_formats(config["OUTPUT"]["output_path"], to_tuple(this_date), create=False)
+            existing_run = queue.find_run(key)
+            if not args.force and (os.path.exists(json_file_format.format("output.json")) or (existing_run is not None and existing_run["stage"] != "failed")):
+                print(f"Skipping {key}, it is done or already submitted")
+            else:
+                search_begin_date, search_end_date = get_fetch_window(this_date, args.source)
+                run_id = submit_run(
+                    queue,
+                    config,
+                    key,
+                    now_date=to_tuple(this_date),
+                    source=args.source,
+                    begin_date=to_tuple(search_begin_date),
+                    end_date=to_tuple(search_end_date),
+                    profiles_arg=args.profiles,
+                    header=get_header(search_begin_date, search_end_date),
+                )
+                print(f"Submitted run {run_id} for {key}")
+        this_date += timedelta(days=1)
+
+
+def print_status(queue: WorkQueue):
+    from tabulate import tabulate
+
+    data = []
+    for run in queue.get_status():
+        tasks = ", ".join(
+            f"{kind} " + "/".join(f"{count} {status}" for status, count in sorted(counts.items()))
+            for kind, counts in run["tasks"].items()
+        )
+        elapsed = (run["finished"] or time.time()) - run["created"]
+        data.append([run["id"], run["key"], run["stage"], f"{elapsed:.0f}s", tasks])
+    print(tabulate(data, headers=["Run", "Key", "Stage", "Elapsed", "Tasks"], tablefmt="github", disable_numparse=True))
+
+
+def run_local_workers(queue_path, workers: int) -> int:
+    # runs `workers` worker processes on this machine until the queue is idle, returns the number of failed processes
+    processes = [
+        subprocess.Popen([sys.executable, "-m", "scripts.workers", "--queue", queue_path, "work", "--name", f"local{i}"])
+        for i in range(workers)
+    ]
+    return sum(process.wait() != 0 for process in processes)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the pipeline as tasks of a shared work queue.")
+    parser.add_argument("--queue", type=str, default=None, help="path of the queue database (default: `work_queue_path` or `cache_path`/work_queue.sqlite)")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for command in ("submit", "local"):
+        subparser = subparsers.add_parser(command, help="submit runs" if command == "submit" else "submit runs, then run local worker processes until they are done")
+        subparser.add_argument("--begin", type=parse_date, default=None, help="first announcement date (YYYY-MM-DD)")
+        subparser.add_argument("--end", type=parse_date, default=None, help="last announcement date (YYYY-MM-DD), defaults to `--begin`")
+        subparser.add_argument("--rss", action="store_true", help="today's announcement through the RSS feeds instead of dates through the API")
+        subparser.add_argument("--source", type=str, choices=["api", "oai"], default="api", help="fetch the dates through the arXiv API, or harvest them through OAI-PMH")
+        subparser.add_argument("--force", action="store_true", help="submit dates even if their outputs exist")
+        subparser.add_argument("--profiles", type=str, default=None, help="comma-separated profile names under `profiles_path`, or \"all\"")
+        if command == "local":
+            subparser.add_argument("--workers", type=int, default=4, help="number of worker processes")
+    work_parser = subparsers.add_parser("work", help="lease and run tasks")
+    work_parser.add_argument("--name", type=str, default=None, help="name of this worker in logs and leases")
+    work_parser.add_argument("--lease", type=float, default=300.0, help="lease of a task in seconds, renewed while it runs")
+    work_parser.add_argument("--forever", action="store_true", help="keep polling for new runs instead of exiting when the queue is idle")
+    subparsers.add_parser("status", help="print the runs and their tasks")
+    args = parser.parse_args()
+
+    config = get_context().config
+    queue_path = args.queue if args.queue is not None else get_work_queue_path(config)
+    queue = WorkQueue(queue_path)
+
+    if args.command in ("submit", "local"):
+        if not args.rss and args.begin is None:
+            parser.error("either --begin or --rss is required")
+        submit(config, queue, args)
+        if args.command == "local":
+            start_time = time.perf_counter()
+            failed_cnt = run_local_workers(queue_path, args.workers)
+            print(f"{args.workers} workers finished in {time.perf_counter() - start_time:.2f}s ({failed_cnt} failed)")
+            print_status(queue)
+    elif args.command == "work":
+        task_cnt = Worker(config, queue, name=args.name, lease_seconds=args.lease).run(exit_when_idle=not args.forever)
+        print(f"Worker ran {task_cnt} tasks")
+    else:
+        print_status(queue)
@@ -0,0 +1,119 @@
+from datetime import date
+
+import pytest
+
+from arxiv_assistant.apis.arxiv_oai import OaiHarvester, OaiRecord, parse_page
+
+FROM_DATE, UNTIL_DATE = date(2025, 5, 12), date(2025, 5, 14)
+
+
+def make_record(arxiv_id, datestamp="2025-05-13", categories="astro-ph.GA astro-ph.CO", updated=None):
+    updated_element = f"<updated>{updated}</updated>" if updated else ""
+    return f"""
+    <record><header><identifier>oai:arXiv.org:{arxiv_id}</identifier><datestamp>{datestamp}</datestamp></header>
+    <metadata><arXiv xmlns="http://arxiv.org/OAI/arXiv/">
+      <id>{arxiv_id}</id><created>2025-05-09</created>{updated_element}
+      <authors><author><keyname>McQuinn</keyname><forenames>Kristin B.</forenames></author></authors>
+      <title>Paper  {arxiv_id}</title><categories>{categories}</categories><abstract> An abstract. </abstract>
+    </arXiv></metadata></record>"""
+
+
+def make_page(records="", token=None, error=None):
+    body = f'<error code="{error}">error</error>' if error else f"<ListRecords>{records}{token or ''}</ListRecords>"
+    return f'<OAI-PMH xmlns="http://www.openarchives.org/OAI/2.0/">{body}</OAI-PMH>'.encode("utf-8")
+
+
+def make_token(token, size=3):
+    return f'<resumptionToken completeListSize="{size}">{token}</resumptionToken>'
+
+
+class FakeResponse:
+    def __init__(self, content, status_code=200):
+        self.content = content
+        self.status_code = status_code
+        self.headers = {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class FakeSession:
+    # answers each request with the next page, or raises to simulate an interrupted harvest
+    def __init__(self, pages):
+        self.pages = list(pages)
+        self.requests = []
+
+    def get(self, url, params, timeout):
+        self.requests.append(dict(params))
+        page = self.pages.pop(0)
+        if isinstance(page, Exception):
+            raise page
+        return FakeResponse(page)
+
+
+FIRST_PAGE = make_page(make_record("2505.00001") + make_record("2505.00002"), make_token("token-1"))
+LAST_PAGE = make_page(make_record("2505.00003", datestamp="2025-05-14", updated="2025-05-13") + make_token(""))
+
+
+def test_parse_page():
+    page = parse_page(FIRST_PAGE)
+    assert [record.arxiv_id for record in page.records] == ["2505.00001", "2505.00002"]
+    assert page.records[0].authors == ("Kristin B. McQuinn",)
+    assert page.records[0].title == "Paper 2505.00001"
+    assert page.records[0].categories == ("astro-ph.GA", "astro-ph.CO")
+    assert page.token == "token-1" and page.complete_list_size == 3
+    assert parse_page(LAST_PAGE).token is None
+    assert parse_page(make_page(error="noRecordsMatch")).records == []
+    with pytest.raises(ValueError):
+        parse_page(make_page(error="badArgument"))
+
+
+def test_harvest_follows_resumption_tokens_and_records_the_days():
+    harvester = OaiHarvester()
+    session = FakeSession([FIRST_PAGE, LAST_PAGE])
+    assert harvester.update("http://oai", "physics:astro-ph", FROM_DATE, UNTIL_DATE, session) == 3
+    assert session.requests[0]["from"] == "2025-05-12" and session.requests[0]["until"] == "2025-05-14"
+    assert session.requests[1] == {"verb": "ListRecords", "resumptionToken": "token-1"}
+    assert harvester.get_checkpoint("physics:astro-ph", FROM_DATE, UNTIL_DATE) is None
+    assert harvester.get_missing_days("physics:astro-ph", FROM_DATE, UNTIL_DATE) == []
+    assert [record.arxiv_id for record in harvester.iter_records("physics:astro-ph", date(2025, 5, 14), date(2025, 5, 14))] == ["2505.00003"]
+    # harvested days are not requested again
+    assert harvester.update("http://oai", "physics:astro-ph", FROM_DATE, UNTIL_DATE, FakeSession([])) == 0
+
+
+def test_interrupted_harvest_continues_from_its_checkpoint():
+    harvester = OaiHarvester()
+    with pytest.raises(ConnectionError):
+        harvester.update("http://oai", "physics:astro-ph", FROM_DATE, UNTIL_DATE, FakeSession([FIRST_PAGE, ConnectionError("reset")]))
+    assert harvester.get_checkpoint("physics:astro-ph", FROM_DATE, UNTIL_DATE) == ("token-1", 1, 2)
+    assert len(harvester.get_missing_days("physics:astro-ph", FROM_DATE, UNTIL_DATE)) == 3
+
+    session = FakeSession([LAST_PAGE])
+    assert harvester.update("http://oai", "physics:astro-ph", FROM_DATE, UNTIL_DATE, session) == 1
+    assert session.requests == [{"verb": "ListRecords", "resumptionToken": "token-1"}]
+    assert harvester.get_checkpoint("physics:astro-ph", FROM_DATE, UNTIL_DATE) is None
+    assert len(list(harvester.iter_records("physics:astro-ph", FROM_DATE, UNTIL_DATE))) == 3
+
+
+def test_expired_token_restarts_from_the_first_page():
+    harvester = OaiHarvester()
+    with pytest.raises(ConnectionError):
+        harvester.update("http://oai", "physics:astro-ph", FROM_DATE, UNTIL_DATE, FakeSession([FIRST_PAGE, ConnectionError("reset")]))
+    session = FakeSession([make_page(error="badResumptionToken"), FIRST_PAGE, LAST_PAGE])
+    assert harvester.update("http://oai", "physics:astro-ph", FROM_DATE, UNTIL_DATE, session) == 3
+    assert "resumptionToken" in session.requests[0]
+    assert session.requests[1]["set"] == "physics:astro-ph"
+    assert harvester.get_missing_days("physics:astro-ph", FROM_DATE, UNTIL_DATE) == []
+
+
+def test_announce_types():
+    record = OaiRecord("2505.00001", "2025-05-13", ("astro-ph.GA", "astro-ph.CO"), "2025-05-12", None, "Title", "Abstract", ())
+    assert record.get_announce_type("astro-ph.GA") == "new"
+    assert record.get_announce_type("astro-ph.CO") == "cross"
+    assert record.get_announce_type("astro-ph.HE") is None
+    replaced = OaiRecord("2505.00001", "2025-05-13", ("astro-ph.GA", "astro-ph.CO"), "2025-04-01", "2025-05-12", "Title", "Abstract", ())
+    assert replaced.get_announce_type("astro-ph.GA") == "replace"
+    assert replaced.get_announce_type("astro-ph.CO") == "replace-cross"
+    metadata_update = OaiRecord("2505.00001", "2025-05-13", ("astro-ph.GA",), "2024-01-01", "2024-02-01", "Title", "Abstract", ())
+    assert metadata_update.get_announce_type("astro-ph.GA") is None
@@ -0,0 +1,36 @@
+import configparser
+
+from arxiv_assistant.filters.filter_gpt import get_paper_handle, parse_compact_output
+
+
+def make_config():
+    config = configparser.ConfigParser()
+    config.read_dict({"OUTPUT": {"debug_messages": "false"}})
+    return config
+
+
+HANDLE_IDS = {get_paper_handle(i): arxiv_id for i, arxiv_id in enumerate(["2502.10001", "2502.10002", "2502.10003"])}
+
+
+def test_parse_compact_output_maps_handles_to_arxiv_ids():
+    json_dicts, invalid_cnt = parse_compact_output("P1|8|5|Dwarf galaxy kinematics\nP3|2|1|Off topic", HANDLE_IDS, make_config())
+    assert invalid_cnt == 0
+    assert json_dicts == [
+        {"ARXIVID": "2502.10001", "COMMENT": "Dwarf galaxy kinematics", "RELEVANCE": 8, "NOVELTY": 5},
+        {"ARXIVID": "2502.10003", "COMMENT": "Off topic", "RELEVANCE": 2, "NOVELTY": 1},
+    ]
+
+
+def test_parse_compact_output_keeps_pipes_in_comments_and_allows_no_comment():
+    json_dicts, invalid_cnt = parse_compact_output("[P1] | 7 | 6 | stars | gas\nP2|3|2", HANDLE_IDS, make_config())
+    assert invalid_cnt == 0
+    assert json_dicts[0]["ARXIVID"] == "2502.10001"
+    assert json_dicts[0]["COMMENT"] == "stars | gas"
+    assert json_dicts[1] == {"ARXIVID": "2502.10002", "COMMENT": "", "RELEVANCE": 3, "NOVELTY": 2}
+
+
+def test_parse_compact_output_skips_fences_and_counts_malformed_lines():
+    raw_out_text = "```\nP1|8|5|ok\n\nP9|4|4|unknown handle\nP2|high|2|not a number\nP3|5\nno separators\n```"
+    json_dicts, invalid_cnt = parse_compact_output(raw_out_text, HANDLE_IDS, make_config())
+    assert [json_dict["ARXIVID"] for json_dict in json_dicts] == ["2502.10001"]
+    assert invalid_cnt == 4
@@ -0,0 +1,79 @@
+import pytest
+
+from arxiv_assistant.filters.filter_rules import RuleSet, apply_rules, decide, parse_rules
+from arxiv_assistant.utils.utils import Paper
+
+
+def make_paper(title="", abstract="", authors=(), arxiv_id="2502.10001"):
+    return Paper(authors=tuple(authors), title=title, abstract=abstract, arxiv_id=arxiv_id)
+
+
+def matched_patterns(rules_text, paper, categories=()):
+    return [rule.pattern for rule in RuleSet(parse_rules(rules_text)).match(paper, categories)]
+
+
+def test_patterns_match_whole_words_case_insensitively():
+    rules_text = "include title: X-ray"
+    assert matched_patterns(rules_text, make_paper(title="Hard x ray emission")) == ["X-ray"]
+    assert matched_patterns(rules_text, make_paper(title="X-Ray binaries")) == ["X-ray"]
+    assert matched_patterns(rules_text, make_paper(title="X-rays from binaries")) == []
+    assert matched_patterns(rules_text, make_paper(title="Max ray tracing")) == []
+
+
+def test_overlapping_patterns_are_all_matched():
+    rules_text = "include text: dwarf galaxy\nexclude text: galaxy cluster\nforce_score abstract: star formation rate\ninclude abstract: formation"
+    paper = make_paper(title="A dwarf galaxy cluster", abstract="The star formation rate of dwarfs")
+    assert matched_patterns(rules_text, paper) == ["dwarf galaxy", "galaxy cluster", "star formation rate", "formation"]
+
+
+def test_fields_are_matched_separately():
+    rules_text = "include title: JWST\ninclude abstract: lensing\ninclude text: quasar"
+    assert matched_patterns(rules_text, make_paper(title="JWST quasars", abstract="Weak lensing")) == ["JWST", "lensing"]
+    assert matched_patterns(rules_text, make_paper(title="Lensing", abstract="A quasar seen by JWST")) == ["quasar"]
+
+
+def test_author_patterns_do_not_span_two_authors():
+    rules_text = "include authors: Kristin McQuinn\ninclude authors: Smith Jones"
+    paper = make_paper(authors=["Kristin B. McQuinn", "Kristin McQuinn", "Ann Smith", "Jones Bob"])
+    assert matched_patterns(rules_text, paper) == ["Kristin McQuinn"]
+
+
+def test_categories_are_matched_exactly():
+    rules_text = "exclude category: astro-ph.IM"
+    assert matched_patterns(rules_text, make_paper(), ["astro-ph.GA", "astro-ph.IM"]) == ["astro-ph.IM"]
+    assert matched_patterns(rules_text, make_paper(), ["astro-ph"]) == []
+
+
+def test_decide_prefers_force_score_and_leaves_conflicts_to_the_llm():
+    rules = parse_rules("include text: dwarf\nexclude text: cluster\nforce_score text: galaxy")
+    assert decide(rules)[0] == "force_score"
+    assert decide(rules[:2]) == ("conflict", rules[:2])
+    assert decide(rules[:1]) == ("include", rules[:1])
+    assert decide([]) == (None, [])
+
+
+def test_apply_rules_splits_the_papers():
+    rule_set = RuleSet(parse_rules("include title: dwarf\nexclude title: cluster\nforce_score title: galaxy"))
+    papers = [
+        make_paper(title="Dwarf stars", arxiv_id="1"),
+        make_paper(title="Cluster lensing", arxiv_id="2"),
+        make_paper(title="Galaxy clusters", arxiv_id="3"),
+        make_paper(title="Dwarf cluster", arxiv_id="4"),
+        make_paper(title="Exoplanets", arxiv_id="5"),
+    ]
+    remaining, included, excluded, forced, decisions = apply_rules(rule_set, papers, include_score=20.0)
+    assert [paper.arxiv_id for paper in remaining] == ["4", "5"]
+    assert list(included) == ["1"] and included["1"].fields["SCORE"] == 20.0
+    assert list(excluded) == ["2"]
+    assert [paper.arxiv_id for paper in forced] == ["3"]
+    assert [decision["action"] for decision in decisions] == ["include", "exclude", "force_score", "conflict"]
+
+
+def test_invalid_rules_are_rejected():
+    rules = parse_rules("# a comment\n\ninclude title: JWST")
+    assert [(str(rule), rule.line) for rule in rules] == [("include title: JWST", 3)]
+    for rules_text in ("include title JWST", "select title: JWST", "include body: JWST", "include title:   "):
+        with pytest.raises(ValueError):
+            parse_rules(rules_text)
+    with pytest.raises(ValueError):
+        RuleSet(parse_rules("include title: ---"))
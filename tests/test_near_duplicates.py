@@ -0,0 +1,70 @@
+from arxiv_assistant.filters.near_duplicates import NearDuplicateIndex, REUSE_SIMILARITY, get_signature, get_similarity
+from arxiv_assistant.utils.utils import Paper
+
+TITLE = "The stellar populations of isolated dwarf galaxies"
+ABSTRACT = (
+    "We measure the star formation histories of forty isolated dwarf galaxies from deep imaging with the Hubble Space Telescope. "
+    "Most of the galaxies formed a large fraction of their stars before reionization, and their quenching times do not depend on "
+    "their distance to the nearest massive galaxy. We compare the histories with simulations of reionization and feedback, "
+    "and find that the simulated dwarfs form their stars too late. The data favour an early and rapid heating of the gas."
+)
+OTHER_ABSTRACT = (
+    "Fast radio bursts are millisecond transients of unknown origin. We report the localization of a repeating burst to a "
+    "star forming region of a spiral host, and constrain the rotation measure and dispersion of the source over two years."
+)
+FIELDS = {"ARXIVID": "2502.10001", "RELEVANCE": 8, "NOVELTY": 6, "COMMENT": "Dwarf galaxies", "REUSED_FROM": "2401.00001"}
+
+
+def make_paper(arxiv_id, title=TITLE, abstract=ABSTRACT):
+    return Paper(authors=("Kristin McQuinn",), title=title, abstract=abstract, arxiv_id=arxiv_id)
+
+
+def make_index(paper, tag="tag"):
+    index = NearDuplicateIndex()
+    index.add({paper.arxiv_id: FIELDS}, {paper.arxiv_id: paper}, tag)
+    return index
+
+
+def test_identical_text_reuses_the_stored_fields():
+    index = make_index(make_paper("2502.10001"))
+    matches = index.find_matches([make_paper("2502.20002")], "tag")
+    assert matches == {"2502.20002": ("2502.10001", "near_duplicate", 1.0, {"RELEVANCE": 8, "NOVELTY": 6, "COMMENT": "Dwarf galaxies"})}
+
+
+def test_scores_are_only_reused_within_one_tag():
+    index = make_index(make_paper("2502.10001"))
+    assert index.find_matches([make_paper("2502.20002")], "other tag") == {}
+
+
+def test_unrelated_paper_has_no_match():
+    index = make_index(make_paper("2502.10001"))
+    assert index.find_matches([make_paper("2502.20002", title="A repeating fast radio burst", abstract=OTHER_ABSTRACT)], "tag") == {}
+
+
+def test_revision_uses_the_lower_same_id_threshold():
+    index = make_index(make_paper("2502.10001"))
+    revised = make_paper("2502.10001v2", abstract=ABSTRACT.split(". We compare")[0] + ". " + OTHER_ABSTRACT)
+    similarity = get_similarity(get_signature(make_paper("2502.10001")), get_signature(revised))
+    assert 0 < similarity < REUSE_SIMILARITY
+    matches = index.find_matches([revised], "tag", same_id_threshold=similarity)
+    assert matches["2502.10001v2"][:2] == ("2502.10001", "same_id")
+    assert index.find_matches([revised], "tag", same_id_threshold=similarity + 0.01) == {}
+    # another paper with the same text is not similar enough without the same id
+    assert index.find_matches([make_paper("2502.20002", abstract=revised.abstract)], "tag", similarity_threshold=similarity + 0.01) == {}
+
+
+def test_near_duplicate_threshold():
+    index = make_index(make_paper("2502.10001"))
+    edited = make_paper("2502.20002", abstract=ABSTRACT.replace("forty", "fifty").replace("too late", "slightly too late"))
+    similarity = get_similarity(get_signature(make_paper("2502.10001")), get_signature(edited))
+    assert REUSE_SIMILARITY <= similarity < 1.0
+    assert index.find_matches([edited], "tag")["2502.20002"][1:3] == ("near_duplicate", similarity)
+    assert index.find_matches([edited], "tag", similarity_threshold=similarity + 0.01) == {}
+
+
+def test_exported_entries_are_found_after_import():
+    source = make_index(make_paper("2502.10001"))
+    target = NearDuplicateIndex()
+    assert target.import_entries(source.export_entries()) == 1
+    assert target.import_entries(source.export_entries()) == 0
+    assert target.find_matches([make_paper("2502.20002")], "tag")["2502.20002"][:2] == ("2502.10001", "near_duplicate")
@@ -0,0 +1,57 @@
+import configparser
+
+from arxiv_assistant.filters.stage_planner import StagePlanner, StageStats
+
+
+def make_config(run_title_filter):
+    config = configparser.ConfigParser()
+    config.read_dict({
+        "SELECTION": {
+            "model": "openai/gpt-4.1",
+            "run_title_filter": str(run_title_filter).lower(),
+            "title_batch_size": "32",
+            "abstract_batch_size": "4",
+            "adaptive_batch_size": "false",
+            "adaptive_threshold": "0",
+            "output_protocol": "jsonl",
+        },
+    })
+    return config
+
+
+def make_stats_with_abstract_history():
+    stats = StageStats()
+    stats.record_batch("openai/gpt-4.1", "abstract:jsonl", 4, papers=100, prompt_tokens=40000, estimated_prompt_tokens=38000, completion_tokens=6000, seconds=50.0)
+    stats.flush()
+    return stats
+
+
+def plan(config, stats):
+    return StagePlanner(stats, config).plan((0, 0), [20] * 50, [300] * 50, title_overhead=500, abstract_overhead=800)
+
+
+def test_abstract_history_without_title_history_keeps_configured_title_filter():
+    config = make_config(run_title_filter=True)
+    chosen = plan(config, make_stats_with_abstract_history())
+    assert chosen.run_title_filter
+    assert chosen.title_batch_size == 32
+    assert chosen.abstract_batch_size == 4
+    assert "title filter" in chosen.reason
+
+
+def test_abstract_history_without_title_filter_plans_abstract_stage():
+    config = make_config(run_title_filter=False)
+    chosen = plan(config, make_stats_with_abstract_history())
+    assert not chosen.run_title_filter
+    assert chosen.predicted_cost > 0
+
+
+def test_predict_stage_without_enough_history_uses_all_batch_sizes():
+    config = make_config(run_title_filter=True)
+    stats = StageStats()
+    stats.record_batch("openai/gpt-4.1", "title", 32, papers=10, prompt_tokens=1000, estimated_prompt_tokens=1000, completion_tokens=50, seconds=2.0)
+    stats.flush()
+    planner = StagePlanner(stats, config)
+    cost, seconds = planner.predict_stage(planner.title_buckets, 32, 64, 1280, 500)
+    assert cost > 0
+    assert seconds == 4.0
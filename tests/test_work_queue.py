@@ -0,0 +1,93 @@
+import time
+
+from arxiv_assistant.workers import MAX_ATTEMPTS, WorkQueue
+
+
+def make_queue(tmp_path):
+    return WorkQueue(str(tmp_path / "work_queue.sqlite"))
+
+
+def plan(stage, params, state, results):
+    # fetch -> score (one task per fetched area) -> merge (planned through without tasks) -> done
+    if stage == "fetch":
+        return "score", {"areas": [result["area"] for result in results]}, [("score", {"area": result["area"]}) for result in results]
+    if stage == "score":
+        return "merge", {**state, "scored": sum(result["papers"] for result in results)}, []
+    return "done", state, []
+
+
+def run_tasks(queue, task_cnt, owner="worker"):
+    for _ in range(task_cnt):
+        task = queue.lease(owner)
+        result = {"area": task["payload"]["area"], "papers": 2}
+        assert queue.complete(task["id"], owner, result, plan=plan)
+
+
+def test_completing_the_last_task_advances_the_run(tmp_path):
+    queue = make_queue(tmp_path)
+    run_id = queue.add_run({"key": "2025-05-16"}, [{"area": "astro-ph.GA"}, {"area": "astro-ph.CO"}])
+    first = queue.lease("worker")
+    assert queue.complete(first["id"], "worker", {"area": "astro-ph.GA", "papers": 2}, plan=plan)
+    assert queue.get_run(run_id)["stage"] == "fetch"  # the other fetch task is open
+    run_tasks(queue, 1)
+    assert queue.get_run(run_id)["stage"] == "score"
+    assert queue.get_run(run_id)["state"] == {"areas": ["astro-ph.GA", "astro-ph.CO"]}
+    assert not queue.is_idle()
+    run_tasks(queue, 2)
+    run = queue.get_run(run_id)
+    assert run["stage"] == "done"  # merge has no tasks and is planned through
+    assert run["state"]["scored"] == 4
+    assert queue.is_idle()
+    assert queue.find_run("2025-05-16")["stage"] == "done"
+
+
+def test_failing_plan_fails_the_run(tmp_path):
+    queue = make_queue(tmp_path)
+    run_id = queue.add_run({"key": "2025-05-16"}, [{"area": "astro-ph.GA"}])
+
+    def failing_plan(stage, params, state, results):
+        raise RuntimeError("no profiles")
+
+    task = queue.lease("worker")
+    assert queue.complete(task["id"], "worker", {"area": "astro-ph.GA"}, plan=failing_plan)
+    run = queue.get_run(run_id)
+    assert run["stage"] == "failed"
+    assert "RuntimeError: no profiles" in run["state"]["error"]
+    assert queue.lease("worker") is None
+    assert queue.is_idle()
+
+
+def test_failed_task_is_retried_until_max_attempts(tmp_path):
+    queue = make_queue(tmp_path)
+    run_id = queue.add_run({"key": "2025-05-16"}, [{"area": "astro-ph.GA"}])
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        task = queue.lease("worker")
+        assert task["attempts"] == attempt
+        assert queue.fail(task["id"], "worker", "timeout") == ("failed" if attempt == MAX_ATTEMPTS else "pending")
+    assert queue.get_run(run_id)["stage"] == "failed"
+    assert queue.lease("worker") is None
+
+
+def test_expired_lease_is_taken_over_and_the_old_owner_is_ignored(tmp_path):
+    queue = make_queue(tmp_path)
+    run_id = queue.add_run({"key": "2025-05-16"}, [{"area": "astro-ph.GA"}])
+    task = queue.lease("dead worker", lease_seconds=0.01)
+    assert queue.lease("worker") is None  # leased
+    time.sleep(0.02)
+    taken = queue.lease("worker")
+    assert taken["id"] == task["id"] and taken["attempts"] == 2
+    assert not queue.renew(task["id"], "dead worker")
+    assert not queue.complete(task["id"], "dead worker", {"area": "astro-ph.GA"}, plan=plan)
+    assert queue.fail(task["id"], "dead worker", "late") == "lost"
+    assert queue.complete(taken["id"], "worker", {"area": "astro-ph.GA", "papers": 1}, plan=plan)
+    assert queue.get_run(run_id)["stage"] == "score"
+
+
+def test_last_expired_lease_fails_the_run(tmp_path):
+    queue = make_queue(tmp_path)
+    run_id = queue.add_run({"key": "2025-05-16"}, [{"area": "astro-ph.GA"}])
+    for _ in range(MAX_ATTEMPTS):
+        assert queue.lease("dying worker", lease_seconds=0.01) is not None
+        time.sleep(0.02)
+    assert queue.lease("worker") is None
+    assert queue.get_run(run_id)["stage"] == "failed"